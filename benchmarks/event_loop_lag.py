@@ -0,0 +1,126 @@
+"""
+Event-loop lag during a mass token renewal.
+
+A heartbeat task sleeps 5 ms in a loop and records how late it wakes up
+while N tenants are renewed with bounded concurrency. Each renewal builds,
+saves and signs a real loginTicketRequest with a cold key cache (PEM
+parsing included); NTP and WSAA are replaced by fakes.
+
+Three runs are compared:
+    inline   - blocking steps executed on the event loop (previous behaviour)
+    threads  - blocking steps in the thread pool (SIGNING_POOL_PROCESSES=0)
+    process  - signing in a process pool (SIGNING_POOL_PROCESSES>0)
+
+Usage (from the repository root):
+    python -m benchmarks.event_loop_lag [tenants] [concurrency] [processes]
+"""
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+from service.controllers import request_access_token_controller as controller
+from service.crypto.key_cache import key_material_cache
+from service.crypto.sign import sign_for_tenant
+from service.utils import blocking_pool
+from service.utils.logger import logger
+from tests.conftest import generate_test_files
+
+HEARTBEAT_SECONDS = 0.005
+WSAA_ROUND_TRIP_SECONDS = 0.05
+
+
+def fake_time_provider():
+    return 1767764408, "2026-01-07T05:40:08Z", "2026-01-07T05:50:08Z"
+
+
+async def heartbeat(lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        expected = time.perf_counter() + HEARTBEAT_SECONDS
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def renew(cuit: str, mode: str, semaphore: asyncio.Semaphore) -> None:
+    async with semaphore:
+        if mode == "inline":
+            request_bytes = controller._build_login_ticket_request_bytes(cuit)
+            sign_for_tenant(cuit, request_bytes)
+        else:
+            request_bytes = await blocking_pool.run_blocking(controller._build_login_ticket_request_bytes, cuit)
+            await blocking_pool.run_cpu_bound(sign_for_tenant, cuit, request_bytes)
+        await asyncio.sleep(WSAA_ROUND_TRIP_SECONDS)
+
+
+async def measure(cuits: list[str], mode: str, concurrency: int) -> dict:
+    key_material_cache.clear()
+    lags: list[float] = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, stop))
+
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    await asyncio.gather(*(renew(cuit, mode, semaphore) for cuit in cuits))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await beat
+    lags_ms = sorted(lag * 1000 for lag in lags)
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "lag_p50_ms": round(statistics.median(lags_ms), 2),
+        "lag_p99_ms": round(lags_ms[max(0, int(len(lags_ms) * 0.99) - 1)], 2),
+        "lag_max_ms": round(lags_ms[-1], 2),
+    }
+
+
+async def warm_up(executor: ProcessPoolExecutor, processes: int) -> None:
+    # Start the worker processes outside the measured window.
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(executor, time.sleep, 0.1) for _ in range(processes)))
+
+
+def main() -> None:
+    tenants = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    processes = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    logger.setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Same relative layout the service uses, so worker processes resolve
+        # tenant paths on their own.
+        os.chdir(tmp)
+        cuits = [f"20{i:09d}" for i in range(tenants)]
+        for cuit in cuits:
+            certs = Path("service/app_certs") / cuit
+            certs.mkdir(parents=True)
+            _, private_key_bytes, certificate_bytes = generate_test_files()
+            (certs / "PrivateKey.key").write_bytes(private_key_bytes)
+            (certs / "returned_certificate.pem").write_bytes(certificate_bytes)
+
+        results = {}
+        with patch.object(controller, "generate_ntp_timestamp", fake_time_provider):
+            results["inline"] = asyncio.run(measure(cuits, "inline", concurrency))
+            results["threads"] = asyncio.run(measure(cuits, "threads", concurrency))
+
+            # Forked workers would inherit the warm cache of the previous run.
+            key_material_cache.clear()
+            executor = ProcessPoolExecutor(max_workers=processes)
+            asyncio.run(warm_up(executor, processes))
+            with patch.object(blocking_pool, "_process_executor", executor):
+                results[f"process x{processes}"] = asyncio.run(measure(cuits, "process", concurrency))
+            executor.shutdown()
+
+    print(f"{tenants} tenants, concurrency {concurrency}, {os.cpu_count()} CPU(s)")
+    for mode, result in results.items():
+        print(f"{mode:<12}: {result}")
+
+
+if __name__ == "__main__":
+    main()
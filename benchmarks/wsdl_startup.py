@@ -0,0 +1,88 @@
+"""
+Cold-start cost of loading the compiled WSFE and WSAA WSDL documents.
+
+Each sample is a fresh interpreter that imports the service and loads the
+WSFE and WSAA documents the way the client managers do on application
+startup, so zeep's WSDL/XSD compilation is measured the way a deploy pays
+for it (httpx client and SSL context creation is excluded).
+
+Two runs are compared:
+    parse   - WSDL cache disabled, zeep compiles both WSDLs (previous behaviour)
+    cached  - compiled documents loaded from a warm on-disk cache
+
+Usage (from the repository root):
+    python -m benchmarks.wsdl_startup [samples]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CHILD_FLAG = "--child"
+
+
+def child() -> None:
+    from zeep import Settings
+    from zeep.transports import AsyncTransport
+
+    from service.soap_client.wsdl.wsdl_cache import load_wsdl_document
+    from service.soap_client.wsdl.wsdl_manager import (get_wsaa_wsdl,
+                                                       get_wsfe_wsdl)
+
+    transport = AsyncTransport()
+
+    started = time.perf_counter()
+    for wsdl in (get_wsfe_wsdl(), get_wsaa_wsdl()):
+        load_wsdl_document(wsdl, transport, Settings())
+    print(time.perf_counter() - started)
+
+
+def sample(env: dict) -> tuple[float, float]:
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.wsdl_startup", CHILD_FLAG],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    process_seconds = time.perf_counter() - started
+    # The service logger writes to stdout: the timing is the last line.
+    return float(output.strip().splitlines()[-1]), process_seconds
+
+
+def measure(env: dict, samples: int) -> dict:
+    wsdl_ms, process_ms = [], []
+    for _ in range(samples):
+        wsdl_seconds, process_seconds = sample(env)
+        wsdl_ms.append(wsdl_seconds * 1000)
+        process_ms.append(process_seconds * 1000)
+
+    return {
+        "wsdl_p50_ms": round(statistics.median(wsdl_ms), 1),
+        "wsdl_max_ms": round(max(wsdl_ms), 1),
+        "process_p50_ms": round(statistics.median(process_ms), 1),
+    }
+
+
+def main() -> None:
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        base_env = {**os.environ, "WSDL_CACHE_DIR": cache_dir}
+
+        results = {}
+        results["parse"] = measure({**base_env, "WSDL_CACHE_ENABLED": "false"}, samples)
+
+        sample({**base_env, "WSDL_CACHE_ENABLED": "true"})  # populate the cache
+        results["cached"] = measure({**base_env, "WSDL_CACHE_ENABLED": "true"}, samples)
+
+    print(f"{samples} cold starts per mode")
+    for mode, result in results.items():
+        print(f"{mode:<8}: {result}")
+
+
+if __name__ == "__main__":
+    if CHILD_FLAG in sys.argv:
+        child()
+    else:
+        main()
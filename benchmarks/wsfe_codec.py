@@ -0,0 +1,107 @@
+"""
+FECAESolicitar encode/decode cost: zeep vs the fast codec.
+
+encode  - validated payload dict -> SOAP request bytes
+decode  - SOAP response bytes -> the dict consult_afip_wsfe() returns
+
+zeep is measured the way a call goes through it: create_message() plus
+serialization for the request, process_reply() plus serialize_object() for
+the response. No network is involved.
+
+Usage (from the repository root):
+    python -m benchmarks.wsfe_codec [records] [iterations]
+"""
+import logging
+import sys
+import timeit
+from types import SimpleNamespace
+
+from zeep import Client
+from zeep.helpers import serialize_object
+from zeep.wsdl.utils import etree_to_string
+
+from service.soap_client.fast_codec import decode_response, encode_request
+from service.soap_client.wsdl.wsdl_manager import get_wsfe_wsdl
+from service.utils.logger import logger
+
+DETAIL = {
+    "Concepto" : 1, "DocTipo" : 80, "DocNro" : 20111111112,
+    "CbteFch" : "20260125", "ImpTotal" : 121.0, "ImpTotConc" : 0.0,
+    "ImpNeto" : 100.0, "ImpOpEx" : 0.0, "ImpTrib" : 0.0, "ImpIVA" : 21.0,
+    "MonId" : "PES", "MonCotiz" : 1.0, "CondicionIVAReceptorId" : 1,
+    "Iva" : {"AlicIva" : [{"Id" : 5, "BaseImp" : 100.0, "Importe" : 21.0}]},
+}
+
+DETAIL_RESPONSE = (
+    "<FECAEDetResponse><Concepto>1</Concepto><DocTipo>80</DocTipo><DocNro>20111111112</DocNro>"
+    "<CbteDesde>{n}</CbteDesde><CbteHasta>{n}</CbteHasta><CbteFch>20260125</CbteFch>"
+    "<Resultado>A</Resultado><Observaciones><Obs><Code>10217</Code><Msg>Observacion</Msg></Obs></Observaciones>"
+    "<CAE>76043123456789</CAE><CAEFchVto>20260204</CAEFchVto></FECAEDetResponse>"
+)
+
+
+def build_payload(records: int) -> dict:
+    return {
+        "Auth" : {"Token" : "T" * 800, "Sign" : "S" * 172, "Cuit" : 30740253022},
+        "FeCAEReq" : {
+            "FeCabReq" : {"CantReg" : records, "PtoVta" : 1, "CbteTipo" : 1},
+            "FeDetReq" : {"FECAEDetRequest" : [
+                {**DETAIL, "CbteDesde" : n, "CbteHasta" : n} for n in range(1, records + 1)
+            ]},
+        },
+    }
+
+
+def build_response(records: int) -> bytes:
+    details = "".join(DETAIL_RESPONSE.format(n=n) for n in range(1, records + 1))
+    return (
+        '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>'
+        '<FECAESolicitarResponse xmlns="http://ar.gov.afip.dif.FEV1/"><FECAESolicitarResult>'
+        "<FeCabResp><Cuit>30740253022</Cuit><PtoVta>1</PtoVta><CbteTipo>1</CbteTipo>"
+        f"<FchProceso>20260125123045</FchProceso><CantReg>{records}</CantReg><Resultado>A</Resultado>"
+        f"<Reproceso>N</Reproceso></FeCabResp><FeDetResp>{details}</FeDetResp>"
+        "</FECAESolicitarResult></FECAESolicitarResponse></soap:Body></soap:Envelope>"
+    ).encode("utf-8")
+
+
+def per_call_us(function, iterations: int) -> float:
+    return min(timeit.repeat(function, number=iterations, repeat=5)) / iterations * 1e6
+
+
+def main() -> None:
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    logger.setLevel(logging.WARNING)
+
+    client = Client(get_wsfe_wsdl())
+    binding = client.service._binding
+    operation = binding.get("FECAESolicitar")
+
+    payload = build_payload(records)
+    content = build_response(records)
+    response = SimpleNamespace(status_code=200, content=content, headers={}, encoding="utf-8")
+
+    def zeep_encode():
+        etree_to_string(client.create_message(client.service, "FECAESolicitar", **payload))
+
+    def zeep_decode():
+        serialize_object(binding.process_reply(client, operation, response))
+
+    def fast_encode():
+        encode_request("FECAESolicitar", payload)
+
+    def fast_decode():
+        serialize_object(decode_response("FECAESolicitar", 200, content))
+
+    results = {
+        "encode" : (per_call_us(zeep_encode, iterations), per_call_us(fast_encode, iterations)),
+        "decode" : (per_call_us(zeep_decode, iterations), per_call_us(fast_decode, iterations)),
+    }
+
+    print(f"FECAESolicitar, {records} record(s), best of 5 x {iterations}")
+    for step, (zeep_us, fast_us) in results.items():
+        print(f"{step:<7}: zeep {zeep_us:8.1f} us | fast {fast_us:8.1f} us | x{zeep_us / fast_us:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+from os import getenv
+
+from dotenv import load_dotenv
+
+# Tunables read from the environment (or a .env file).
+# Every value has a safe default so the service runs without any configuration.
+load_dotenv(override=False)
+
+
+def _get_int(name: str, default: int) -> int:
+    return int(getenv(name, default))
+
+
+def _get_float(name: str, default: float) -> float:
+    return float(getenv(name, default))
+
+
+def _get_bool(name: str, default: bool) -> bool:
+    return getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+# ===================
+# == ACCESS TOKENS ==
+# ===================
+
+# Cached tokens are treated as expired this many seconds before their real
+# expirationTime, so a request never leaves with a token that dies in flight.
+TOKEN_EXPIRY_MARGIN_SECONDS = _get_int("TOKEN_EXPIRY_MARGIN_SECONDS", 60)
+
+# Maximum time a request waits for an in-flight token regeneration of its CUIT.
+TOKEN_REGENERATION_TIMEOUT_SECONDS = _get_int("TOKEN_REGENERATION_TIMEOUT_SECONDS", 60)
+
+# Tokens are renewed this many seconds before expirationTime...
+TOKEN_REFRESH_MARGIN_SECONDS = _get_int("TOKEN_REFRESH_MARGIN_SECONDS", 1800)
+
+# ...minus a random jitter of up to this many seconds, so tenants whose tokens
+# were issued together do not all hit WSAA in the same second.
+TOKEN_REFRESH_JITTER_SECONDS = _get_int("TOKEN_REFRESH_JITTER_SECONDS", 300)
+
+# Delay before retrying a renewal that failed.
+TOKEN_REFRESH_RETRY_SECONDS = _get_int("TOKEN_REFRESH_RETRY_SECONDS", 60)
+
+# Interval of the sweep that picks up tenants without a scheduled renewal
+# (e.g. certificates copied straight into the certs volume).
+TOKEN_DISCOVERY_SWEEP_HOURS = _get_int("TOKEN_DISCOVERY_SWEEP_HOURS", 6)
+
+# Tenants checked/renewed in parallel by the scheduler sweep.
+SCHEDULER_MAX_CONCURRENCY = _get_int("SCHEDULER_MAX_CONCURRENCY", 10)
+
+# Time budget for checking and renewing a single tenant during the sweep.
+SCHEDULER_TENANT_TIMEOUT_SECONDS = _get_int("SCHEDULER_TENANT_TIMEOUT_SECONDS", 120)
+
+
+# ===================
+# == BLOCKING POOL ==
+# ===================
+
+# Worker threads for CPU/disk-bound steps (CMS signing, key loading, lxml
+# parsing, file I/O) that would otherwise stall the event loop.
+BLOCKING_POOL_SIZE = _get_int("BLOCKING_POOL_SIZE", 4)
+
+# Worker processes for CMS signing. Loading an RSA key holds the GIL, so
+# under mass renewals threads still stall the loop; with a value > 0 signing
+# runs in a process pool instead. 0 signs in the thread pool above.
+SIGNING_POOL_PROCESSES = _get_int("SIGNING_POOL_PROCESSES", 0)
+
+
+# ===================
+# ==== AFIP CLOCK ===
+# ===================
+
+NTP_SERVER = getenv("NTP_SERVER", "time.afip.gov.ar")
+NTP_TIMEOUT_SECONDS = _get_int("NTP_TIMEOUT_SECONDS", 5)
+
+# How often the background job samples NTP.
+NTP_SYNC_INTERVAL_SECONDS = _get_int("NTP_SYNC_INTERVAL_SECONDS", 300)
+
+# Weight of a new sample in the smoothed offset (1.0 = no smoothing).
+NTP_SMOOTHING = _get_float("NTP_SMOOTHING", 0.3)
+
+# After this long without a good sample the clock reports itself stale
+# (readiness fails) but keeps serving the last good offset.
+NTP_MAX_STALENESS_SECONDS = _get_int("NTP_MAX_STALENESS_SECONDS", 3600)
+
+
+# ===================
+# == WSFE TRANSPORT =
+# ===================
+
+# Connection pool toward WSFE. Keep-alive expiry should stay below the idle
+# timeout of AFIP's load balancers so pooled connections are not reset.
+WSFE_MAX_CONNECTIONS = _get_int("WSFE_MAX_CONNECTIONS", 100)
+WSFE_MAX_KEEPALIVE_CONNECTIONS = _get_int("WSFE_MAX_KEEPALIVE_CONNECTIONS", 20)
+WSFE_KEEPALIVE_EXPIRY_SECONDS = _get_float("WSFE_KEEPALIVE_EXPIRY_SECONDS", 5.0)
+
+WSFE_CONNECT_TIMEOUT_SECONDS = _get_float("WSFE_CONNECT_TIMEOUT_SECONDS", 20.0)
+WSFE_READ_TIMEOUT_SECONDS = _get_float("WSFE_READ_TIMEOUT_SECONDS", 20.0)
+WSFE_WRITE_TIMEOUT_SECONDS = _get_float("WSFE_WRITE_TIMEOUT_SECONDS", 20.0)
+# Maximum wait for a free connection when the pool is exhausted.
+WSFE_POOL_TIMEOUT_SECONDS = _get_float("WSFE_POOL_TIMEOUT_SECONDS", 20.0)
+
+# Requires the optional "h2" package (pip install "httpx[http2]").
+WSFE_HTTP2 = _get_bool("WSFE_HTTP2", False)
+
+# ===================
+# ===== STORAGE =====
+# ===================
+
+# Local state that must survive restarts (voucher cache, queues, CAEA).
+# Mount it as a volume in Docker.
+DATA_DIR = getenv("DATA_DIR", "service/data")
+
+# ===================
+# ==== WSDL CACHE ===
+# ===================
+
+# Compiled WSDL/XSD documents persisted between restarts, keyed by WSDL hash
+# and zeep version. Loading one unpickles it, so it is off by default and
+# the directory must only be writable by the service.
+WSDL_CACHE_ENABLED = _get_bool("WSDL_CACHE_ENABLED", False)
+WSDL_CACHE_DIR = getenv("WSDL_CACHE_DIR", f"{DATA_DIR}/wsdl_cache")
+
+# ===================
+# ==== FAST CODEC ===
+# ===================
+
+# Render/parse FECAESolicitar and FECompUltimoAutorizado without zeep objects.
+WSFE_FAST_CODEC = _get_bool("WSFE_FAST_CODEC", False)
+
+# ===================
+# == CATALOG CACHE ==
+# ===================
+
+# FEParamGet* catalogs change a few times a year. Entries are fresh for their
+# TTL, then served stale (and refreshed in the background) for STALE seconds.
+CATALOG_CACHE_TTL_SECONDS = _get_int("CATALOG_CACHE_TTL_SECONDS", 86400)
+CATALOG_CACHE_STALE_SECONDS = _get_int("CATALOG_CACHE_STALE_SECONDS", 604800)
+# Keys include the CUIT of tenant catalogs and the request parameters: least recently used go first.
+CATALOG_CACHE_MAX_ENTRIES = _get_int("CATALOG_CACHE_MAX_ENTRIES", 5000)
+
+# Per-operation TTL: CATALOG_CACHE_TTL_<OPERATION>, e.g. CATALOG_CACHE_TTL_FEPARAMGETPTOSVENTA.
+# Points of sale and activities belong to the tenant and change more often.
+CATALOG_CACHE_OPERATION_TTL_SECONDS = {
+    operation: _get_int(f"CATALOG_CACHE_TTL_{operation.upper()}", default)
+    for operation, default in (
+        ("FEParamGetTiposTributos", CATALOG_CACHE_TTL_SECONDS),
+        ("FEParamGetTiposMonedas", CATALOG_CACHE_TTL_SECONDS),
+        ("FEParamGetTiposIva", CATALOG_CACHE_TTL_SECONDS),
+        ("FEParamGetTiposOpcional", CATALOG_CACHE_TTL_SECONDS),
+        ("FEParamGetTiposConcepto", CATALOG_CACHE_TTL_SECONDS),
+        ("FEParamGetTiposCbte", CATALOG_CACHE_TTL_SECONDS),
+        ("FEParamGetCondicionIvaReceptor", CATALOG_CACHE_TTL_SECONDS),
+        ("FEParamGetTiposDoc", CATALOG_CACHE_TTL_SECONDS),
+        ("FEParamGetTiposPaises", CATALOG_CACHE_TTL_SECONDS),
+        ("FEParamGetPtosVenta", 3600),
+        ("FEParamGetActividades", 3600),
+    )
+}
+
+# ===================
+# ==== COTIZACION ===
+# ===================
+
+# Latest quote per currency (FEParamGetCotizacion without FchCotiz). Quotes
+# for a given date never change and are kept until evicted.
+COTIZACION_CACHE_TTL_SECONDS = _get_int("COTIZACION_CACHE_TTL_SECONDS", 900)
+COTIZACION_REFRESH_INTERVAL_SECONDS = _get_int("COTIZACION_REFRESH_INTERVAL_SECONDS", 600)
+# Currencies not requested for this long stop being refreshed by the scheduler.
+COTIZACION_TRACK_SECONDS = _get_int("COTIZACION_TRACK_SECONDS", 86400)
+COTIZACION_CACHE_MAX_ENTRIES = _get_int("COTIZACION_CACHE_MAX_ENTRIES", 1000)
+
+# ===================
+# == VOUCHER CACHE ==
+# ===================
+
+# FECompConsultar results of authorized vouchers never change: they are kept
+# in a bounded in-memory LRU backed by a SQLite file under DATA_DIR.
+COMPROBANTE_CACHE_PATH = getenv("COMPROBANTE_CACHE_PATH", f"{DATA_DIR}/comprobantes.sqlite3")
+COMPROBANTE_CACHE_MAX_ENTRIES = _get_int("COMPROBANTE_CACHE_MAX_ENTRIES", 10000)
+# "Not found" answers (code 602) are only trusted this long.
+COMPROBANTE_CACHE_NEGATIVE_TTL_SECONDS = _get_int("COMPROBANTE_CACHE_NEGATIVE_TTL_SECONDS", 30)
+
+# ===================
+# == COALESCING =====
+# ===================
+
+# Identical read-only WSFE calls (FECompUltimoAutorizado, FECompConsultar, FEParamGet*, ...)
+# in flight at the same time share one AFIP call.
+REQUEST_COALESCING_ENABLED = _get_bool("REQUEST_COALESCING_ENABLED", True)
+
+# ===================
+# == FECAE BATCHING =
+# ===================
+
+# Opt-in: single-voucher FECAESolicitar requests are coalesced per CUIT,
+# PtoVta and CbteTipo into multi-record calls and numbered by the service
+# (CbteDesde/CbteHasta sent by the client are ignored).
+FECAE_BATCHING_ENABLED = _get_bool("FECAE_BATCHING_ENABLED", False)
+# How long the first voucher of a batch waits for company.
+FECAE_BATCH_WINDOW_MS = _get_int("FECAE_BATCH_WINDOW_MS", 20)
+# AFIP records-per-request limit (RegXReq of FECompTotXRequest).
+FECAE_BATCH_MAX_RECORDS = _get_int("FECAE_BATCH_MAX_RECORDS", 250)
+
+# ===================
+# ===== BULK API ====
+# ===================
+
+# NDJSON bulk invoicing: lines read but not yet answered (memory bound).
+BULK_MAX_IN_FLIGHT = _get_int("BULK_MAX_IN_FLIGHT", 50)
+# Invoices of one CUIT/PtoVta/CbteTipo sent at a time. Keep 1 when clients
+# number their invoices; with FECAE batching on, higher values fill batches.
+BULK_SEQUENCE_CONCURRENCY = _get_int("BULK_SEQUENCE_CONCURRENCY", 1)
+BULK_MAX_LINE_BYTES = _get_int("BULK_MAX_LINE_BYTES", 1048576)
+
+# ===================
+# ==== JOB QUEUE ====
+# ===================
+
+# Asynchronous invoice jobs (submit now, poll for the result later).
+JOB_QUEUE_PATH = getenv("JOB_QUEUE_PATH", f"{DATA_DIR}/jobs.sqlite3")
+# Workers running jobs concurrently. Jobs of one CUIT/PtoVta/CbteTipo still run one at a time.
+JOB_WORKERS = _get_int("JOB_WORKERS", 4)
+# Idle workers check the queue this often even without a new submission.
+JOB_POLL_INTERVAL_SECONDS = _get_float("JOB_POLL_INTERVAL_SECONDS", 1.0)
+# Finished jobs (and their results) are deleted after this long.
+JOB_RETENTION_SECONDS = _get_int("JOB_RETENTION_SECONDS", 604800)
+
+# ===================
+# === IDEMPOTENCY ===
+# ===================
+
+# Results of FECAESolicitar, FECAEASolicitar and FECAEARegInformativo sent with an Idempotency-Key.
+IDEMPOTENCY_STORE_PATH = getenv("IDEMPOTENCY_STORE_PATH", f"{DATA_DIR}/idempotency.sqlite3")
+# How long a retry with the same key gets the stored result instead of a new AFIP call.
+IDEMPOTENCY_TTL_SECONDS = _get_int("IDEMPOTENCY_TTL_SECONDS", 86400)
+
+# ===================
+# == CONSULT RANGE ==
+# ===================
+
+# /wsfe/FECompConsultar/range: most vouchers per request.
+CONSULT_RANGE_MAX_VOUCHERS = _get_int("CONSULT_RANGE_MAX_VOUCHERS", 1000)
+# FECompConsultar calls of one range request in flight at a time.
+CONSULT_RANGE_CONCURRENCY = _get_int("CONSULT_RANGE_CONCURRENCY", 10)
+# FECompConsultar calls per second across all range requests (0 disables the limit).
+CONSULT_RANGE_RATE_PER_SECOND = _get_float("CONSULT_RANGE_RATE_PER_SECOND", 20.0)
+
+# ===================
+# == RATE LIMITS ====
+# ===================
+
+# Outbound WSFE calls per second, per operation class: invoice (FECAESolicitar,
+# FECAEASolicitar, FECAEARegInformativo, FECAEASinMovimientoInformar), catalog
+# (FEParamGet*, FEDummy) and query (everything else). *_GLOBAL is shared by every
+# tenant, *_PER_CUIT applies to each tenant on its own. 0 disables a limit.
+AFIP_RATE_INVOICE_GLOBAL = _get_float("AFIP_RATE_INVOICE_GLOBAL", 0.0)
+AFIP_RATE_INVOICE_PER_CUIT = _get_float("AFIP_RATE_INVOICE_PER_CUIT", 0.0)
+AFIP_RATE_QUERY_GLOBAL = _get_float("AFIP_RATE_QUERY_GLOBAL", 0.0)
+AFIP_RATE_QUERY_PER_CUIT = _get_float("AFIP_RATE_QUERY_PER_CUIT", 0.0)
+AFIP_RATE_CATALOG_GLOBAL = _get_float("AFIP_RATE_CATALOG_GLOBAL", 0.0)
+AFIP_RATE_CATALOG_PER_CUIT = _get_float("AFIP_RATE_CATALOG_PER_CUIT", 0.0)
+# Calls allowed in a burst, in seconds worth of the rate.
+AFIP_RATE_BURST_SECONDS = _get_float("AFIP_RATE_BURST_SECONDS", 1.0)
+
+# ===================
+# ====== CAEA =======
+# ===================
+
+# CAEA codes obtained for contingency invoicing (served by /wsfe/caea/local).
+CAEA_STORE_PATH = getenv("CAEA_STORE_PATH", f"{DATA_DIR}/caea.sqlite3")
+# Request every tenant's CAEA ahead of time. A granted CAEA must later be reported
+# (FECAEARegInformativo or FECAEASinMovimientoInformar), so this is opt-in.
+CAEA_PREFETCH_ENABLED = _get_bool("CAEA_PREFETCH_ENABLED", False)
+CAEA_PREFETCH_INTERVAL_HOURS = _get_int("CAEA_PREFETCH_INTERVAL_HOURS", 6)
+# The next period's CAEA is requested once the period starts within this many days (AFIP allows 5).
+CAEA_PREFETCH_DAYS_AHEAD = _get_int("CAEA_PREFETCH_DAYS_AHEAD", 5)
+# Tenants whose CAEA is requested at the same time.
+CAEA_PREFETCH_CONCURRENCY = _get_int("CAEA_PREFETCH_CONCURRENCY", 5)
+# AFIP calls in flight at once while closing a CAEA period (/wsfe/caea/close).
+CAEA_CLOSE_CONCURRENCY = _get_int("CAEA_CLOSE_CONCURRENCY", 5)
+# What each period close already informed, so a close run again after a crash skips it.
+CAEA_CLOSE_STORE_PATH = getenv("CAEA_CLOSE_STORE_PATH", f"{DATA_DIR}/caea_close.sqlite3")
+
+# ===================
+# == CONTINGENCY ====
+# ===================
+
+# Issue single-voucher FECAESolicitar requests under the stored CAEA while WSFE is degraded.
+CONTINGENCY_ENABLED = _get_bool("CONTINGENCY_ENABLED", False)
+# Point of sale enabled for CAEA; required when CONTINGENCY_ENABLED (AFIP rejects CAEA vouchers on a CAE one).
+CONTINGENCY_PTO_VTA = _get_int("CONTINGENCY_PTO_VTA", 0)
+# Voucher types whose last number on CONTINGENCY_PTO_VTA is read from AFIP with every CAEA prefetch.
+CONTINGENCY_CBTE_TIPOS = [int(tipo) for tipo in getenv("CONTINGENCY_CBTE_TIPOS", "1,3,6,8,11,13").split(",") if tipo.strip()]
+# WSFE is degraded when, over the last CONTINGENCY_WINDOW_SECONDS and at least CONTINGENCY_MIN_SAMPLES
+# FECAESolicitar calls, the error rate or the mean latency reaches these thresholds.
+CONTINGENCY_WINDOW_SECONDS = _get_float("CONTINGENCY_WINDOW_SECONDS", 60.0)
+CONTINGENCY_MIN_SAMPLES = _get_int("CONTINGENCY_MIN_SAMPLES", 10)
+CONTINGENCY_ERROR_RATE = _get_float("CONTINGENCY_ERROR_RATE", 0.5)
+CONTINGENCY_LATENCY_SECONDS = _get_float("CONTINGENCY_LATENCY_SECONDS", 10.0)
+# How often WSFE is probed (FEDummy) while degraded, and queued vouchers reported once it recovers.
+CONTINGENCY_PROBE_INTERVAL_SECONDS = _get_int("CONTINGENCY_PROBE_INTERVAL_SECONDS", 30)
+# Vouchers per FECAEARegInformativo call.
+CONTINGENCY_REPORT_BATCH_SIZE = _get_int("CONTINGENCY_REPORT_BATCH_SIZE", 250)
+CONTINGENCY_STORE_PATH = getenv("CONTINGENCY_STORE_PATH", f"{DATA_DIR}/contingency.sqlite3")
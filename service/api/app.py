@@ -13,16 +13,44 @@ from starlette.exceptions import HTTPException
 from service.api import tenants, wsaa, wsfe
 from service.controllers.readiness_health_controller import \
     readiness_health_check
+from service.soap_client.async_client import (close_clients,
+                                              connection_pool_stats,
+                                              warm_up_clients)
+from service.soap_client.wsdl.wsdl_manager import get_wsaa_wsdl, get_wsfe_wsdl
 from service.utils.afip_token_scheduler import start_scheduler, stop_scheduler
+from service.utils.blocking_pool import shutdown_blocking_pool
+from service.utils.caea_period_close import caea_period_close
+from service.utils.caea_store import caea_store
+from service.utils.catalog_cache import catalog_cache
+from service.utils.comprobante_cache import comprobante_cache
+from service.utils.comprobante_sequencer import comprobante_sequencer
+from service.utils.contingency import contingency
+from service.utils.cotizacion_cache import cotizacion_cache
+from service.utils.fecae_batcher import fecae_batcher
+from service.utils.idempotency import idempotency_store
+from service.utils.job_queue import job_queue
+from service.utils.jwt_validator import verify_token
 from service.utils.logger import logger
+from service.utils.rate_limit import afip_rate_limiter, consult_range_bucket
+from service.utils.request_coalescer import request_coalescer
 
 load_dotenv(override=False)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    warm_up_clients(get_wsfe_wsdl(), get_wsaa_wsdl())
     start_scheduler()
+    await job_queue.start()
     yield
+    await job_queue.stop()
     stop_scheduler()
+    await close_clients()
+    comprobante_cache.close()
+    idempotency_store.close()
+    caea_store.close()
+    caea_period_close.close()
+    contingency.close()
+    shutdown_blocking_pool()
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(wsaa.router)
@@ -45,6 +73,30 @@ async def readiness() -> dict:
     return status
 
 
+# ===================
+# ===== METRICS =====
+# ===================
+
+@app.get("/metrics")
+async def metrics(jwt = Depends(verify_token)) -> dict:
+
+    return {
+        "connection_pools" : connection_pool_stats(),
+        "catalog_cache" : catalog_cache.stats(),
+        "cotizacion_cache" : cotizacion_cache.stats(),
+        "comprobante_cache" : comprobante_cache.stats(),
+        "voucher_sequences" : comprobante_sequencer.stats(),
+        "fecae_batching" : fecae_batcher.stats(),
+        "jobs" : await job_queue.stats(),
+        "idempotency" : idempotency_store.stats(),
+        "caea" : caea_store.stats(),
+        "contingency" : await contingency.stats(),
+        "consult_range_rate_limit" : consult_range_bucket.stats(),
+        "afip_rate_limits" : afip_rate_limiter.stats(),
+        "request_coalescing" : request_coalescer.stats(),
+        }
+
+
 # ===================
 # === DOCS CONFIG ===
 # ===================
@@ -11,3 +11,13 @@ class FeCompConsReq(BaseModel):
 class FECompConsultar(BaseModel):
     Auth: Auth
     FeCompConsReq: FeCompConsReq
+
+class FeCompConsRangoReq(BaseModel):
+    PtoVta: int
+    CbteTipo: int
+    CbteDesde: int
+    CbteHasta: int
+
+class FECompConsultarRango(BaseModel):
+    Auth: Auth
+    FeCompConsReq: FeCompConsRangoReq
@@ -98,4 +98,17 @@ class FeCAEARegInfReq(BaseModel):
 
 class FECAEARegInformativo(BaseModel):
     Auth: Auth
-    FeCAEARegInfReq: FeCAEARegInfReq
\ No newline at end of file
+    FeCAEARegInfReq: FeCAEARegInfReq
+
+class CAEAComprobantes(BaseModel):
+    PtoVta: int
+    CbteTipo: int
+    FECAEADetRequest: list[FECAEADetRequest]
+
+
+class CAEAPeriodClose(BaseModel):
+    """Vouchers issued under the CAEA and points of sale without movement in its period."""
+    Auth: Auth
+    CAEA: str
+    Comprobantes: list[CAEAComprobantes] = []
+    SinMovimiento: list[int] = []
@@ -36,6 +36,13 @@ class FECAEAConsultar(BaseModel):
     Periodo: int
     Orden: int
 
+class CAEALocal(BaseModel):
+    """Periodo/Orden default to the current CAEA period."""
+    Auth: Auth
+
+    Periodo: int | None = None
+    Orden: int | None = None
+
 class FEParamGetCotizacion(BaseModel):
     Auth: Auth
 
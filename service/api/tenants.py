@@ -5,9 +5,15 @@ from pathlib import Path
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 
 from service.controllers.request_access_token_controller import \
-    generate_afip_access_token
+    regenerate_afip_access_token
+from service.crypto.key_cache import key_material_cache
+from service.utils.afip_token_scheduler import (get_scheduled_refresh,
+                                                schedule_token_refresh,
+                                                token_expiration,
+                                                unschedule_token_refresh)
 from service.utils.jwt_validator import verify_token
 from service.utils.logger import logger
+from service.utils.token_cache import token_cache
 from service.xml_management.xml_builder import xml_exists
 
 router = APIRouter()
@@ -50,13 +56,20 @@ async def upload_certs(
 
     logger.info(f"Certificates uploaded for CUIT {cuit}")
 
+    # Tokens and key material of the previous certificate must not be used anymore.
+    token_cache.invalidate(cuit)
+    key_material_cache.invalidate(cuit)
+
     try:
-        result = await generate_afip_access_token(cuit)
+        # Shared with any renewal of this CUIT in flight: WSAA rejects a second loginCms.
+        result = await regenerate_afip_access_token(cuit)
         token_status = result.get("status", "unknown")
     except Exception as e:
         logger.error(f"Failed to generate initial token for CUIT {cuit}: {e}")
         token_status = "error"
 
+    schedule_token_refresh(cuit, await token_expiration(cuit))
+
     return {
         "status": "ok",
         "cuit": cuit,
@@ -74,6 +87,7 @@ async def get_tenant_status(cuit: str, jwt=Depends(verify_token)) -> dict:
     has_key = (certs_dir / "PrivateKey.key").exists()
     has_cert = (certs_dir / "returned_certificate.pem").exists()
     has_token = xml_exists("loginTicketResponse.xml", cuit)
+    next_refresh = get_scheduled_refresh(cuit)
 
     return {
         "cuit": cuit,
@@ -81,6 +95,7 @@ async def get_tenant_status(cuit: str, jwt=Depends(verify_token)) -> dict:
         "has_private_key": has_key,
         "has_certificate": has_cert,
         "token_valid": has_token,
+        "next_token_refresh": next_refresh.isoformat() if next_refresh else None,
     }
 
 
@@ -97,6 +112,10 @@ async def delete_tenant(cuit: str, jwt=Depends(verify_token)) -> dict:
     if xml_dir.exists():
         shutil.rmtree(xml_dir)
 
+    token_cache.invalidate(cuit)
+    key_material_cache.invalidate(cuit)
+    unschedule_token_refresh(cuit)
+
     logger.info(f"Tenant {cuit} deleted")
 
     return {"status": "deleted", "cuit": cuit}
@@ -1,9 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
-
-from service.api.models.fe_comp_consultar import FECompConsultar
+import copy
+import json
+import time
+
+from fastapi import (APIRouter, Depends, Header, HTTPException, Request,
+                     Response)
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+
+from config.settings import (BULK_MAX_IN_FLIGHT, BULK_MAX_LINE_BYTES,
+                             BULK_SEQUENCE_CONCURRENCY,
+                             CONSULT_RANGE_CONCURRENCY,
+                             CONSULT_RANGE_MAX_VOUCHERS,
+                             FECAE_BATCHING_ENABLED, WSFE_FAST_CODEC)
+from service.api.models.fe_comp_consultar import (FECompConsultar,
+                                                  FECompConsultarRango)
 from service.api.models.fecae_solicitar import FECAESolicitar
-from service.api.models.fecaea_reg_informativo import FECAEARegInformativo
-from service.api.models.simple_models import (FECAEAConsultar,
+from service.api.models.fecaea_reg_informativo import (CAEAPeriodClose,
+                                                       FECAEARegInformativo)
+from service.api.models.simple_models import (CAEALocal, FECAEAConsultar,
                                               FECAEASinMovimientoConsultar,
                                               FECAEASinMovimientoInformar,
                                               FECAEASolicitar,
@@ -22,14 +36,36 @@ from service.api.models.simple_models import (FECAEAConsultar,
                                               FEParamGetTiposPaises,
                                               FEParamGetTiposTributos)
 from service.controllers.request_access_token_controller import \
-    generate_afip_access_token
+    regenerate_afip_access_token
 from service.payload_builder.builder import add_auth_to_payload
 from service.soap_client.async_client import WSFEClientManager
+from service.soap_client.fast_codec import call_wsfe
+from service.soap_client.format_error import build_error_response
 from service.soap_client.wsdl.wsdl_manager import get_wsfe_wsdl
 from service.soap_client.wsfe import consult_afip_wsfe
+from service.utils.blocking_pool import run_blocking
+from service.utils.caea_period_close import caea_period_close
+from service.utils.caea_store import afip_today, caea_store, period_of
+from service.utils.catalog_cache import catalog_cache, wants_fresh
+from service.utils.comprobante_cache import (comprobante_cache,
+                                             fecae_from_consults)
+from service.utils.comprobante_sequencer import comprobante_sequencer
+from service.utils.contingency import contingency
+from service.utils.cotizacion_cache import cotizacion_cache
+from service.utils.fecae_batcher import fecae_batcher, is_batchable
+from service.utils.idempotency import (MAX_KEY_LENGTH, IdempotencyKeyReused,
+                                       idempotency_store)
+from service.utils.job_queue import FINISHED, job_queue
 from service.utils.jwt_validator import verify_token
 from service.utils.logger import logger
-from service.xml_management.xml_builder import extract_token_and_sign_from_xml, xml_exists
+from service.utils.ndjson_stream import (NDJSONStreamingResponse, map_ordered,
+                                         stream_ndjson)
+from service.utils.rate_limit import afip_rate_limiter, consult_range_bucket
+from service.utils.request_coalescer import request_coalescer
+from service.utils.token_cache import token_cache
+from service.utils.wsfe_health import wsfe_health
+from service.xml_management.xml_builder import (extract_credentials_from_xml,
+                                                xml_exists)
 
 router = APIRouter()
 afip_wsdl = get_wsfe_wsdl()
@@ -40,11 +76,29 @@ def _extract_cuit(data: dict) -> str:
     return str(data["Auth"]["Cuit"])
 
 
+def _load_token_and_sign(cuit: str) -> tuple[str, str]:
+    """Return token and sign from the token cache, reading loginTicketResponse.xml only on a cache miss."""
+    cached = token_cache.get(cuit)
+    if cached is None:
+        token, sign, expiration = extract_credentials_from_xml(cuit)
+        token_cache.set(cuit, token, sign, expiration)
+        cached = token_cache.get(cuit)
+
+    if cached is None:
+        raise ValueError("Token in loginTicketResponse.xml is expired")
+
+    return cached.token, cached.sign
+
+
 async def _get_token_and_sign(cuit: str) -> tuple[str, str]:
     """Extract token and sign, regenerating the token if needed."""
+    cached = token_cache.get(cuit)
+    if cached is not None:
+        return cached.token, cached.sign
+
     if not xml_exists("loginTicketResponse.xml", cuit):
         logger.warning(f"Token file not found for CUIT {cuit}, attempting to regenerate...")
-        result = await generate_afip_access_token(cuit)
+        result = await regenerate_afip_access_token(cuit)
         if result.get("status") != "success":
             raise HTTPException(
                 status_code=503,
@@ -52,18 +106,18 @@ async def _get_token_and_sign(cuit: str) -> tuple[str, str]:
             )
 
     try:
-        return extract_token_and_sign_from_xml(cuit)
+        return await run_blocking(_load_token_and_sign, cuit)
     except Exception as e:
         logger.error(f"Failed to extract token/sign for CUIT {cuit}: {e}")
         logger.info(f"Attempting token regeneration for CUIT {cuit}...")
-        result = await generate_afip_access_token(cuit)
+        result = await regenerate_afip_access_token(cuit)
         if result.get("status") != "success":
             raise HTTPException(
                 status_code=503,
                 detail=f"AFIP token not available for CUIT {cuit}. Token regeneration failed.",
             )
         try:
-            return extract_token_and_sign_from_xml(cuit)
+            return await run_blocking(_load_token_and_sign, cuit)
         except Exception as e2:
             logger.error(f"Token extraction still failed after regeneration for CUIT {cuit}: {e2}")
             raise HTTPException(
@@ -72,182 +126,353 @@ async def _get_token_and_sign(cuit: str) -> tuple[str, str]:
             )
 
 
-@router.post("/wsfe/FECAESolicitar")
-async def fecae_solicitar(data: FECAESolicitar, jwt = Depends(verify_token)) -> dict:
+async def _call_afip(operation: str, cuit: str | None, make_request) -> dict:
+    """consult_afip_wsfe, once the outbound rate limits of the operation's class let it through."""
+    await afip_rate_limiter.acquire(operation, cuit)
+    return await consult_afip_wsfe(make_request, operation)
 
-    logger.info("Received request to generate invoice at /wsfe/FECAESolicitar")
 
-    data = data.model_dump(by_alias=True, exclude_none=True)
+async def _consult(operation: str, payload: dict, make_request) -> dict:
+    """_call_afip; identical read-only calls in flight at the same time share one AFIP call."""
+    cuit = str(payload["Auth"]["Cuit"]) if "Auth" in payload else None
+    return await request_coalescer.run(operation, payload, lambda: _call_afip(operation, cuit, make_request))
+
+
+async def _consult_catalog(operation: str, data: dict, response: Response, cache_control: str | None) -> dict:
+    """
+    FEParamGet* call served through the catalog cache.
+    The X-Cache response header tells whether AFIP was queried (MISS, BYPASS)
+    or the answer came from the cache (HIT, STALE).
+    """
+    cuit = _extract_cuit(data)
+    params = {key: value for key, value in data.items() if key != "Auth"}
+
+    async def fetch():
+        token, sign = await _get_token_and_sign(cuit)
+        payload = add_auth_to_payload(copy.deepcopy(data), token, sign)
+
+        async def make_request():
+            manager = WSFEClientManager(afip_wsdl)
+            client = manager.get_client()
+            return await getattr(client.service, operation)(**payload)
+
+        return await _consult(operation, payload, make_request)
+
+    result, cache_status = await catalog_cache.get_or_fetch(operation, cuit, params, fetch, bypass=wants_fresh(cache_control))
+    response.headers["X-Cache"] = cache_status
+    return result
+
+
+async def _request_cae(data: dict) -> dict:
+    """
+    Send a FECAESolicitar payload (Auth without token) and record the
+    authorized vouchers in the voucher sequencer and cache.
+    """
     cuit = _extract_cuit(data)
     token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
+    payload = add_auth_to_payload(data, token, sign)
 
     async def make_request():
         manager = WSFEClientManager(afip_wsdl)
+        if WSFE_FAST_CODEC:
+            return await call_wsfe(manager, "FECAESolicitar", payload)
         client = manager.get_client()
-        return await client.service.FECAESolicitar(**data)
+        return await client.service.FECAESolicitar(**payload)
 
+    # Waiting for the rate limit is not AFIP latency, so it stays out of wsfe_health.
+    await afip_rate_limiter.acquire("FECAESolicitar", cuit)
+    started = time.monotonic()
     result = await consult_afip_wsfe(make_request, "FECAESolicitar")
+    wsfe_health.record(time.monotonic() - started, result.get("status") == "success")
+
+    comprobante_sequencer.record_fecae(payload, result)
+    await comprobante_cache.store_fecae_result(payload, result)
     return result
 
 
-@router.post("/wsfe/FECompTotXRequest")
-async def fecomp_totx_request(data: FECompTotXRequest, jwt = Depends(verify_token)) -> dict:
+async def _comp_consultar(cuit: str, cbte_tipo: int, pto_vta: int, cbte_nro: int) -> dict:
+    """FECompConsultar of one voucher, through the voucher cache."""
+    async def fetch():
+        token, sign = await _get_token_and_sign(cuit)
+        query = {"CbteTipo" : cbte_tipo, "PtoVta" : pto_vta, "CbteNro" : cbte_nro}
+        payload = add_auth_to_payload({"Auth" : {"Cuit" : int(cuit)}, "FeCompConsReq" : query}, token, sign)
 
-    data = data.model_dump(by_alias=True, exclude_none=True)
-    cuit = _extract_cuit(data)
-    token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
+        async def make_request():
+            manager = WSFEClientManager(afip_wsdl)
+            client = manager.get_client()
+            return await client.service.FECompConsultar(**payload)
 
-    async def make_request():
-        manager = WSFEClientManager(afip_wsdl)
-        client = manager.get_client()
-        return await client.service.FECompTotXRequest(**data)
+        return await _consult("FECompConsultar", payload, make_request)
 
-    result = await consult_afip_wsfe(make_request, "FECompTotXRequest")
+    result, _ = await comprobante_cache.get_or_fetch(cuit, cbte_tipo, pto_vta, cbte_nro, fetch)
     return result
 
 
-@router.post("/wsfe/FECompUltimoAutorizado")
-async def fe_comp_ultimo_autorizado(data: FECompUltimoAutorizado, jwt = Depends(verify_token)) -> dict:
-    logger.info("Received request to generate invoice at /wsfe/FECompUltimoAutorizado")
+async def _recover_cae(data: dict) -> dict | None:
+    """
+    FECAESolicitar job run again after a restart: if AFIP already has its
+    vouchers, their FECompConsultar data stands in for the lost answer
+    instead of a second call refused with 10016.
+    """
+    cuit = _extract_cuit(data)
+    header = data["FeCAEReq"]["FeCabReq"]
+
+    consults = []
+    for detail in data["FeCAEReq"]["FeDetReq"]["FECAEDetRequest"]:
+        consult = await _comp_consultar(cuit, header["CbteTipo"], header["PtoVta"], detail["CbteDesde"])
+        consults.append(consult)
+        if not ((consult.get("response") or {}).get("ResultGet") or {}).get("CodAutorizacion"):
+            break
+
+    result = fecae_from_consults(data, consults)
+    if result is not None:
+        comprobante_sequencer.record_fecae(data, result)
+    return result
 
-    data = data.model_dump(by_alias=True, exclude_none=True)
+
+async def _request_cae_in_sequence(data: dict) -> dict:
+    """_request_cae holding the numbering lock of its CUIT/PtoVta/CbteTipo (batches hold it themselves)."""
+    header = data["FeCAEReq"]["FeCabReq"]
+    async with comprobante_sequencer.lock(_extract_cuit(data), header["PtoVta"], header["CbteTipo"]):
+        return await _request_cae(data)
+
+
+job_queue.register("FECAESolicitar", _request_cae_in_sequence, _recover_cae)
+
+
+async def _last_authorized(data: dict) -> dict:
+    """FECompUltimoAutorizado for a payload with Auth, PtoVta and CbteTipo."""
     cuit = _extract_cuit(data)
     token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
+    payload = add_auth_to_payload(copy.deepcopy(data), token, sign)
 
     async def make_request():
         manager = WSFEClientManager(afip_wsdl)
+        if WSFE_FAST_CODEC:
+            return await call_wsfe(manager, "FECompUltimoAutorizado", payload)
         client = manager.get_client()
-        return await client.service.FECompUltimoAutorizado(**data)
-
-    result = await consult_afip_wsfe(make_request, "FECompUltimoAutorizado")
-    return result
+        return await client.service.FECompUltimoAutorizado(**payload)
 
+    return await _consult("FECompUltimoAutorizado", payload, make_request)
 
-@router.post("/wsfe/FECompConsultar")
-async def fe_comp_consultar(comp_info: FECompConsultar, jwt = Depends(verify_token)) -> dict:
-    logger.info("Received request to query specific invoice at /wsfe/FECompConsultar")
 
-    data = comp_info.model_dump(by_alias=True, exclude_none=True)
-    cuit = _extract_cuit(data)
+async def _caea_call(operation: str, cuit: str, periodo: int, orden: int) -> dict:
+    """FECAEASolicitar or FECAEAConsultar; a granted CAEA is kept in the local CAEA store."""
     token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
+    payload = add_auth_to_payload({"Auth" : {"Cuit" : int(cuit)}, "Periodo" : periodo, "Orden" : orden}, token, sign)
 
     async def make_request():
         manager = WSFEClientManager(afip_wsdl)
         client = manager.get_client()
-        return await client.service.FECompConsultar(**data)
+        return await getattr(client.service, operation)(**payload)
 
-    result = await consult_afip_wsfe(make_request, "FECompConsultar")
+    result = await _consult(operation, payload, make_request)
+    await caea_store.record(cuit, result)
     return result
 
 
-@router.post("/wsfe/FECAEARegInformativo")
-async def fecaea_reg_informativo(data: FECAEARegInformativo, jwt = Depends(verify_token)) -> dict:
+caea_store.register(_caea_call)
 
-    data = data.model_dump(by_alias=True, exclude_none=True)
+
+async def _reg_informativo(data: dict) -> dict:
+    """FECAEARegInformativo for a payload with Auth without token."""
     cuit = _extract_cuit(data)
     token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
+    payload = add_auth_to_payload(copy.deepcopy(data), token, sign)
 
     async def make_request():
         manager = WSFEClientManager(afip_wsdl)
         client = manager.get_client()
-        return await client.service.FECAEARegInformativo(**data)
+        return await client.service.FECAEARegInformativo(**payload)
 
-    result = await consult_afip_wsfe(make_request, "FECAEARegInformativo")
-    return result
+    return await _call_afip("FECAEARegInformativo", cuit, make_request)
 
 
-@router.post("/wsfe/FECAEASolicitar")
-async def fecaea_solicitar(data: FECAEASolicitar, jwt = Depends(verify_token)) -> dict:
-
-    data = data.model_dump(by_alias=True, exclude_none=True)
-    cuit = _extract_cuit(data)
-    token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
-
+async def _probe_wsfe() -> bool:
+    """FEDummy: WSFE answers and its application, database and auth servers are OK."""
     async def make_request():
         manager = WSFEClientManager(afip_wsdl)
         client = manager.get_client()
-        return await client.service.FECAEASolicitar(**data)
+        return await client.service.FEDummy()
 
-    result = await consult_afip_wsfe(make_request, "FECAEASolicitar")
-    return result
+    result = await _consult("FEDummy", {}, make_request)
+    response = result.get("response") if result.get("status") == "success" else None
+    return isinstance(response, dict) and all(response.get(server) == "OK" for server in ("AppServer", "DbServer", "AuthServer"))
 
 
-@router.post("/wsfe/FECAEASinMovimientoConsultar")
-async def fecaea_sin_movimiento_consultar(data: FECAEASinMovimientoConsultar, jwt = Depends(verify_token)) -> dict:
+contingency.register(_reg_informativo, _probe_wsfe, _last_authorized)
 
-    data = data.model_dump(by_alias=True, exclude_none=True)
-    cuit = _extract_cuit(data)
+
+async def _sin_movimiento_informar(cuit: str, pto_vta: int, caea: str) -> dict:
+    """FECAEASinMovimientoInformar: no voucher was issued under the CAEA on this point of sale."""
     token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
+    payload = add_auth_to_payload({"Auth" : {"Cuit" : int(cuit)}, "PtoVta" : pto_vta, "CAEA" : caea}, token, sign)
 
     async def make_request():
         manager = WSFEClientManager(afip_wsdl)
         client = manager.get_client()
-        return await client.service.FECAEASinMovimientoConsultar(**data)
+        return await client.service.FECAEASinMovimientoInformar(**payload)
 
-    result = await consult_afip_wsfe(make_request, "FECAEASinMovimientoConsultar")
-    return result
+    return await _call_afip("FECAEASinMovimientoInformar", cuit, make_request)
 
 
-@router.post("/wsfe/FECAEASinMovimientoInformar")
-async def fecaea_sin_movimiento_informar(data: FECAEASinMovimientoInformar, jwt = Depends(verify_token)) -> dict:
+caea_period_close.register(_reg_informativo, _sin_movimiento_informar)
+job_queue.register("CAEAPeriodClose", caea_period_close.run)
 
-    data = data.model_dump(by_alias=True, exclude_none=True)
-    cuit = _extract_cuit(data)
+
+async def _cotizacion(cuit: str, mon_id: str, fch_cotiz: str | None) -> dict:
+    """FEParamGetCotizacion with a token fetched for this call."""
     token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
+    data = {"Auth" : {"Cuit" : int(cuit)}, "MonId" : mon_id}
+    if fch_cotiz is not None:
+        data["FchCotiz"] = fch_cotiz
+    payload = add_auth_to_payload(data, token, sign)
 
     async def make_request():
         manager = WSFEClientManager(afip_wsdl)
         client = manager.get_client()
-        return await client.service.FECAEASinMovimientoInformar(**data)
+        return await client.service.FEParamGetCotizacion(**payload)
+
+    return await _consult("FEParamGetCotizacion", payload, make_request)
+
+
+cotizacion_cache.register(_cotizacion)
+
+
+async def _idempotent(operation: str, data: dict, idempotency_key: str | None, response: Response, call) -> dict:
+    """
+    Run an AFIP-mutating call at most once per Idempotency-Key. Retries get
+    the first call's result back (Idempotent-Replayed: true) without
+    reaching AFIP. Requests without the header run as usual.
+    """
+    if idempotency_key is None:
+        return await call()
+
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+
+    try:
+        result, replayed = await idempotency_store.run(operation, _extract_cuit(data), idempotency_key, data, call)
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-    result = await consult_afip_wsfe(make_request, "FECAEASinMovimientoInformar")
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
     return result
 
 
-@router.post("/wsfe/FECAEAConsultar")
-async def fecaea_consultar(data: FECAEAConsultar, jwt = Depends(verify_token)) -> dict:
+async def _solicitar(data: dict) -> tuple[dict, int | None]:
+    """
+    FECAESolicitar through the batcher when enabled, or under the stored
+    CAEA while WSFE is degraded and contingency is enabled. Returns
+    (result, batch size or None).
+    """
+    if contingency.active() and is_batchable(data):
+        issued = await contingency.issue(data)
+        if issued is not None:
+            return issued, None
+
+    if FECAE_BATCHING_ENABLED and is_batchable(data):
+        header = data["FeCAEReq"]["FeCabReq"]
+        sequence = {"Auth" : data["Auth"], "PtoVta" : header["PtoVta"], "CbteTipo" : header["CbteTipo"]}
+        return await fecae_batcher.submit(data, _request_cae, lambda: _last_authorized(sequence))
+
+    return await _request_cae_in_sequence(data), None
+
+
+@router.post("/wsfe/FECAESolicitar")
+async def fecae_solicitar(data: FECAESolicitar, response: Response, idempotency_key: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
+
+    logger.info("Received request to generate invoice at /wsfe/FECAESolicitar")
 
     data = data.model_dump(by_alias=True, exclude_none=True)
-    cuit = _extract_cuit(data)
-    token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
 
-    async def make_request():
-        manager = WSFEClientManager(afip_wsdl)
-        client = manager.get_client()
-        return await client.service.FECAEAConsultar(**data)
+    async def call():
+        result, batch_size = await _solicitar(data)
+        if batch_size is not None:
+            response.headers["X-Batch-Size"] = str(batch_size)
+        return result
 
-    result = await consult_afip_wsfe(make_request, "FECAEAConsultar")
-    return result
+    return await _idempotent("FECAESolicitar", data, idempotency_key, response, call)
 
 
-@router.post("/wsfe/FEParamGetCotizacion")
-async def fe_param_get_cotization(data: FEParamGetCotizacion, jwt = Depends(verify_token)) -> dict:
+@router.post("/wsfe/FECAESolicitar/bulk")
+async def fecae_solicitar_bulk(request: Request, jwt = Depends(verify_token)) -> NDJSONStreamingResponse:
+    """
+    NDJSON in, NDJSON out: one FECAESolicitar body per line, one
+    {"line": n, ...result} per line back as soon as it completes. Lines are
+    validated as they arrive and never buffered as a whole; invoices of the
+    same CUIT/PtoVta/CbteTipo run BULK_SEQUENCE_CONCURRENCY at a time, in order.
+    """
+    logger.info("Received bulk invoice stream at /wsfe/FECAESolicitar/bulk")
+
+    def handle(line_no: int, line: bytes):
+        try:
+            data = FECAESolicitar.model_validate_json(line).model_dump(by_alias=True, exclude_none=True)
+        except ValidationError as e:
+            return None, build_error_response("FECAESolicitar", "Validation error", str(e))
+
+        async def work():
+            try:
+                result, _ = await _solicitar(data)
+                return result
+            except HTTPException as e:
+                return build_error_response("FECAESolicitar", "Access token error", e.detail)
+
+        header = data["FeCAEReq"]["FeCabReq"]
+        return (_extract_cuit(data), header["PtoVta"], header["CbteTipo"]), work
+
+    return NDJSONStreamingResponse(
+        stream_ndjson(
+            request.stream(),
+            handle,
+            method="FECAESolicitar",
+            max_in_flight=BULK_MAX_IN_FLIGHT,
+            per_sequence=BULK_SEQUENCE_CONCURRENCY,
+            max_line_bytes=BULK_MAX_LINE_BYTES,
+        ),
+    )
+
+
+@router.post("/wsfe/FECAESolicitar/jobs", status_code=202)
+async def fecae_solicitar_job(data: FECAESolicitar, jwt = Depends(verify_token)) -> dict:
+    """
+    Queue the invoice and return at once. Poll /wsfe/jobs/{job_id} and read
+    the FECAESolicitar result from /wsfe/jobs/{job_id}/result. Jobs always
+    use the CbteDesde/CbteHasta sent, so a job re-run after a crash cannot
+    authorize a second voucher; if the first run reached AFIP, the re-run
+    takes its result from FECompConsultar instead.
+    """
+    logger.info("Received invoice job at /wsfe/FECAESolicitar/jobs")
 
     data = data.model_dump(by_alias=True, exclude_none=True)
-    cuit = _extract_cuit(data)
-    token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
+    header = data["FeCAEReq"]["FeCabReq"]
+    sequence = f"{_extract_cuit(data)}/{header['PtoVta']}/{header['CbteTipo']}"
 
-    async def make_request():
-        manager = WSFEClientManager(afip_wsdl)
-        client = manager.get_client()
-        return await client.service.FEParamGetCotizacion(**data)
+    job = await job_queue.submit("FECAESolicitar", data, sequence=sequence)
+    return job.summary()
 
-    result = await consult_afip_wsfe(make_request, "FEParamGetCotizacion")
-    return result
 
+@router.get("/wsfe/jobs/{job_id}")
+async def get_job(job_id: str, jwt = Depends(verify_token)) -> dict:
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.summary()
 
-@router.post("/wsfe/FEParamGetTiposTributos")
-async def fe_param_get_tipos_tributos(data: FEParamGetTiposTributos, jwt = Depends(verify_token)) -> dict:
+
+@router.get("/wsfe/jobs/{job_id}/result")
+async def get_job_result(job_id: str, jwt = Depends(verify_token)) -> dict:
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job.status not in FINISHED:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}")
+    return job.result
+
+
+@router.post("/wsfe/FECompTotXRequest")
+async def fecomp_totx_request(data: FECompTotXRequest, jwt = Depends(verify_token)) -> dict:
 
     data = data.model_dump(by_alias=True, exclude_none=True)
     cuit = _extract_cuit(data)
@@ -257,82 +482,146 @@ async def fe_param_get_tipos_tributos(data: FEParamGetTiposTributos, jwt = Depen
     async def make_request():
         manager = WSFEClientManager(afip_wsdl)
         client = manager.get_client()
-        return await client.service.FEParamGetTiposTributos(**data)
+        return await client.service.FECompTotXRequest(**data)
 
-    result = await consult_afip_wsfe(make_request, "FEParamGetTiposTributos")
+    result = await _consult("FECompTotXRequest", data, make_request)
     return result
 
 
-@router.post("/wsfe/FEParamGetTiposMonedas")
-async def fe_param_get_tipos_monedas(data: FEParamGetTiposMonedas, jwt = Depends(verify_token)) -> dict:
+@router.post("/wsfe/FECompUltimoAutorizado")
+async def fe_comp_ultimo_autorizado(data: FECompUltimoAutorizado, jwt = Depends(verify_token)) -> dict:
+    logger.info("Received request to generate invoice at /wsfe/FECompUltimoAutorizado")
 
     data = data.model_dump(by_alias=True, exclude_none=True)
     cuit = _extract_cuit(data)
-    token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
 
-    async def make_request():
-        manager = WSFEClientManager(afip_wsdl)
-        client = manager.get_client()
-        return await client.service.FEParamGetTiposMonedas(**data)
+    result = await _last_authorized(data)
+    comprobante_sequencer.record_last_authorized(cuit, data["PtoVta"], data["CbteTipo"], result)
+    return result
 
-    result = await consult_afip_wsfe(make_request, "FEParamGetTiposMonedas")
+
+@router.post("/wsfe/next-voucher-number")
+async def next_voucher_number(data: FECompUltimoAutorizado, response: Response, jwt = Depends(verify_token)) -> dict:
+    """
+    Next CbteNro for PtoVta/CbteTipo from the local sequence. AFIP is only
+    queried (FECompUltimoAutorizado) the first time a sequence is used or
+    after it fell out of sync. X-Sequence-Source tells which one answered.
+    """
+    data = data.model_dump(by_alias=True, exclude_none=True)
+    cuit = _extract_cuit(data)
+
+    result, source = await comprobante_sequencer.next_number(cuit, data["PtoVta"], data["CbteTipo"], lambda: _last_authorized(data))
+    response.headers["X-Sequence-Source"] = source
     return result
 
 
-@router.post("/wsfe/FEParamGetTiposIva")
-async def fe_param_get_tipos_iva(data: FEParamGetTiposIva, jwt = Depends(verify_token)) -> dict:
+@router.post("/wsfe/FECompConsultar")
+async def fe_comp_consultar(comp_info: FECompConsultar, response: Response, cache_control: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
+    logger.info("Received request to query specific invoice at /wsfe/FECompConsultar")
 
-    data = data.model_dump(by_alias=True, exclude_none=True)
+    data = comp_info.model_dump(by_alias=True, exclude_none=True)
     cuit = _extract_cuit(data)
-    token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
+    query = data["FeCompConsReq"]
 
-    async def make_request():
-        manager = WSFEClientManager(afip_wsdl)
-        client = manager.get_client()
-        return await client.service.FEParamGetTiposIva(**data)
+    async def fetch():
+        token, sign = await _get_token_and_sign(cuit)
+        payload = add_auth_to_payload(copy.deepcopy(data), token, sign)
+
+        async def make_request():
+            manager = WSFEClientManager(afip_wsdl)
+            client = manager.get_client()
+            return await client.service.FECompConsultar(**payload)
 
-    result = await consult_afip_wsfe(make_request, "FEParamGetTiposIva")
+        return await _consult("FECompConsultar", payload, make_request)
+
+    result, cache_status = await comprobante_cache.get_or_fetch(
+        cuit, query["CbteTipo"], query["PtoVta"], query["CbteNro"], fetch, bypass=wants_fresh(cache_control),
+    )
+    response.headers["X-Cache"] = cache_status
     return result
 
 
-@router.post("/wsfe/FEParamGetTiposOpcional")
-async def fe_param_get_tipos_opcional(data: FEParamGetTiposOpcional, jwt = Depends(verify_token)) -> dict:
+@router.post("/wsfe/FECompConsultar/range")
+async def fe_comp_consultar_range(data: FECompConsultarRango, cache_control: str | None = Header(None), jwt = Depends(verify_token)) -> StreamingResponse:
+    """
+    FECompConsultar for every CbteNro from CbteDesde to CbteHasta, streamed
+    back as NDJSON ({"CbteNro": n, "cache": ..., ...result}) in number order.
+    CONSULT_RANGE_CONCURRENCY lookups run at once and every AFIP call takes a
+    token from the shared range rate limit; cached vouchers skip both. The
+    tenant token is looked up once for the whole range.
+    """
+    logger.info("Received range query at /wsfe/FECompConsultar/range")
 
     data = data.model_dump(by_alias=True, exclude_none=True)
     cuit = _extract_cuit(data)
+    query = data["FeCompConsReq"]
+    first, last = query["CbteDesde"], query["CbteHasta"]
+
+    if first < 1 or last < first:
+        raise HTTPException(status_code=400, detail="CbteDesde must be at least 1 and not greater than CbteHasta")
+    if last - first + 1 > CONSULT_RANGE_MAX_VOUCHERS:
+        raise HTTPException(status_code=400, detail=f"A range query covers at most {CONSULT_RANGE_MAX_VOUCHERS} vouchers")
+
     token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
+    bypass = wants_fresh(cache_control)
+
+    async def lookup(cbte_nro: int) -> bytes:
+        async def fetch():
+            payload = add_auth_to_payload(
+                {"Auth" : copy.deepcopy(data["Auth"]),
+                 "FeCompConsReq" : {"PtoVta" : query["PtoVta"], "CbteTipo" : query["CbteTipo"], "CbteNro" : cbte_nro}},
+                token, sign,
+            )
 
-    async def make_request():
-        manager = WSFEClientManager(afip_wsdl)
-        client = manager.get_client()
-        return await client.service.FEParamGetTiposOpcional(**data)
+            async def make_request():
+                manager = WSFEClientManager(afip_wsdl)
+                client = manager.get_client()
+                return await client.service.FECompConsultar(**payload)
 
-    result = await consult_afip_wsfe(make_request, "FEParamGetTiposOpcional")
-    return result
+            async def call():
+                await consult_range_bucket.acquire()
+                return await _call_afip("FECompConsultar", cuit, make_request)
 
+            return await request_coalescer.run("FECompConsultar", payload, call)
 
-@router.post("/wsfe/FEParamGetTiposConcepto")
-async def fe_param_get_tipos_concepto(data: FEParamGetTiposConcepto, jwt = Depends(verify_token)) -> dict:
+        try:
+            result, cache_status = await comprobante_cache.get_or_fetch(
+                cuit, query["CbteTipo"], query["PtoVta"], cbte_nro, fetch, bypass=bypass,
+            )
+        except Exception as e:
+            logger.error(f"Range query of voucher {cbte_nro} failed: {e}")
+            result, cache_status = build_error_response("FECompConsultar", "unknown", str(e)), None
+
+        line = {"CbteNro" : cbte_nro, "cache" : cache_status, **result}
+        return (json.dumps(line, default=str) + "\n").encode("utf-8")
+
+    return StreamingResponse(
+        map_ordered(range(first, last + 1), lookup, CONSULT_RANGE_CONCURRENCY),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.post("/wsfe/FECAEARegInformativo")
+async def fecaea_reg_informativo(data: FECAEARegInformativo, response: Response, idempotency_key: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
+
+    data = data.model_dump(by_alias=True, exclude_none=True)
+    return await _idempotent("FECAEARegInformativo", data, idempotency_key, response, lambda: _reg_informativo(data))
+
+
+@router.post("/wsfe/FECAEASolicitar")
+async def fecaea_solicitar(data: FECAEASolicitar, response: Response, idempotency_key: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
 
     data = data.model_dump(by_alias=True, exclude_none=True)
     cuit = _extract_cuit(data)
-    token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
 
-    async def make_request():
-        manager = WSFEClientManager(afip_wsdl)
-        client = manager.get_client()
-        return await client.service.FEParamGetTiposConcepto(**data)
+    async def call():
+        return await _caea_call("FECAEASolicitar", cuit, data["Periodo"], data["Orden"])
 
-    result = await consult_afip_wsfe(make_request, "FEParamGetTiposConcepto")
-    return result
+    return await _idempotent("FECAEASolicitar", data, idempotency_key, response, call)
 
 
-@router.post("/wsfe/FEParamGetPtosVenta")
-async def fe_param_get_ptos_venta(data: FEParamGetPtosVenta, jwt = Depends(verify_token)) -> dict:
+@router.post("/wsfe/FECAEASinMovimientoConsultar")
+async def fecaea_sin_movimiento_consultar(data: FECAEASinMovimientoConsultar, jwt = Depends(verify_token)) -> dict:
 
     data = data.model_dump(by_alias=True, exclude_none=True)
     cuit = _extract_cuit(data)
@@ -342,92 +631,157 @@ async def fe_param_get_ptos_venta(data: FEParamGetPtosVenta, jwt = Depends(verif
     async def make_request():
         manager = WSFEClientManager(afip_wsdl)
         client = manager.get_client()
-        return await client.service.FEParamGetPtosVenta(**data)
+        return await client.service.FECAEASinMovimientoConsultar(**data)
 
-    result = await consult_afip_wsfe(make_request, "FEParamGetPtosVenta")
+    result = await _consult("FECAEASinMovimientoConsultar", data, make_request)
     return result
 
 
-@router.post("/wsfe/FEParamGetTiposCbte")
-async def fe_param_get_tipos_cbte(data: FEParamGetTiposCbte, jwt = Depends(verify_token)) -> dict:
+@router.post("/wsfe/FECAEASinMovimientoInformar")
+async def fecaea_sin_movimiento_informar(data: FECAEASinMovimientoInformar, jwt = Depends(verify_token)) -> dict:
 
     data = data.model_dump(by_alias=True, exclude_none=True)
     cuit = _extract_cuit(data)
-    token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
-
-    async def make_request():
-        manager = WSFEClientManager(afip_wsdl)
-        client = manager.get_client()
-        return await client.service.FEParamGetTiposCbte(**data)
 
-    result = await consult_afip_wsfe(make_request, "FEParamGetTiposCbte")
-    return result
+    return await _sin_movimiento_informar(cuit, data["PtoVta"], data["CAEA"])
 
 
-@router.post("/wsfe/FEParamGetCondicionIvaReceptor")
-async def fe_param_get_condicion_iva_receptor(data: FEParamGetCondicionIvaReceptor, jwt = Depends(verify_token)) -> dict:
+@router.post("/wsfe/FECAEAConsultar")
+async def fecaea_consultar(data: FECAEAConsultar, jwt = Depends(verify_token)) -> dict:
 
     data = data.model_dump(by_alias=True, exclude_none=True)
     cuit = _extract_cuit(data)
-    token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
 
-    async def make_request():
-        manager = WSFEClientManager(afip_wsdl)
-        client = manager.get_client()
-        return await client.service.FEParamGetCondicionIvaReceptor(**data)
+    return await _caea_call("FECAEAConsultar", cuit, data["Periodo"], data["Orden"])
 
-    result = await consult_afip_wsfe(make_request, "FEParamGetCondicionIvaReceptor")
+
+@router.post("/wsfe/caea/local")
+async def caea_local(data: CAEALocal, jwt = Depends(verify_token)) -> dict:
+    """
+    CAEA of a period (the current one by default) from the local store,
+    without calling AFIP. 404 when it was never obtained; the prefetch job
+    or /wsfe/FECAEASolicitar fill the store.
+    """
+    data = data.model_dump(by_alias=True, exclude_none=True)
+    cuit = _extract_cuit(data)
+    current_periodo, current_orden = period_of(afip_today())
+    periodo, orden = data.get("Periodo", current_periodo), data.get("Orden", current_orden)
+
+    result = await caea_store.get(cuit, periodo, orden)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No CAEA stored for CUIT {cuit}, period {periodo}/{orden}")
     return result
 
 
-@router.post("/wsfe/FEParamGetTiposDoc")
-async def fe_param_get_tipos_doc(data: FEParamGetTiposDoc, jwt = Depends(verify_token)) -> dict:
+@router.post("/wsfe/caea/close", status_code=202)
+async def caea_close(data: CAEAPeriodClose, jwt = Depends(verify_token)) -> dict:
+    """
+    Queue the close of a CAEA period: every voucher is informed with
+    FECAEARegInformativo in batches of up to FECAE_BATCH_MAX_RECORDS, and
+    every point of sale in SinMovimiento with FECAEASinMovimientoInformar.
+    Poll /wsfe/jobs/{job_id} for progress and read the per-voucher and
+    per-point-of-sale outcome from /wsfe/jobs/{job_id}/result.
+    """
+    logger.info("Received CAEA period close at /wsfe/caea/close")
 
     data = data.model_dump(by_alias=True, exclude_none=True)
-    cuit = _extract_cuit(data)
-    token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
+    if not data["Comprobantes"] and not data["SinMovimiento"]:
+        raise HTTPException(status_code=400, detail="Nothing to inform: send Comprobantes and/or SinMovimiento")
+    caeas = {detail["CAEA"] for group in data["Comprobantes"] for detail in group["FECAEADetRequest"]}
+    if caeas - {data["CAEA"]}:
+        raise HTTPException(status_code=400, detail=f"Every voucher must carry CAEA {data['CAEA']}")
 
-    async def make_request():
-        manager = WSFEClientManager(afip_wsdl)
-        client = manager.get_client()
-        return await client.service.FEParamGetTiposDoc(**data)
+    pending = await caea_period_close.pending_contingency_vouchers(str(_extract_cuit(data)), data["CAEA"])
+    if pending:
+        raise HTTPException(status_code=409, detail=f"{pending} contingency voucher(s) under CAEA {data['CAEA']} are not reported to AFIP yet")
 
-    result = await consult_afip_wsfe(make_request, "FEParamGetTiposDoc")
-    return result
+    # One close at a time per tenant.
+    job = await job_queue.submit("CAEAPeriodClose", data, sequence=f"caea-close/{_extract_cuit(data)}")
+    return job.summary()
 
 
-@router.post("/wsfe/FEParamGetTiposPaises")
-async def fe_param_get_tipos_paises(data: FEParamGetTiposPaises, jwt = Depends(verify_token)) -> dict:
+@router.post("/wsfe/FEParamGetCotizacion")
+async def fe_param_get_cotization(data: FEParamGetCotizacion, cache_control: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
 
     data = data.model_dump(by_alias=True, exclude_none=True)
     cuit = _extract_cuit(data)
-    token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
 
-    async def make_request():
-        manager = WSFEClientManager(afip_wsdl)
-        client = manager.get_client()
-        return await client.service.FEParamGetTiposPaises(**data)
-
-    result = await consult_afip_wsfe(make_request, "FEParamGetTiposPaises")
+    result = await cotizacion_cache.get_or_fetch(cuit, data["MonId"], data.get("FchCotiz"), bypass=wants_fresh(cache_control))
     return result
 
 
-@router.post("/wsfe/FEParamGetActividades")
-async def fe_param_get_actividades(data: FEParamGetActividades, jwt = Depends(verify_token)) -> dict:
+@router.post("/wsfe/FEParamGetTiposTributos")
+async def fe_param_get_tipos_tributos(data: FEParamGetTiposTributos, response: Response, cache_control: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
 
     data = data.model_dump(by_alias=True, exclude_none=True)
-    cuit = _extract_cuit(data)
-    token, sign = await _get_token_and_sign(cuit)
-    data = add_auth_to_payload(data, token, sign)
+    return await _consult_catalog("FEParamGetTiposTributos", data, response, cache_control)
 
-    async def make_request():
-        manager = WSFEClientManager(afip_wsdl)
-        client = manager.get_client()
-        return await client.service.FEParamGetActividades(**data)
 
-    result = await consult_afip_wsfe(make_request, "FEParamGetActividades")
-    return result
+@router.post("/wsfe/FEParamGetTiposMonedas")
+async def fe_param_get_tipos_monedas(data: FEParamGetTiposMonedas, response: Response, cache_control: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
+
+    data = data.model_dump(by_alias=True, exclude_none=True)
+    return await _consult_catalog("FEParamGetTiposMonedas", data, response, cache_control)
+
+
+@router.post("/wsfe/FEParamGetTiposIva")
+async def fe_param_get_tipos_iva(data: FEParamGetTiposIva, response: Response, cache_control: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
+
+    data = data.model_dump(by_alias=True, exclude_none=True)
+    return await _consult_catalog("FEParamGetTiposIva", data, response, cache_control)
+
+
+@router.post("/wsfe/FEParamGetTiposOpcional")
+async def fe_param_get_tipos_opcional(data: FEParamGetTiposOpcional, response: Response, cache_control: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
+
+    data = data.model_dump(by_alias=True, exclude_none=True)
+    return await _consult_catalog("FEParamGetTiposOpcional", data, response, cache_control)
+
+
+@router.post("/wsfe/FEParamGetTiposConcepto")
+async def fe_param_get_tipos_concepto(data: FEParamGetTiposConcepto, response: Response, cache_control: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
+
+    data = data.model_dump(by_alias=True, exclude_none=True)
+    return await _consult_catalog("FEParamGetTiposConcepto", data, response, cache_control)
+
+
+@router.post("/wsfe/FEParamGetPtosVenta")
+async def fe_param_get_ptos_venta(data: FEParamGetPtosVenta, response: Response, cache_control: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
+
+    data = data.model_dump(by_alias=True, exclude_none=True)
+    return await _consult_catalog("FEParamGetPtosVenta", data, response, cache_control)
+
+
+@router.post("/wsfe/FEParamGetTiposCbte")
+async def fe_param_get_tipos_cbte(data: FEParamGetTiposCbte, response: Response, cache_control: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
+
+    data = data.model_dump(by_alias=True, exclude_none=True)
+    return await _consult_catalog("FEParamGetTiposCbte", data, response, cache_control)
+
+
+@router.post("/wsfe/FEParamGetCondicionIvaReceptor")
+async def fe_param_get_condicion_iva_receptor(data: FEParamGetCondicionIvaReceptor, response: Response, cache_control: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
+
+    data = data.model_dump(by_alias=True, exclude_none=True)
+    return await _consult_catalog("FEParamGetCondicionIvaReceptor", data, response, cache_control)
+
+
+@router.post("/wsfe/FEParamGetTiposDoc")
+async def fe_param_get_tipos_doc(data: FEParamGetTiposDoc, response: Response, cache_control: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
+
+    data = data.model_dump(by_alias=True, exclude_none=True)
+    return await _consult_catalog("FEParamGetTiposDoc", data, response, cache_control)
+
+
+@router.post("/wsfe/FEParamGetTiposPaises")
+async def fe_param_get_tipos_paises(data: FEParamGetTiposPaises, response: Response, cache_control: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
+
+    data = data.model_dump(by_alias=True, exclude_none=True)
+    return await _consult_catalog("FEParamGetTiposPaises", data, response, cache_control)
+
+
+@router.post("/wsfe/FEParamGetActividades")
+async def fe_param_get_actividades(data: FEParamGetActividades, response: Response, cache_control: str | None = Header(None), jwt = Depends(verify_token)) -> dict:
+
+    data = data.model_dump(by_alias=True, exclude_none=True)
+    return await _consult_catalog("FEParamGetActividades", data, response, cache_control)
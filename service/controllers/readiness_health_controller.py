@@ -1,6 +1,7 @@
 from zeep.helpers import serialize_object
 
 from service.soap_client.wsfe import wsfe_dummy
+from service.time.afip_clock import afip_clock
 from service.time.time_management import request_ntp_for_readiness
 from service.utils.logger import logger
 
@@ -15,10 +16,12 @@ async def readiness_health_check() -> dict:
         logger.debug("NTP readiness check OK")
 
     else:
+        seconds_since_sync = afip_clock.seconds_since_sync()
         ntp = {
             "status": "error",
-            "message": "NTP query failed",
-            "server": "time.afip.gov.ar"
+            "message": "AFIP clock not synchronized or stale",
+            "server": afip_clock.server,
+            "seconds_since_sync": round(seconds_since_sync) if seconds_since_sync is not None else None
         }
         logger.warning("NTP readiness check FAILED")
 
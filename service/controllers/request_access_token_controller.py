@@ -1,40 +1,59 @@
-from config.paths import get_as_bytes
-from service.crypto.sign import sign_login_ticket_request
-from service.soap_client.async_client import wsaa_client
+import asyncio
+
+from config.settings import TOKEN_REGENERATION_TIMEOUT_SECONDS
+from service.crypto.sign import sign_for_tenant
+from service.soap_client.async_client import WSAAClientManager
 from service.soap_client.wsaa import consult_afip_wsaa
 from service.soap_client.wsdl.wsdl_manager import get_wsaa_wsdl
 from service.time.time_management import generate_ntp_timestamp
+from service.utils.blocking_pool import run_blocking, run_cpu_bound
 from service.utils.logger import logger
+from service.utils.single_flight import SingleFlight
+from service.utils.token_cache import token_cache
 from service.xml_management.xml_builder import (
-    build_login_ticket_request, parse_and_save_loginticketresponse, save_xml)
+    build_login_ticket_request, extract_credentials_from_login_ticket_response,
+    parse_and_save_loginticketresponse, save_xml, xml_to_bytes)
 
+token_regenerations = SingleFlight()
 
-async def generate_afip_access_token(cuit: str) -> dict:
 
-    logger.info(f"Generating a new access token for CUIT {cuit}...")
+def _build_login_ticket_request_bytes(cuit: str) -> bytes:
 
     root = build_login_ticket_request(generate_ntp_timestamp)
     save_xml(root, "loginTicketRequest.xml", cuit)
-    login_ticket_request_bytes, private_key_bytes, certificate_bytes = get_as_bytes(cuit)
-    b64_cms = sign_login_ticket_request(login_ticket_request_bytes, private_key_bytes, certificate_bytes)
+
+    # Signed from memory (same bytes as the saved file), no need to read it back.
+    return xml_to_bytes(root)
+
+
+def _save_login_ticket_response(login_ticket_response: str, cuit: str) -> tuple:
+
+    parse_and_save_loginticketresponse(login_ticket_response, save_xml, cuit)
+
+    return extract_credentials_from_login_ticket_response(login_ticket_response)
+
+
+async def generate_afip_access_token(cuit: str) -> dict:
+
+    logger.info(f"Generating a new access token for CUIT {cuit}...")
+
+    # Time query, disk writes, key loading and signing are blocking: keep them
+    # off the event loop so in-flight invoice requests are not stalled.
+    login_ticket_request_bytes = await run_blocking(_build_login_ticket_request_bytes, cuit)
+    b64_cms = await run_cpu_bound(sign_for_tenant, cuit, login_ticket_request_bytes)
 
     afip_wsdl = get_wsaa_wsdl()
-    client, httpx_client = wsaa_client(afip_wsdl)
 
     async def login_cms():
-        try:
-            return await client.service.loginCms(b64_cms)
-
-        finally:
-            if client and client.transport:
-                await client.transport.aclose()
-            else:
-                await httpx_client.aclose()
+        manager = WSAAClientManager(afip_wsdl)
+        client = manager.get_client()
+        return await client.service.loginCms(b64_cms)
 
     login_ticket_response = await consult_afip_wsaa(login_cms, "loginCms")
 
     if login_ticket_response["status"] == "success":
-        parse_and_save_loginticketresponse(login_ticket_response["response"], save_xml, cuit)
+        token, sign, expiration = await run_blocking(_save_login_ticket_response, login_ticket_response["response"], cuit)
+        token_cache.set(cuit, token, sign, expiration)
 
         logger.info(f"Token generated successfully for CUIT {cuit}.")
         return {
@@ -46,3 +65,22 @@ async def generate_afip_access_token(cuit: str) -> dict:
         return {
             "status" : "error generating access token."
             }
+
+
+async def regenerate_afip_access_token(
+                                    cuit: str,
+                                    timeout: float = TOKEN_REGENERATION_TIMEOUT_SECONDS
+                                ) -> dict:
+    """
+    Single-flight wrapper around generate_afip_access_token().
+    Concurrent callers for the same CUIT share one WSAA login instead of
+    each signing and sending its own loginCms (WSAA rejects all but the first).
+    """
+    try:
+        return await token_regenerations.run(cuit, lambda: generate_afip_access_token(cuit), timeout)
+
+    except asyncio.TimeoutError:
+        logger.error(f"Timed out after {timeout}s waiting for token regeneration of CUIT {cuit}.")
+        return {
+            "status" : "timeout waiting for access token."
+            }
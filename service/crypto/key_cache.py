@@ -0,0 +1,65 @@
+import os
+from dataclasses import dataclass
+
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.types import PrivateKeyTypes
+
+from config import paths
+from service.utils.logger import logger
+
+
+@dataclass(frozen=True)
+class KeyMaterial:
+    private_key: PrivateKeyTypes
+    certificate: x509.Certificate
+    private_key_mtime_ns: int
+    certificate_mtime_ns: int
+
+
+class KeyMaterialCache:
+    """
+    Per-tenant cache of the deserialized private key and certificate.
+    Loading an RSA key from PEM is far more expensive than signing with it,
+    so the parsed objects are kept until the files change on disk (mtime)
+    or the tenant's certificates are replaced or deleted.
+    """
+    def __init__(self) -> None:
+        self._entries: dict[str, KeyMaterial] = {}
+
+    def get(self, cuit: str) -> tuple[PrivateKeyTypes, x509.Certificate]:
+        afip_paths = paths.get_afip_paths(cuit)
+        private_key_mtime_ns = os.stat(afip_paths.private_key).st_mtime_ns
+        certificate_mtime_ns = os.stat(afip_paths.certificate).st_mtime_ns
+
+        entry = self._entries.get(cuit)
+        if (
+            entry is not None
+            and entry.private_key_mtime_ns == private_key_mtime_ns
+            and entry.certificate_mtime_ns == certificate_mtime_ns
+        ):
+            return entry.private_key, entry.certificate
+
+        logger.debug(f"Loading private key and certificate for CUIT {cuit}")
+
+        with open(afip_paths.private_key, "rb") as file:
+            private_key = serialization.load_pem_private_key(file.read(), password=None)
+
+        with open(afip_paths.certificate, "rb") as file:
+            certificate = x509.load_pem_x509_certificate(file.read())
+
+        self._entries[cuit] = KeyMaterial(private_key, certificate, private_key_mtime_ns, certificate_mtime_ns)
+        return private_key, certificate
+
+    def invalidate(self, cuit: str) -> None:
+        self._entries.pop(cuit, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+key_material_cache = KeyMaterialCache()
+
+
+def get_key_material(cuit: str) -> tuple[PrivateKeyTypes, x509.Certificate]:
+    return key_material_cache.get(cuit)
@@ -2,8 +2,10 @@ import base64
 
 from cryptography import x509
 from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric.types import PrivateKeyTypes
 from cryptography.hazmat.primitives.serialization import pkcs7
 
+from service.crypto.key_cache import get_key_material
 from service.utils.logger import logger
 
 
@@ -13,11 +15,20 @@ def sign_login_ticket_request(
                             certificate_bytes: bytes
                         ) -> str:
 
-    logger.debug("Signing loginTicketRequest.xml...")
-
     private_key = serialization.load_pem_private_key(private_key_bytes, password=None)
     certificate = x509.load_pem_x509_certificate(certificate_bytes)
 
+    return sign_with_key_material(login_ticket_request_bytes, private_key, certificate)
+
+
+def sign_with_key_material(
+                        login_ticket_request_bytes: bytes,
+                        private_key: PrivateKeyTypes,
+                        certificate: x509.Certificate
+                    ) -> str:
+
+    logger.debug("Signing loginTicketRequest.xml...")
+
     cms_signature = (
         pkcs7.PKCS7SignatureBuilder()
         .set_data(login_ticket_request_bytes)
@@ -28,4 +39,15 @@ def sign_login_ticket_request(
     b64_cms = base64.b64encode(cms_signature).decode("ascii")
     logger.debug("loginTicketRequest.xml successfully signed.")
 
-    return b64_cms
\ No newline at end of file
+    return b64_cms
+
+
+def sign_for_tenant(cuit: str, login_ticket_request_bytes: bytes) -> str:
+    """
+    Sign with the tenant's cached key material. Module-level so it can run in
+    the signing process pool, where each worker keeps its own key cache
+    (refreshed on file mtime change).
+    """
+    private_key, certificate = get_key_material(cuit)
+
+    return sign_with_key_material(login_ticket_request_bytes, private_key, certificate)
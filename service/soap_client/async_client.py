@@ -1,7 +1,129 @@
+import importlib.util
+
 import httpx
-from zeep import AsyncClient
+from zeep import AsyncClient, Settings
 from zeep.transports import AsyncTransport
 
+from config.settings import (WSFE_CONNECT_TIMEOUT_SECONDS, WSFE_HTTP2,
+                             WSFE_KEEPALIVE_EXPIRY_SECONDS,
+                             WSFE_MAX_CONNECTIONS,
+                             WSFE_MAX_KEEPALIVE_CONNECTIONS,
+                             WSFE_POOL_TIMEOUT_SECONDS,
+                             WSFE_READ_TIMEOUT_SECONDS,
+                             WSFE_WRITE_TIMEOUT_SECONDS)
+from service.soap_client.wsdl.wsdl_cache import load_wsdl_document
+from service.utils.logger import logger
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives its connection checkout back once closed."""
+    def __init__(self, stream: httpx.AsyncByteStream, release) -> None:
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class PoolStatsTransport(httpx.AsyncBaseTransport):
+    """
+    Pooled httpx transport that counts its own connection checkouts: a
+    request is in flight from the moment it is sent until its response is
+    closed. The pooling itself is a regular AsyncHTTPTransport.
+    """
+    def __init__(self, limits: httpx.Limits = httpx.Limits(max_connections=100, max_keepalive_connections=20), http2: bool = False) -> None:
+        self.limits = limits
+        self.http2 = http2
+        self._transport = httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+        self._counters = {"requests" : 0, "in_flight" : 0, "peak_in_flight" : 0}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        release = self._checkout()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    def _checkout(self):
+        self._counters["requests"] += 1
+        self._counters["in_flight"] += 1
+        self._counters["peak_in_flight"] = max(self._counters["peak_in_flight"], self._counters["in_flight"])
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self._counters["in_flight"] -= 1
+
+        return release
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    def stats(self) -> dict:
+        """Checkouts so far plus the configured pool limits."""
+        return {
+            **self._counters,
+            "max_connections" : self.limits.max_connections,
+            "max_keepalive_connections" : self.limits.max_keepalive_connections,
+            "keepalive_expiry" : self.limits.keepalive_expiry,
+            "http2" : self.http2,
+        }
+
+
+def build_wsfe_pool() -> PoolStatsTransport:
+    """
+    Pooled transport for WSFE with the pool size and keep-alive from
+    settings. HTTP/2 is only enabled when requested and the optional h2
+    package is installed; otherwise HTTP/1.1 keep-alive is used.
+    """
+    http2 = WSFE_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("WSFE_HTTP2 is enabled but the 'h2' package is not installed, using HTTP/1.1")
+        http2 = False
+
+    return PoolStatsTransport(
+        limits=httpx.Limits(
+            max_connections=WSFE_MAX_CONNECTIONS,
+            max_keepalive_connections=WSFE_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=WSFE_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        http2=http2,
+    )
+
+
+def build_wsfe_httpx_client(pool: PoolStatsTransport) -> httpx.AsyncClient:
+    """httpx client for WSFE over `pool` with the per-phase timeouts from settings."""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            connect=WSFE_CONNECT_TIMEOUT_SECONDS,
+            read=WSFE_READ_TIMEOUT_SECONDS,
+            write=WSFE_WRITE_TIMEOUT_SECONDS,
+            pool=WSFE_POOL_TIMEOUT_SECONDS,
+        ),
+        transport=pool,
+    )
+
 
 class WSFEClientManager:
     _instance = None
@@ -15,9 +137,12 @@ class WSFEClientManager:
     def __init__(self, wsdl):
         if self.__class__._client is None:
 
-            self.httpx_client = httpx.AsyncClient(timeout=20.0)
+            self.pool = build_wsfe_pool()
+            self.httpx_client = build_wsfe_httpx_client(self.pool)
             self.transport = AsyncTransport(client=self.httpx_client)
-            self.__class__._client = AsyncClient(wsdl=wsdl, transport=self.transport)
+            settings = Settings()
+            document = load_wsdl_document(wsdl, self.transport, settings)
+            self.__class__._client = AsyncClient(wsdl=document, transport=self.transport, settings=settings)
 
     def get_client(self): 
         return self.__class__._client
@@ -32,9 +157,62 @@ class WSFEClientManager:
             await self.httpx_client.aclose()
 
 
-def wsaa_client(afip_wsdl):
-    httpx_client = httpx.AsyncClient(timeout=30.0)
-    transport = AsyncTransport(client=httpx_client)
-    client = AsyncClient(wsdl=afip_wsdl, transport=transport)
+class WSAAClientManager:
+    """
+    Long-lived WSAA client: the WSDL is parsed once and loginCms calls reuse
+    pooled keep-alive connections instead of a new client per login.
+    """
+    _instance = None
+    _client = None
+
+    def __new__(cls, wsdl):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self, wsdl):
+        if self.__class__._client is None:
+
+            self.pool = PoolStatsTransport()
+            self.httpx_client = httpx.AsyncClient(timeout=30.0, transport=self.pool)
+            self.transport = AsyncTransport(client=self.httpx_client)
+            settings = Settings()
+            document = load_wsdl_document(wsdl, self.transport, settings)
+            self.__class__._client = AsyncClient(wsdl=document, transport=self.transport, settings=settings)
+
+    def get_client(self):
+        return self.__class__._client
+
+    @classmethod
+    def reset_singleton(cls):
+        cls._instance = None
+        cls._client = None
+
+    async def close(self) -> None:
+        if self.__class__._client:
+            await self.httpx_client.aclose()
+
+
+def connection_pool_stats() -> dict:
+    """Pool utilisation of the long-lived WSFE and WSAA clients (null until first use)."""
+    stats = {}
+    for name, manager_class in (("wsfe", WSFEClientManager), ("wsaa", WSAAClientManager)):
+        if manager_class._instance is not None and manager_class._client is not None:
+            stats[name] = manager_class._instance.pool.stats()
+        else:
+            stats[name] = None
+    return stats
+
+
+def warm_up_clients(wsfe_wsdl: str, wsaa_wsdl: str) -> None:
+    """Build the WSFE and WSAA clients at startup instead of on the first request."""
+    WSFEClientManager(wsfe_wsdl)
+    WSAAClientManager(wsaa_wsdl)
+
 
-    return client, httpx_client
\ No newline at end of file
+async def close_clients() -> None:
+    """Close the pooled WSFE and WSAA connections on shutdown."""
+    for manager_class in (WSFEClientManager, WSAAClientManager):
+        if manager_class._instance is not None and manager_class._client is not None:
+            await manager_class._instance.close()
+            manager_class.reset_singleton()
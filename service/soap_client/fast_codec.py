@@ -0,0 +1,326 @@
+"""
+zeep-free codec for the highest-volume WSFE operations.
+
+Requests are rendered straight from the validated payload dict with tag
+templates compiled once from a hand-written copy of the WSFE schema, and
+responses are read with lxml into the same structure serialize_object()
+produces from zeep objects (every schema field present, None when absent,
+[] for empty repeated elements). Errors are raised as the zeep exceptions
+consult_afip_wsfe() already handles, so callers see no difference.
+"""
+from dataclasses import dataclass
+from xml.sax.saxutils import escape
+
+import httpx
+from lxml import etree
+from zeep.exceptions import Fault, TransportError
+
+from service.soap_client.async_client import WSFEClientManager
+
+WSFE_NS = "http://ar.gov.afip.dif.FEV1/"
+SOAP_ENV_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+
+_ENVELOPE_OPEN = (
+    "<?xml version='1.0' encoding='utf-8'?>\n"
+    f'<soap-env:Envelope xmlns:soap-env="{SOAP_ENV_NS}"><soap-env:Body>'
+)
+_ENVELOPE_CLOSE = "</soap-env:Body></soap-env:Envelope>"
+
+# Same escaping lxml applies to text nodes.
+_TEXT_ENTITIES = {"\r" : "&#13;"}
+
+_PARSER = etree.XMLParser(remove_comments=True, resolve_entities=False, no_network=True)
+
+MANY = True
+
+
+@dataclass(frozen=True)
+class _Field:
+    name: str
+    tag: str
+    open_tag: str
+    close_tag: str
+    type: object
+    many: bool
+
+
+@dataclass(frozen=True)
+class _ComplexType:
+    fields: tuple[_Field, ...]
+    by_tag: dict[str, _Field]
+
+
+def _complex(*fields: tuple) -> _ComplexType:
+    """
+    Compile (name, type[, MANY]) tuples into a complex type. `type` is a
+    leaf converter (int, float, str) or a nested _ComplexType.
+    """
+    compiled = tuple(
+        _Field(
+            name=name,
+            tag=f"{{{WSFE_NS}}}{name}",
+            open_tag=f"<ns0:{name}>",
+            close_tag=f"</ns0:{name}>",
+            type=field_type,
+            many=bool(many),
+        )
+        for name, field_type, *many in fields
+    )
+    return _ComplexType(compiled, {field.tag: field for field in compiled})
+
+
+# ===================
+# ===== SCHEMA ======
+# ===================
+
+_AUTH = _complex(("Token", str), ("Sign", str), ("Cuit", int))
+
+_ERRORS = _complex(("Err", _complex(("Code", int), ("Msg", str)), MANY))
+_EVENTS = _complex(("Evt", _complex(("Code", int), ("Msg", str)), MANY))
+
+_FECAE_DET_REQUEST = _complex(
+    ("Concepto", int),
+    ("DocTipo", int),
+    ("DocNro", int),
+    ("CbteDesde", int),
+    ("CbteHasta", int),
+    ("CbteFch", str),
+    ("ImpTotal", float),
+    ("ImpTotConc", float),
+    ("ImpNeto", float),
+    ("ImpOpEx", float),
+    ("ImpTrib", float),
+    ("ImpIVA", float),
+    ("FchServDesde", str),
+    ("FchServHasta", str),
+    ("FchVtoPago", str),
+    ("MonId", str),
+    ("MonCotiz", float),
+    ("CanMisMonExt", str),
+    ("CondicionIVAReceptorId", int),
+    ("CbtesAsoc", _complex(("CbteAsoc", _complex(
+        ("Tipo", int), ("PtoVta", int), ("Nro", int), ("Cuit", str), ("CbteFch", str),
+    ), MANY))),
+    ("Tributos", _complex(("Tributo", _complex(
+        ("Id", int), ("Desc", str), ("BaseImp", float), ("Alic", float), ("Importe", float),
+    ), MANY))),
+    ("Iva", _complex(("AlicIva", _complex(
+        ("Id", int), ("BaseImp", float), ("Importe", float),
+    ), MANY))),
+    ("Opcionales", _complex(("Opcional", _complex(
+        ("Id", str), ("Valor", str),
+    ), MANY))),
+    ("Compradores", _complex(("Comprador", _complex(
+        ("DocTipo", int), ("DocNro", int), ("Porcentaje", float),
+    ), MANY))),
+    ("PeriodoAsoc", _complex(("FchDesde", str), ("FchHasta", str))),
+    ("Actividades", _complex(("Actividad", _complex(("Id", int)), MANY))),
+)
+
+_FECAE_SOLICITAR = _complex(
+    ("Auth", _AUTH),
+    ("FeCAEReq", _complex(
+        ("FeCabReq", _complex(("CantReg", int), ("PtoVta", int), ("CbteTipo", int))),
+        ("FeDetReq", _complex(("FECAEDetRequest", _FECAE_DET_REQUEST, MANY))),
+    )),
+)
+
+_FECAE_RESPONSE = _complex(
+    ("FeCabResp", _complex(
+        ("Cuit", int),
+        ("PtoVta", int),
+        ("CbteTipo", int),
+        ("FchProceso", str),
+        ("CantReg", int),
+        ("Resultado", str),
+        ("Reproceso", str),
+    )),
+    ("FeDetResp", _complex(("FECAEDetResponse", _complex(
+        ("Concepto", int),
+        ("DocTipo", int),
+        ("DocNro", int),
+        ("CbteDesde", int),
+        ("CbteHasta", int),
+        ("CbteFch", str),
+        ("Resultado", str),
+        ("Observaciones", _complex(("Obs", _complex(("Code", int), ("Msg", str)), MANY))),
+        ("CAE", str),
+        ("CAEFchVto", str),
+    ), MANY))),
+    ("Events", _EVENTS),
+    ("Errors", _ERRORS),
+)
+
+_FECOMP_ULTIMO_AUTORIZADO = _complex(("Auth", _AUTH), ("PtoVta", int), ("CbteTipo", int))
+
+_FERECUPERA_LAST_CBTE_RESPONSE = _complex(
+    ("PtoVta", int),
+    ("CbteTipo", int),
+    ("CbteNro", int),
+    ("Errors", _ERRORS),
+    ("Events", _EVENTS),
+)
+
+
+@dataclass(frozen=True)
+class _Operation:
+    request: _ComplexType
+    response: _ComplexType
+    open_tag: str
+    close_tag: str
+    soap_action: str
+    response_path: str
+
+
+def _operation(name: str, request: _ComplexType, response: _ComplexType) -> _Operation:
+    return _Operation(
+        request=request,
+        response=response,
+        open_tag=f'<ns0:{name} xmlns:ns0="{WSFE_NS}">',
+        close_tag=f"</ns0:{name}>",
+        soap_action=f'"{WSFE_NS}{name}"',
+        response_path=f"{{{WSFE_NS}}}{name}Response/{{{WSFE_NS}}}{name}Result",
+    )
+
+
+OPERATIONS = {
+    "FECAESolicitar" : _operation("FECAESolicitar", _FECAE_SOLICITAR, _FECAE_RESPONSE),
+    "FECompUltimoAutorizado" : _operation("FECompUltimoAutorizado", _FECOMP_ULTIMO_AUTORIZADO, _FERECUPERA_LAST_CBTE_RESPONSE),
+}
+
+
+# ===================
+# ===== ENCODE ======
+# ===================
+
+def _render(parts: list[str], complex_type: _ComplexType, values: dict) -> None:
+    for field in complex_type.fields:
+        value = values.get(field.name)
+        if value is None:
+            continue
+
+        for item in (value if field.many else (value,)):
+            parts.append(field.open_tag)
+            if isinstance(field.type, _ComplexType):
+                _render(parts, field.type, item)
+            else:
+                parts.append(escape(str(item), _TEXT_ENTITIES))
+            parts.append(field.close_tag)
+
+
+def encode_request(operation_name: str, payload: dict) -> bytes:
+    """SOAP envelope for `operation_name` from a payload already including Auth."""
+    operation = OPERATIONS[operation_name]
+
+    parts = [_ENVELOPE_OPEN, operation.open_tag]
+    _render(parts, operation.request, payload)
+    parts.append(operation.close_tag)
+    parts.append(_ENVELOPE_CLOSE)
+
+    return "".join(parts).encode("utf-8")
+
+
+# ===================
+# ===== DECODE ======
+# ===================
+
+def _read(element: etree._Element, complex_type: _ComplexType) -> dict:
+    result = {field.name: [] if field.many else None for field in complex_type.fields}
+
+    for child in element:
+        field = complex_type.by_tag.get(child.tag)
+        if field is None:
+            continue
+
+        if isinstance(field.type, _ComplexType):
+            # zeep reads a complex element without children or attributes as None.
+            value = _read(child, field.type) if len(child) or child.attrib else None
+        elif child.text is None:
+            value = None
+        else:
+            value = field.type(child.text.strip()) if field.type is not str else child.text
+
+        if field.many:
+            result[field.name].append(value)
+        else:
+            result[field.name] = value
+
+    return result
+
+
+def _raise_fault(fault: etree._Element) -> None:
+
+    def get_text(name):
+        child = fault.find(name)
+        return child.text if child is not None else None
+
+    raise Fault(
+        message=get_text("faultstring"),
+        code=get_text("faultcode"),
+        actor=get_text("faultactor"),
+        detail=fault.find("detail"),
+    )
+
+
+def decode_response(operation_name: str, status_code: int, content: bytes) -> dict | None:
+    """
+    Result of `operation_name` as serialize_object() would return it.
+    Raises TransportError for an invalid body and Fault for SOAP faults or
+    non-200 replies, like zeep does.
+    """
+    operation = OPERATIONS[operation_name]
+
+    if status_code != 200 and not content:
+        raise TransportError(
+            f"Server returned HTTP status {status_code} (no content available)",
+            status_code=status_code,
+        )
+
+    try:
+        envelope = etree.fromstring(content, parser=_PARSER)
+    except etree.XMLSyntaxError as e:
+        raise TransportError(
+            f"Server returned response ({status_code}) with invalid XML: {e}.\nContent: {content!r}",
+            status_code=status_code,
+            content=content,
+        )
+
+    body = envelope.find(f"{{{SOAP_ENV_NS}}}Body")
+    fault = body.find(f"{{{SOAP_ENV_NS}}}Fault") if body is not None else None
+
+    if fault is not None:
+        _raise_fault(fault)
+
+    if status_code != 200:
+        raise Fault(message="Unknown fault occured", code=None, actor=None, detail=content)
+
+    result = body.find(operation.response_path) if body is not None else None
+    if result is None:
+        return None
+
+    return _read(result, operation.response)
+
+
+# ===================
+# ===== CALL ========
+# ===================
+
+async def call_wsfe(manager: WSFEClientManager, operation_name: str, payload: dict) -> dict | None:
+    """
+    Send `operation_name` through the manager's pooled httpx client without
+    building zeep objects. Drop-in replacement for client.service.<operation>
+    inside a consult_afip_wsfe() make_request.
+    """
+    operation = OPERATIONS[operation_name]
+    address = manager.get_client().service._binding_options["address"]
+
+    response: httpx.Response = await manager.httpx_client.post(
+        address,
+        content=encode_request(operation_name, payload),
+        headers={
+            "SOAPAction" : operation.soap_action,
+            "Content-Type" : "text/xml; charset=utf-8",
+        },
+    )
+
+    return decode_response(operation_name, response.status_code, response.content)
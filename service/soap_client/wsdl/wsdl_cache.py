@@ -0,0 +1,164 @@
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+from functools import cached_property
+from pathlib import Path
+
+import zeep
+from lxml import etree
+from zeep import Settings
+from zeep.transports import Transport
+from zeep.wsdl import Document
+
+from config.settings import WSDL_CACHE_DIR, WSDL_CACHE_ENABLED
+from service.utils.logger import logger
+
+# Classes zeep builds at runtime while compiling the XSD; pickle cannot
+# import them by name, so they are rebuilt from their name, bases and attributes.
+_DYNAMIC_MODULES = ("zeep.xsd.dynamic_types", "zeep.objects")
+
+_cached_attributes: dict[type, frozenset[str]] = {}
+
+
+def _new_instance(cls: type) -> object:
+    return cls.__new__(cls)
+
+
+def _new_class(name: str, bases: tuple, module: str) -> type:
+    return type(name, bases, {"__module__" : module})
+
+
+def _set_class_attributes(cls: type, attributes: dict) -> None:
+    for name, value in attributes.items():
+        setattr(cls, name, value)
+
+
+def _get_cached_attributes(cls: type) -> frozenset[str]:
+    """Names of cached_property attributes: lazily recomputed, never persisted."""
+    if cls not in _cached_attributes:
+        names = set()
+        for klass in reversed(cls.__mro__):
+            for name, value in vars(klass).items():
+                if isinstance(value, cached_property):
+                    names.add(name)
+                else:
+                    names.discard(name)
+        _cached_attributes[cls] = frozenset(names)
+    return _cached_attributes[cls]
+
+
+class _DocumentPickler(pickle.Pickler):
+    """
+    Pickler for a compiled zeep Document.
+    Settings and transport are left out (the loading client provides its own),
+    lxml QNames are stored as text and zeep's dynamic XSD classes are rebuilt.
+    """
+    def persistent_id(self, obj):
+        if isinstance(obj, Settings):
+            return "settings"
+        if isinstance(obj, Transport):
+            return "transport"
+        return None
+
+    def reducer_override(self, obj):
+        if isinstance(obj, etree.QName):
+            return etree.QName, (obj.text,)
+
+        if isinstance(obj, type):
+            if obj.__module__ not in _DYNAMIC_MODULES:
+                return NotImplemented
+            attributes = {
+                name: value for name, value in vars(obj).items()
+                if name not in ("__dict__", "__weakref__", "__module__", "__doc__")
+            }
+            return _new_class, (obj.__name__, obj.__bases__, obj.__module__), attributes, None, None, _set_class_attributes
+
+        cached = _get_cached_attributes(type(obj))
+        if cached and hasattr(obj, "__dict__"):
+            state = {name: value for name, value in vars(obj).items() if name not in cached}
+            # Indicators such as Sequence are list subclasses: keep their items too.
+            list_items = iter(obj) if isinstance(obj, list) else None
+            dict_items = iter(obj.items()) if isinstance(obj, dict) else None
+            return _new_instance, (type(obj),), state, list_items, dict_items
+
+        return NotImplemented
+
+
+class _DocumentUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, transport: Transport, settings: Settings) -> None:
+        super().__init__(file)
+        self._persistent = {"settings" : settings, "transport" : transport}
+
+    def persistent_load(self, pid):
+        return self._persistent[pid]
+
+
+def get_cache_path(wsdl_path: str, cache_dir: str | None = None) -> Path:
+    """Cache file for a WSDL: keyed by its content hash, zeep and Python versions."""
+    with open(wsdl_path, "rb") as file:
+        digest = hashlib.sha256(file.read()).hexdigest()[:16]
+
+    python_version = f"py{sys.version_info.major}{sys.version_info.minor}"
+    filename = f"{Path(wsdl_path).stem}-{digest}-zeep{zeep.__version__}-{python_version}.pickle"
+    return Path(cache_dir or WSDL_CACHE_DIR) / filename
+
+
+def _save(document: Document, cache_path: Path) -> None:
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Write to a temporary file and rename, so concurrent workers never read a partial cache.
+    fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            _DocumentPickler(file, protocol=pickle.HIGHEST_PROTOCOL).dump(document)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_wsdl_document(
+                    wsdl_path: str,
+                    transport: Transport,
+                    settings: Settings,
+                    cache_dir: str | None = None,
+                    enabled: bool | None = None,
+                ) -> Document:
+    """
+    Compiled WSDL document for a local WSDL file.
+    Loaded from the disk cache when present; otherwise parsed by zeep and
+    written to the cache for the next start. A corrupt or incompatible cache
+    file is discarded and the WSDL is parsed again.
+    """
+    if enabled is None:
+        enabled = WSDL_CACHE_ENABLED
+
+    if not enabled:
+        return Document(wsdl_path, transport, settings=settings)
+
+    cache_path = get_cache_path(wsdl_path, cache_dir)
+
+    if cache_path.exists():
+        try:
+            with open(cache_path, "rb") as file:
+                document = _DocumentUnpickler(file, transport, settings).load()
+            logger.debug(f"Compiled WSDL loaded from cache: {cache_path}")
+            return document
+
+        except Exception as e:
+            logger.warning(f"Discarding unreadable WSDL cache {cache_path}: {e}")
+            cache_path.unlink(missing_ok=True)
+
+    document = Document(wsdl_path, transport, settings=settings)
+
+    try:
+        _save(document, cache_path)
+        logger.debug(f"Compiled WSDL cached to {cache_path}")
+
+    except Exception as e:
+        logger.warning(f"Could not cache compiled WSDL {wsdl_path}: {e}")
+
+    return document
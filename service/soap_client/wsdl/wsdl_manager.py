@@ -25,3 +25,7 @@ def get_wsfe_wsdl() -> str:
     else:
         filename = "wsfe_homo.wsdl"
         return os.path.join(CURRENT_DIR, filename)
+
+
+def get_wsfe_environment() -> str:
+    return "production" if IS_WSFE_PRODUCTION else "homologation"
@@ -0,0 +1,93 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+import ntplib
+
+from config.settings import (NTP_MAX_STALENESS_SECONDS, NTP_SERVER,
+                             NTP_SMOOTHING, NTP_TIMEOUT_SECONDS)
+from service.utils.logger import logger
+
+
+class AfipClock:
+    """
+    AFIP-corrected time served from memory.
+    NTP is sampled in the background and kept as a smoothed offset against
+    time.monotonic(), so reading the time never waits on the network and is
+    immune to local wall-clock jumps. When sampling fails the last good
+    offset keeps being used; past max_staleness the clock reports itself stale.
+    """
+    def __init__(
+                self,
+                server: str = NTP_SERVER,
+                timeout: int = NTP_TIMEOUT_SECONDS,
+                smoothing: float = NTP_SMOOTHING,
+                max_staleness: int = NTP_MAX_STALENESS_SECONDS,
+            ) -> None:
+        self.server = server
+        self.timeout = timeout
+        self.smoothing = smoothing
+        self.max_staleness = max_staleness
+
+        self._offset: float | None = None
+        self._last_sync: float | None = None
+        self._lock = threading.Lock()
+
+    def sample(self) -> bool:
+        """Query NTP once (blocking) and fold the result into the offset."""
+        try:
+            sent = time.monotonic()
+            response = ntplib.NTPClient().request(self.server, timeout=self.timeout)
+            received = time.monotonic()
+
+        except Exception as e:
+            logger.warning(f"NTP sample from {self.server} failed: {e}")
+            return False
+
+        # Server transmit time plus half the round trip is the AFIP time at `received`.
+        sample_offset = response.tx_time + (received - sent) / 2 - received
+
+        with self._lock:
+            if self._offset is None:
+                self._offset = sample_offset
+            else:
+                self._offset += self.smoothing * (sample_offset - self._offset)
+            self._last_sync = received
+
+        logger.debug(f"NTP sample from {self.server} OK (round trip {received - sent:.3f}s)")
+        return True
+
+    def now(self) -> float | None:
+        """AFIP epoch seconds, or None if the clock was never synchronized."""
+        if self._offset is None:
+            return None
+        return time.monotonic() + self._offset
+
+    def is_synchronized(self) -> bool:
+        return self._offset is not None
+
+    def is_stale(self) -> bool:
+        if self._last_sync is None:
+            return True
+        return time.monotonic() - self._last_sync > self.max_staleness
+
+    def seconds_since_sync(self) -> float | None:
+        if self._last_sync is None:
+            return None
+        return time.monotonic() - self._last_sync
+
+    def reset(self) -> None:
+        with self._lock:
+            self._offset = None
+            self._last_sync = None
+
+
+afip_clock = AfipClock()
+
+
+def afip_now() -> datetime:
+    """Current AFIP time as an aware datetime, falling back to the local clock if never synchronized."""
+    epoch = afip_clock.now()
+    if epoch is None:
+        return datetime.now(timezone.utc)
+    return datetime.fromtimestamp(epoch, tz=timezone.utc)
@@ -1,28 +1,26 @@
-import socket
 from datetime import datetime, timedelta, timezone
 
-import ntplib
-
+from service.time.afip_clock import afip_clock
+from service.utils.blocking_pool import run_blocking
 from service.utils.logger import logger
 
 
 def generate_ntp_timestamp() -> tuple[int, str, str]:
-
-    logger.debug("Consulting NTP for get the datetime...")
-
-    try:
-        client = ntplib.NTPClient()
-        response = client.request('time.afip.gov.ar', timeout=5)
-
-    except socket.timeout:
-        logger.warning("NTP request timed out")
+    """
+    Time provider for build_login_ticket_request() and is_expired().
+    Served from the AFIP clock's last good offset; NTP is only queried here
+    on a cold start, before the background sync has produced a sample.
+    """
+    logger.debug("Reading AFIP-corrected datetime...")
+
+    if not afip_clock.is_synchronized() and not afip_clock.sample():
         return False, False, False
 
-    except Exception as e:
-        logger.warning(f"NTP readiness check failed: {e}")
-        return False, False, False
+    if afip_clock.is_stale():
+        logger.warning(f"AFIP clock is stale ({afip_clock.seconds_since_sync():.0f}s since last NTP sync), "
+                       "using last good offset")
 
-    generation_dt = datetime.fromtimestamp(response.tx_time, tz=timezone.utc)
+    generation_dt = datetime.fromtimestamp(afip_clock.now(), tz=timezone.utc)
 
     actual_time_epoch = int(generation_dt.timestamp())
 
@@ -37,16 +35,16 @@ def generate_ntp_timestamp() -> tuple[int, str, str]:
 
 
 def request_ntp_for_readiness() -> bool:
-    try:
-        logger.debug("Checking NTP availability for readiness...")
-        client = ntplib.NTPClient()
-        client.request("time.afip.gov.ar", timeout=5)
-        return True
-    
-    except socket.timeout:
-        logger.warning("NTP request timed out")
+    """Ready while the background sync keeps the AFIP clock fresh; no NTP query here."""
+    logger.debug("Checking AFIP clock for readiness...")
+
+    if afip_clock.is_stale():
+        logger.warning("AFIP clock is not synchronized or stale")
         return False
-    
-    except Exception as e:
-        logger.warning(f"NTP readiness check failed: {e}")
-        return False
\ No newline at end of file
+
+    return True
+
+
+async def sync_afip_clock() -> None:
+    """Background job: take one NTP sample without blocking the event loop."""
+    await run_blocking(afip_clock.sample)
@@ -1,63 +1,379 @@
-from datetime import datetime, timezone
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Any
 
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from service.controllers.request_access_token_controller import \
-    generate_afip_access_token
-from service.time.time_management import \
-    generate_ntp_timestamp as time_provider
+from config.settings import (CAEA_PREFETCH_ENABLED,
+                             CAEA_PREFETCH_INTERVAL_HOURS, CONTINGENCY_ENABLED,
+                             CONTINGENCY_PROBE_INTERVAL_SECONDS,
+                             COTIZACION_REFRESH_INTERVAL_SECONDS,
+                             NTP_SYNC_INTERVAL_SECONDS,
+                             SCHEDULER_MAX_CONCURRENCY,
+                             SCHEDULER_TENANT_TIMEOUT_SECONDS,
+                             TOKEN_DISCOVERY_SWEEP_HOURS,
+                             TOKEN_REFRESH_JITTER_SECONDS,
+                             TOKEN_REFRESH_MARGIN_SECONDS,
+                             TOKEN_REFRESH_RETRY_SECONDS)
+from service.controllers.request_access_token_controller import (
+    generate_afip_access_token, token_regenerations)
+from service.time.afip_clock import afip_now
+from service.time.time_management import sync_afip_clock
+from service.utils.blocking_pool import run_blocking
+from service.utils.caea_store import caea_store
+from service.utils.catalog_cache import catalog_cache
+from service.utils.contingency import contingency
+from service.utils.cotizacion_cache import cotizacion_cache
+from service.utils.idempotency import idempotency_store
+from service.utils.job_queue import job_queue
 from service.utils.logger import logger
-from service.xml_management.xml_builder import is_expired, xml_exists
+from service.utils.token_cache import token_cache
+from service.xml_management.xml_builder import (extract_credentials_from_xml,
+                                                xml_exists)
 
+# Each tenant gets its own one-shot "date" job that fires shortly before its
+# token expires. APScheduler keeps jobs ordered by next_run_time, so the job
+# store doubles as the priority queue of pending renewals.
 scheduler = AsyncIOScheduler()
 
-async def run_job():
+REFRESH_JOB_PREFIX = "afip_token_refresh_"
+
+# WSAA logins in flight at once, shared by the discovery sweep and the
+# per-tenant refresh jobs: tokens issued together expire together.
+_renewal_slots: tuple[asyncio.AbstractEventLoop, asyncio.Semaphore] | None = None
+
+
+def _refresh_job_id(cuit: str) -> str:
+    return f"{REFRESH_JOB_PREFIX}{cuit}"
+
+
+def _get_token_expiration(cuit: str) -> datetime | None:
+    cached = token_cache.get(cuit)
+    if cached is not None:
+        return cached.expiration
+
+    try:
+        _, _, expiration = extract_credentials_from_xml(cuit)
+        return expiration
+    except Exception as e:
+        logger.debug(f"Could not read token expiration for CUIT {cuit}: {e}")
+        return None
+
+
+def _refresh_due(expiration: datetime) -> bool:
+    margin = timedelta(seconds=TOKEN_REFRESH_MARGIN_SECONDS)
+    return afip_now() >= expiration - margin
+
+
+def compute_refresh_time(expiration: datetime) -> datetime:
+    margin = timedelta(seconds=TOKEN_REFRESH_MARGIN_SECONDS)
+    jitter = timedelta(seconds=random.uniform(0, TOKEN_REFRESH_JITTER_SECONDS))
+
+    # Scheduler run dates are local time: translate from AFIP time.
+    clock_skew = datetime.now(timezone.utc) - afip_now()
+    return max(expiration - margin - jitter + clock_skew, datetime.now(timezone.utc))
+
+
+async def _renew(cuit: str) -> dict:
+    # Share the renewal with any request regenerating the same CUIT right now.
+    return await token_regenerations.run(cuit, lambda: generate_afip_access_token(cuit))
+
+
+def _renewal_semaphore() -> asyncio.Semaphore:
+    global _renewal_slots
+    loop = asyncio.get_running_loop()
+    if _renewal_slots is None or _renewal_slots[0] is not loop:
+        _renewal_slots = (loop, asyncio.Semaphore(SCHEDULER_MAX_CONCURRENCY))
+    return _renewal_slots[1]
+
+
+async def _in_renewal_slot(work: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Run `work` in a renewal slot. Past SCHEDULER_TENANT_TIMEOUT_SECONDS the
+    caller gets TimeoutError, but the slot stays taken until the work ends:
+    the shared WSAA login keeps running, and hung logins must not add up
+    past SCHEDULER_MAX_CONCURRENCY.
+    """
+    semaphore = _renewal_semaphore()
+    await semaphore.acquire()
+    task = asyncio.ensure_future(work())
+
+    def release(done: asyncio.Task) -> None:
+        semaphore.release()
+        if not done.cancelled():
+            done.exception()
+
+    try:
+        await asyncio.wait({task}, timeout=SCHEDULER_TENANT_TIMEOUT_SECONDS)
+    finally:
+        task.add_done_callback(release)
+
+    if not task.done():
+        raise asyncio.TimeoutError
+    return task.result()
+
+
+async def token_expiration(cuit: str) -> datetime | None:
+    """A tenant's token expiration, read off the event loop."""
+    return await run_blocking(_get_token_expiration, cuit)
+
+
+def schedule_token_refresh(cuit: str, expiration: datetime | None) -> datetime:
+    """
+    (Re)schedule the renewal of a tenant's token from its real expirationTime
+    (see token_expiration()). Without one, the renewal is retried after
+    TOKEN_REFRESH_RETRY_SECONDS.
+    """
+    if expiration is None:
+        run_at = datetime.now(timezone.utc) + timedelta(seconds=TOKEN_REFRESH_RETRY_SECONDS)
+        logger.warning(f"No valid token found for CUIT {cuit}, retrying renewal at {run_at.isoformat()}")
+    else:
+        run_at = compute_refresh_time(expiration)
+        logger.debug(f"Token refresh for CUIT {cuit} scheduled at {run_at.isoformat()}")
+
+    job = scheduler.get_job(_refresh_job_id(cuit))
+    if job is not None:
+        job.reschedule(trigger="date", run_date=run_at)
+        return run_at
+
+    scheduler.add_job(
+        refresh_tenant_token,
+        trigger="date",
+        run_date=run_at,
+        args=[cuit],
+        id=_refresh_job_id(cuit),
+        replace_existing=True,
+        misfire_grace_time=None,
+    )
+    return run_at
+
+
+def unschedule_token_refresh(cuit: str) -> None:
+    try:
+        scheduler.remove_job(_refresh_job_id(cuit))
+    except JobLookupError:
+        pass
+
+
+def get_scheduled_refresh(cuit: str) -> datetime | None:
+    job = scheduler.get_job(_refresh_job_id(cuit))
+    if job is None:
+        return None
+    # Jobs added before the scheduler starts have no next_run_time yet.
+    return getattr(job, "next_run_time", None) or job.trigger.run_date
+
+
+async def refresh_tenant_token(cuit: str) -> None:
+
+    if not (Path("service/app_certs") / cuit).is_dir():
+        logger.info(f"CUIT {cuit} is no longer registered, dropping its token refresh.")
+        return
+
+    expiration = await token_expiration(cuit)
+    if expiration is not None and not _refresh_due(expiration):
+        # Renewed elsewhere (on demand or manually) since this job was scheduled.
+        schedule_token_refresh(cuit, expiration)
+        return
+
+    try:
+        result = await _in_renewal_slot(lambda: _renew(cuit))
+    except asyncio.TimeoutError:
+        logger.error(f"Timed out after {SCHEDULER_TENANT_TIMEOUT_SECONDS}s renewing token for CUIT {cuit}")
+        result = {"status": "error"}
+    except Exception as e:
+        logger.error(f"Error renewing token for CUIT {cuit}: {e}")
+        result = {"status": "error"}
+
+    if result.get("status") != "success":
+        logger.error(f"Scheduled token renewal failed for CUIT {cuit}.")
+        # Retried after the retry delay.
+        schedule_token_refresh(cuit, None)
+        return
+
+    schedule_token_refresh(cuit, await token_expiration(cuit))
+
+
+async def _check_tenant(cuit: str) -> str:
+
+    if not xml_exists("loginTicketRequest.xml", cuit) or not xml_exists("loginTicketResponse.xml", cuit):
+        result = await _renew(cuit)
+        return "renewed" if result.get("status") == "success" else "failed"
+
+    expiration = await token_expiration(cuit)
+    if expiration is None or _refresh_due(expiration):
+        result = await _renew(cuit)
+        return "renewed" if result.get("status") == "success" else "failed"
+
+    logger.info(f"Token not expired for CUIT {cuit}.")
+    return "skipped"
+
+
+async def _sweep_tenant(cuit: str, skip_scheduled: bool) -> str:
+
+    # Tenants with a pending refresh job are already taken care of.
+    if skip_scheduled and get_scheduled_refresh(cuit) is not None:
+        return "skipped"
+
+    try:
+        outcome = await _in_renewal_slot(lambda: _check_tenant(cuit))
+    except asyncio.TimeoutError:
+        logger.error(f"Timed out after {SCHEDULER_TENANT_TIMEOUT_SECONDS}s renewing token for CUIT {cuit}")
+        outcome = "failed"
+    except Exception as e:
+        logger.error(f"Error renewing token for CUIT {cuit}: {e}")
+        outcome = "failed"
+
+    # A failed tenant is retried after the retry delay.
+    schedule_token_refresh(cuit, None if outcome == "failed" else await token_expiration(cuit))
+    return outcome
+
+
+async def run_job(skip_scheduled: bool = False) -> dict:
     logger.info("Starting job: verifying token expiration for all tenants")
 
+    summary = {"renewed": 0, "skipped": 0, "failed": 0, "duration_seconds": 0.0}
+
     certs_dir = Path("service/app_certs")
     if not certs_dir.exists():
         logger.info("No app_certs directory found, skipping scheduler run.")
-        return
+        return summary
 
-    for cuit_dir in certs_dir.iterdir():
-        if not cuit_dir.is_dir():
-            continue
-        cuit = cuit_dir.name
-        try:
-            if not xml_exists("loginTicketRequest.xml", cuit):
-                await generate_afip_access_token(cuit)
-                continue
+    started = time.monotonic()
 
-            if xml_exists("loginTicketResponse.xml", cuit):
-                if is_expired("loginTicketResponse.xml", time_provider, cuit):
-                    await generate_afip_access_token(cuit)
-                else:
-                    logger.info(f"Token not expired for CUIT {cuit}.")
-                continue
+    cuits = [cuit_dir.name for cuit_dir in certs_dir.iterdir() if cuit_dir.is_dir()]
+    outcomes = await asyncio.gather(*(_sweep_tenant(cuit, skip_scheduled) for cuit in cuits))
 
-            if not xml_exists("loginTicketResponse.xml", cuit):
-                await generate_afip_access_token(cuit)
+    for outcome in outcomes:
+        summary[outcome] += 1
+    summary["duration_seconds"] = round(time.monotonic() - started, 3)
 
-        except Exception as e:
-            logger.error(f"Error renewing token for CUIT {cuit}: {e}")
+    logger.info(
+        f"Scheduler job finished for all tenants: {summary['renewed']} renewed, "
+        f"{summary['skipped']} skipped, {summary['failed']} failed in {summary['duration_seconds']}s"
+    )
+    return summary
 
-    logger.info("Scheduler job finished for all tenants.")
+
+async def run_caea_prefetch() -> dict:
+    """
+    Obtain the current and upcoming CAEA of every tenant before it is
+    needed, and the last numbers of the CAEA point of sale for contingency.
+    """
+    certs_dir = Path("service/app_certs")
+    if not certs_dir.exists():
+        logger.info("No app_certs directory found, skipping CAEA prefetch.")
+        return {"stored": 0, "obtained": 0, "failed": 0}
+
+    cuits = [cuit_dir.name for cuit_dir in certs_dir.iterdir() if cuit_dir.is_dir()]
+    summary = await caea_store.prefetch(cuits)
+    # The CAEA point of sale's numbers can only be read while WSFE is up.
+    if CONTINGENCY_ENABLED:
+        summary["contingency_seed"] = await contingency.seed(cuits)
+    return summary
 
 
 def start_scheduler():
-    logger.info("Scheduler starting: job configured to run every 11 hours")
+    logger.info(f"Scheduler starting: tenant discovery sweep every {TOKEN_DISCOVERY_SWEEP_HOURS} hours, "
+                "token renewals scheduled from each token's expirationTime")
+
+    # Keeps the AFIP clock offset fresh for token generation and expiry checks.
+    scheduler.add_job(
+        sync_afip_clock,
+        trigger="interval",
+        seconds=NTP_SYNC_INTERVAL_SECONDS,
+        id="afip_clock_sync",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        next_run_time=datetime.now(timezone.utc)
+    )
 
     scheduler.add_job(
         run_job,
         trigger="interval",
-        hours=11,
+        hours=TOKEN_DISCOVERY_SWEEP_HOURS,
+        kwargs={"skip_scheduled": True},
         id="afip_token_watchdog",
         replace_existing=True,
         max_instances=1,
         coalesce=True,
         next_run_time=datetime.now(timezone.utc)
     )
+
+    # Keeps requested currency quotes warm and picks up newly published rates.
+    scheduler.add_job(
+        cotizacion_cache.refresh_latest,
+        trigger="interval",
+        seconds=COTIZACION_REFRESH_INTERVAL_SECONDS,
+        id="afip_cotizacion_refresh",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # Finished invoice jobs are kept JOB_RETENTION_SECONDS for polling.
+    scheduler.add_job(
+        job_queue.purge,
+        trigger="interval",
+        hours=1,
+        id="afip_job_purge",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # Catalogs past CATALOG_CACHE_STALE_SECONDS are never served again.
+    scheduler.add_job(
+        catalog_cache.purge,
+        trigger="interval",
+        hours=1,
+        id="afip_catalog_cache_purge",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # Idempotency-Key results are replayed for IDEMPOTENCY_TTL_SECONDS.
+    scheduler.add_job(
+        idempotency_store.purge,
+        trigger="interval",
+        hours=1,
+        id="afip_idempotency_purge",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # CAEA for contingency invoicing, obtained before the period starts.
+    if CAEA_PREFETCH_ENABLED:
+        scheduler.add_job(
+            run_caea_prefetch,
+            trigger="interval",
+            hours=CAEA_PREFETCH_INTERVAL_HOURS,
+            id="afip_caea_prefetch",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            next_run_time=datetime.now(timezone.utc)
+        )
+
+    # Probes WSFE while degraded and reports CAEA contingency vouchers once it recovers.
+    if CONTINGENCY_ENABLED:
+        scheduler.add_job(
+            contingency.tick,
+            trigger="interval",
+            seconds=CONTINGENCY_PROBE_INTERVAL_SECONDS,
+            id="afip_contingency_tick",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+
     scheduler.start()
 
 def stop_scheduler():
@@ -0,0 +1,37 @@
+import asyncio
+import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+from config.settings import BLOCKING_POOL_SIZE, SIGNING_POOL_PROCESSES
+
+# Threads for disk I/O and lxml work, which release the GIL.
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="afrelay-blocking")
+
+# Optional processes for work that holds the GIL (RSA key loading, signing).
+# Workers are started lazily on first use.
+_process_executor = ProcessPoolExecutor(max_workers=SIGNING_POOL_PROCESSES) if SIGNING_POOL_PROCESSES > 0 else None
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a disk-bound or GIL-releasing callable in the thread pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def run_cpu_bound(func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a CPU-bound callable in the process pool when one is configured,
+    otherwise in the thread pool. func and args must be picklable.
+    """
+    if _process_executor is None:
+        return await run_blocking(func, *args)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_process_executor, func, *args)
+
+
+def shutdown_blocking_pool() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
+    if _process_executor is not None:
+        _process_executor.shutdown(wait=False, cancel_futures=True)
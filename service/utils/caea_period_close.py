@@ -0,0 +1,289 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from config.settings import (CAEA_CLOSE_CONCURRENCY, CAEA_CLOSE_STORE_PATH,
+                             FECAE_BATCH_MAX_RECORDS)
+from service.soap_client.format_error import build_error_response
+from service.soap_client.wsdl.wsdl_manager import get_wsfe_environment
+from service.utils.contingency import (PENDING, REJECTED, REPORTED,
+                                       contingency, report_outcomes,
+                                       report_payload)
+from service.utils.job_queue import job_queue
+from service.utils.logger import logger
+from service.utils.sqlite_store import SQLiteStore
+
+# Outcomes AFIP accepted, per CAEA: a close run again skips them.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS caea_close_vouchers (
+    environment TEXT NOT NULL,
+    cuit TEXT NOT NULL,
+    caea TEXT NOT NULL,
+    pto_vta INTEGER NOT NULL,
+    cbte_tipo INTEGER NOT NULL,
+    cbte_desde INTEGER NOT NULL,
+    record TEXT NOT NULL,
+    reported_at REAL NOT NULL,
+    PRIMARY KEY (environment, cuit, caea, pto_vta, cbte_tipo, cbte_desde)
+);
+CREATE TABLE IF NOT EXISTS caea_close_no_movement (
+    environment TEXT NOT NULL,
+    cuit TEXT NOT NULL,
+    caea TEXT NOT NULL,
+    pto_vta INTEGER NOT NULL,
+    record TEXT NOT NULL,
+    reported_at REAL NOT NULL,
+    PRIMARY KEY (environment, cuit, caea, pto_vta)
+);
+"""
+
+# report(FECAEARegInformativo payload, Auth without token) -> result
+Report = Callable[[dict], Awaitable[dict]]
+# inform_no_movement(cuit, pto_vta, caea) -> FECAEASinMovimientoInformar result
+InformNoMovement = Callable[[str, int, str], Awaitable[dict]]
+
+
+def _error_of(result: dict) -> dict | None:
+    if result.get("status") != "success":
+        return result.get("error")
+    response = result.get("response")
+    return response.get("Errors") if isinstance(response, dict) else None
+
+
+def _no_movement_outcome(result: dict) -> str:
+    if result.get("status") != "success" or not isinstance(result.get("response"), dict):
+        return PENDING
+    return REPORTED if result["response"].get("Resultado") == "A" else REJECTED
+
+
+class CAEAPeriodClose:
+    """
+    Closes a CAEA period for one tenant: informs its vouchers with
+    FECAEARegInformativo, packed per PtoVta/CbteTipo into batches of up to
+    `max_records` (AFIP's records-per-request limit), and calls
+    FECAEASinMovimientoInformar for each point of sale without movement.
+    Up to `concurrency` AFIP calls run at once; batches of one
+    PtoVta/CbteTipo go in number order. Runs as a job (see JobQueue) and
+    reports its progress there.
+
+    What AFIP accepted is stored as each call returns, so a close run again
+    (after a crash, or to retry what failed) only sends the rest. Vouchers
+    issued by the contingency manager under the CAEA must be reported
+    first: the close refuses to run while any is pending, and skips the
+    ones it already reported.
+    """
+    def __init__(
+                self,
+                path: str | Path = CAEA_CLOSE_STORE_PATH,
+                max_records: int = FECAE_BATCH_MAX_RECORDS,
+                concurrency: int = CAEA_CLOSE_CONCURRENCY,
+            ) -> None:
+        self._store = SQLiteStore(path, _SCHEMA)
+        self._max_records = max_records
+        self._concurrency = concurrency
+        self._report: Report | None = None
+        self._inform_no_movement: InformNoMovement | None = None
+
+    def register(self, report: Report, inform_no_movement: InformNoMovement) -> None:
+        self._report = report
+        self._inform_no_movement = inform_no_movement
+
+    def batches(self, groups: list[dict]) -> list[tuple[int, int, list[dict]]]:
+        """(PtoVta, CbteTipo, details) batches, merging groups of the same PtoVta/CbteTipo."""
+        merged: dict[tuple[int, int], list[dict]] = {}
+        for group in groups:
+            merged.setdefault((group["PtoVta"], group["CbteTipo"]), []).extend(group["FECAEADetRequest"])
+
+        batches = []
+        for (pto_vta, cbte_tipo), details in merged.items():
+            details.sort(key=lambda detail: detail["CbteDesde"])
+            for start in range(0, len(details), self._max_records):
+                batches.append((pto_vta, cbte_tipo, details[start:start + self._max_records]))
+        return batches
+
+    async def run(self, data: dict) -> dict:
+        """
+        Job handler. `data` carries Auth, the CAEA, the vouchers as
+        Comprobantes (PtoVta, CbteTipo, FECAEADetRequest) and the points of
+        sale without movement as SinMovimiento.
+        """
+        if self._report is None or self._inform_no_movement is None:
+            raise RuntimeError("No CAEA period close senders registered")
+
+        cuit = str(data["Auth"]["Cuit"])
+        caea = data["CAEA"]
+
+        issued = await contingency.caea_vouchers(cuit, caea)
+        pending = sum(1 for status in issued.values() if status == PENDING)
+        if pending:
+            raise RuntimeError(f"{pending} contingency voucher(s) under CAEA {caea} are not reported yet, close the period once WSFE recovers")
+
+        key = (get_wsfe_environment(), cuit, caea)
+        reported_vouchers, reported_no_movement = await self._store.call(lambda db: self._read(db, key))
+        for (pto_vta, cbte_tipo, cbte_nro), status in issued.items():
+            if status == REPORTED:
+                reported_vouchers.setdefault((pto_vta, cbte_tipo, cbte_nro), {
+                    "PtoVta" : pto_vta, "CbteTipo" : cbte_tipo, "CbteDesde" : cbte_nro, "CbteHasta" : cbte_nro,
+                    "status" : REPORTED, "Observaciones" : None, "error" : None,
+                })
+
+        skipped, groups = [], []
+        for group in data.get("Comprobantes", []):
+            details = []
+            for detail in group["FECAEADetRequest"]:
+                record = reported_vouchers.get((group["PtoVta"], group["CbteTipo"], detail["CbteDesde"]))
+                if record is not None:
+                    skipped.append(record)
+                else:
+                    details.append(detail)
+            groups.append({**group, "FECAEADetRequest" : details})
+        batches = self.batches(groups)
+
+        no_movement, skipped_no_movement = [], []
+        for pto_vta in dict.fromkeys(data.get("SinMovimiento", [])):
+            if pto_vta in reported_no_movement:
+                skipped_no_movement.append(reported_no_movement[pto_vta])
+            else:
+                no_movement.append(pto_vta)
+
+        semaphore = asyncio.Semaphore(self._concurrency)
+        progress = {
+            "vouchers_total" : len(skipped) + sum(len(details) for _, _, details in batches), "vouchers_done" : len(skipped),
+            "batches_total" : len(batches), "batches_done" : 0,
+            "sin_movimiento_total" : len(skipped_no_movement) + len(no_movement), "sin_movimiento_done" : len(skipped_no_movement),
+        }
+        job_queue.report_progress(progress)
+        started = time.monotonic()
+
+        async def call(method: str, func, *args) -> dict:
+            async with semaphore:
+                try:
+                    return await func(*args)
+                except Exception as e:
+                    return build_error_response(method, "Unexpected error", str(e))
+
+        async def report_sequence(sequence: list[tuple[int, int, list[dict]]]) -> list[dict]:
+            records = []
+            failed = None
+            for pto_vta, cbte_tipo, details in sequence:
+                if failed is None:
+                    result = await call("FECAEARegInformativo", self._report, report_payload(cuit, pto_vta, cbte_tipo, details))
+                    outcomes = report_outcomes(result, len(details))
+                    if outcomes is None:
+                        # Later batches of this PtoVta/CbteTipo would leave a gap in the numbering.
+                        failed = result
+                else:
+                    result, outcomes = failed, None
+
+                answers = ((result.get("response") or {}).get("FeDetResp") or {}).get("FECAEADetResponse") or []
+                batch_records = []
+                for index, detail in enumerate(details):
+                    answer = answers[index] if outcomes is not None and len(answers) == len(details) else None
+                    batch_records.append({
+                        "PtoVta" : pto_vta,
+                        "CbteTipo" : cbte_tipo,
+                        "CbteDesde" : detail["CbteDesde"],
+                        "CbteHasta" : detail["CbteHasta"],
+                        "status" : outcomes[index] if outcomes is not None else PENDING,
+                        "Observaciones" : (answer or {}).get("Observaciones"),
+                        "error" : _error_of(result) if answer is None else None,
+                    })
+                accepted = [record for record in batch_records if record["status"] == REPORTED]
+                if accepted:
+                    await self._store.call(lambda db: self._save_vouchers(db, key, accepted))
+                records.extend(batch_records)
+                progress["vouchers_done"] += len(details)
+                progress["batches_done"] += 1
+                job_queue.report_progress(progress)
+            return records
+
+        async def inform(pto_vta: int) -> dict:
+            result = await call("FECAEASinMovimientoInformar", self._inform_no_movement, cuit, pto_vta, caea)
+            record = {"PtoVta" : pto_vta, "status" : _no_movement_outcome(result), "error" : _error_of(result), "result" : result.get("response")}
+            if record["status"] == REPORTED:
+                await self._store.call(lambda db: self._save_no_movement(db, key, record))
+            progress["sin_movimiento_done"] += 1
+            job_queue.report_progress(progress)
+            return record
+
+        sequences: dict[tuple[int, int], list] = {}
+        for batch in batches:
+            sequences.setdefault(batch[:2], []).append(batch)
+
+        voucher_results, no_movement_results = await asyncio.gather(
+            asyncio.gather(*(report_sequence(sequence) for sequence in sequences.values())),
+            asyncio.gather(*(inform(pto_vta) for pto_vta in no_movement)),
+        )
+        vouchers = sorted(
+            [*skipped, *(record for records in voucher_results for record in records)],
+            key=lambda record: (record["PtoVta"], record["CbteTipo"], record["CbteDesde"]),
+        )
+        no_movement_results = sorted([*skipped_no_movement, *no_movement_results], key=lambda record: record["PtoVta"])
+
+        def count(items: list[dict]) -> dict:
+            counts = {REPORTED : 0, REJECTED : 0, PENDING : 0}
+            for item in items:
+                counts[item["status"]] += 1
+            return counts
+
+        summary = {"vouchers" : count(vouchers), "sin_movimiento" : count(no_movement_results)}
+        logger.info(f"CAEA {caea} of {cuit} closed in {time.monotonic() - started:.1f}s: {summary}")
+        return {
+            "status" : "success",
+            "response" : {
+                "Cuit" : int(cuit),
+                "CAEA" : caea,
+                "summary" : summary,
+                "vouchers" : vouchers,
+                "sin_movimiento" : no_movement_results,
+            },
+        }
+
+    async def pending_contingency_vouchers(self, cuit: str, caea: str) -> int:
+        """Vouchers issued in contingency under the CAEA and not reported to AFIP yet."""
+        return sum(1 for status in (await contingency.caea_vouchers(cuit, caea)).values() if status == PENDING)
+
+    # ===================
+    # ===== SQLITE ======
+    # ===================
+
+    @staticmethod
+    def _read(db: sqlite3.Connection, key: tuple) -> tuple[dict, dict]:
+        vouchers = {
+            (row["pto_vta"], row["cbte_tipo"], row["cbte_desde"]) : json.loads(row["record"])
+            for row in db.execute(
+                "SELECT pto_vta, cbte_tipo, cbte_desde, record FROM caea_close_vouchers WHERE environment = ? AND cuit = ? AND caea = ?", key,
+            )
+        }
+        no_movement = {
+            row["pto_vta"] : json.loads(row["record"])
+            for row in db.execute(
+                "SELECT pto_vta, record FROM caea_close_no_movement WHERE environment = ? AND cuit = ? AND caea = ?", key,
+            )
+        }
+        return vouchers, no_movement
+
+    @staticmethod
+    def _save_vouchers(db: sqlite3.Connection, key: tuple, records: list[dict]) -> None:
+        now = time.time()
+        db.executemany(
+            "INSERT OR REPLACE INTO caea_close_vouchers (environment, cuit, caea, pto_vta, cbte_tipo, cbte_desde, record, reported_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(*key, record["PtoVta"], record["CbteTipo"], record["CbteDesde"], json.dumps(record, default=str), now) for record in records],
+        )
+
+    @staticmethod
+    def _save_no_movement(db: sqlite3.Connection, key: tuple, record: dict) -> None:
+        db.execute(
+            "INSERT OR REPLACE INTO caea_close_no_movement (environment, cuit, caea, pto_vta, record, reported_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (*key, record["PtoVta"], json.dumps(record, default=str), time.time()),
+        )
+
+    def close(self) -> None:
+        self._store.close()
+
+
+caea_period_close = CAEAPeriodClose()
@@ -0,0 +1,228 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections.abc import Awaitable, Callable
+from datetime import date, timedelta, timezone
+from pathlib import Path
+
+from config.settings import (CAEA_PREFETCH_CONCURRENCY,
+                             CAEA_PREFETCH_DAYS_AHEAD, CAEA_STORE_PATH)
+from service.soap_client.wsdl.wsdl_manager import get_wsfe_environment
+from service.time.afip_clock import afip_now
+from service.utils.logger import logger
+from service.utils.single_flight import SingleFlight
+from service.utils.sqlite_store import SQLiteStore
+
+# CAEA periods follow the Argentine calendar (UTC-3, no DST).
+AFIP_TZ = timezone(timedelta(hours=-3))
+
+LOCAL = "local"
+AFIP = "afip"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS caea (
+    environment TEXT NOT NULL,
+    cuit TEXT NOT NULL,
+    periodo INTEGER NOT NULL,
+    orden INTEGER NOT NULL,
+    caea TEXT NOT NULL,
+    result TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (environment, cuit, periodo, orden)
+)
+"""
+
+# fetch(operation, cuit, periodo, orden) -> FECAEASolicitar / FECAEAConsultar result
+Fetch = Callable[[str, str, int, int], Awaitable[dict]]
+
+
+def afip_today() -> date:
+    return afip_now().astimezone(AFIP_TZ).date()
+
+
+def period_of(day: date) -> tuple[int, int]:
+    """(Periodo, Orden) of a day: Orden 1 covers days 1-15, Orden 2 the rest of the month."""
+    return day.year * 100 + day.month, 1 if day.day <= 15 else 2
+
+
+def period_start(periodo: int, orden: int) -> date:
+    return date(periodo // 100, periodo % 100, 1 if orden == 1 else 16)
+
+
+def next_period(periodo: int, orden: int) -> tuple[int, int]:
+    if orden == 1:
+        return periodo, 2
+    year, month = divmod(periodo, 100)
+    return (year + 1) * 100 + 1 if month == 12 else periodo + 1, 1
+
+
+def due_periods(today: date, days_ahead: int) -> list[tuple[int, int]]:
+    """The current period, plus the next one once it starts within `days_ahead` days."""
+    current = period_of(today)
+    upcoming = next_period(*current)
+    if (period_start(*upcoming) - today).days <= days_ahead:
+        return [current, upcoming]
+    return [current]
+
+
+def caea_result(result: dict) -> dict | None:
+    """Normalized FECAEAConsultar-like result when `result` carries a CAEA, else None."""
+    if result.get("status") != "success" or not isinstance(result.get("response"), dict):
+        return None
+    result_get = result["response"].get("ResultGet")
+    if not isinstance(result_get, dict) or not result_get.get("CAEA"):
+        return None
+    return {"status" : "success", "response" : {"ResultGet" : result_get, "Errors" : None, "Events" : None}}
+
+
+class CAEAStore:
+    """
+    CAEA codes by environment, CUIT, Periodo and Orden, kept in memory and
+    in a SQLite file so contingency invoicing can read them without AFIP.
+    A CAEA never changes once granted. `prefetch()` obtains the codes of
+    the current and next period ahead of time: FECAEASolicitar first and,
+    when AFIP refuses it (already granted), FECAEAConsultar.
+    """
+    def __init__(
+                self,
+                path: str | Path = CAEA_STORE_PATH,
+                concurrency: int = CAEA_PREFETCH_CONCURRENCY,
+                days_ahead: int = CAEA_PREFETCH_DAYS_AHEAD,
+            ) -> None:
+        self._store = SQLiteStore(path, _SCHEMA)
+        self._concurrency = concurrency
+        self._days_ahead = days_ahead
+        self._entries: dict[tuple, dict] = {}
+        self._fetch: Fetch | None = None
+        self._fetches = SingleFlight()
+        self._counters = {"lookups" : 0, "misses" : 0, "fetched" : 0, "fetch_failures" : 0}
+
+    def register(self, fetch: Fetch) -> None:
+        self._fetch = fetch
+
+    def make_key(self, cuit: str, periodo: int, orden: int) -> tuple:
+        return get_wsfe_environment(), str(cuit), int(periodo), int(orden)
+
+    async def get(self, cuit: str, periodo: int, orden: int) -> dict | None:
+        """Local lookup only; None when the CAEA was never obtained."""
+        key = self.make_key(cuit, periodo, orden)
+        self._counters["lookups"] += 1
+
+        result = self._entries.get(key)
+        if result is None:
+            result = await self._store.call(lambda db: self._read(db, key))
+            if result is not None:
+                self._entries[key] = result
+        if result is None:
+            self._counters["misses"] += 1
+        return result
+
+    async def current(self, cuit: str) -> dict | None:
+        return await self.get(cuit, *period_of(afip_today()))
+
+    async def record(self, cuit: str, result: dict) -> bool:
+        """Keep the CAEA carried by a FECAEASolicitar/FECAEAConsultar result, if any."""
+        normalized = caea_result(result)
+        if normalized is None:
+            return False
+
+        result_get = normalized["response"]["ResultGet"]
+        key = self.make_key(cuit, result_get["Periodo"], result_get["Orden"])
+        self._entries[key] = normalized
+        try:
+            await self._store.call(lambda db: self._write(db, key, normalized))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not persist CAEA {key[1:]}: {e}")
+        return True
+
+    async def obtain(self, cuit: str, periodo: int, orden: int) -> tuple[dict, str]:
+        """Return (result, source): the stored CAEA, or one requested/consulted from AFIP."""
+        stored = await self.get(cuit, periodo, orden)
+        if stored is not None:
+            return stored, LOCAL
+
+        key = self.make_key(cuit, periodo, orden)
+        return await self._fetches.run(key, lambda: self._request(cuit, periodo, orden)), AFIP
+
+    async def _request(self, cuit: str, periodo: int, orden: int) -> dict:
+        if self._fetch is None:
+            raise RuntimeError("No CAEA fetch registered")
+
+        result = await self._fetch("FECAEASolicitar", cuit, periodo, orden)
+        if caea_result(result) is None:
+            # Typically "already granted" (requested earlier or elsewhere).
+            result = await self._fetch("FECAEAConsultar", cuit, periodo, orden)
+
+        if await self.record(cuit, result):
+            self._counters["fetched"] += 1
+        else:
+            self._counters["fetch_failures"] += 1
+        return result
+
+    async def prefetch(self, cuits: list[str], today: date | None = None) -> dict:
+        """Scheduled job: make sure every tenant has the CAEA of the due periods."""
+        periods = due_periods(today or afip_today(), self._days_ahead)
+        semaphore = asyncio.Semaphore(self._concurrency)
+        summary = {"stored" : 0, "obtained" : 0, "failed" : 0}
+        started = time.monotonic()
+
+        async def prefetch_one(cuit: str, periodo: int, orden: int) -> str:
+            async with semaphore:
+                try:
+                    result, source = await self.obtain(cuit, periodo, orden)
+                except Exception as e:
+                    logger.error(f"CAEA prefetch for CUIT {cuit} {periodo}/{orden} failed: {e}")
+                    return "failed"
+            if source == LOCAL:
+                return "stored"
+            if caea_result(result) is None:
+                logger.error(f"CAEA prefetch for CUIT {cuit} {periodo}/{orden} got no CAEA: {result.get('error') or result.get('response')}")
+                return "failed"
+            return "obtained"
+
+        outcomes = await asyncio.gather(*(
+            prefetch_one(cuit, periodo, orden) for cuit in cuits for periodo, orden in periods
+        ))
+        for outcome in outcomes:
+            summary[outcome] += 1
+
+        logger.info(
+            f"CAEA prefetch for {len(cuits)} tenant(s), periods {periods}: {summary['obtained']} obtained, "
+            f"{summary['stored']} already stored, {summary['failed']} failed in {round(time.monotonic() - started, 3)}s"
+        )
+        return summary
+
+    # ===================
+    # ===== SQLITE ======
+    # ===================
+
+    @staticmethod
+    def _read(db: sqlite3.Connection, key: tuple) -> dict | None:
+        row = db.execute(
+            "SELECT result FROM caea WHERE environment = ? AND cuit = ? AND periodo = ? AND orden = ?",
+            key,
+        ).fetchone()
+        return json.loads(row["result"]) if row else None
+
+    @staticmethod
+    def _write(db: sqlite3.Connection, key: tuple, result: dict) -> None:
+        db.execute(
+            "INSERT OR REPLACE INTO caea VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (*key, result["response"]["ResultGet"]["CAEA"], json.dumps(result, default=str), time.time()),
+        )
+
+    def close(self) -> None:
+        self._store.close()
+
+    def clear(self) -> None:
+        """Forget the in-memory entries and counters; the disk store is kept."""
+        self._entries.clear()
+        for name in self._counters:
+            self._counters[name] = 0
+
+    def stats(self) -> dict:
+        return {"entries" : len(self._entries), **self._counters}
+
+
+caea_store = CAEAStore()
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from config.settings import (CATALOG_CACHE_MAX_ENTRIES,
+                             CATALOG_CACHE_OPERATION_TTL_SECONDS,
+                             CATALOG_CACHE_STALE_SECONDS)
+from service.soap_client.wsdl.wsdl_manager import get_wsfe_environment
+from service.utils.logger import logger
+from service.utils.single_flight import SingleFlight
+
+# Catalogs that depend on the tenant; the rest are the same for every CUIT.
+PER_CUIT_OPERATIONS = frozenset({"FEParamGetPtosVenta", "FEParamGetActividades"})
+
+HIT = "HIT"
+STALE = "STALE"
+MISS = "MISS"
+BYPASS = "BYPASS"
+
+
+@dataclass(frozen=True)
+class CachedCatalog:
+    result: dict
+    fetched_at: float
+    ttl: float
+
+    def age(self, now: float) -> float:
+        return now - self.fetched_at
+
+
+def _is_cacheable(result: dict) -> bool:
+    """Only successful AFIP answers without Errors are worth keeping."""
+    if result.get("status") != "success":
+        return False
+    response = result.get("response")
+    return isinstance(response, dict) and not response.get("Errors")
+
+
+class CatalogCache:
+    """
+    Response cache for the FEParamGet* catalog operations.
+    Keyed by operation, WSFE environment, CUIT (only for tenant-specific
+    catalogs) and the remaining request parameters. Fresh entries are served
+    as is; past their TTL they are still served for `stale_seconds` while a
+    single background refresh replaces them, and are dropped after that.
+    At most `max_entries` are kept (LRU). Failed or AFIP-rejected answers
+    are never cached.
+    """
+    def __init__(
+                self,
+                operation_ttl: dict[str, int] = CATALOG_CACHE_OPERATION_TTL_SECONDS,
+                stale_seconds: int = CATALOG_CACHE_STALE_SECONDS,
+                max_entries: int = CATALOG_CACHE_MAX_ENTRIES,
+            ) -> None:
+        self._operation_ttl = operation_ttl
+        self._stale_seconds = stale_seconds
+        self._max_entries = max_entries
+        self._entries: OrderedDict[tuple, CachedCatalog] = OrderedDict()
+        self._fetches = SingleFlight()
+        self._refreshes: set[asyncio.Task] = set()
+        self._counters = {HIT : 0, STALE : 0, MISS : 0, BYPASS : 0}
+
+    def make_key(self, operation: str, cuit: str, params: dict) -> tuple:
+        tenant = cuit if operation in PER_CUIT_OPERATIONS else None
+        return operation, get_wsfe_environment(), tenant, json.dumps(params, sort_keys=True)
+
+    async def get_or_fetch(
+                        self,
+                        operation: str,
+                        cuit: str,
+                        params: dict,
+                        fetch: Callable[[], Awaitable[dict]],
+                        bypass: bool = False,
+                    ) -> tuple[dict, str]:
+        """Return (result, cache status). `params` excludes Auth."""
+        key = self.make_key(operation, cuit, params)
+
+        if bypass:
+            self._counters[BYPASS] += 1
+            return await self._fetch(key, operation, fetch), BYPASS
+
+        entry = self._entries.get(key)
+        now = time.monotonic()
+
+        if entry is not None and self._expired(entry, now):
+            del self._entries[key]
+            entry = None
+        elif entry is not None:
+            self._entries.move_to_end(key)
+
+        if entry is not None and entry.age(now) < entry.ttl:
+            self._counters[HIT] += 1
+            return entry.result, HIT
+
+        if entry is not None:
+            self._counters[STALE] += 1
+            self._refresh_in_background(key, operation, fetch)
+            return entry.result, STALE
+
+        self._counters[MISS] += 1
+        return await self._fetches.run(key, lambda: self._fetch(key, operation, fetch)), MISS
+
+    async def _fetch(self, key: tuple, operation: str, fetch: Callable[[], Awaitable[dict]]) -> dict:
+        result = await fetch()
+
+        if _is_cacheable(result):
+            ttl = self._operation_ttl.get(operation, 0)
+            self._entries[key] = CachedCatalog(result, time.monotonic(), ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+            logger.debug(f"Catalog {operation} cached for {ttl}s")
+
+        return result
+
+    def _refresh_in_background(self, key: tuple, operation: str, fetch: Callable[[], Awaitable[dict]]) -> None:
+        if self._fetches.in_flight(key):
+            return
+
+        async def refresh():
+            try:
+                await self._fetches.run(key, lambda: self._fetch(key, operation, fetch))
+            except Exception as e:
+                logger.warning(f"Background refresh of catalog {operation} failed: {e}")
+
+        # Keep a reference so the task is not garbage collected mid-flight.
+        task = asyncio.create_task(refresh())
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    def _expired(self, entry: CachedCatalog, now: float) -> bool:
+        return entry.age(now) >= entry.ttl + self._stale_seconds
+
+    async def purge(self) -> int:
+        """Scheduled job: drop entries past their stale window."""
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if self._expired(entry, now)]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            logger.info(f"Purged {len(expired)} expired catalog cache entries")
+        return len(expired)
+
+    def invalidate(self, operation: str | None = None) -> None:
+        if operation is None:
+            self._entries.clear()
+            return
+        for key in [key for key in self._entries if key[0] == operation]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        for status in self._counters:
+            self._counters[status] = 0
+
+    def stats(self) -> dict:
+        return {"entries" : len(self._entries), **{status.lower() : count for status, count in self._counters.items()}}
+
+
+catalog_cache = CatalogCache()
+
+
+def wants_fresh(cache_control: str | None) -> bool:
+    """Clients opt out of cached catalogs with `Cache-Control: no-cache` (or no-store)."""
+    if not cache_control:
+        return False
+    directives = {directive.strip().lower() for directive in cache_control.split(",")}
+    return bool(directives & {"no-cache", "no-store"})
@@ -0,0 +1,289 @@
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from config.settings import (COMPROBANTE_CACHE_MAX_ENTRIES,
+                             COMPROBANTE_CACHE_NEGATIVE_TTL_SECONDS,
+                             COMPROBANTE_CACHE_PATH)
+from service.soap_client.wsdl.wsdl_manager import get_wsfe_environment
+from service.utils.catalog_cache import BYPASS, HIT, MISS
+from service.utils.logger import logger
+from service.utils.single_flight import SingleFlight
+from service.utils.sqlite_store import SQLiteStore
+
+# FECompConsultar: "No existen datos en nuestros registros para los parametros ingresados"
+NOT_FOUND_CODE = 602
+
+# ResultGet of FECompConsultar (FECompConsResponse extends FECAEDetRequest).
+_RESULT_GET_FIELDS = (
+    "Concepto", "DocTipo", "DocNro", "CbteDesde", "CbteHasta", "CbteFch",
+    "ImpTotal", "ImpTotConc", "ImpNeto", "ImpOpEx", "ImpTrib", "ImpIVA",
+    "FchServDesde", "FchServHasta", "FchVtoPago", "MonId", "MonCotiz",
+    "CanMisMonExt", "CondicionIVAReceptorId", "CbtesAsoc", "Tributos", "Iva",
+    "Opcionales", "Compradores", "PeriodoAsoc", "Actividades",
+    "Resultado", "CodAutorizacion", "EmisionTipo", "FchVto", "FchProceso",
+    "Observaciones", "PtoVta", "CbteTipo",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS comprobantes (
+    environment TEXT NOT NULL,
+    cuit TEXT NOT NULL,
+    cbte_tipo INTEGER NOT NULL,
+    pto_vta INTEGER NOT NULL,
+    cbte_nro INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (environment, cuit, cbte_tipo, pto_vta, cbte_nro)
+)
+"""
+
+
+def _is_authorized(result: dict) -> bool:
+    """An authorized voucher (it has a CAE/CAEA) never changes again."""
+    if result.get("status") != "success":
+        return False
+    response = result.get("response")
+    if not isinstance(response, dict) or response.get("Errors"):
+        return False
+    result_get = response.get("ResultGet")
+    return isinstance(result_get, dict) and bool(result_get.get("CodAutorizacion"))
+
+
+def _is_not_found(result: dict) -> bool:
+    if result.get("status") != "success":
+        return False
+    try:
+        errors = result["response"]["Errors"]["Err"]
+    except (KeyError, TypeError):
+        return False
+    return any(error.get("Code") == NOT_FOUND_CODE for error in errors or [])
+
+
+def authorized_from_fecae(request: dict, result: dict) -> list[tuple[int, int, int, dict]]:
+    """
+    (CbteTipo, PtoVta, CbteNro, FECompConsultar result) for every voucher a
+    successful FECAESolicitar authorized. The ResultGet is rebuilt from the
+    request detail plus the CAE data of its FECAEDetResponse. Ranges
+    (CbteDesde != CbteHasta) are skipped.
+    """
+    if result.get("status") != "success" or not isinstance(result.get("response"), dict):
+        return []
+
+    response = result["response"]
+    header = response.get("FeCabResp") or {}
+    responses = (response.get("FeDetResp") or {}).get("FECAEDetResponse") or []
+    requests = request["FeCAEReq"]["FeDetReq"]["FECAEDetRequest"]
+    pto_vta, cbte_tipo = header.get("PtoVta"), header.get("CbteTipo")
+
+    authorized = []
+    for detail, det_response in zip(requests, responses):
+        if not det_response or det_response.get("Resultado") != "A" or not det_response.get("CAE"):
+            continue
+        if det_response.get("CbteDesde") != det_response.get("CbteHasta"):
+            continue
+
+        result_get = {name: detail.get(name) for name in _RESULT_GET_FIELDS}
+        result_get.update({
+            "CbteDesde" : det_response["CbteDesde"],
+            "CbteHasta" : det_response["CbteHasta"],
+            "CbteFch" : det_response.get("CbteFch") or detail.get("CbteFch"),
+            "Resultado" : "A",
+            "CodAutorizacion" : det_response["CAE"],
+            "EmisionTipo" : "CAE",
+            "FchVto" : det_response.get("CAEFchVto"),
+            "FchProceso" : header.get("FchProceso"),
+            "Observaciones" : det_response.get("Observaciones"),
+            "PtoVta" : pto_vta,
+            "CbteTipo" : cbte_tipo,
+        })
+        consult_result = {"status" : "success", "response" : {"ResultGet" : result_get, "Errors" : None, "Events" : None}}
+        authorized.append((cbte_tipo, pto_vta, det_response["CbteDesde"], consult_result))
+
+    return authorized
+
+
+def fecae_from_consults(request: dict, consults: list[dict]) -> dict | None:
+    """
+    FECAESolicitar result rebuilt from the FECompConsultar results of the
+    request's vouchers (by CbteDesde, in order), for a request AFIP already
+    processed but whose answer was lost. None when AFIP does not have the
+    first voucher: the request never reached it. Vouchers AFIP does not have
+    (or that were not consulted) come back rejected.
+    """
+    if not consults or not _is_authorized(consults[0]):
+        return None
+
+    header = request["FeCAEReq"]["FeCabReq"]
+    details = []
+    for index, detail in enumerate(request["FeCAEReq"]["FeDetReq"]["FECAEDetRequest"]):
+        consult = consults[index] if index < len(consults) else {}
+        if not _is_authorized(consult):
+            details.append({
+                **{name: detail.get(name) for name in ("Concepto", "DocTipo", "DocNro", "CbteDesde", "CbteHasta", "CbteFch")},
+                "Resultado" : "R",
+            })
+            continue
+
+        result_get = consult["response"]["ResultGet"]
+        details.append({
+            **{name: result_get.get(name) for name in ("Concepto", "DocTipo", "DocNro", "CbteDesde", "CbteHasta", "CbteFch")},
+            "Resultado" : "A",
+            "CAE" : result_get["CodAutorizacion"],
+            "CAEFchVto" : result_get.get("FchVto"),
+            "Observaciones" : result_get.get("Observaciones"),
+        })
+
+    authorized = sum(1 for detail in details if detail["Resultado"] == "A")
+    return {
+        "status" : "success",
+        "response" : {
+            "FeCabResp" : {
+                "Cuit" : int(request["Auth"]["Cuit"]),
+                "PtoVta" : header["PtoVta"],
+                "CbteTipo" : header["CbteTipo"],
+                "FchProceso" : consults[0]["response"]["ResultGet"].get("FchProceso"),
+                "CantReg" : len(details),
+                "Resultado" : "A" if authorized == len(details) else "P",
+                "Reproceso" : "S",
+            },
+            "FeDetResp" : {"FECAEDetResponse" : details},
+            "Events" : None,
+            "Errors" : None,
+        },
+    }
+
+
+class ComprobanteCache:
+    """
+    FECompConsultar results of authorized vouchers, keyed by environment,
+    CUIT, CbteTipo, PtoVta and CbteNro. Once a voucher has a CAE its data is
+    immutable, so entries never expire: a bounded LRU in memory sits in
+    front of a SQLite file that survives restarts. "Not found" answers are
+    kept in memory only, for `negative_ttl` seconds, because the voucher may
+    be authorized right after.
+    """
+    def __init__(
+                self,
+                path: str | Path = COMPROBANTE_CACHE_PATH,
+                max_entries: int = COMPROBANTE_CACHE_MAX_ENTRIES,
+                negative_ttl: int = COMPROBANTE_CACHE_NEGATIVE_TTL_SECONDS,
+            ) -> None:
+        self._store = SQLiteStore(path, _SCHEMA)
+        self._max_entries = max_entries
+        self._negative_ttl = negative_ttl
+        self._entries: OrderedDict[tuple, dict] = OrderedDict()
+        self._negative: dict[tuple, tuple[dict, float]] = {}
+        self._fetches = SingleFlight()
+        self._counters = {HIT : 0, MISS : 0, BYPASS : 0}
+
+    def make_key(self, cuit: str, cbte_tipo: int, pto_vta: int, cbte_nro: int) -> tuple:
+        return get_wsfe_environment(), str(cuit), int(cbte_tipo), int(pto_vta), int(cbte_nro)
+
+    async def get_or_fetch(self, cuit: str, cbte_tipo: int, pto_vta: int, cbte_nro: int, fetch, bypass: bool = False) -> tuple[dict, str]:
+        """Return (result, cache status) for one voucher."""
+        key = self.make_key(cuit, cbte_tipo, pto_vta, cbte_nro)
+
+        if bypass:
+            self._counters[BYPASS] += 1
+            return await self._fetch(key, fetch), BYPASS
+
+        cached = await self.get(key)
+        if cached is not None:
+            self._counters[HIT] += 1
+            return cached, HIT
+
+        self._counters[MISS] += 1
+        return await self._fetches.run(key, lambda: self._fetch(key, fetch)), MISS
+
+    async def get(self, key: tuple) -> dict | None:
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+            return result
+
+        negative = self._negative.get(key)
+        if negative is not None:
+            if time.monotonic() - negative[1] < self._negative_ttl:
+                return negative[0]
+            del self._negative[key]
+
+        result = await self._store.call(lambda db: self._read(db, key))
+        if result is not None:
+            self._remember(key, result)
+        return result
+
+    async def put(self, key: tuple, result: dict) -> None:
+        """Store an authorized voucher in memory and on disk."""
+        self._negative.pop(key, None)
+        self._remember(key, result)
+        try:
+            await self._store.call(lambda db: self._write(db, key, result))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not persist voucher {key[1:]} to {self._store.path}: {e}")
+
+    async def store_fecae_result(self, request: dict, result: dict) -> int:
+        """Cache every voucher authorized by a FECAESolicitar call. Returns how many."""
+        cuit = request["Auth"]["Cuit"]
+        authorized = authorized_from_fecae(request, result)
+        for cbte_tipo, pto_vta, cbte_nro, consult_result in authorized:
+            await self.put(self.make_key(cuit, cbte_tipo, pto_vta, cbte_nro), consult_result)
+        return len(authorized)
+
+    async def _fetch(self, key: tuple, fetch) -> dict:
+        result = await fetch()
+
+        if _is_authorized(result):
+            await self.put(key, result)
+        elif _is_not_found(result):
+            self._negative[key] = (result, time.monotonic())
+
+        return result
+
+    def _remember(self, key: tuple, result: dict) -> None:
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    # ===================
+    # ===== SQLITE ======
+    # ===================
+
+    @staticmethod
+    def _read(db: sqlite3.Connection, key: tuple) -> dict | None:
+        row = db.execute(
+            "SELECT result FROM comprobantes WHERE environment = ? AND cuit = ? "
+            "AND cbte_tipo = ? AND pto_vta = ? AND cbte_nro = ?",
+            key,
+        ).fetchone()
+        return json.loads(row["result"]) if row else None
+
+    @staticmethod
+    def _write(db: sqlite3.Connection, key: tuple, result: dict) -> None:
+        db.execute(
+            "INSERT OR REPLACE INTO comprobantes VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (*key, json.dumps(result, default=str), time.time()),
+        )
+
+    def close(self) -> None:
+        self._store.close()
+
+    def clear(self) -> None:
+        """Forget the in-memory entries and counters; the disk store is kept."""
+        self._entries.clear()
+        self._negative.clear()
+        for status in self._counters:
+            self._counters[status] = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries" : len(self._entries),
+            "negative_entries" : len(self._negative),
+            **{status.lower() : count for status, count in self._counters.items()},
+        }
+
+
+comprobante_cache = ComprobanteCache()
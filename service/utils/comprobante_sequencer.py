@@ -0,0 +1,154 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+
+from service.soap_client.wsdl.wsdl_manager import get_wsfe_environment
+from service.utils.logger import logger
+from service.utils.single_flight import SingleFlight
+
+# FECAESolicitar: CbteDesde is not the next number to authorize.
+SEQUENCE_MISMATCH_CODE = 10016
+
+LOCAL = "local"
+AFIP = "afip"
+
+
+def _codes(messages: dict | None, name: str) -> set[int]:
+    if not isinstance(messages, dict):
+        return set()
+    return {message.get("Code") for message in messages.get(name) or [] if message}
+
+
+def _last_authorized(result: dict) -> int | None:
+    """CbteNro of a successful FECompUltimoAutorizado answer."""
+    if result.get("status") != "success":
+        return None
+    response = result.get("response")
+    if not isinstance(response, dict) or response.get("Errors"):
+        return None
+    return response.get("CbteNro")
+
+
+class ComprobanteSequencer:
+    """
+    Last authorized voucher number per environment, CUIT, PtoVta and
+    CbteTipo. A sequence is seeded once from FECompUltimoAutorizado and then
+    advanced locally from the FECAESolicitar answers that go through the
+    service. When AFIP rejects a voucher because its number is not the next
+    one (another system issued vouchers on the same point of sale), the
+    sequence is dropped and seeded again on its next use.
+
+    `lock()` is the one numbering lock of a sequence: every path that picks
+    a number and sends it (the batcher, direct FECAESolicitar calls and
+    jobs, CAEA contingency) holds it until AFIP answered.
+    """
+    def __init__(self) -> None:
+        self._last: dict[tuple, int] = {}
+        self._locks: dict[tuple, asyncio.Lock] = {}
+        self._seeds = SingleFlight()
+        self._counters = {"local" : 0, "seeds" : 0, "resyncs" : 0}
+
+    def make_key(self, cuit: str, pto_vta: int, cbte_tipo: int) -> tuple:
+        return get_wsfe_environment(), str(cuit), int(pto_vta), int(cbte_tipo)
+
+    def lock(self, cuit: str, pto_vta: int, cbte_tipo: int) -> asyncio.Lock:
+        return self._locks.setdefault(self.make_key(cuit, pto_vta, cbte_tipo), asyncio.Lock())
+
+    async def next_number(
+                        self,
+                        cuit: str,
+                        pto_vta: int,
+                        cbte_tipo: int,
+                        seed: Callable[[], Awaitable[dict]],
+                    ) -> tuple[dict, str]:
+        """
+        Return (result, source). `seed` runs FECompUltimoAutorizado and is
+        only awaited when the sequence is unknown; its error is returned as is.
+        The number is not reserved: callers issuing vouchers concurrently on
+        the same sequence must coordinate.
+        """
+        key = self.make_key(cuit, pto_vta, cbte_tipo)
+
+        last = self._last.get(key)
+        source = LOCAL
+        if last is None:
+            result = await self._seeds.run(key, lambda: self._seed(key, seed))
+            last = _last_authorized(result)
+            if last is None:
+                return result, AFIP
+            source = AFIP
+        else:
+            self._counters["local"] += 1
+
+        return {
+            "status" : "success",
+            "response" : {"PtoVta" : pto_vta, "CbteTipo" : cbte_tipo, "LastCbteNro" : last, "NextCbteNro" : last + 1},
+        }, source
+
+    async def _seed(self, key: tuple, seed: Callable[[], Awaitable[dict]]) -> dict:
+        result = await seed()
+        self._record_last_authorized(key, result)
+        self._counters["seeds"] += 1
+        return result
+
+    def record_last_authorized(self, cuit: str, pto_vta: int, cbte_tipo: int, result: dict) -> int | None:
+        """Take an FECompUltimoAutorizado answer as the truth for its sequence. Returns its CbteNro."""
+        return self._record_last_authorized(self.make_key(cuit, pto_vta, cbte_tipo), result)
+
+    def _record_last_authorized(self, key: tuple, result: dict) -> int | None:
+        last = _last_authorized(result)
+        if last is not None:
+            self._last[key] = last
+        return last
+
+    def record_fecae(self, request: dict, result: dict) -> None:
+        """Advance (or drop, on a number mismatch) the sequence of a FECAESolicitar call."""
+        if result.get("status") != "success" or not isinstance(result.get("response"), dict):
+            return
+
+        header = request["FeCAEReq"]["FeCabReq"]
+        key = self.make_key(request["Auth"]["Cuit"], header["PtoVta"], header["CbteTipo"])
+        response = result["response"]
+        details = (response.get("FeDetResp") or {}).get("FECAEDetResponse") or []
+
+        # Records after a rejected one fail with the same code only because
+        # the rejected number was left unused; that is not a sequence out of sync.
+        first_rejected = next((index for index, detail in enumerate(details) if detail and detail.get("Resultado") == "R"), len(details))
+        mismatch = SEQUENCE_MISMATCH_CODE in _codes(response.get("Errors"), "Err") or any(
+            SEQUENCE_MISMATCH_CODE in _codes(detail.get("Observaciones"), "Obs") for detail in details[:first_rejected + 1] if detail
+        )
+        if mismatch:
+            if self._last.pop(key, None) is not None:
+                self._counters["resyncs"] += 1
+                logger.warning(f"Voucher sequence {key[1:]} out of sync with AFIP, it will be seeded again")
+            return
+
+        authorized = [detail["CbteHasta"] for detail in details if detail and detail.get("Resultado") == "A"]
+        if authorized:
+            self._last[key] = max(self._last.get(key, 0), *authorized)
+
+    def last_known(self, cuit: str, pto_vta: int, cbte_tipo: int) -> int | None:
+        """Last number of the sequence if it is known locally; never calls AFIP."""
+        return self._last.get(self.make_key(cuit, pto_vta, cbte_tipo))
+
+    def advance(self, cuit: str, pto_vta: int, cbte_tipo: int, cbte_nro: int) -> None:
+        """Record a number issued without FECAESolicitar (CAEA contingency vouchers)."""
+        key = self.make_key(cuit, pto_vta, cbte_tipo)
+        self._last[key] = max(self._last.get(key, 0), cbte_nro)
+
+    def invalidate(self, cuit: str | None = None) -> None:
+        if cuit is None:
+            self._last.clear()
+            return
+        for key in [key for key in self._last if key[1] == str(cuit)]:
+            del self._last[key]
+
+    def clear(self) -> None:
+        self._last.clear()
+        for name in self._counters:
+            self._counters[name] = 0
+
+    def stats(self) -> dict:
+        return {"sequences" : len(self._last), **self._counters}
+
+
+comprobante_sequencer = ComprobanteSequencer()
@@ -0,0 +1,363 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections.abc import Awaitable, Callable
+from itertools import groupby
+from pathlib import Path
+
+from config.settings import (CAEA_PREFETCH_CONCURRENCY, CONTINGENCY_CBTE_TIPOS,
+                             CONTINGENCY_ENABLED, CONTINGENCY_LATENCY_SECONDS,
+                             CONTINGENCY_PTO_VTA,
+                             CONTINGENCY_REPORT_BATCH_SIZE,
+                             CONTINGENCY_STORE_PATH)
+from service.soap_client.wsdl.wsdl_manager import get_wsfe_environment
+from service.time.afip_clock import afip_now
+from service.utils.caea_store import AFIP_TZ, caea_store
+from service.utils.comprobante_sequencer import comprobante_sequencer
+from service.utils.logger import logger
+from service.utils.sqlite_store import SQLiteStore
+from service.utils.wsfe_health import WSFEHealth, wsfe_health
+
+PENDING = "pending"
+REPORTED = "reported"
+REJECTED = "rejected"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contingency_vouchers (
+    environment TEXT NOT NULL,
+    cuit TEXT NOT NULL,
+    pto_vta INTEGER NOT NULL,
+    cbte_tipo INTEGER NOT NULL,
+    cbte_nro INTEGER NOT NULL,
+    caea TEXT NOT NULL,
+    detail TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    created_at REAL NOT NULL,
+    reported_at REAL,
+    PRIMARY KEY (environment, cuit, pto_vta, cbte_tipo, cbte_nro)
+);
+CREATE INDEX IF NOT EXISTS contingency_by_status ON contingency_vouchers (status);
+CREATE TABLE IF NOT EXISTS contingency_sequences (
+    environment TEXT NOT NULL,
+    cuit TEXT NOT NULL,
+    pto_vta INTEGER NOT NULL,
+    cbte_tipo INTEGER NOT NULL,
+    last_nro INTEGER NOT NULL,
+    seeded_at REAL NOT NULL,
+    PRIMARY KEY (environment, cuit, pto_vta, cbte_tipo)
+);
+"""
+
+# report(FECAEARegInformativo payload, Auth without token) -> result
+Report = Callable[[dict], Awaitable[dict]]
+# probe() -> True when WSFE answers and its servers report OK
+Probe = Callable[[], Awaitable[bool]]
+# last_authorized(payload with Auth, PtoVta, CbteTipo) -> FECompUltimoAutorizado result
+LastAuthorized = Callable[[dict], Awaitable[dict]]
+
+
+def _afip_timestamp() -> str:
+    return afip_now().astimezone(AFIP_TZ).strftime("%Y%m%d%H%M%S")
+
+
+def _issued_result(cuit: str, pto_vta: int, cbte_tipo: int, detail: dict) -> dict:
+    """FECAESolicitar-shaped answer for a voucher issued under CAEA."""
+    return {
+        "status" : "success",
+        "response" : {
+            "FeCabResp" : {
+                "Cuit" : int(cuit), "PtoVta" : pto_vta, "CbteTipo" : cbte_tipo, "FchProceso" : _afip_timestamp(),
+                "CantReg" : 1, "Resultado" : "A", "Reproceso" : "N",
+            },
+            "FeDetResp" : {"FECAEDetResponse" : [{
+                "Concepto" : detail.get("Concepto"),
+                "DocTipo" : detail.get("DocTipo"),
+                "DocNro" : detail.get("DocNro"),
+                "CbteDesde" : detail["CbteDesde"],
+                "CbteHasta" : detail["CbteHasta"],
+                "CbteFch" : detail.get("CbteFch"),
+                "Resultado" : "A",
+                "EmisionTipo" : "CAEA",
+                "CAEA" : detail["CAEA"],
+                "Observaciones" : None,
+            }]},
+            "Errors" : None,
+            "Events" : None,
+        },
+        "contingency" : True,
+    }
+
+
+def report_payload(cuit: str, pto_vta: int, cbte_tipo: int, details: list[dict]) -> dict:
+    return {
+        "Auth" : {"Cuit" : int(cuit)},
+        "FeCAEARegInfReq" : {
+            "FeCabReq" : {"CantReg" : len(details), "PtoVta" : pto_vta, "CbteTipo" : cbte_tipo},
+            "FeDetReq" : {"FECAEADetRequest" : details},
+        },
+    }
+
+
+def report_outcomes(result: dict, size: int) -> list[str] | None:
+    """
+    REPORTED/REJECTED per voucher of a FECAEARegInformativo answer, in
+    request order. None when AFIP did not answer (the vouchers stay pending).
+    """
+    if result.get("status") != "success" or not isinstance(result.get("response"), dict):
+        return None
+    details = (result["response"].get("FeDetResp") or {}).get("FECAEADetResponse") or []
+    if len(details) != size:
+        # Rejected as a whole (request-level Errors).
+        return [REJECTED] * size
+    return [REPORTED if detail and detail.get("Resultado") == "A" else REJECTED for detail in details]
+
+
+class ContingencyManager:
+    """
+    Opt-in CAEA contingency. While WSFE is degraded (see WSFEHealth),
+    single-voucher FECAESolicitar requests of a CUIT with a stored CAEA for
+    the current period are numbered locally on the CAEA point of sale,
+    answered at once and kept in SQLite. The last number of each voucher
+    type on that point of sale is read from AFIP by `seed()` while WSFE is
+    healthy and kept in SQLite too, so it is known when WSFE goes down,
+    even after a restart. `tick()` probes WSFE while degraded and, once it
+    is healthy, reports the queued vouchers with FECAEARegInformativo in
+    batches of `batch_size`.
+    """
+    def __init__(
+                self,
+                path: str | Path = CONTINGENCY_STORE_PATH,
+                enabled: bool = CONTINGENCY_ENABLED,
+                pto_vta: int = CONTINGENCY_PTO_VTA,
+                batch_size: int = CONTINGENCY_REPORT_BATCH_SIZE,
+                health: WSFEHealth = wsfe_health,
+                cbte_tipos: list[int] = CONTINGENCY_CBTE_TIPOS,
+                seed_concurrency: int = CAEA_PREFETCH_CONCURRENCY,
+            ) -> None:
+        if enabled and pto_vta <= 0:
+            raise ValueError("CONTINGENCY_ENABLED requires CONTINGENCY_PTO_VTA, the point of sale enabled for CAEA")
+
+        self._store = SQLiteStore(path, _SCHEMA)
+        self.enabled = enabled
+        self._pto_vta = pto_vta
+        self._batch_size = batch_size
+        self._health = health
+        self._cbte_tipos = cbte_tipos
+        self._seed_concurrency = seed_concurrency
+        self._report: Report | None = None
+        self._probe: Probe | None = None
+        self._last_authorized: LastAuthorized | None = None
+        self._reporting = asyncio.Lock()
+        self._counters = {"issued" : 0, "not_eligible" : 0, "report_calls" : 0, "probes" : 0}
+
+    def register(self, report: Report, probe: Probe, last_authorized: LastAuthorized) -> None:
+        self._report = report
+        self._probe = probe
+        self._last_authorized = last_authorized
+
+    def active(self) -> bool:
+        return self.enabled and self._health.degraded
+
+    # ===================
+    # ===== ISSUING =====
+    # ===================
+
+    async def issue(self, data: dict) -> dict | None:
+        """
+        Issue a single-voucher FECAESolicitar under the current CAEA. None when
+        the voucher is not eligible (no CAEA stored, or the CAEA point of
+        sale's last number is unknown) and must go to AFIP as usual.
+        """
+        cuit = str(data["Auth"]["Cuit"])
+        pto_vta = self._pto_vta
+        cbte_tipo = data["FeCAEReq"]["FeCabReq"]["CbteTipo"]
+
+        caea = await caea_store.current(cuit)
+        if caea is None:
+            self._counters["not_eligible"] += 1
+            return None
+
+        key = (get_wsfe_environment(), cuit, int(pto_vta), int(cbte_tipo))
+        async with comprobante_sequencer.lock(cuit, pto_vta, cbte_tipo):
+            last = await self._last_number(key)
+            if last is None:
+                self._counters["not_eligible"] += 1
+                logger.warning(f"No known last number for {key[1:]}, voucher sent to AFIP despite degraded WSFE")
+                return None
+
+            detail = {
+                **data["FeCAEReq"]["FeDetReq"]["FECAEDetRequest"][0],
+                "CbteDesde" : last + 1,
+                "CbteHasta" : last + 1,
+                "CAEA" : caea["response"]["ResultGet"]["CAEA"],
+                "CbteFchHsGen" : _afip_timestamp(),
+            }
+            await self._store.call(lambda db: db.execute(
+                "INSERT INTO contingency_vouchers (environment, cuit, pto_vta, cbte_tipo, cbte_nro, caea, detail, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, last + 1, detail["CAEA"], json.dumps(detail, default=str), PENDING, time.time()),
+            ))
+            comprobante_sequencer.advance(cuit, pto_vta, cbte_tipo, last + 1)
+
+        self._counters["issued"] += 1
+        return _issued_result(cuit, pto_vta, cbte_tipo, detail)
+
+    async def _last_number(self, key: tuple) -> int | None:
+        """Highest of the sequencer's number, the last seed and the vouchers issued here."""
+        _, cuit, pto_vta, cbte_tipo = key
+        known = comprobante_sequencer.last_known(cuit, pto_vta, cbte_tipo)
+        seeded, issued = await self._store.call(lambda db: db.execute(
+            "SELECT "
+            "(SELECT last_nro FROM contingency_sequences WHERE environment = ? AND cuit = ? AND pto_vta = ? AND cbte_tipo = ?), "
+            "(SELECT MAX(cbte_nro) FROM contingency_vouchers WHERE environment = ? AND cuit = ? AND pto_vta = ? AND cbte_tipo = ?)",
+            (*key, *key),
+        ).fetchone())
+        numbers = [number for number in (known, seeded, issued) if number is not None]
+        return max(numbers) if numbers else None
+
+    async def seed(self, cuits: list[str]) -> dict:
+        """
+        Scheduled with the CAEA prefetch: read the last number of every
+        voucher type of each tenant on the CAEA point of sale with
+        FECompUltimoAutorizado, and store it. Skipped while WSFE is degraded.
+        """
+        summary = {"seeded" : 0, "failed" : 0}
+        if not self.enabled or self._health.degraded:
+            return summary
+        if self._last_authorized is None:
+            raise RuntimeError("No FECompUltimoAutorizado sender registered")
+
+        semaphore = asyncio.Semaphore(self._seed_concurrency)
+
+        async def seed_one(cuit: str, cbte_tipo: int) -> str:
+            key = (get_wsfe_environment(), cuit, self._pto_vta, cbte_tipo)
+            async with semaphore, comprobante_sequencer.lock(cuit, self._pto_vta, cbte_tipo):
+                try:
+                    result = await self._last_authorized({"Auth" : {"Cuit" : int(cuit)}, "PtoVta" : self._pto_vta, "CbteTipo" : cbte_tipo})
+                except Exception as e:
+                    logger.error(f"Reading the last CAEA voucher number of {key[1:]} failed: {e}")
+                    return "failed"
+
+                last = comprobante_sequencer.record_last_authorized(cuit, self._pto_vta, cbte_tipo, result)
+                if last is None:
+                    logger.error(f"No last CAEA voucher number for {key[1:]}: {result.get('error') or result.get('response')}")
+                    return "failed"
+
+                await self._store.call(lambda db: db.execute(
+                    "INSERT OR REPLACE INTO contingency_sequences (environment, cuit, pto_vta, cbte_tipo, last_nro, seeded_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (*key, last, time.time()),
+                ))
+                return "seeded"
+
+        outcomes = await asyncio.gather(*(seed_one(str(cuit), cbte_tipo) for cuit in cuits for cbte_tipo in self._cbte_tipos))
+        for outcome in outcomes:
+            summary[outcome] += 1
+        return summary
+
+    # ===================
+    # ==== REPORTING ====
+    # ===================
+
+    async def report_pending(self, cuit: str | None = None) -> dict:
+        """Send the pending vouchers (of one CUIT, or all) with FECAEARegInformativo."""
+        if self._report is None:
+            raise RuntimeError("No FECAEARegInformativo sender registered")
+
+        summary = {REPORTED : 0, REJECTED : 0, PENDING : 0}
+        async with self._reporting:
+            rows = await self._store.call(lambda db: db.execute(
+                "SELECT * FROM contingency_vouchers WHERE status = ? AND environment = ? AND (? IS NULL OR cuit = ?) "
+                "ORDER BY cuit, pto_vta, cbte_tipo, cbte_nro",
+                (PENDING, get_wsfe_environment(), cuit, cuit),
+            ).fetchall())
+
+            groups = groupby(rows, key=lambda row: (row["cuit"], row["pto_vta"], row["cbte_tipo"]))
+            for (group_cuit, pto_vta, cbte_tipo), group in groups:
+                group = list(group)
+                for start in range(0, len(group), self._batch_size):
+                    batch = group[start:start + self._batch_size]
+                    details = [json.loads(row["detail"]) for row in batch]
+
+                    self._counters["report_calls"] += 1
+                    result = await self._report(report_payload(group_cuit, pto_vta, cbte_tipo, details))
+                    outcomes = report_outcomes(result, len(batch))
+                    if outcomes is None:
+                        # AFIP unreachable again: keep the rest for the next run.
+                        logger.error(f"Reporting CAEA vouchers of {group_cuit} {pto_vta}/{cbte_tipo} failed: {result.get('error')}")
+                        summary[PENDING] += len(group) - start
+                        break
+
+                    await self._store.call(lambda db: self._mark(db, batch, outcomes, result))
+                    for outcome in outcomes:
+                        summary[outcome] += 1
+                    if REJECTED in outcomes:
+                        logger.error(f"AFIP rejected {outcomes.count(REJECTED)} CAEA voucher(s) of {group_cuit} {pto_vta}/{cbte_tipo}")
+
+        if any(summary.values()):
+            logger.info(f"CAEA vouchers reported: {summary[REPORTED]} accepted, {summary[REJECTED]} rejected, {summary[PENDING]} still pending")
+        return summary
+
+    @staticmethod
+    def _mark(db: sqlite3.Connection, rows: list[sqlite3.Row], outcomes: list[str], result: dict) -> None:
+        stored_result = json.dumps(result, default=str)
+        now = time.time()
+        db.executemany(
+            "UPDATE contingency_vouchers SET status = ?, result = ?, reported_at = ? "
+            "WHERE environment = ? AND cuit = ? AND pto_vta = ? AND cbte_tipo = ? AND cbte_nro = ?",
+            [
+                (outcome, stored_result, now, row["environment"], row["cuit"], row["pto_vta"], row["cbte_tipo"], row["cbte_nro"])
+                for row, outcome in zip(rows, outcomes)
+            ],
+        )
+
+    async def tick(self) -> None:
+        """Scheduled job: probe WSFE while degraded; report queued vouchers once it is healthy."""
+        if not self.enabled:
+            return
+
+        if self._health.degraded:
+            if self._probe is None:
+                return
+            self._counters["probes"] += 1
+            started = time.monotonic()
+            try:
+                healthy = await self._probe()
+            except Exception as e:
+                logger.warning(f"WSFE probe failed: {e}")
+                healthy = False
+            if not healthy or time.monotonic() - started >= CONTINGENCY_LATENCY_SECONDS:
+                return
+            self._health.recover()
+
+        if await self._count(PENDING):
+            await self.report_pending()
+
+    async def caea_vouchers(self, cuit: str, caea: str) -> dict[tuple[int, int, int], str]:
+        """Status of every voucher issued here under a CAEA, by (PtoVta, CbteTipo, CbteNro)."""
+        rows = await self._store.call(lambda db: db.execute(
+            "SELECT pto_vta, cbte_tipo, cbte_nro, status FROM contingency_vouchers WHERE environment = ? AND cuit = ? AND caea = ?",
+            (get_wsfe_environment(), str(cuit), caea),
+        ).fetchall())
+        return {(row["pto_vta"], row["cbte_tipo"], row["cbte_nro"]) : row["status"] for row in rows}
+
+    async def _count(self, status: str) -> int:
+        return await self._store.call(lambda db: db.execute(
+            "SELECT COUNT(*) FROM contingency_vouchers WHERE status = ?", (status,)
+        ).fetchone()[0])
+
+    def close(self) -> None:
+        self._store.close()
+
+    async def stats(self) -> dict:
+        rows = await self._store.call(lambda db: db.execute(
+            "SELECT status, COUNT(*) AS count FROM contingency_vouchers GROUP BY status"
+        ).fetchall())
+        counts = {PENDING : 0, REPORTED : 0, REJECTED : 0}
+        counts.update({row["status"] : row["count"] for row in rows})
+        return {"enabled" : self.enabled, **self._health.stats(), **self._counters, "vouchers" : counts}
+
+
+contingency = ContingencyManager()
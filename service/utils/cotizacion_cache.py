@@ -0,0 +1,182 @@
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from config.settings import (COTIZACION_CACHE_MAX_ENTRIES,
+                             COTIZACION_CACHE_TTL_SECONDS,
+                             COTIZACION_TRACK_SECONDS)
+from service.soap_client.wsdl.wsdl_manager import get_wsfe_environment
+from service.time.afip_clock import afip_now
+from service.utils.logger import logger
+from service.utils.single_flight import SingleFlight
+
+LATEST = "latest"
+
+# fetch(cuit, MonId, FchCotiz or None) -> FEParamGetCotizacion result
+Fetch = Callable[[str, str, str | None], Awaitable[dict]]
+
+
+@dataclass
+class CachedCotizacion:
+    result: dict
+    fetched_at: datetime
+    fetched_monotonic: float
+    cuit: str
+    last_access: float = field(default_factory=time.monotonic)
+
+    @property
+    def rate_date(self) -> str | None:
+        return _rate_date(self.result)
+
+
+def _rate_date(result: dict) -> str | None:
+    try:
+        return result["response"]["ResultGet"]["FchCotiz"]
+    except (KeyError, TypeError):
+        return None
+
+
+def _is_cacheable(result: dict) -> bool:
+    if result.get("status") != "success":
+        return False
+    response = result.get("response")
+    return isinstance(response, dict) and not response.get("Errors") and _rate_date(result) is not None
+
+
+class CotizacionCache:
+    """
+    Currency quotes from FEParamGetCotizacion keyed by environment, MonId and
+    rate date. A published quote for a given date never changes, so dated
+    entries are kept until evicted (LRU), provided AFIP answered with that
+    very date; a quote of another day (e.g. the last business day before a
+    holiday) lives for `ttl_seconds` only. The latest quote (no FchCotiz)
+    lives for `ttl_seconds` too and is also refreshed by a scheduled job
+    while clients keep asking for it, which picks up a newly published rate
+    date. The refresh asks AFIP on behalf of the CUIT of the last request,
+    with a token fetched at that moment.
+    """
+    def __init__(
+                self,
+                ttl_seconds: int = COTIZACION_CACHE_TTL_SECONDS,
+                max_entries: int = COTIZACION_CACHE_MAX_ENTRIES,
+                track_seconds: int = COTIZACION_TRACK_SECONDS,
+            ) -> None:
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._track_seconds = track_seconds
+        self._entries: OrderedDict[tuple, CachedCotizacion] = OrderedDict()
+        self._fetches = SingleFlight()
+        self._fetch_quote: Fetch | None = None
+
+    def register(self, fetch: Fetch) -> None:
+        self._fetch_quote = fetch
+
+    def make_key(self, mon_id: str, fch_cotiz: str | None) -> tuple:
+        return get_wsfe_environment(), mon_id.upper(), fch_cotiz or LATEST
+
+    async def get_or_fetch(self, cuit: str, mon_id: str, fch_cotiz: str | None, bypass: bool = False) -> dict:
+        """Quote for MonId/FchCotiz with a `freshness` field added to the result."""
+        key = self.make_key(mon_id, fch_cotiz)
+
+        entry = None if bypass else self._get_valid(key)
+        if entry is not None:
+            entry.last_access = time.monotonic()
+            return self._with_freshness(entry.result, entry, cached=True)
+
+        result = await self._fetches.run(key, lambda: self._fetch(key, cuit))
+        entry = self._entries.get(key) if _is_cacheable(result) else None
+        return self._with_freshness(result, entry, cached=False)
+
+    def _get_valid(self, key: tuple) -> CachedCotizacion | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        # Only a quote published for the requested date is final.
+        if entry.rate_date != key[2] and time.monotonic() - entry.fetched_monotonic >= self._ttl:
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    async def _fetch(self, key: tuple, cuit: str) -> dict:
+        if self._fetch_quote is None:
+            raise RuntimeError("No FEParamGetCotizacion fetcher registered")
+
+        result = await self._fetch_quote(cuit, key[1], None if key[2] == LATEST else key[2])
+        if _is_cacheable(result):
+            self._store(key, result, cuit)
+        return result
+
+    def _store(self, key: tuple, result: dict, cuit: str) -> None:
+        previous = self._entries.get(key)
+        entry = CachedCotizacion(result, afip_now(), time.monotonic(), cuit)
+        if previous is not None:
+            entry.last_access = previous.last_access
+
+            if key[2] == LATEST and previous.rate_date != entry.rate_date:
+                logger.info(f"New {key[1]} quote published by AFIP for {entry.rate_date} "
+                            f"(previous {previous.rate_date})")
+
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+
+        # The latest quote is also the quote for its own rate date.
+        if key[2] == LATEST:
+            dated_key = (key[0], key[1], entry.rate_date)
+            self._entries[dated_key] = CachedCotizacion(result, entry.fetched_at, entry.fetched_monotonic, cuit)
+
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def _with_freshness(self, result: dict, entry: CachedCotizacion | None, cached: bool) -> dict:
+        if entry is None:
+            return {**result, "freshness" : {"cached" : False, "fetched_at" : None, "age_seconds" : None, "rate_date" : None}}
+
+        return {
+            **result,
+            "freshness" : {
+                "cached" : cached,
+                "fetched_at" : entry.fetched_at.isoformat(),
+                "age_seconds" : round(time.monotonic() - entry.fetched_monotonic, 1),
+                "rate_date" : entry.rate_date,
+            },
+        }
+
+    async def refresh_latest(self) -> dict:
+        """
+        Scheduled job: re-query the latest quote of every currency requested
+        within `track_seconds`, for the CUIT of its last request.
+        Currencies nobody asked for lately are dropped from the refresh.
+        """
+        now = time.monotonic()
+        refreshed, failed = 0, 0
+
+        for key, entry in list(self._entries.items()):
+            if key[2] != LATEST or now - entry.last_access > self._track_seconds:
+                continue
+            try:
+                result = await self._fetches.run(key, lambda: self._fetch(key, entry.cuit))
+                if _is_cacheable(result):
+                    refreshed += 1
+                else:
+                    failed += 1
+            except Exception as e:
+                failed += 1
+                logger.warning(f"Scheduled refresh of {key[1]} quote failed: {e}")
+
+        if refreshed or failed:
+            logger.debug(f"Cotizacion refresh: {refreshed} refreshed, {failed} failed")
+        return {"refreshed" : refreshed, "failed" : failed}
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        latest = sum(1 for key in self._entries if key[2] == LATEST)
+        return {"entries" : len(self._entries), "latest_quotes" : latest}
+
+
+cotizacion_cache = CotizacionCache()
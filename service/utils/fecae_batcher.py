@@ -0,0 +1,210 @@
+import asyncio
+import copy
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+from config.settings import FECAE_BATCH_MAX_RECORDS, FECAE_BATCH_WINDOW_MS
+from service.utils.comprobante_sequencer import comprobante_sequencer
+from service.utils.logger import logger
+
+Send = Callable[[dict], Awaitable[dict]]
+Seed = Callable[[], Awaitable[dict]]
+
+
+@dataclass
+class _Batch:
+    key: tuple
+    auth: dict
+    send: Send
+    seed: Seed
+    records: list[tuple[dict, asyncio.Future]] = field(default_factory=list)
+    timer: asyncio.TimerHandle | None = None
+
+
+def is_batchable(data: dict) -> bool:
+    """Only single-voucher requests are coalesced; multi-record ones go as sent."""
+    details = data["FeCAEReq"]["FeDetReq"]["FECAEDetRequest"]
+    return len(details) == 1 and data["FeCAEReq"]["FeCabReq"]["CantReg"] == 1
+
+
+def _demultiplex(result: dict, size: int) -> list[dict]:
+    """
+    Split a multi-record FECAESolicitar result into one single-record result
+    per voucher, in request order. Results that cannot be split (transport
+    errors, request-level Errors without details) are given to everyone.
+    """
+    response = result.get("response") if result.get("status") == "success" else None
+    details = ((response or {}).get("FeDetResp") or {}).get("FECAEDetResponse") or []
+    if len(details) != size:
+        return [result] * size
+
+    header = response.get("FeCabResp") or {}
+    return [
+        {
+            **result,
+            "response" : {
+                **response,
+                "FeCabResp" : {**header, "CantReg" : 1, "Resultado" : detail.get("Resultado")},
+                "FeDetResp" : {"FECAEDetResponse" : [detail]},
+            },
+        }
+        for detail in details
+    ]
+
+
+def _first_rejected(result: dict, size: int) -> int | None:
+    """Index of the first voucher AFIP rejected in a multi-record result, if any."""
+    response = result.get("response") if result.get("status") == "success" else None
+    details = ((response or {}).get("FeDetResp") or {}).get("FECAEDetResponse") or []
+    if len(details) != size:
+        return None
+    return next((index for index, detail in enumerate(details) if (detail or {}).get("Resultado") == "R"), None)
+
+
+def _rejected_as_a_whole(result: dict) -> bool:
+    """AFIP answered, but with request-level Errors and no per-voucher detail."""
+    response = result.get("response") if result.get("status") == "success" else None
+    return isinstance(response, dict) and not (response.get("FeDetResp") or {}).get("FECAEDetResponse")
+
+
+class FECAEBatcher:
+    """
+    Coalesces single-voucher FECAESolicitar requests for the same CUIT,
+    PtoVta and CbteTipo. Requests wait up to `window_ms` (or until
+    `max_records` are queued), get consecutive numbers from the voucher
+    sequencer and go to AFIP as one multi-record call; each caller receives
+    its own record back. Batches hold the sequencer's numbering lock while
+    they are sent, so numbers never overlap. A rejected voucher leaves its
+    number unused, so AFIP rejects every record after it as out of sequence
+    (10016): those records are numbered again and sent in a new call.
+    """
+    def __init__(
+                self,
+                window_ms: int = FECAE_BATCH_WINDOW_MS,
+                max_records: int = FECAE_BATCH_MAX_RECORDS,
+            ) -> None:
+        self._window = window_ms / 1000
+        self._max_records = max_records
+        self._open: dict[tuple, _Batch] = {}
+        self._flushes: set[asyncio.Task] = set()
+        self._counters = {"batches" : 0, "records" : 0, "split_batches" : 0, "resent_records" : 0}
+
+    async def submit(self, data: dict, send: Send, seed: Seed) -> tuple[dict, int]:
+        """
+        Queue one voucher and wait for its result. Returns (result, number of
+        records in the AFIP call). CbteDesde/CbteHasta are assigned here.
+        `send` posts a FECAESolicitar payload (Auth without token) and `seed`
+        runs FECompUltimoAutorizado for the sequence.
+        """
+        header = data["FeCAEReq"]["FeCabReq"]
+        key = comprobante_sequencer.make_key(data["Auth"]["Cuit"], header["PtoVta"], header["CbteTipo"])
+        loop = asyncio.get_running_loop()
+
+        batch = self._open.get(key)
+        if batch is None:
+            batch = _Batch(key, copy.deepcopy(data["Auth"]), send, seed)
+            batch.timer = loop.call_later(self._window, self._close, batch)
+            self._open[key] = batch
+
+        future = loop.create_future()
+        batch.records.append((data["FeCAEReq"]["FeDetReq"]["FECAEDetRequest"][0], future))
+
+        if len(batch.records) >= self._max_records:
+            self._close(batch)
+
+        return await future
+
+    def _close(self, batch: _Batch) -> None:
+        if self._open.get(batch.key) is batch:
+            del self._open[batch.key]
+        if batch.timer is not None:
+            batch.timer.cancel()
+
+        # Keep a reference so the task is not garbage collected mid-flight.
+        task = asyncio.create_task(self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: _Batch) -> None:
+        details = [detail for detail, _ in batch.records]
+        size = len(details)
+
+        try:
+            async with comprobante_sequencer.lock(*batch.key[1:]):
+                results = await self._send_all(batch, details)
+
+        except Exception as e:
+            logger.error(f"Batch of {size} vouchers for {batch.key[1:]} failed: {e}")
+            for _, future in batch.records:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch.records, results):
+            if not future.done():
+                future.set_result((result, size))
+
+    async def _send_all(self, batch: _Batch, details: list[dict]) -> list[dict]:
+        """Send `details` and return one single-record result per voucher, in order."""
+        results = []
+        while details:
+            size = len(details)
+            result, sent = await self._send(batch, details)
+
+            # A request-level rejection says nothing about which voucher
+            # caused it: retry them one by one so only that one fails.
+            if sent and size > 1 and _rejected_as_a_whole(result):
+                self._counters["split_batches"] += 1
+                logger.warning(f"Batch of {size} vouchers for {batch.key[1:]} rejected as a whole, sending them one by one")
+                results.extend([(await self._send(batch, [detail]))[0] for detail in details])
+                break
+
+            split = _demultiplex(result, size)
+            rejected = _first_rejected(result, size) if sent else None
+            if rejected is None or rejected == size - 1:
+                results.extend(split)
+                break
+
+            # The records after the rejected one were refused for their numbers only.
+            results.extend(split[:rejected + 1])
+            details = details[rejected + 1:]
+            self._counters["resent_records"] += len(details)
+            logger.warning(f"Voucher {rejected + 1} of {size} for {batch.key[1:]} rejected, sending the {len(details)} after it again")
+
+        return results
+
+    async def _send(self, batch: _Batch, details: list[dict]) -> tuple[dict, bool]:
+        """
+        Number `details` and post them as one FECAESolicitar. Returns (result,
+        sent); when the sequence cannot be seeded the seed error is returned
+        and nothing is sent.
+        """
+        _, cuit, pto_vta, cbte_tipo = batch.key
+
+        numbered, _ = await comprobante_sequencer.next_number(cuit, pto_vta, cbte_tipo, batch.seed)
+        if "NextCbteNro" not in (numbered.get("response") or {}):
+            return numbered, False
+
+        first = numbered["response"]["NextCbteNro"]
+        records = [{**detail, "CbteDesde" : first + i, "CbteHasta" : first + i} for i, detail in enumerate(details)]
+        payload = {
+            "Auth" : copy.deepcopy(batch.auth),
+            "FeCAEReq" : {
+                "FeCabReq" : {"CantReg" : len(records), "PtoVta" : pto_vta, "CbteTipo" : cbte_tipo},
+                "FeDetReq" : {"FECAEDetRequest" : records},
+            },
+        }
+
+        self._counters["batches"] += 1
+        self._counters["records"] += len(records)
+        return await batch.send(payload), True
+
+    def stats(self) -> dict:
+        return {
+            "open_batches" : len(self._open),
+            "queued_records" : sum(len(batch.records) for batch in self._open.values()),
+            **self._counters,
+        }
+
+
+fecae_batcher = FECAEBatcher()
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import sqlite3
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from config.settings import IDEMPOTENCY_STORE_PATH, IDEMPOTENCY_TTL_SECONDS
+from service.soap_client.wsdl.wsdl_manager import get_wsfe_environment
+from service.utils.logger import logger
+from service.utils.single_flight import SingleFlight
+from service.utils.sqlite_store import SQLiteStore
+
+MAX_KEY_LENGTH = 255
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    environment TEXT NOT NULL,
+    cuit TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    key TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    result TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (environment, cuit, operation, key)
+)
+"""
+
+
+class IdempotencyKeyReused(Exception):
+    """The Idempotency-Key was already used with a different request body."""
+
+
+def fingerprint(payload: dict) -> str:
+    """Hash of the request body without Auth (the token changes between retries)."""
+    body = {name: value for name, value in payload.items() if name != "Auth"}
+    return hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Results of AFIP-mutating calls keyed by environment, CUIT, operation and
+    the client's Idempotency-Key. A retry that arrives while the first call
+    is in flight waits for it; one that arrives later gets the stored result
+    for `ttl` seconds. Only answers AFIP actually gave are stored: transport
+    errors leave the key free so the client can retry.
+    """
+    def __init__(
+                self,
+                path: str | Path = IDEMPOTENCY_STORE_PATH,
+                ttl: int = IDEMPOTENCY_TTL_SECONDS,
+            ) -> None:
+        self._store = SQLiteStore(path, _SCHEMA)
+        self._ttl = ttl
+        self._calls = SingleFlight()
+        self._in_flight: dict[tuple, str] = {}
+        self._counters = {"executed" : 0, "replayed" : 0, "joined" : 0, "conflicts" : 0}
+
+    def make_key(self, cuit: str, operation: str, key: str) -> tuple:
+        return get_wsfe_environment(), str(cuit), operation, key
+
+    async def run(self, operation: str, cuit: str, key: str, payload: dict, call: Callable[[], Awaitable[dict]]) -> tuple[dict, bool]:
+        """
+        Return (result, replayed). `call` only runs when neither a stored
+        result nor an in-flight call exists for the key. Raises
+        IdempotencyKeyReused when the key was used with another body.
+        """
+        store_key = self.make_key(cuit, operation, key)
+        body = fingerprint(payload)
+
+        in_flight = self._in_flight.get(store_key)
+        if in_flight is not None:
+            self._check(in_flight, body, key)
+            self._counters["joined"] += 1
+            return await self._calls.run(store_key, call), True
+
+        stored = await self._store.call(lambda db: self._read(db, store_key, time.time() - self._ttl))
+        if stored is not None:
+            self._check(stored[0], body, key)
+            self._counters["replayed"] += 1
+            return stored[1], True
+
+        # Someone may have started the call while the store was read.
+        if store_key in self._in_flight:
+            return await self.run(operation, cuit, key, payload, call)
+
+        self._in_flight[store_key] = body
+        self._counters["executed"] += 1
+        return await self._calls.run(store_key, lambda: self._execute(store_key, body, call)), False
+
+    async def _execute(self, store_key: tuple, body: str, call: Callable[[], Awaitable[dict]]) -> dict:
+        try:
+            result = await call()
+            if result.get("status") == "success":
+                try:
+                    await self._store.call(lambda db: self._write(db, store_key, body, result))
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not persist idempotent result {store_key[1:]}: {e}")
+            return result
+        finally:
+            self._in_flight.pop(store_key, None)
+
+    def _check(self, stored: str, body: str, key: str) -> None:
+        if stored != body:
+            self._counters["conflicts"] += 1
+            raise IdempotencyKeyReused(f"Idempotency-Key {key} was already used with a different request body")
+
+    # ===================
+    # ===== SQLITE ======
+    # ===================
+
+    @staticmethod
+    def _read(db: sqlite3.Connection, store_key: tuple, not_before: float) -> tuple[str, dict] | None:
+        row = db.execute(
+            "SELECT fingerprint, result FROM idempotency WHERE environment = ? AND cuit = ? "
+            "AND operation = ? AND key = ? AND stored_at >= ?",
+            (*store_key, not_before),
+        ).fetchone()
+        return (row["fingerprint"], json.loads(row["result"])) if row else None
+
+    @staticmethod
+    def _write(db: sqlite3.Connection, store_key: tuple, body: str, result: dict) -> None:
+        db.execute(
+            "INSERT OR REPLACE INTO idempotency VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (*store_key, body, json.dumps(result, default=str), time.time()),
+        )
+
+    async def purge(self) -> int:
+        """Scheduled job: delete results older than the TTL."""
+        cutoff = time.time() - self._ttl
+        deleted = await self._store.call(lambda db: db.execute(
+            "DELETE FROM idempotency WHERE stored_at < ?", (cutoff,)
+        ).rowcount)
+        if deleted:
+            logger.info(f"Purged {deleted} expired idempotency key(s)")
+        return deleted
+
+    def close(self) -> None:
+        self._store.close()
+
+    def stats(self) -> dict:
+        return {"in_flight" : len(self._in_flight), **self._counters}
+
+
+idempotency_store = IdempotencyStore()
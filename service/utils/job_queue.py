@@ -0,0 +1,295 @@
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from pathlib import Path
+
+from config.settings import (JOB_POLL_INTERVAL_SECONDS, JOB_QUEUE_PATH,
+                             JOB_RETENTION_SECONDS, JOB_WORKERS)
+from service.soap_client.format_error import build_error_response
+from service.utils.logger import logger
+from service.utils.sqlite_store import SQLiteStore
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+FINISHED = (DONE, FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    operation TEXT NOT NULL,
+    sequence TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status);
+"""
+
+# Oldest queued job whose sequence has no job running, so vouchers of one
+# CUIT/PtoVta/CbteTipo reach AFIP in submission order.
+_CLAIM = """
+UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1
+WHERE id = (
+    SELECT id FROM jobs
+    WHERE status = 'queued'
+      AND (sequence IS NULL OR sequence NOT IN (
+          SELECT sequence FROM jobs WHERE status = 'running' AND sequence IS NOT NULL))
+    ORDER BY rowid
+    LIMIT 1
+)
+RETURNING *
+"""
+
+Handler = Callable[[dict], Awaitable[dict]]
+# recover(payload) -> result of a call AFIP already processed, or None to run it again
+Recover = Callable[[dict], Awaitable[dict | None]]
+
+# Id of the job whose handler is running in this task, for report_progress().
+_current_job: ContextVar[str | None] = ContextVar("current_job", default=None)
+
+
+def _isoformat(timestamp: float | None) -> str | None:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp is not None else None
+
+
+@dataclass(frozen=True)
+class Job:
+    id: str
+    operation: str
+    sequence: str | None
+    payload: dict
+    status: str
+    result: dict | None
+    attempts: int
+    created_at: float
+    started_at: float | None
+    finished_at: float | None
+    progress: dict | None = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        return cls(
+            id=row["id"],
+            operation=row["operation"],
+            sequence=row["sequence"],
+            payload=json.loads(row["payload"]),
+            status=row["status"],
+            result=json.loads(row["result"]) if row["result"] else None,
+            attempts=row["attempts"],
+            created_at=row["created_at"],
+            started_at=row["started_at"],
+            finished_at=row["finished_at"],
+        )
+
+    def summary(self) -> dict:
+        return {
+            "job_id" : self.id,
+            "operation" : self.operation,
+            "status" : self.status,
+            "attempts" : self.attempts,
+            "created_at" : _isoformat(self.created_at),
+            "started_at" : _isoformat(self.started_at),
+            "finished_at" : _isoformat(self.finished_at),
+            **({"progress" : self.progress} if self.progress is not None else {}),
+        }
+
+
+class JobQueue:
+    """
+    Durable queue of AFIP calls. Submitted jobs are committed to SQLite
+    before the job id is returned, and worker tasks run them through the
+    handler registered for their operation. Jobs left running by a crash
+    are queued again on start; before such a job runs again, the recover
+    callable of its operation (if any) may find that AFIP already processed
+    it and supply the result instead. A job is "done" when its handler
+    returned (the result may still be an AFIP or network error) and
+    "failed" when the handler raised. Storage errors do not stop the
+    workers: they are logged and retried.
+    """
+    def __init__(
+                self,
+                path: str | Path = JOB_QUEUE_PATH,
+                workers: int = JOB_WORKERS,
+                poll_seconds: float = JOB_POLL_INTERVAL_SECONDS,
+                retention_seconds: int = JOB_RETENTION_SECONDS,
+            ) -> None:
+        self._store = SQLiteStore(path, _SCHEMA)
+        self._workers_count = workers
+        self._poll_seconds = poll_seconds
+        self._retention_seconds = retention_seconds
+        self._handlers: dict[str, Handler] = {}
+        self._recover: dict[str, Recover] = {}
+        self._wakeup = asyncio.Event()
+        self._workers: list[asyncio.Task] = []
+        self._progress: dict[str, dict] = {}
+
+    def register(self, operation: str, handler: Handler, recover: Recover | None = None) -> None:
+        self._handlers[operation] = handler
+        if recover is not None:
+            self._recover[operation] = recover
+
+    async def submit(self, operation: str, payload: dict, sequence: str | None = None) -> Job:
+        if operation not in self._handlers:
+            raise ValueError(f"No job handler registered for {operation}")
+
+        job = Job(uuid.uuid4().hex, operation, sequence, payload, QUEUED, None, 0, time.time(), None, None)
+        await self._store.call(lambda db: db.execute(
+            "INSERT INTO jobs (id, operation, sequence, payload, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job.id, operation, sequence, json.dumps(payload), QUEUED, job.created_at),
+        ))
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Job | None:
+        row = await self._store.call(lambda db: db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+        if row is None:
+            return None
+        return replace(Job.from_row(row), progress=self._progress.get(job_id))
+
+    def report_progress(self, progress: dict) -> None:
+        """
+        Called from a running handler: progress shown in the job summary until
+        the job finishes. Kept in memory only; the handler's result is what
+        is stored.
+        """
+        job_id = _current_job.get()
+        if job_id is not None:
+            self._progress[job_id] = dict(progress)
+
+    # ===================
+    # ===== WORKERS =====
+    # ===================
+
+    async def start(self) -> None:
+        recovered = await self._store.call(lambda db: db.execute(
+            "UPDATE jobs SET status = 'queued' WHERE status = 'running'"
+        ).rowcount)
+        if recovered:
+            logger.warning(f"{recovered} job(s) interrupted by a restart were queued again")
+
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self._workers_count)]
+        logger.info(f"Job queue started with {self._workers_count} worker(s)")
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._store.close()
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                await self._work_once()
+            except sqlite3.Error as e:
+                # e.g. "database is locked": the worker must outlive it.
+                logger.error(f"Job queue storage error, retrying in {self._poll_seconds}s: {e}")
+                await asyncio.sleep(self._poll_seconds)
+
+    async def _work_once(self) -> None:
+        # Cleared before claiming so a submit that lands meanwhile is not missed.
+        self._wakeup.clear()
+        row = await self._store.call(lambda db: db.execute(_CLAIM, (time.time(),)).fetchone())
+
+        if row is None:
+            # asyncio.timeout() rather than wait_for(): on 3.11 wait_for can
+            # swallow a cancel that races with the event, and stop() would hang.
+            try:
+                async with asyncio.timeout(self._poll_seconds):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                pass
+            return
+
+        job = Job.from_row(row)
+        status, result = await self._execute(job)
+        await self._finish(job, status, result)
+        self._progress.pop(job.id, None)
+        # A finished job may unblock the next one of its sequence.
+        self._wakeup.set()
+
+    async def _finish(self, job: Job, status: str, result: dict) -> None:
+        """Store the outcome, retrying storage errors: the AFIP call must not be lost."""
+        while True:
+            try:
+                await self._store.call(lambda db: db.execute(
+                    "UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE id = ?",
+                    (status, json.dumps(result, default=str), time.time(), job.id),
+                ))
+                return
+            except sqlite3.Error as e:
+                logger.error(f"Could not store the result of job {job.id}, retrying in {self._poll_seconds}s: {e}")
+                await asyncio.sleep(self._poll_seconds)
+
+    async def _execute(self, job: Job) -> tuple[str, dict]:
+        handler = self._handlers.get(job.operation)
+        if handler is None:
+            return FAILED, build_error_response(job.operation, "unknown", "No job handler registered")
+
+        token = _current_job.set(job.id)
+        try:
+            # Claimed before: it may have reached AFIP before the restart.
+            if job.attempts > 1:
+                recovered = await self._recovered(job)
+                if recovered is not None:
+                    return DONE, recovered
+            return DONE, await handler(job.payload)
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.operation}) failed: {e}")
+            return FAILED, build_error_response(job.operation, "unknown", str(e))
+        finally:
+            _current_job.reset(token)
+
+    async def _recovered(self, job: Job) -> dict | None:
+        recover = self._recover.get(job.operation)
+        if recover is None:
+            return None
+        try:
+            result = await recover(job.payload)
+        except Exception as e:
+            logger.warning(f"Could not check whether job {job.id} ({job.operation}) already reached AFIP, running it again: {e}")
+            return None
+        if result is not None:
+            logger.info(f"Job {job.id} ({job.operation}) had already been processed by AFIP, result recovered")
+        return result
+
+    # ===================
+    # ===== CLEANUP =====
+    # ===================
+
+    async def purge(self) -> int:
+        """Scheduled job: delete finished jobs older than the retention period."""
+        cutoff = time.time() - self._retention_seconds
+        deleted = await self._store.call(lambda db: db.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (*FINISHED, cutoff)
+        ).rowcount)
+        if deleted:
+            logger.info(f"Purged {deleted} finished job(s)")
+        return deleted
+
+    async def stats(self) -> dict:
+        rows = await self._store.call(lambda db: db.execute(
+            "SELECT status, COUNT(*) AS count FROM jobs GROUP BY status"
+        ).fetchall())
+        counts = {QUEUED : 0, RUNNING : 0, DONE : 0, FAILED : 0}
+        counts.update({row["status"] : row["count"] for row in rows})
+        return {"workers" : len(self._workers), **counts}
+
+    def close(self) -> None:
+        self._store.close()
+
+
+job_queue = JobQueue()
@@ -0,0 +1,142 @@
+import asyncio
+import json
+from collections import deque
+from collections.abc import (AsyncIterator, Awaitable, Callable, Hashable,
+                             Iterable)
+from typing import Any, TypeVar
+
+import anyio
+from starlette.responses import StreamingResponse
+from starlette.types import Receive
+
+from service.soap_client.format_error import build_error_response
+from service.utils.logger import logger
+
+# handle(line_no, line) -> (sequence, work) to run `work()` under the
+# sequence's concurrency limit, or (None, result) for an immediate result.
+Handler = Callable[[int, bytes], tuple[Hashable | None, Callable[[], Awaitable[dict]] | dict]]
+
+_DONE = object()
+
+T = TypeVar("T")
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for bodies that keep reading the request while they
+    are sent. Starlette's disconnect listener would compete with the request
+    stream for receive() and swallow body messages, so the request stream is
+    left as the only reader (it raises ClientDisconnect itself).
+    """
+    media_type = "application/x-ndjson"
+
+    async def listen_for_disconnect(self, receive: Receive) -> None:
+        await anyio.sleep_forever()
+
+
+async def read_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[tuple[int, bytes]]:
+    """Yield (line number, line) for every non-blank line of a chunked byte stream."""
+    buffer = bytearray()
+    line_no = 0
+
+    async for chunk in chunks:
+        buffer.extend(chunk)
+        start = 0
+        while (end := buffer.find(b"\n", start)) != -1:
+            line_no += 1
+            line = bytes(buffer[start:end])
+            start = end + 1
+            if line.strip():
+                yield line_no, line
+        del buffer[:start]
+
+        if len(buffer) > max_line_bytes:
+            raise ValueError(f"Line {line_no + 1} is longer than {max_line_bytes} bytes")
+
+    if bytes(buffer).strip():
+        yield line_no + 1, bytes(buffer)
+
+
+async def stream_ndjson(
+                    chunks: AsyncIterator[bytes],
+                    handle: Handler,
+                    method: str,
+                    max_in_flight: int,
+                    per_sequence: int,
+                    max_line_bytes: int,
+                ) -> AsyncIterator[bytes]:
+    """
+    Process an NDJSON request body line by line and yield one NDJSON result
+    line ({"line": n, ...result}) per input line, in completion order.
+
+    At most `max_in_flight` lines are read but not yet written back, so a
+    slow AFIP or a slow client stops the input from being read instead of
+    piling up in memory. Lines of the same sequence run at most
+    `per_sequence` at a time, started in input order.
+    """
+    results: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max_in_flight)
+    sequences: dict[Hashable, asyncio.Semaphore] = {}
+    tasks: set[asyncio.Task] = set()
+
+    async def run(line_no: int, sequence: Hashable, work: Callable[[], Awaitable[dict]]) -> None:
+        try:
+            async with sequences.setdefault(sequence, asyncio.Semaphore(per_sequence)):
+                result = await work()
+        except Exception as e:
+            logger.error(f"Bulk {method} line {line_no} failed: {e}")
+            result = build_error_response(method, "unknown", str(e))
+        results.put_nowait((line_no, result))
+
+    async def produce() -> None:
+        try:
+            async for line_no, line in read_lines(chunks, max_line_bytes):
+                await slots.acquire()
+                sequence, work = handle(line_no, line)
+                if sequence is None:
+                    results.put_nowait((line_no, work))
+                    continue
+
+                task = asyncio.create_task(run(line_no, sequence, work))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+        except Exception as e:
+            await slots.acquire()
+            results.put_nowait((None, build_error_response(method, "Invalid stream", str(e))))
+
+        # wait() rather than gather(): cancelling the producer must not cancel them.
+        if tasks:
+            await asyncio.wait(set(tasks))
+        results.put_nowait(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (item := await results.get()) is not _DONE:
+            # The slot is freed once the result is handed to the client.
+            slots.release()
+            line_no, result = item
+            yield (json.dumps({"line" : line_no, **result}, default=str) + "\n").encode("utf-8")
+    finally:
+        # Client gone: stop reading. Lines already sent to AFIP finish on their own.
+        producer.cancel()
+
+
+async def map_ordered(items: Iterable[T], func: Callable[[T], Awaitable[Any]], max_in_flight: int) -> AsyncIterator[Any]:
+    """
+    Yield func(item) for every item, in input order, with at most
+    `max_in_flight` calls running. A slow item holds back the results
+    behind it (and new calls) but not the calls already started. Closing
+    the iterator cancels whatever is still running.
+    """
+    pending: deque[asyncio.Task] = deque()
+    try:
+        for item in items:
+            pending.append(asyncio.create_task(func(item)))
+            if len(pending) >= max_in_flight:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
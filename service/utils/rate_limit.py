@@ -0,0 +1,203 @@
+import asyncio
+import math
+import time
+from collections import deque
+
+from config.settings import (AFIP_RATE_BURST_SECONDS, AFIP_RATE_CATALOG_GLOBAL,
+                             AFIP_RATE_CATALOG_PER_CUIT,
+                             AFIP_RATE_INVOICE_GLOBAL,
+                             AFIP_RATE_INVOICE_PER_CUIT,
+                             AFIP_RATE_QUERY_GLOBAL, AFIP_RATE_QUERY_PER_CUIT,
+                             CONSULT_RANGE_CONCURRENCY,
+                             CONSULT_RANGE_RATE_PER_SECOND)
+
+INVOICE = "invoice"
+QUERY = "query"
+CATALOG = "catalog"
+
+INVOICE_OPERATIONS = frozenset({
+    "FECAESolicitar",
+    "FECAEASolicitar",
+    "FECAEARegInformativo",
+    "FECAEASinMovimientoInformar",
+})
+
+
+def operation_class(operation: str) -> str:
+    if operation in INVOICE_OPERATIONS:
+        return INVOICE
+    if operation.startswith("FEParamGet") or operation == "FEDummy":
+        return CATALOG
+    return QUERY
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average and bursts of up to
+    `burst`. Waiters are served in arrival order (asyncio.Lock is FIFO), so
+    a long range cannot starve a short one that arrived later. A rate of 0
+    or less disables the limit.
+    """
+    def __init__(self, rate: float, burst: int) -> None:
+        self._rate = rate
+        self._burst = max(1, burst)
+        self._tokens = float(self._burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._counters = {"acquired" : 0, "delayed" : 0}
+        self._waited = 0.0
+
+    async def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns the seconds waited."""
+        if self._rate <= 0:
+            return 0.0
+
+        started = time.monotonic()
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+                self._refill()
+            self._tokens -= 1
+
+        waited = time.monotonic() - started
+        self._counters["acquired"] += 1
+        if waited > 0.001:
+            self._counters["delayed"] += 1
+            self._waited += waited
+        return waited
+
+    def try_acquire(self) -> float:
+        """Take a token if one is available and return 0.0; otherwise the seconds until one is."""
+        if self._rate <= 0:
+            return 0.0
+        self._refill()
+        if self._tokens < 1:
+            return (1 - self._tokens) / self._rate
+        self._tokens -= 1
+        self._counters["acquired"] += 1
+        return 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def stats(self) -> dict:
+        return {
+            "rate_per_second" : self._rate,
+            "burst" : self._burst,
+            **self._counters,
+            "waited_seconds" : round(self._waited, 3),
+        }
+
+
+def _burst(rate: float, burst_seconds: float) -> int:
+    return max(1, math.ceil(rate * burst_seconds))
+
+
+class FairLimiter:
+    """
+    A bucket per CUIT plus a global one shared by every CUIT. A call first
+    takes a token from its CUIT's bucket, then queues for the global one.
+    The global queue is served round-robin across CUITs (FIFO within each),
+    so a tenant with hundreds of queued calls delays the others by at most
+    one call per turn instead of all of them.
+    """
+    def __init__(self, global_rate: float, per_cuit_rate: float, burst_seconds: float = AFIP_RATE_BURST_SECONDS) -> None:
+        self._global = TokenBucket(global_rate, _burst(global_rate, burst_seconds))
+        self._per_cuit_rate = per_cuit_rate
+        self._per_cuit_burst = _burst(per_cuit_rate, burst_seconds)
+        self._per_cuit: dict[str, TokenBucket] = {}
+        # CUIT -> waiting futures; dict order is the round-robin order.
+        self._waiters: dict[str | None, deque[asyncio.Future]] = {}
+        self._dispatcher: asyncio.Task | None = None
+        self._counters = {"acquired" : 0, "delayed" : 0}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def acquire(self, cuit: str | None) -> float:
+        """Wait for both limits. Returns the seconds spent queued."""
+        started = time.monotonic()
+
+        if self._per_cuit_rate > 0 and cuit is not None:
+            bucket = self._per_cuit.get(cuit)
+            if bucket is None:
+                bucket = self._per_cuit[cuit] = TokenBucket(self._per_cuit_rate, self._per_cuit_burst)
+            await bucket.acquire()
+
+        if self._waiters or self._global.try_acquire() > 0:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(cuit, deque()).append(future)
+            if self._dispatcher is None or self._dispatcher.done():
+                self._dispatcher = asyncio.create_task(self._dispatch())
+            await future
+
+        waited = time.monotonic() - started
+        self._counters["acquired"] += 1
+        if waited > 0.001:
+            self._counters["delayed"] += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return waited
+
+    async def _dispatch(self) -> None:
+        while (cuit := self._next_cuit()) is not None:
+            delay = self._global.try_acquire()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            # The served CUIT goes to the back of the round.
+            queue = self._waiters.pop(cuit)
+            queue.popleft().set_result(None)
+            if queue:
+                self._waiters[cuit] = queue
+
+    def _next_cuit(self) -> str | None:
+        """First CUIT in turn with a live waiter, dropping cancelled ones."""
+        for cuit in list(self._waiters):
+            queue = self._waiters[cuit]
+            while queue and queue[0].done():
+                queue.popleft()
+            if queue:
+                return cuit
+            del self._waiters[cuit]
+        return None
+
+    def stats(self) -> dict:
+        delayed = self._counters["delayed"]
+        return {
+            "global_rate_per_second" : self._global.stats()["rate_per_second"],
+            "per_cuit_rate_per_second" : self._per_cuit_rate,
+            **self._counters,
+            "waiting" : sum(len(queue) for queue in self._waiters.values()),
+            "queue_wait_seconds_total" : round(self._wait_total, 3),
+            "queue_wait_seconds_mean" : round(self._wait_total / delayed, 3) if delayed else 0.0,
+            "queue_wait_seconds_max" : round(self._wait_max, 3),
+        }
+
+
+class AFIPRateLimiter:
+    """Outbound limits toward WSFE, one FairLimiter per operation class."""
+    def __init__(self, limits: dict[str, tuple[float, float]], burst_seconds: float = AFIP_RATE_BURST_SECONDS) -> None:
+        self._limiters = {
+            name : FairLimiter(global_rate, per_cuit_rate, burst_seconds)
+            for name, (global_rate, per_cuit_rate) in limits.items()
+        }
+
+    async def acquire(self, operation: str, cuit: str | None) -> float:
+        return await self._limiters[operation_class(operation)].acquire(cuit)
+
+    def stats(self) -> dict:
+        return {name : limiter.stats() for name, limiter in self._limiters.items()}
+
+
+# FECompConsultar calls made by range queries, shared by every request.
+consult_range_bucket = TokenBucket(CONSULT_RANGE_RATE_PER_SECOND, CONSULT_RANGE_CONCURRENCY)
+
+# Every WSFE call, by operation class: (global, per-CUIT) calls per second.
+afip_rate_limiter = AFIPRateLimiter({
+    INVOICE : (AFIP_RATE_INVOICE_GLOBAL, AFIP_RATE_INVOICE_PER_CUIT),
+    QUERY : (AFIP_RATE_QUERY_GLOBAL, AFIP_RATE_QUERY_PER_CUIT),
+    CATALOG : (AFIP_RATE_CATALOG_GLOBAL, AFIP_RATE_CATALOG_PER_CUIT),
+})
@@ -0,0 +1,66 @@
+import copy
+from collections.abc import Awaitable, Callable
+
+from config.settings import REQUEST_COALESCING_ENABLED
+from service.soap_client.wsdl.wsdl_manager import get_wsfe_environment
+from service.utils.idempotency import fingerprint
+from service.utils.single_flight import SingleFlight
+
+# WSFE operations that only read; concurrent identical calls can share one answer.
+READ_ONLY_OPERATIONS = frozenset({
+    "FEDummy",
+    "FECompUltimoAutorizado",
+    "FECompConsultar",
+    "FECompTotXRequest",
+    "FECAEAConsultar",
+    "FECAEASinMovimientoConsultar",
+    "FEParamGetActividades",
+    "FEParamGetCondicionIvaReceptor",
+    "FEParamGetCotizacion",
+    "FEParamGetPtosVenta",
+    "FEParamGetTiposCbte",
+    "FEParamGetTiposConcepto",
+    "FEParamGetTiposDoc",
+    "FEParamGetTiposIva",
+    "FEParamGetTiposMonedas",
+    "FEParamGetTiposOpcional",
+    "FEParamGetTiposPaises",
+    "FEParamGetTiposTributos",
+})
+
+
+class RequestCoalescer:
+    """
+    In-flight deduplication of read-only WSFE calls. Calls with the same
+    environment, operation, CUIT and payload (Auth aside, the token differs
+    between callers) that overlap in time share a single upstream call and
+    its result. Nothing is kept once the call returns; caching is left to
+    the caches in front of it. Other operations pass straight through.
+    """
+    def __init__(self, enabled: bool = REQUEST_COALESCING_ENABLED) -> None:
+        self.enabled = enabled
+        self._calls = SingleFlight()
+        self._counters = {"upstream_calls" : 0, "coalesced" : 0}
+
+    def make_key(self, operation: str, payload: dict) -> tuple:
+        cuit = (payload.get("Auth") or {}).get("Cuit")
+        return get_wsfe_environment(), operation, str(cuit) if cuit is not None else None, fingerprint(payload)
+
+    async def run(self, operation: str, payload: dict, call: Callable[[], Awaitable[dict]]) -> dict:
+        if not self.enabled or operation not in READ_ONLY_OPERATIONS:
+            return await call()
+
+        key = self.make_key(operation, payload)
+        if not self._calls.in_flight(key):
+            self._counters["upstream_calls"] += 1
+            return await self._calls.run(key, call)
+
+        # Each joiner gets its own copy: callers mutate results on the way out.
+        self._counters["coalesced"] += 1
+        return copy.deepcopy(await self._calls.run(key, call))
+
+    def stats(self) -> dict:
+        return {"enabled" : self.enabled, **self._counters}
+
+
+request_coalescer = RequestCoalescer()
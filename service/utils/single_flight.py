@@ -0,0 +1,41 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into a single execution.
+    The first caller starts the work; everyone arriving while it is in flight
+    awaits the same task and receives its result (or its exception).
+    """
+    def __init__(self) -> None:
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+
+    async def run(
+                self,
+                key: Hashable,
+                factory: Callable[[], Awaitable[Any]],
+                timeout: float | None = None,
+            ) -> Any:
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+
+        # shield() keeps a waiter that times out (or is cancelled) from
+        # cancelling the shared task for everyone else.
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._in_flight
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+        # Mark the exception as retrieved in case every waiter timed out.
+        if not task.cancelled():
+            task.exception()
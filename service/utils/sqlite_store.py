@@ -0,0 +1,50 @@
+import sqlite3
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import TypeVar
+
+from service.utils.blocking_pool import run_blocking
+
+T = TypeVar("T")
+
+
+class SQLiteStore:
+    """
+    One SQLite file under DATA_DIR, opened lazily and shared by every thread
+    of the blocking pool behind a lock. `call()` runs a function with the
+    connection inside a transaction, off the event loop. WAL journaling
+    keeps commits cheap; a crash loses at most the last transaction.
+    """
+    def __init__(self, path: str | Path, schema: str) -> None:
+        self.path = Path(path)
+        self._schema = schema
+        self._db: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(self._schema)
+            self._db = db
+        return self._db
+
+    def run(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        """Run `func(connection)` in a transaction (blocking)."""
+        with self._lock:
+            db = self._connection()
+            with db:
+                return func(db)
+
+    async def call(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        return await run_blocking(self.run, func)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from config.settings import TOKEN_EXPIRY_MARGIN_SECONDS
+from service.time.afip_clock import afip_now
+from service.utils.logger import logger
+
+
+@dataclass(frozen=True)
+class CachedToken:
+    token: str
+    sign: str
+    expiration: datetime
+
+
+class TokenCache:
+    """
+    Process-wide cache of AFIP access tickets keyed by CUIT.
+    Keeps loginTicketResponse.xml off the hot path: the file is only read
+    when the cache is cold, and entries are dropped on expiry, tenant deletion
+    or certificate re-upload.
+    """
+    def __init__(self, expiry_margin_seconds: int = TOKEN_EXPIRY_MARGIN_SECONDS) -> None:
+        self._entries: dict[str, CachedToken] = {}
+        self._expiry_margin = timedelta(seconds=expiry_margin_seconds)
+
+    def get(self, cuit: str, now: datetime | None = None) -> CachedToken | None:
+        entry = self._entries.get(cuit)
+        if entry is None:
+            return None
+
+        now = now or afip_now()
+        if now >= entry.expiration - self._expiry_margin:
+            logger.debug(f"Cached token expired for CUIT {cuit}, evicting.")
+            self._entries.pop(cuit, None)
+            return None
+
+        return entry
+
+    def set(self, cuit: str, token: str, sign: str, expiration: datetime) -> None:
+        self._entries[cuit] = CachedToken(token, sign, expiration)
+        logger.debug(f"Token cached for CUIT {cuit} until {expiration.isoformat()}")
+
+    def invalidate(self, cuit: str) -> None:
+        if self._entries.pop(cuit, None) is not None:
+            logger.debug(f"Token cache invalidated for CUIT {cuit}")
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+token_cache = TokenCache()
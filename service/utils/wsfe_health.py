@@ -0,0 +1,102 @@
+import time
+from collections import deque
+
+from config.settings import (CONTINGENCY_ERROR_RATE,
+                             CONTINGENCY_LATENCY_SECONDS,
+                             CONTINGENCY_MIN_SAMPLES,
+                             CONTINGENCY_WINDOW_SECONDS)
+from service.utils.logger import logger
+
+NORMAL = "normal"
+DEGRADED = "degraded"
+
+
+class WSFEHealth:
+    """
+    Outcome and latency of recent FECAESolicitar calls over a sliding window
+    of `window_seconds`. Once at least `min_samples` calls are in the window
+    and their error rate reaches `error_rate`, or their mean latency reaches
+    `latency_seconds`, WSFE is marked degraded. It stays degraded until
+    `recover()` is called after a successful probe; calls made meanwhile
+    do not flip it back.
+    """
+    def __init__(
+                self,
+                window_seconds: float = CONTINGENCY_WINDOW_SECONDS,
+                min_samples: int = CONTINGENCY_MIN_SAMPLES,
+                error_rate: float = CONTINGENCY_ERROR_RATE,
+                latency_seconds: float = CONTINGENCY_LATENCY_SECONDS,
+            ) -> None:
+        self._window = window_seconds
+        self._min_samples = min_samples
+        self._error_rate = error_rate
+        self._latency = latency_seconds
+        self._samples: deque[tuple[float, float, bool]] = deque()
+        self._degraded_since: float | None = None
+        self._episodes = 0
+        self._seconds_degraded = 0.0
+
+    @property
+    def degraded(self) -> bool:
+        return self._degraded_since is not None
+
+    def record(self, latency: float, ok: bool) -> None:
+        now = time.monotonic()
+        self._samples.append((now, latency, ok))
+        self._expire(now)
+
+        if self.degraded or len(self._samples) < self._min_samples:
+            return
+
+        error_rate, mean_latency = self._window_stats()
+        if error_rate >= self._error_rate or mean_latency >= self._latency:
+            self._degraded_since = now
+            self._episodes += 1
+            logger.warning(
+                f"WSFE degraded: {error_rate:.0%} errors, {mean_latency:.2f}s mean latency "
+                f"over the last {len(self._samples)} calls"
+            )
+
+    def recover(self) -> None:
+        if self._degraded_since is None:
+            return
+        duration = time.monotonic() - self._degraded_since
+        self._seconds_degraded += duration
+        self._degraded_since = None
+        self._samples.clear()
+        logger.info(f"WSFE recovered after {duration:.1f}s")
+
+    def degraded_for(self) -> float:
+        return time.monotonic() - self._degraded_since if self._degraded_since is not None else 0.0
+
+    def _expire(self, now: float) -> None:
+        while self._samples and now - self._samples[0][0] > self._window:
+            self._samples.popleft()
+
+    def _window_stats(self) -> tuple[float, float]:
+        if not self._samples:
+            return 0.0, 0.0
+        errors = sum(1 for _, _, ok in self._samples if not ok)
+        return errors / len(self._samples), sum(latency for _, latency, _ in self._samples) / len(self._samples)
+
+    def clear(self) -> None:
+        self._samples.clear()
+        self._degraded_since = None
+        self._episodes = 0
+        self._seconds_degraded = 0.0
+
+    def stats(self) -> dict:
+        self._expire(time.monotonic())
+        error_rate, mean_latency = self._window_stats()
+        return {
+            "mode" : DEGRADED if self.degraded else NORMAL,
+            "window_calls" : len(self._samples),
+            "window_error_rate" : round(error_rate, 3),
+            "window_mean_latency_seconds" : round(mean_latency, 3),
+            "episodes" : self._episodes,
+            "current_episode_seconds" : round(self.degraded_for(), 1),
+            "total_seconds_degraded" : round(self._seconds_degraded + self.degraded_for(), 1),
+        }
+
+
+wsfe_health = WSFEHealth()
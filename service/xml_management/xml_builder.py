@@ -55,6 +55,29 @@ def extract_token_and_sign_from_xml(cuit: str) -> tuple[str, str]:
 
     return token, sign
 
+def extract_credentials_from_xml(cuit: str) -> tuple[str, str, datetime]:
+
+    path = paths.get_afip_paths(cuit).login_response
+    tree = etree.parse(path)
+
+    return _read_credentials(tree.getroot())
+
+def extract_credentials_from_login_ticket_response(login_ticket_response: str) -> tuple[str, str, datetime]:
+
+    root = etree.fromstring(login_ticket_response.encode("utf-8"))
+
+    return _read_credentials(root)
+
+def _read_credentials(root: "etree._Element") -> tuple[str, str, datetime]:
+
+    token = root.find(".//token").text
+    sign = root.find(".//sign").text
+    expiration_time_str = root.find(".//expirationTime").text
+
+    expiration_dt = datetime.fromisoformat(expiration_time_str).astimezone(timezone.utc)
+
+    return token, sign, expiration_dt
+
 def is_expired(xml_name: str, time_provider, cuit: str) -> bool:
 
     logger.debug(f"Running is_expired() function for {xml_name} (CUIT: {cuit})")
@@ -77,6 +100,9 @@ def is_expired(xml_name: str, time_provider, cuit: str) -> bool:
     else:
         return False
 
+def xml_to_bytes(root) -> bytes:
+    return etree.tostring(root, pretty_print=True, xml_declaration=True, encoding="UTF-8")
+
 def save_xml(root, xml_name: str, cuit: str) -> None:
 
     path = paths.get_afip_paths(cuit).base_xml / xml_name
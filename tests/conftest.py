@@ -17,8 +17,16 @@ from zeep.transports import AsyncTransport
 
 from config.paths import AfipPaths
 from service.api.app import app
-from service.soap_client.async_client import WSFEClientManager, wsaa_client
+from service.soap_client.async_client import (WSAAClientManager,
+                                              WSFEClientManager)
+from service.utils.caea_period_close import caea_period_close
+from service.utils.caea_store import caea_store
+from service.utils.comprobante_cache import comprobante_cache
+from service.utils.contingency import contingency
+from service.utils.idempotency import idempotency_store
+from service.utils.job_queue import job_queue
 from service.utils.jwt_validator import verify_token
+from service.utils.wsfe_health import wsfe_health
 
 # Zeep logs for debugging
 # logging.getLogger("zeep").setLevel(logging.DEBUG)
@@ -56,6 +64,74 @@ def override_afip_paths(afip_paths, monkeypatch):
     monkeypatch.setattr("config.paths.get_afip_paths", lambda: afip_paths)
 
 
+# Keep compiled WSDL caches out of the source tree
+@pytest.fixture(autouse=True)
+def wsdl_cache_dir(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "wsdl_cache"
+    monkeypatch.setattr("service.soap_client.wsdl.wsdl_cache.WSDL_CACHE_DIR", str(cache_dir))
+    return cache_dir
+
+
+# Keep the voucher cache on a throwaway SQLite file
+@pytest.fixture(autouse=True)
+def comprobante_cache_store(tmp_path, monkeypatch):
+    comprobante_cache.close()
+    comprobante_cache.clear()
+    monkeypatch.setattr(comprobante_cache._store, "path", tmp_path / "comprobantes.sqlite3")
+    yield comprobante_cache
+    comprobante_cache.close()
+    comprobante_cache.clear()
+
+
+# Keep queued jobs on a throwaway SQLite file
+@pytest.fixture(autouse=True)
+def job_queue_store(tmp_path, monkeypatch):
+    job_queue.close()
+    monkeypatch.setattr(job_queue._store, "path", tmp_path / "jobs.sqlite3")
+    yield job_queue
+    job_queue.close()
+
+
+# Keep Idempotency-Key results on a throwaway SQLite file
+@pytest.fixture(autouse=True)
+def idempotency_store_path(tmp_path, monkeypatch):
+    idempotency_store.close()
+    monkeypatch.setattr(idempotency_store._store, "path", tmp_path / "idempotency.sqlite3")
+    yield idempotency_store
+    idempotency_store.close()
+
+
+# Keep CAEA codes on a throwaway SQLite file
+@pytest.fixture(autouse=True)
+def caea_store_path(tmp_path, monkeypatch):
+    caea_store.close()
+    caea_store.clear()
+    monkeypatch.setattr(caea_store._store, "path", tmp_path / "caea.sqlite3")
+    yield caea_store
+    caea_store.close()
+    caea_store.clear()
+
+
+# Keep what CAEA period closes informed on a throwaway SQLite file
+@pytest.fixture(autouse=True)
+def caea_close_store(tmp_path, monkeypatch):
+    caea_period_close.close()
+    monkeypatch.setattr(caea_period_close._store, "path", tmp_path / "caea_close.sqlite3")
+    yield caea_period_close
+    caea_period_close.close()
+
+
+# Contingency vouchers on a throwaway SQLite file, WSFE starts healthy
+@pytest.fixture(autouse=True)
+def contingency_store(tmp_path, monkeypatch):
+    contingency.close()
+    wsfe_health.clear()
+    monkeypatch.setattr(contingency._store, "path", tmp_path / "contingency.sqlite3")
+    yield contingency
+    contingency.close()
+    wsfe_health.clear()
+
+
 # Create FastAPI testing client
 @pytest.fixture
 def client() -> httpxAsyncClient:
@@ -83,11 +159,16 @@ def wsaa_httpserver_fixed_port():
 # Initialize zeep async client for wsaa with mock wsdl 
 # only if httpserver is up
 @pytest_asyncio.fixture
-def wsaa_manager(wsaa_httpserver_fixed_port):
-    mock_path = Path("tests") / "mocks" / "wsfe_mock.wsdl"
+async def wsaa_manager(wsaa_httpserver_fixed_port):
+    WSAAClientManager.reset_singleton()
+
+    mock_path = Path("tests") / "mocks" / "wsaa_mock.wsdl"
     afip_wsdl = str(mock_path.resolve())
-    manager = wsaa_client(afip_wsdl)
+    manager = WSAAClientManager(afip_wsdl)
     yield manager
+    await manager.close()
+
+    WSAAClientManager.reset_singleton()
 
 
 # Initialize zeep async client for wsfe with mock wsdl 
@@ -106,8 +187,8 @@ async def wsfe_manager(wsfe_httpserver_fixed_port):
 
 
 # Patch functions with fakes for request_access_token_controller integration test.
-@pytest.fixture
-def patch_request_access_token_dependencies():
+@pytest_asyncio.fixture
+async def patch_request_access_token_dependencies():
 
     def fake_time_provider():
         return (
@@ -120,20 +201,17 @@ def patch_request_access_token_dependencies():
         mock_path = Path("tests") / "mocks" / "wsaa_mock.wsdl"
         afip_wsdl = str(mock_path.resolve())
         return afip_wsdl
-    
-    def wsaa_client_mock(afip_wsdl):
 
-        httpx_client = httpx.AsyncClient(timeout=30.0)
-        transport = AsyncTransport(client=httpx_client)
-        client = zeepAsyncClient(wsdl=afip_wsdl, transport=transport)
-
-        return client, httpx_client
+    WSAAClientManager.reset_singleton()
 
     with patch("service.controllers.request_access_token_controller.get_wsaa_wsdl", fake_wsdl_manager):
-        with patch("service.controllers.request_access_token_controller.wsaa_client", wsaa_client_mock):
-            with patch("service.controllers.request_access_token_controller.generate_ntp_timestamp", fake_time_provider):
-                with patch("service.controllers.request_access_token_controller.get_as_bytes", generate_test_files):
-                    yield
+        with patch("service.controllers.request_access_token_controller.generate_ntp_timestamp", fake_time_provider):
+            with patch("service.crypto.sign.get_key_material", generate_test_key_material):
+                yield
+
+    if WSAAClientManager._instance is not None:
+        await WSAAClientManager._instance.close()
+    WSAAClientManager.reset_singleton()
 
 
 # Generate a fake private key, cert and xml 
@@ -182,4 +260,15 @@ def generate_test_files() -> tuple[bytes, bytes, bytes]:
     xml_bytes = login_ticket_request.encode('utf-8')
     # ===
 
-    return xml_bytes, private_key_bytes, cert_bytes_pem
\ No newline at end of file
+    return xml_bytes, private_key_bytes, cert_bytes_pem
+
+
+# Same fake key and cert as generate_test_files(), already deserialized
+# as returned by the key material cache.
+def generate_test_key_material(cuit: str | None = None) -> tuple:
+
+    _, private_key_bytes, certificate_bytes = generate_test_files()
+    private_key = serialization.load_pem_private_key(private_key_bytes, password=None)
+    certificate = x509.load_pem_x509_certificate(certificate_bytes)
+
+    return private_key, certificate
@@ -0,0 +1,63 @@
+import json
+import re
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import AsyncClient
+from werkzeug import Response
+
+INVOICE_RESPONSE = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<FECAESolicitarResponse xmlns="http://ar.gov.afip.dif.FEV1/"><FECAESolicitarResult>
+<FeCabResp><Cuit>30740253022</Cuit><PtoVta>1</PtoVta><CbteTipo>6</CbteTipo><FchProceso>20260125123045</FchProceso>
+<CantReg>1</CantReg><Resultado>A</Resultado><Reproceso>N</Reproceso></FeCabResp>
+<FeDetResp><FECAEDetResponse><Concepto>1</Concepto><DocTipo>99</DocTipo><DocNro>0</DocNro>
+<CbteDesde>{n}</CbteDesde><CbteHasta>{n}</CbteHasta><CbteFch>20260125</CbteFch><Resultado>A</Resultado>
+<CAE>7604312345678{n}</CAE><CAEFchVto>20260204</CAEFchVto></FECAEDetResponse></FeDetResp>
+</FECAESolicitarResult></FECAESolicitarResponse></soap:Body></soap:Envelope>"""
+
+
+def _invoice(cbte_nro: int) -> dict:
+    return {
+        "Auth": {"Cuit": 30740253022},
+        "FeCAEReq": {
+            "FeCabReq": {"CantReg": 1, "PtoVta": 1, "CbteTipo": 6},
+            "FeDetReq": {"FECAEDetRequest": [{
+                "Concepto": 1, "DocTipo": 99, "DocNro": 0, "CbteDesde": cbte_nro, "CbteHasta": cbte_nro,
+                "CbteFch": "20260125", "ImpTotal": 100.0, "ImpNeto": 100.0, "ImpTotConc": 0.0, "ImpOpEx": 0.0,
+                "ImpTrib": 0.0, "ImpIVA": 0.0, "MonId": "PES", "MonCotiz": 1, "CondicionIVAReceptorId": 5,
+            }]},
+        },
+    }
+
+
+def afip_handler(request):
+    number = re.search(r"CbteDesde>(\d+)<", request.get_data(as_text=True)).group(1)
+    return Response(INVOICE_RESPONSE.format(n=number), content_type="text/xml")
+
+
+@pytest.fixture
+def fake_credentials():
+    with patch("service.api.wsfe._get_token_and_sign", AsyncMock(return_value=("fake_token", "fake_sign"))):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_bulk_invoices_stream_one_result_per_line(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth, fake_credentials):
+
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_handler(afip_handler)
+
+    lines = [json.dumps(_invoice(42)), '{"Auth": {"Cuit": "not a cuit"}}', json.dumps(_invoice(43))]
+    body = ("\n".join(lines) + "\n").encode()
+
+    resp = await client.post("/wsfe/FECAESolicitar/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    results = {result["line"]: result for result in map(json.loads, resp.text.splitlines())}
+
+    assert results[2]["status"] == "error"
+    assert results[2]["error"]["error_type"] == "Validation error"
+    for line, number in ((1, 42), (3, 43)):
+        assert results[line]["status"] == "success"
+        assert results[line]["response"]["FeDetResp"]["FECAEDetResponse"][0]["CAE"] == f"7604312345678{number}"
+    assert len(wsfe_httpserver_fixed_port.log) == 2
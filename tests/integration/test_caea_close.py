@@ -0,0 +1,84 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import AsyncClient
+from werkzeug import Response
+
+from service.utils.contingency import PENDING, contingency
+from service.utils.job_queue import job_queue
+from tests.integration.test_contingency import REG_INFORMATIVO_RESPONSE
+
+CAEA = "36043123456789"
+
+SIN_MOVIMIENTO_RESPONSE = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<FECAEASinMovimientoInformarResponse xmlns="http://ar.gov.afip.dif.FEV1/"><FECAEASinMovimientoInformarResult>
+<CAEA>36043123456789</CAEA><FchProceso>20260216</FchProceso><PtoVta>7</PtoVta><Resultado>A</Resultado>
+</FECAEASinMovimientoInformarResult></FECAEASinMovimientoInformarResponse></soap:Body></soap:Envelope>"""
+
+DETAIL = {
+    "Concepto": 1, "DocTipo": 99, "DocNro": 0, "CbteDesde": 42, "CbteHasta": 42, "CbteFch": "20260205",
+    "ImpTotal": 121.0, "ImpNeto": 121.0, "ImpTotConc": 0.0, "ImpOpEx": 0.0, "ImpTrib": 0.0,
+    "ImpIVA": 0.0, "MonId": "PES", "MonCotiz": 1, "CondicionIVAReceptorId": 5, "CAEA": CAEA,
+}
+
+PAYLOAD = {
+    "Auth": {"Cuit": 30740253022},
+    "CAEA": CAEA,
+    "Comprobantes": [{"PtoVta": 5, "CbteTipo": 6, "FECAEADetRequest": [DETAIL]}],
+    "SinMovimiento": [7],
+}
+
+
+def afip_handler(request):
+    body = request.get_data(as_text=True)
+    if "FECAEASinMovimientoInformar" in body:
+        return Response(SIN_MOVIMIENTO_RESPONSE, content_type="text/xml")
+    return Response(REG_INFORMATIVO_RESPONSE, content_type="text/xml")
+
+
+@pytest.mark.asyncio
+async def test_period_close_job_informs_vouchers_and_points_of_sale(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth):
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_handler(afip_handler)
+
+    with patch("service.api.wsfe._get_token_and_sign", AsyncMock(return_value=("fake_token", "fake_sign"))):
+        resp = await client.post("/wsfe/caea/close", json=PAYLOAD)
+        assert resp.status_code == 202
+        job_id = resp.json()["job_id"]
+
+        await job_queue.start()
+        try:
+            for _ in range(200):
+                status = (await client.get(f"/wsfe/jobs/{job_id}")).json()["status"]
+                if status == "done":
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await job_queue.stop()
+
+    assert status == "done"
+    result = (await client.get(f"/wsfe/jobs/{job_id}/result")).json()["response"]
+    assert result["summary"] == {
+        "vouchers" : {"reported" : 1, "rejected" : 0, "pending" : 0},
+        "sin_movimiento" : {"reported" : 1, "rejected" : 0, "pending" : 0},
+    }
+    assert result["sin_movimiento"][0]["result"]["PtoVta"] == 7
+    assert len(wsfe_httpserver_fixed_port.log) == 2
+
+
+@pytest.mark.asyncio
+async def test_period_close_rejects_empty_or_mismatched_requests(client: AsyncClient, override_auth):
+    empty = {"Auth": {"Cuit": 30740253022}, "CAEA": CAEA}
+    assert (await client.post("/wsfe/caea/close", json=empty)).status_code == 400
+
+    mismatched = {**PAYLOAD, "CAEA": "36040000000000"}
+    assert (await client.post("/wsfe/caea/close", json=mismatched)).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_period_close_waits_for_pending_contingency_vouchers(client: AsyncClient, override_auth, monkeypatch):
+    monkeypatch.setattr(contingency, "caea_vouchers", AsyncMock(return_value={(5, 6, 43) : PENDING}))
+
+    resp = await client.post("/wsfe/caea/close", json=PAYLOAD)
+
+    assert resp.status_code == 409
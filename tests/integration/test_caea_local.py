@@ -0,0 +1,49 @@
+from datetime import date
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import AsyncClient
+
+from service.utils.caea_store import caea_store
+
+CAEA_RESPONSE = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<FECAEASolicitarResponse xmlns="http://ar.gov.afip.dif.FEV1/"><FECAEASolicitarResult>
+<ResultGet><CAEA>36043123456789</CAEA><Periodo>202602</Periodo><Orden>1</Orden>
+<FchVigDesde>20260201</FchVigDesde><FchVigHasta>20260215</FchVigHasta><FchTopeInf>20260223</FchTopeInf>
+<FchProceso>20260127</FchProceso></ResultGet>
+</FECAEASolicitarResult></FECAEASolicitarResponse></soap:Body></soap:Envelope>"""
+
+
+@pytest.fixture(autouse=True)
+def fake_token():
+    with patch("service.api.wsfe._get_token_and_sign", AsyncMock(return_value=("fake_token", "fake_sign"))):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_granted_caea_is_served_locally(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth):
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(CAEA_RESPONSE, content_type="text/xml")
+    query = {"Auth": {"Cuit": 30740253022}, "Periodo": 202602, "Orden": 1}
+
+    missing = await client.post("/wsfe/caea/local", json=query)
+    assert missing.status_code == 404
+
+    granted = await client.post("/wsfe/FECAEASolicitar", json=query)
+    assert granted.json()["response"]["ResultGet"]["CAEA"] == "36043123456789"
+
+    local = await client.post("/wsfe/caea/local", json=query)
+    assert local.status_code == 200
+    assert local.json()["response"]["ResultGet"]["CAEA"] == "36043123456789"
+    assert len(wsfe_httpserver_fixed_port.log) == 1
+
+
+@pytest.mark.asyncio
+async def test_local_lookup_defaults_to_the_current_period(client: AsyncClient, override_auth):
+    with patch("service.api.wsfe.afip_today", return_value=date(2026, 2, 20)):
+        await caea_store.record("30740253022", {"status": "success", "response": {
+            "ResultGet": {"CAEA": "36043123456790", "Periodo": 202602, "Orden": 2}, "Errors": None, "Events": None,
+        }})
+        resp = await client.post("/wsfe/caea/local", json={"Auth": {"Cuit": 30740253022}})
+
+    assert resp.status_code == 200
+    assert resp.json()["response"]["ResultGet"]["CAEA"] == "36043123456790"
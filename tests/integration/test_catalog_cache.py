@@ -0,0 +1,87 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import AsyncClient
+
+from service.utils.catalog_cache import catalog_cache
+
+SOAP_RESPONSE = """<?xml version="1.0" encoding="utf-8"?>
+<soap-env:Envelope
+    xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/"
+    xmlns:ar="http://ar.gov.afip.dif.FEV1/">
+    <soap-env:Body>
+        <ar:FEParamGetTiposIvaResponse>
+            <ar:FEParamGetTiposIvaResult>
+                <ar:ResultGet>
+                    <ar:IvaTipo>
+                        <ar:Id>5</ar:Id>
+                        <ar:Desc>21%</ar:Desc>
+                        <ar:FchDesde>20090220</ar:FchDesde>
+                        <ar:FchHasta>NULL</ar:FchHasta>
+                    </ar:IvaTipo>
+                </ar:ResultGet>
+            </ar:FEParamGetTiposIvaResult>
+        </ar:FEParamGetTiposIvaResponse>
+    </soap-env:Body>
+</soap-env:Envelope>
+"""
+
+PAYLOAD = {"Auth": {"Cuit": 30740253022}}
+
+
+@pytest.fixture(autouse=True)
+def clean_catalog_cache():
+    catalog_cache.clear()
+    yield
+    catalog_cache.clear()
+
+
+@pytest.fixture
+def fake_credentials():
+    with patch("service.api.wsfe._get_token_and_sign", AsyncMock(return_value=("fake_token", "fake_sign"))):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_catalog_is_served_from_cache(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth, fake_credentials):
+
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(
+        SOAP_RESPONSE, content_type="text/xml"
+    )
+
+    first = await client.post("/wsfe/FEParamGetTiposIva", json=PAYLOAD)
+    second = await client.post("/wsfe/FEParamGetTiposIva", json=PAYLOAD)
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json() == first.json()
+    assert first.json()["response"]["ResultGet"]["IvaTipo"][0]["Desc"] == "21%"
+    assert len(wsfe_httpserver_fixed_port.log) == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_control_no_cache_queries_afip(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth, fake_credentials):
+
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(
+        SOAP_RESPONSE, content_type="text/xml"
+    )
+
+    await client.post("/wsfe/FEParamGetTiposIva", json=PAYLOAD)
+    resp = await client.post("/wsfe/FEParamGetTiposIva", json=PAYLOAD, headers={"Cache-Control": "no-cache"})
+
+    assert resp.headers["X-Cache"] == "BYPASS"
+    assert len(wsfe_httpserver_fixed_port.log) == 2
+
+
+@pytest.mark.asyncio
+async def test_afip_failures_are_not_cached(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth, fake_credentials):
+
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(
+        "Internal Server Error", status=500, content_type="text/plain"
+    )
+
+    first = await client.post("/wsfe/FEParamGetTiposIva", json=PAYLOAD)
+    second = await client.post("/wsfe/FEParamGetTiposIva", json=PAYLOAD)
+
+    assert first.json()["status"] == "error"
+    assert second.headers["X-Cache"] == "MISS"
@@ -0,0 +1,107 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import AsyncClient
+
+from tests.integration.test_consult_invoice import SOAP_RESPONSE
+
+AUTHORIZED_RESPONSE = SOAP_RESPONSE.replace(
+    "<PtoVta>1</PtoVta>",
+    "<Resultado>A</Resultado><CodAutorizacion>76043123456789</CodAutorizacion>"
+    "<EmisionTipo>CAE</EmisionTipo><FchVto>20260119</FchVto><PtoVta>1</PtoVta>",
+)
+
+PAYLOAD = {"Auth": {"Cuit": 30740253022}, "FeCompConsReq": {"PtoVta": 1, "CbteTipo": 6, "CbteNro": 100}}
+
+
+@pytest.fixture
+def fake_credentials():
+    with patch("service.api.wsfe._get_token_and_sign", AsyncMock(return_value=("fake_token", "fake_sign"))):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_authorized_voucher_is_served_from_cache(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth, fake_credentials):
+
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(
+        AUTHORIZED_RESPONSE, content_type="text/xml"
+    )
+
+    first = await client.post("/wsfe/FECompConsultar", json=PAYLOAD)
+    second = await client.post("/wsfe/FECompConsultar", json=PAYLOAD)
+    fresh = await client.post("/wsfe/FECompConsultar", json=PAYLOAD, headers={"Cache-Control": "no-cache"})
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert fresh.headers["X-Cache"] == "BYPASS"
+    assert second.json() == first.json()
+    assert first.json()["response"]["ResultGet"]["CodAutorizacion"] == "76043123456789"
+    assert len(wsfe_httpserver_fixed_port.log) == 2
+
+
+@pytest.mark.asyncio
+async def test_voucher_without_authorization_is_not_cached(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth, fake_credentials):
+
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(
+        SOAP_RESPONSE, content_type="text/xml"
+    )
+
+    await client.post("/wsfe/FECompConsultar", json=PAYLOAD)
+    second = await client.post("/wsfe/FECompConsultar", json=PAYLOAD)
+
+    assert second.headers["X-Cache"] == "MISS"
+    assert len(wsfe_httpserver_fixed_port.log) == 2
+
+
+INVOICE_RESPONSE = """
+<soap-env:Envelope xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/" xmlns:ar="http://ar.gov.afip.dif.FEV1/">
+    <soap-env:Body>
+        <ar:FECAESolicitarResponse>
+            <ar:FECAESolicitarResult>
+                <ar:FeCabResp>
+                    <ar:Cuit>30740253022</ar:Cuit><ar:PtoVta>1</ar:PtoVta><ar:CbteTipo>6</ar:CbteTipo>
+                    <ar:FchProceso>20260125123045</ar:FchProceso><ar:CantReg>1</ar:CantReg>
+                    <ar:Resultado>A</ar:Resultado><ar:Reproceso>N</ar:Reproceso>
+                </ar:FeCabResp>
+                <ar:FeDetResp>
+                    <ar:FECAEDetResponse>
+                        <ar:Concepto>1</ar:Concepto><ar:DocTipo>99</ar:DocTipo><ar:DocNro>0</ar:DocNro>
+                        <ar:CbteDesde>100</ar:CbteDesde><ar:CbteHasta>100</ar:CbteHasta><ar:CbteFch>20260125</ar:CbteFch>
+                        <ar:Resultado>A</ar:Resultado><ar:CAE>76043123456789</ar:CAE><ar:CAEFchVto>20260204</ar:CAEFchVto>
+                    </ar:FECAEDetResponse>
+                </ar:FeDetResp>
+            </ar:FECAESolicitarResult>
+        </ar:FECAESolicitarResponse>
+    </soap-env:Body>
+</soap-env:Envelope>
+"""
+
+INVOICE_PAYLOAD = {
+    "Auth": {"Cuit": 30740253022},
+    "FeCAEReq": {
+        "FeCabReq": {"CantReg": 1, "PtoVta": 1, "CbteTipo": 6},
+        "FeDetReq": {"FECAEDetRequest": [{
+            "Concepto": 1, "DocTipo": 99, "DocNro": 0, "CbteDesde": 100, "CbteHasta": 100, "CbteFch": "20260125",
+            "ImpTotal": 100.0, "ImpNeto": 100.0, "ImpTotConc": 0.0, "ImpOpEx": 0.0, "ImpTrib": 0.0, "ImpIVA": 0.0,
+            "MonId": "PES", "MonCotiz": 1, "CondicionIVAReceptorId": 5,
+        }]},
+    },
+}
+
+
+@pytest.mark.asyncio
+async def test_invoice_authorized_by_fecae_is_served_without_afip(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth, fake_credentials):
+
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(
+        INVOICE_RESPONSE, content_type="text/xml"
+    )
+
+    invoice = await client.post("/wsfe/FECAESolicitar", json=INVOICE_PAYLOAD)
+    consult = await client.post("/wsfe/FECompConsultar", json=PAYLOAD)
+
+    assert invoice.json()["status"] == "success"
+    assert consult.headers["X-Cache"] == "HIT"
+    result_get = consult.json()["response"]["ResultGet"]
+    assert result_get["CodAutorizacion"] == "76043123456789"
+    assert result_get["ImpTotal"] == 100.0
+    assert len(wsfe_httpserver_fixed_port.log) == 1
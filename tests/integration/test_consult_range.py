@@ -0,0 +1,62 @@
+import json
+import re
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import AsyncClient
+from werkzeug import Response
+
+from tests.integration.test_comprobante_cache import AUTHORIZED_RESPONSE
+
+
+def afip_handler(request):
+    number = re.search(r"CbteNro>(\d+)<", request.get_data(as_text=True)).group(1)
+    body = AUTHORIZED_RESPONSE.replace("<CbteDesde>100</CbteDesde>", f"<CbteDesde>{number}</CbteDesde>")
+    return Response(body, content_type="text/xml")
+
+
+def _payload(first: int, last: int) -> dict:
+    return {"Auth": {"Cuit": 30740253022}, "FeCompConsReq": {"PtoVta": 1, "CbteTipo": 6, "CbteDesde": first, "CbteHasta": last}}
+
+
+@pytest.fixture
+def fake_credentials():
+    with patch("service.api.wsfe._get_token_and_sign", AsyncMock(return_value=("fake_token", "fake_sign"))) as mock:
+        yield mock
+
+
+@pytest.mark.asyncio
+async def test_range_is_streamed_in_order_with_one_token_lookup(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth, fake_credentials):
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_handler(afip_handler)
+
+    resp = await client.post("/wsfe/FECompConsultar/range", json=_payload(100, 111))
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [line["CbteNro"] for line in lines] == list(range(100, 112))
+    assert [line["response"]["ResultGet"]["CbteDesde"] for line in lines] == list(range(100, 112))
+    assert {line["cache"] for line in lines} == {"MISS"}
+    assert len(wsfe_httpserver_fixed_port.log) == 12
+    fake_credentials.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_cached_vouchers_do_not_reach_afip(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth, fake_credentials):
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_handler(afip_handler)
+
+    await client.post("/wsfe/FECompConsultar/range", json=_payload(100, 103))
+    resp = await client.post("/wsfe/FECompConsultar/range", json=_payload(100, 105))
+
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [line["cache"] for line in lines] == ["HIT"] * 4 + ["MISS"] * 2
+    assert len(wsfe_httpserver_fixed_port.log) == 6
+
+
+@pytest.mark.asyncio
+async def test_invalid_ranges_are_rejected(client: AsyncClient, override_auth, fake_credentials):
+    assert (await client.post("/wsfe/FECompConsultar/range", json=_payload(10, 9))).status_code == 400
+
+    with patch("service.api.wsfe.CONSULT_RANGE_MAX_VOUCHERS", 5):
+        assert (await client.post("/wsfe/FECompConsultar/range", json=_payload(1, 6))).status_code == 400
+    fake_credentials.assert_not_awaited()
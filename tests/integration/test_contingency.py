@@ -0,0 +1,93 @@
+from datetime import date
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import AsyncClient
+from werkzeug import Response
+
+from service.utils.caea_store import caea_store
+from service.utils.comprobante_sequencer import comprobante_sequencer
+from service.utils.contingency import REPORTED, contingency
+from service.utils.wsfe_health import wsfe_health
+from tests.integration.test_idempotency_keys import INVOICE_RESPONSE
+
+CUIT = 30740253022
+CAEA = "36043123456789"
+
+DUMMY_RESPONSE = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<FEDummyResponse xmlns="http://ar.gov.afip.dif.FEV1/"><FEDummyResult>
+<AppServer>OK</AppServer><DbServer>OK</DbServer><AuthServer>OK</AuthServer>
+</FEDummyResult></FEDummyResponse></soap:Body></soap:Envelope>"""
+
+REG_INFORMATIVO_RESPONSE = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<FECAEARegInformativoResponse xmlns="http://ar.gov.afip.dif.FEV1/"><FECAEARegInformativoResult>
+<FeCabResp><Cuit>30740253022</Cuit><PtoVta>5</PtoVta><CbteTipo>6</CbteTipo><FchProceso>20260206</FchProceso>
+<CantReg>1</CantReg><Resultado>A</Resultado><Reproceso>N</Reproceso></FeCabResp>
+<FeDetResp><FECAEADetResponse><Concepto>1</Concepto><DocTipo>99</DocTipo><DocNro>0</DocNro>
+<CbteDesde>42</CbteDesde><CbteHasta>42</CbteHasta><CbteFch>20260205</CbteFch><Resultado>A</Resultado>
+<CAEA>36043123456789</CAEA></FECAEADetResponse></FeDetResp>
+</FECAEARegInformativoResult></FECAEARegInformativoResponse></soap:Body></soap:Envelope>"""
+
+PAYLOAD = {
+    "Auth": {"Cuit": CUIT},
+    "FeCAEReq": {
+        "FeCabReq": {"CantReg": 1, "PtoVta": 1, "CbteTipo": 6},
+        "FeDetReq": {"FECAEDetRequest": [{
+            "Concepto": 1, "DocTipo": 99, "DocNro": 0, "CbteDesde": 0, "CbteHasta": 0, "CbteFch": "20260205",
+            "ImpTotal": 121.0, "ImpNeto": 121.0, "ImpTotConc": 0.0, "ImpOpEx": 0.0, "ImpTrib": 0.0,
+            "ImpIVA": 0.0, "MonId": "PES", "MonCotiz": 1, "CondicionIVAReceptorId": 5,
+        }]},
+    },
+}
+
+
+def afip_handler(request):
+    body = request.get_data(as_text=True)
+    if "FEDummy" in body:
+        return Response(DUMMY_RESPONSE, content_type="text/xml")
+    return Response(REG_INFORMATIVO_RESPONSE, content_type="text/xml")
+
+
+@pytest.fixture(autouse=True)
+def contingency_ready(monkeypatch):
+    monkeypatch.setattr(contingency, "enabled", True)
+    monkeypatch.setattr(contingency, "_pto_vta", 5)
+    comprobante_sequencer.clear()
+    comprobante_sequencer.advance(str(CUIT), 5, 6, 41)
+    with patch("service.utils.caea_store.afip_today", return_value=date(2026, 2, 5)), \
+         patch("service.api.wsfe._get_token_and_sign", AsyncMock(return_value=("fake_token", "fake_sign"))):
+        yield
+    comprobante_sequencer.clear()
+
+
+@pytest.mark.asyncio
+async def test_degraded_wsfe_issues_under_caea_and_reports_on_recovery(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth):
+    await caea_store.record(str(CUIT), {"status": "success", "response": {"ResultGet": {"CAEA": CAEA, "Periodo": 202602, "Orden": 1}}})
+    for _ in range(10):
+        wsfe_health.record(0.1, False)
+
+    resp = await client.post("/wsfe/FECAESolicitar", json=PAYLOAD)
+
+    detail = resp.json()["response"]["FeDetResp"]["FECAEDetResponse"][0]
+    assert resp.json()["contingency"] is True
+    assert (detail["CbteDesde"], detail["CAEA"], detail["EmisionTipo"]) == (42, CAEA, "CAEA")
+    assert len(wsfe_httpserver_fixed_port.log) == 0
+
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_handler(afip_handler)
+    await contingency.tick()
+
+    assert not wsfe_health.degraded
+    assert (await contingency.stats())["vouchers"][REPORTED] == 1
+    report = wsfe_httpserver_fixed_port.log[1][0].get_data(as_text=True)
+    assert "FECAEARegInformativo" in report and CAEA in report and "CbteFchHsGen" in report
+
+
+@pytest.mark.asyncio
+async def test_healthy_wsfe_is_used_as_usual(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth):
+    await caea_store.record(str(CUIT), {"status": "success", "response": {"ResultGet": {"CAEA": CAEA, "Periodo": 202602, "Orden": 1}}})
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(INVOICE_RESPONSE, content_type="text/xml")
+
+    resp = await client.post("/wsfe/FECAESolicitar", json=PAYLOAD)
+
+    assert "contingency" not in resp.json()
+    assert len(wsfe_httpserver_fixed_port.log) == 1
@@ -0,0 +1,77 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import AsyncClient
+from werkzeug import Response
+
+from service.utils.comprobante_sequencer import comprobante_sequencer
+
+LAST_AUTHORIZED_RESPONSE = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<FECompUltimoAutorizadoResponse xmlns="http://ar.gov.afip.dif.FEV1/"><FECompUltimoAutorizadoResult>
+<PtoVta>1</PtoVta><CbteTipo>6</CbteTipo><CbteNro>41</CbteNro>
+</FECompUltimoAutorizadoResult></FECompUltimoAutorizadoResponse></soap:Body></soap:Envelope>"""
+
+DETAIL_RESPONSE = """<FECAEDetResponse><Concepto>1</Concepto><DocTipo>99</DocTipo><DocNro>0</DocNro>
+<CbteDesde>{n}</CbteDesde><CbteHasta>{n}</CbteHasta><CbteFch>20260125</CbteFch><Resultado>A</Resultado>
+<CAE>7604312345678{n}</CAE><CAEFchVto>20260204</CAEFchVto></FECAEDetResponse>"""
+
+INVOICE_RESPONSE = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<FECAESolicitarResponse xmlns="http://ar.gov.afip.dif.FEV1/"><FECAESolicitarResult>
+<FeCabResp><Cuit>30740253022</Cuit><PtoVta>1</PtoVta><CbteTipo>6</CbteTipo><FchProceso>20260125123045</FchProceso>
+<CantReg>2</CantReg><Resultado>A</Resultado><Reproceso>N</Reproceso></FeCabResp>
+<FeDetResp>{details}</FeDetResp>
+</FECAESolicitarResult></FECAESolicitarResponse></soap:Body></soap:Envelope>"""
+
+
+def _payload(imp_total: float) -> dict:
+    return {
+        "Auth": {"Cuit": 30740253022},
+        "FeCAEReq": {
+            "FeCabReq": {"CantReg": 1, "PtoVta": 1, "CbteTipo": 6},
+            "FeDetReq": {"FECAEDetRequest": [{
+                "Concepto": 1, "DocTipo": 99, "DocNro": 0, "CbteDesde": 0, "CbteHasta": 0, "CbteFch": "20260125",
+                "ImpTotal": imp_total, "ImpNeto": imp_total, "ImpTotConc": 0.0, "ImpOpEx": 0.0, "ImpTrib": 0.0,
+                "ImpIVA": 0.0, "MonId": "PES", "MonCotiz": 1, "CondicionIVAReceptorId": 5,
+            }]},
+        },
+    }
+
+
+def afip_handler(request):
+    body = request.get_data(as_text=True)
+    if "FECompUltimoAutorizado" in body:
+        return Response(LAST_AUTHORIZED_RESPONSE, content_type="text/xml")
+    details = "".join(DETAIL_RESPONSE.format(n=n) for n in (42, 43))
+    return Response(INVOICE_RESPONSE.format(details=details), content_type="text/xml")
+
+
+@pytest.fixture(autouse=True)
+def batching_enabled():
+    comprobante_sequencer.clear()
+    with patch("service.api.wsfe.FECAE_BATCHING_ENABLED", True), \
+         patch("service.api.wsfe._get_token_and_sign", AsyncMock(return_value=("fake_token", "fake_sign"))):
+        yield
+    comprobante_sequencer.clear()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_invoices_are_sent_as_one_batch(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth):
+
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_handler(afip_handler)
+
+    first, second = await asyncio.gather(
+        client.post("/wsfe/FECAESolicitar", json=_payload(100.0)),
+        client.post("/wsfe/FECAESolicitar", json=_payload(200.0)),
+    )
+
+    assert first.headers["X-Batch-Size"] == second.headers["X-Batch-Size"] == "2"
+    numbers = sorted(
+        resp.json()["response"]["FeDetResp"]["FECAEDetResponse"][0]["CbteDesde"] for resp in (first, second)
+    )
+    assert numbers == [42, 43]
+
+    # One FECompUltimoAutorizado to seed the sequence, one FECAESolicitar with both vouchers.
+    assert len(wsfe_httpserver_fixed_port.log) == 2
+    invoice_request = wsfe_httpserver_fixed_port.log[1][0].get_data(as_text=True)
+    assert invoice_request.count("FECAEDetRequest>") == 4
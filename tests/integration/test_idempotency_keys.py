@@ -0,0 +1,75 @@
+import asyncio
+import copy
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import AsyncClient
+
+INVOICE_RESPONSE = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<FECAESolicitarResponse xmlns="http://ar.gov.afip.dif.FEV1/"><FECAESolicitarResult>
+<FeCabResp><Cuit>30740253022</Cuit><PtoVta>1</PtoVta><CbteTipo>6</CbteTipo><FchProceso>20260125123045</FchProceso>
+<CantReg>1</CantReg><Resultado>A</Resultado><Reproceso>N</Reproceso></FeCabResp>
+<FeDetResp><FECAEDetResponse><Concepto>1</Concepto><DocTipo>99</DocTipo><DocNro>0</DocNro>
+<CbteDesde>42</CbteDesde><CbteHasta>42</CbteHasta><CbteFch>20260125</CbteFch><Resultado>A</Resultado>
+<CAE>76043123456789</CAE><CAEFchVto>20260204</CAEFchVto></FECAEDetResponse></FeDetResp>
+</FECAESolicitarResult></FECAESolicitarResponse></soap:Body></soap:Envelope>"""
+
+PAYLOAD = {
+    "Auth": {"Cuit": 30740253022},
+    "FeCAEReq": {
+        "FeCabReq": {"CantReg": 1, "PtoVta": 1, "CbteTipo": 6},
+        "FeDetReq": {"FECAEDetRequest": [{
+            "Concepto": 1, "DocTipo": 99, "DocNro": 0, "CbteDesde": 42, "CbteHasta": 42, "CbteFch": "20260125",
+            "ImpTotal": 121.0, "ImpNeto": 121.0, "ImpTotConc": 0.0, "ImpOpEx": 0.0, "ImpTrib": 0.0,
+            "ImpIVA": 0.0, "MonId": "PES", "MonCotiz": 1, "CondicionIVAReceptorId": 5,
+        }]},
+    },
+}
+
+
+@pytest.fixture(autouse=True)
+def fake_token():
+    with patch("service.api.wsfe._get_token_and_sign", AsyncMock(return_value=("fake_token", "fake_sign"))):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_retries_with_the_same_key_reach_afip_once(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth):
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(INVOICE_RESPONSE, content_type="text/xml")
+    headers = {"Idempotency-Key": "invoice-42"}
+
+    first, concurrent = await asyncio.gather(
+        client.post("/wsfe/FECAESolicitar", json=PAYLOAD, headers=headers),
+        client.post("/wsfe/FECAESolicitar", json=PAYLOAD, headers=headers),
+    )
+    later = await client.post("/wsfe/FECAESolicitar", json=PAYLOAD, headers=headers)
+
+    assert first.json() == concurrent.json() == later.json()
+    assert first.json()["response"]["FeDetResp"]["FECAEDetResponse"][0]["CAE"] == "76043123456789"
+    assert later.headers["Idempotent-Replayed"] == "true"
+    assert len(wsfe_httpserver_fixed_port.log) == 1
+
+
+@pytest.mark.asyncio
+async def test_requests_without_key_are_not_deduplicated(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth):
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(INVOICE_RESPONSE, content_type="text/xml")
+
+    await client.post("/wsfe/FECAESolicitar", json=PAYLOAD)
+    resp = await client.post("/wsfe/FECAESolicitar", json=PAYLOAD)
+
+    assert "Idempotent-Replayed" not in resp.headers
+    assert len(wsfe_httpserver_fixed_port.log) == 2
+
+
+@pytest.mark.asyncio
+async def test_key_reused_with_another_invoice_is_rejected(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth):
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(INVOICE_RESPONSE, content_type="text/xml")
+    headers = {"Idempotency-Key": "invoice-42"}
+    other = copy.deepcopy(PAYLOAD)
+    other["FeCAEReq"]["FeDetReq"]["FECAEDetRequest"][0]["ImpTotal"] = 242.0
+
+    await client.post("/wsfe/FECAESolicitar", json=PAYLOAD, headers=headers)
+    resp = await client.post("/wsfe/FECAESolicitar", json=other, headers=headers)
+
+    assert resp.status_code == 422
+    assert len(wsfe_httpserver_fixed_port.log) == 1
@@ -0,0 +1,65 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import AsyncClient
+
+from service.utils.job_queue import job_queue
+
+INVOICE_RESPONSE = """<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>
+<FECAESolicitarResponse xmlns="http://ar.gov.afip.dif.FEV1/"><FECAESolicitarResult>
+<FeCabResp><Cuit>30740253022</Cuit><PtoVta>1</PtoVta><CbteTipo>6</CbteTipo><FchProceso>20260125123045</FchProceso>
+<CantReg>1</CantReg><Resultado>A</Resultado><Reproceso>N</Reproceso></FeCabResp>
+<FeDetResp><FECAEDetResponse><Concepto>1</Concepto><DocTipo>99</DocTipo><DocNro>0</DocNro>
+<CbteDesde>42</CbteDesde><CbteHasta>42</CbteHasta><CbteFch>20260125</CbteFch><Resultado>A</Resultado>
+<CAE>76043123456789</CAE><CAEFchVto>20260204</CAEFchVto></FECAEDetResponse></FeDetResp>
+</FECAESolicitarResult></FECAESolicitarResponse></soap:Body></soap:Envelope>"""
+
+PAYLOAD = {
+    "Auth": {"Cuit": 30740253022},
+    "FeCAEReq": {
+        "FeCabReq": {"CantReg": 1, "PtoVta": 1, "CbteTipo": 6},
+        "FeDetReq": {"FECAEDetRequest": [{
+            "Concepto": 1, "DocTipo": 99, "DocNro": 0, "CbteDesde": 42, "CbteHasta": 42, "CbteFch": "20260125",
+            "ImpTotal": 121.0, "ImpNeto": 121.0, "ImpTotConc": 0.0, "ImpOpEx": 0.0, "ImpTrib": 0.0,
+            "ImpIVA": 0.0, "MonId": "PES", "MonCotiz": 1, "CondicionIVAReceptorId": 5,
+        }]},
+    },
+}
+
+
+@pytest.mark.asyncio
+async def test_invoice_job_is_queued_then_authorized(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth):
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(INVOICE_RESPONSE, content_type="text/xml")
+
+    with patch("service.api.wsfe._get_token_and_sign", AsyncMock(return_value=("fake_token", "fake_sign"))):
+        resp = await client.post("/wsfe/FECAESolicitar/jobs", json=PAYLOAD)
+        assert resp.status_code == 202
+        job_id = resp.json()["job_id"]
+        assert resp.json()["status"] == "queued"
+
+        # Nothing runs until the workers are started (the lifespan does it in production).
+        pending = await client.get(f"/wsfe/jobs/{job_id}/result")
+        assert pending.status_code == 409
+
+        await job_queue.start()
+        try:
+            for _ in range(200):
+                status = (await client.get(f"/wsfe/jobs/{job_id}")).json()["status"]
+                if status == "done":
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await job_queue.stop()
+
+    assert status == "done"
+    result = (await client.get(f"/wsfe/jobs/{job_id}/result")).json()
+    assert result["status"] == "success"
+    assert result["response"]["FeDetResp"]["FECAEDetResponse"][0]["CAE"] == "76043123456789"
+    assert len(wsfe_httpserver_fixed_port.log) == 1
+
+
+@pytest.mark.asyncio
+async def test_unknown_job_returns_404(client: AsyncClient, override_auth):
+    assert (await client.get("/wsfe/jobs/missing")).status_code == 404
+    assert (await client.get("/wsfe/jobs/missing/result")).status_code == 404
@@ -0,0 +1,16 @@
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.mark.asyncio
+async def test_metrics_require_a_token(client: AsyncClient):
+    assert (await client.get("/metrics")).status_code == 403
+    assert (await client.get("/metrics", headers={"Authorization": "Bearer wrong"})).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_metrics_with_a_token(client: AsyncClient, override_auth):
+    resp = await client.get("/metrics")
+
+    assert resp.status_code == 200
+    assert "connection_pools" in resp.json()
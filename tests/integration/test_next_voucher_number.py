@@ -0,0 +1,66 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import AsyncClient
+
+from service.utils.comprobante_sequencer import comprobante_sequencer
+
+SOAP_RESPONSE = """<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+    <soap:Body>
+        <FECompUltimoAutorizadoResponse xmlns="http://ar.gov.afip.dif.FEV1/">
+            <FECompUltimoAutorizadoResult>
+                <PtoVta>1</PtoVta>
+                <CbteTipo>6</CbteTipo>
+                <CbteNro>41</CbteNro>
+            </FECompUltimoAutorizadoResult>
+        </FECompUltimoAutorizadoResponse>
+    </soap:Body>
+</soap:Envelope>
+"""
+
+PAYLOAD = {"Auth": {"Cuit": 30740253022}, "PtoVta": 1, "CbteTipo": 6}
+
+
+@pytest.fixture(autouse=True)
+def clean_sequencer():
+    comprobante_sequencer.clear()
+    yield
+    comprobante_sequencer.clear()
+
+
+@pytest.fixture
+def fake_credentials():
+    with patch("service.api.wsfe._get_token_and_sign", AsyncMock(return_value=("fake_token", "fake_sign"))):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_next_voucher_number_queries_afip_once(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth, fake_credentials):
+
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(
+        SOAP_RESPONSE, content_type="text/xml"
+    )
+
+    first = await client.post("/wsfe/next-voucher-number", json=PAYLOAD)
+    second = await client.post("/wsfe/next-voucher-number", json=PAYLOAD)
+
+    assert first.headers["X-Sequence-Source"] == "afip"
+    assert second.headers["X-Sequence-Source"] == "local"
+    assert second.json()["response"]["NextCbteNro"] == 42
+    assert len(wsfe_httpserver_fixed_port.log) == 1
+
+
+@pytest.mark.asyncio
+async def test_last_authorized_route_updates_the_sequence(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth, fake_credentials):
+
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(
+        SOAP_RESPONSE, content_type="text/xml"
+    )
+
+    await client.post("/wsfe/FECompUltimoAutorizado", json=PAYLOAD)
+    resp = await client.post("/wsfe/next-voucher-number", json=PAYLOAD)
+
+    assert resp.headers["X-Sequence-Source"] == "local"
+    assert resp.json()["response"]["NextCbteNro"] == 42
+    assert len(wsfe_httpserver_fixed_port.log) == 1
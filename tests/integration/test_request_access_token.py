@@ -83,4 +83,34 @@ async def test_generate_afip_access_token_error(
 
     assert resp.status_code == 200
     data = resp.json()
-    assert data["status"] == "error generating access token."
\ No newline at end of file
+    assert data["status"] == "error generating access token."
+
+
+@pytest.mark.asyncio
+async def test_wsaa_client_is_reused_across_logins(
+                                                wsaa_httpserver_fixed_port,
+                                                patch_request_access_token_dependencies
+                                            ):
+
+    from service.controllers.request_access_token_controller import \
+        generate_afip_access_token
+    from service.soap_client.async_client import WSAAClientManager
+
+    wsaa_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(
+        SOAP_RESPONSE, content_type="text/xml"
+    )
+
+    with patch("service.controllers.request_access_token_controller.save_xml", MagicMock()):
+        with patch("service.controllers.request_access_token_controller.parse_and_save_loginticketresponse", MagicMock()):
+            with patch("service.soap_client.async_client.AsyncClient", wraps=AsyncClient) as zeep_client_spy:
+
+                first = await generate_afip_access_token("30740253022")
+                client = WSAAClientManager._client
+                second = await generate_afip_access_token("20304050607")
+
+    assert first["status"] == "success"
+    assert second["status"] == "success"
+    assert WSAAClientManager._client is client
+    assert zeep_client_spy.call_count == 1
+    assert len(wsaa_httpserver_fixed_port.log) == 2
+
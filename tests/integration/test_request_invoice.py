@@ -1,3 +1,5 @@
+from unittest.mock import AsyncMock, patch
+
 import pytest
 from httpx import AsyncClient
 
@@ -135,3 +137,44 @@ async def test_request_invoice_error(client: AsyncClient, wsfe_httpserver_fixed_
     data = resp.json()
     assert data["status"] == "error"
     assert data["error"]["error_type"] == "HTTP Error"
+
+
+@pytest.mark.asyncio
+async def test_request_invoice_fast_codec_matches_zeep(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth):
+
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(
+        SOAP_RESPONSE, content_type="text/xml"
+    )
+
+    payload = {
+        "Auth": {"Cuit": 30740253022},
+        "FeCAEReq": {
+            "FeCabReq": {"CantReg": 1, "PtoVta": 1, "CbteTipo": 11},
+            "FeDetReq": {
+                "FECAEDetRequest": [
+                    {
+                        "Concepto": 1, "DocTipo": 99, "DocNro": 0,
+                        "CbteDesde": 2, "CbteHasta": 2, "CbteFch" : "20260125",
+                        "ImpTotal": 100.0, "ImpNeto": 100.0, "ImpTotConc": 0.0,
+                        "ImpOpEx": 0.0, "ImpTrib": 0.0, "ImpIVA": 0.0,
+                        "MonId": "PES", "MonCotiz": 1, "CondicionIVAReceptorId": 5,
+                    }
+                ]
+            }
+        }
+    }
+
+    fake_credentials = AsyncMock(return_value=("fake_token", "fake_sign"))
+
+    with patch("service.api.wsfe._get_token_and_sign", fake_credentials):
+        zeep_resp = await client.post("/wsfe/FECAESolicitar", json=payload)
+
+    with patch("service.api.wsfe._get_token_and_sign", fake_credentials), \
+         patch("service.api.wsfe.WSFE_FAST_CODEC", True):
+        fast_resp = await client.post("/wsfe/FECAESolicitar", json=payload)
+
+    assert fast_resp.json() == zeep_resp.json()
+    assert fast_resp.json()["response"]["FeCabResp"]["Resultado"] == "A"
+
+    fast_request, _ = wsfe_httpserver_fixed_port.log[-1]
+    assert fast_request.headers["SOAPAction"] == '"http://ar.gov.afip.dif.FEV1/FECAESolicitar"'
@@ -1,5 +1,10 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
 import pytest
 from httpx import AsyncClient
+from werkzeug import Response
 
 SOAP_RESPONSE = """<?xml version="1.0" encoding="utf-8"?>
 <soap-env:Envelope
@@ -70,4 +75,46 @@ async def test_consult_last_authorized_error(client: AsyncClient, wsfe_httpserve
     assert resp.status_code == 200 # 200 its for FastAPI endpoint
     data = resp.json()
     assert data["status"] == "error"
-    assert data["error"]["error_type"] == "HTTP Error"
\ No newline at end of file
+    assert data["error"]["error_type"] == "HTTP Error"
+
+@pytest.mark.asyncio
+async def test_consult_last_authorized_fast_codec_matches_zeep(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth):
+
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_data(
+        SOAP_RESPONSE, content_type="text/xml"
+    )
+
+    payload = {
+        "Auth": {"Cuit": 30740253022},
+        "PtoVta": 1,
+        "CbteTipo": 6
+    }
+
+    fake_credentials = AsyncMock(return_value=("fake_token", "fake_sign"))
+
+    with patch("service.api.wsfe._get_token_and_sign", fake_credentials):
+        zeep_resp = await client.post("/wsfe/FECompUltimoAutorizado", json=payload)
+
+    with patch("service.api.wsfe._get_token_and_sign", fake_credentials), \
+         patch("service.api.wsfe.WSFE_FAST_CODEC", True):
+        fast_resp = await client.post("/wsfe/FECompUltimoAutorizado", json=payload)
+
+    assert fast_resp.json() == zeep_resp.json()
+    assert fast_resp.json()["response"]["CbteNro"] == 1548
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_one_afip_call(client: AsyncClient, wsfe_httpserver_fixed_port, wsfe_manager, override_auth):
+
+    def slow_response(request):
+        time.sleep(0.1)
+        return Response(SOAP_RESPONSE, content_type="text/xml")
+
+    wsfe_httpserver_fixed_port.expect_request("/soap", method="POST").respond_with_handler(slow_response)
+    payload = {"Auth": {"Cuit": 30740253022}, "PtoVta": 1, "CbteTipo": 6}
+
+    with patch("service.api.wsfe._get_token_and_sign", AsyncMock(return_value=("fake_token", "fake_sign"))):
+        responses = await asyncio.gather(*(client.post("/wsfe/FECompUltimoAutorizado", json=payload) for _ in range(5)))
+
+    assert {resp.json()["response"]["CbteNro"] for resp in responses} == {1548}
+    assert len(wsfe_httpserver_fixed_port.log) == 1
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from pathlib import Path
 from unittest.mock import AsyncMock, patch
@@ -72,3 +73,57 @@ class TestSchedulerMultiTenant:
         with patch("service.utils.afip_token_scheduler.Path", return_value=nonexistent):
             from service.utils.afip_token_scheduler import run_job
             await run_job()
+
+    async def test_renewals_run_concurrently_within_limit(self, tmp_path):
+        certs_dir = tmp_path / "certs"
+        cuits = [f"2030405{i:04d}" for i in range(12)]
+        for cuit in cuits:
+            (certs_dir / cuit).mkdir(parents=True)
+
+        running = {"now": 0, "peak": 0}
+
+        async def slow_generate(cuit):
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+            await asyncio.sleep(0.05)
+            running["now"] -= 1
+            return {"status": "success"}
+
+        with patch("service.utils.afip_token_scheduler.Path", return_value=certs_dir), \
+             patch("service.utils.afip_token_scheduler.SCHEDULER_MAX_CONCURRENCY", 4), \
+             patch("service.utils.afip_token_scheduler.generate_afip_access_token", side_effect=slow_generate), \
+             patch("service.utils.afip_token_scheduler.xml_exists", return_value=False):
+
+            from service.utils.afip_token_scheduler import run_job
+            summary = await run_job()
+
+        assert running["peak"] == 4
+        assert summary["renewed"] == 12
+        assert summary["failed"] == 0
+
+    async def test_summary_counts_failures_and_timeouts(self, tmp_path):
+        certs_dir = tmp_path / "certs"
+        (certs_dir / "20304050607").mkdir(parents=True)
+        (certs_dir / "27123456789").mkdir(parents=True)
+        (certs_dir / "30111111118").mkdir(parents=True)
+
+        async def side_effect(cuit):
+            if cuit == "20304050607":
+                raise Exception("WSAA error")
+            if cuit == "27123456789":
+                await asyncio.sleep(1)
+            return {"status": "success"}
+
+        with patch("service.utils.afip_token_scheduler.Path", return_value=certs_dir), \
+             patch("service.utils.afip_token_scheduler.SCHEDULER_TENANT_TIMEOUT_SECONDS", 0.1), \
+             patch("service.utils.afip_token_scheduler.generate_afip_access_token", side_effect=side_effect), \
+             patch("service.utils.afip_token_scheduler.xml_exists", return_value=False):
+
+            from service.utils.afip_token_scheduler import run_job
+            summary = await run_job()
+
+        assert summary["renewed"] == 1
+        assert summary["failed"] == 2
+        assert summary["skipped"] == 0
+        assert summary["duration_seconds"] < 1
+
@@ -30,7 +30,7 @@ def xml_base(tmp_path):
 
 
 class TestUploadCerts:
-    @patch("service.api.tenants.generate_afip_access_token", new_callable=AsyncMock, return_value={"status": "success"})
+    @patch("service.api.tenants.regenerate_afip_access_token", new_callable=AsyncMock, return_value={"status": "success"})
     def test_upload_creates_directories_and_files(self, mock_gen, client, certs_base, xml_base):
         cuit = "20304050607"
         response = client.post(
@@ -48,6 +48,7 @@ class TestUploadCerts:
         assert (certs_base / cuit / "PrivateKey.key").exists()
         assert (certs_base / cuit / "returned_certificate.pem").exists()
         assert (xml_base / cuit).exists()
+        mock_gen.assert_awaited_once_with(cuit)
 
     def test_upload_rejects_invalid_cuit(self, client):
         response = client.post(
@@ -67,7 +68,7 @@ class TestGetTenantStatus:
         data = response.json()
         assert data["certs_uploaded"] is False
 
-    @patch("service.api.tenants.generate_afip_access_token", new_callable=AsyncMock, return_value={"status": "success"})
+    @patch("service.api.tenants.regenerate_afip_access_token", new_callable=AsyncMock, return_value={"status": "success"})
     def test_status_after_upload(self, mock_gen, client, certs_base):
         cuit = "20304050607"
         client.post(
@@ -84,7 +85,7 @@ class TestGetTenantStatus:
 
 
 class TestDeleteTenant:
-    @patch("service.api.tenants.generate_afip_access_token", new_callable=AsyncMock, return_value={"status": "success"})
+    @patch("service.api.tenants.regenerate_afip_access_token", new_callable=AsyncMock, return_value={"status": "success"})
     def test_delete_removes_dirs(self, mock_gen, client, certs_base, xml_base):
         cuit = "20304050607"
         client.post(
@@ -102,7 +103,7 @@ class TestDeleteTenant:
 
 
 class TestListTenants:
-    @patch("service.api.tenants.generate_afip_access_token", new_callable=AsyncMock, return_value={"status": "success"})
+    @patch("service.api.tenants.regenerate_afip_access_token", new_callable=AsyncMock, return_value={"status": "success"})
     def test_lists_uploaded_tenants(self, mock_gen, client):
         for cuit in ["20304050607", "27123456789"]:
             client.post(
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from service.time.afip_clock import AfipClock
+
+
+def _ntp_answering(*tx_times):
+    patcher = patch("ntplib.NTPClient")
+    mock_client = patcher.start()
+    mock_client.return_value.request.side_effect = [SimpleNamespace(tx_time=tx_time) for tx_time in tx_times]
+    return patcher
+
+
+class TestAfipClock:
+    def test_not_synchronized_until_first_sample(self):
+        clock = AfipClock()
+
+        assert clock.now() is None
+        assert clock.is_stale()
+
+    def test_serves_time_from_offset(self):
+        clock = AfipClock()
+        patcher = _ntp_answering(1_800_000_000.0)
+        try:
+            assert clock.sample()
+        finally:
+            patcher.stop()
+
+        assert clock.now() == pytest.approx(1_800_000_000.0, abs=0.5)
+        assert not clock.is_stale()
+
+    def test_offset_is_smoothed(self):
+        clock = AfipClock(smoothing=0.5)
+        patcher = _ntp_answering(1_800_000_000.0, 1_800_000_010.0)
+        try:
+            clock.sample()
+            clock.sample()
+        finally:
+            patcher.stop()
+
+        # Halfway between the two samples.
+        assert clock.now() == pytest.approx(1_800_000_005.0, abs=0.5)
+
+    def test_failed_sample_keeps_last_good_offset(self):
+        clock = AfipClock()
+        patcher = _ntp_answering(1_800_000_000.0)
+        try:
+            clock.sample()
+        finally:
+            patcher.stop()
+
+        with patch("ntplib.NTPClient") as mock_client:
+            mock_client.return_value.request.side_effect = OSError("timeout")
+            assert clock.sample() is False
+
+        assert clock.now() == pytest.approx(1_800_000_000.0, abs=0.5)
+
+    def test_stale_after_max_staleness(self):
+        clock = AfipClock(max_staleness=60)
+        patcher = _ntp_answering(1_800_000_000.0)
+        try:
+            clock.sample()
+        finally:
+            patcher.stop()
+
+        with patch("service.time.afip_clock.time.monotonic", return_value=clock._last_sync + 61):
+            assert clock.is_stale()
+            # Still serving time from the last good offset.
+            assert clock.now() is not None
@@ -0,0 +1,199 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from service.utils import afip_token_scheduler
+from service.utils.token_cache import token_cache
+
+CUIT = "20304050607"
+
+
+@pytest.fixture(autouse=True)
+def fresh_scheduler():
+    token_cache.clear()
+    with patch.object(afip_token_scheduler, "scheduler", AsyncIOScheduler()):
+        yield afip_token_scheduler.scheduler
+    token_cache.clear()
+
+
+class TestComputeRefreshTime:
+    def test_refresh_before_expiration_within_jitter(self):
+        expiration = datetime.now(timezone.utc) + timedelta(hours=12)
+
+        with patch.object(afip_token_scheduler, "TOKEN_REFRESH_MARGIN_SECONDS", 1800), \
+             patch.object(afip_token_scheduler, "TOKEN_REFRESH_JITTER_SECONDS", 300):
+            run_at = afip_token_scheduler.compute_refresh_time(expiration)
+
+        assert expiration - timedelta(seconds=2100) <= run_at <= expiration - timedelta(seconds=1800)
+
+    def test_never_in_the_past(self):
+        expiration = datetime.now(timezone.utc) + timedelta(minutes=5)
+
+        run_at = afip_token_scheduler.compute_refresh_time(expiration)
+
+        assert run_at >= datetime.now(timezone.utc) - timedelta(seconds=1)
+
+
+class TestScheduleTokenRefresh:
+    def test_schedules_from_expiration(self, fresh_scheduler):
+        expiration = datetime.now(timezone.utc) + timedelta(hours=12)
+
+        run_at = afip_token_scheduler.schedule_token_refresh(CUIT, expiration)
+
+        assert run_at < expiration
+        assert afip_token_scheduler.get_scheduled_refresh(CUIT) == run_at
+
+    def test_retries_soon_when_no_token(self):
+        with patch.object(afip_token_scheduler, "_get_token_expiration") as read_expiration:
+            run_at = afip_token_scheduler.schedule_token_refresh(CUIT, None)
+
+        # No file I/O on the event loop: the caller resolves the expiration.
+        read_expiration.assert_not_called()
+
+        assert run_at <= datetime.now(timezone.utc) + timedelta(seconds=afip_token_scheduler.TOKEN_REFRESH_RETRY_SECONDS)
+
+    def test_one_job_per_tenant_and_unschedule(self, fresh_scheduler):
+        afip_token_scheduler.schedule_token_refresh(CUIT, datetime.now(timezone.utc) + timedelta(hours=12))
+        afip_token_scheduler.schedule_token_refresh(CUIT, datetime.now(timezone.utc) + timedelta(hours=6))
+
+        assert len(fresh_scheduler.get_jobs()) == 1
+
+        afip_token_scheduler.unschedule_token_refresh(CUIT)
+        assert afip_token_scheduler.get_scheduled_refresh(CUIT) is None
+
+
+@pytest.mark.asyncio
+class TestRefreshTenantToken:
+    async def test_fresh_token_is_only_rescheduled(self, tmp_path):
+        (tmp_path / CUIT).mkdir()
+        token_cache.set(CUIT, "token", "sign", datetime.now(timezone.utc) + timedelta(hours=12))
+        mock_generate = AsyncMock(return_value={"status": "success"})
+
+        with patch.object(afip_token_scheduler, "Path", return_value=tmp_path), \
+             patch.object(afip_token_scheduler, "generate_afip_access_token", mock_generate):
+            await afip_token_scheduler.refresh_tenant_token(CUIT)
+
+        mock_generate.assert_not_called()
+        assert afip_token_scheduler.get_scheduled_refresh(CUIT) is not None
+
+    async def test_due_token_is_renewed_and_rescheduled(self, tmp_path):
+        (tmp_path / CUIT).mkdir()
+        token_cache.set(CUIT, "token", "sign", datetime.now(timezone.utc) + timedelta(minutes=10))
+        new_expiration = datetime.now(timezone.utc) + timedelta(hours=12)
+
+        async def fake_generate(cuit):
+            token_cache.set(cuit, "new-token", "new-sign", new_expiration)
+            return {"status": "success"}
+
+        with patch.object(afip_token_scheduler, "Path", return_value=tmp_path), \
+             patch.object(afip_token_scheduler, "generate_afip_access_token", side_effect=fake_generate) as mock_generate:
+            await afip_token_scheduler.refresh_tenant_token(CUIT)
+
+        mock_generate.assert_called_once_with(CUIT)
+        next_refresh = afip_token_scheduler.get_scheduled_refresh(CUIT)
+        assert datetime.now(timezone.utc) + timedelta(hours=11) < next_refresh < new_expiration
+
+    async def test_deleted_tenant_is_dropped(self, tmp_path):
+        mock_generate = AsyncMock(return_value={"status": "success"})
+
+        with patch.object(afip_token_scheduler, "Path", return_value=tmp_path), \
+             patch.object(afip_token_scheduler, "generate_afip_access_token", mock_generate):
+            await afip_token_scheduler.refresh_tenant_token(CUIT)
+
+        mock_generate.assert_not_called()
+        assert afip_token_scheduler.get_scheduled_refresh(CUIT) is None
+
+
+@pytest.mark.asyncio
+class TestDiscoverySweep:
+    async def test_skips_tenants_with_pending_refresh(self, tmp_path):
+        (tmp_path / CUIT).mkdir()
+        (tmp_path / "27123456789").mkdir()
+        afip_token_scheduler.schedule_token_refresh(CUIT, datetime.now(timezone.utc) + timedelta(hours=12))
+        mock_generate = AsyncMock(return_value={"status": "success"})
+
+        with patch.object(afip_token_scheduler, "Path", return_value=tmp_path), \
+             patch.object(afip_token_scheduler, "generate_afip_access_token", mock_generate), \
+             patch.object(afip_token_scheduler, "xml_exists", return_value=False):
+            await afip_token_scheduler.run_job(skip_scheduled=True)
+
+        assert [call.args[0] for call in mock_generate.call_args_list] == ["27123456789"]
+        assert afip_token_scheduler.get_scheduled_refresh("27123456789") is not None
+
+
+@pytest.mark.asyncio
+class TestRefreshJobLimits:
+    async def test_hung_renewal_times_out_and_is_retried(self, tmp_path):
+        (tmp_path / CUIT).mkdir()
+
+        async def hung_generate(cuit):
+            await asyncio.sleep(0.3)
+
+        with patch.object(afip_token_scheduler, "Path", return_value=tmp_path), \
+             patch.object(afip_token_scheduler, "SCHEDULER_TENANT_TIMEOUT_SECONDS", 0.05), \
+             patch.object(afip_token_scheduler, "_get_token_expiration", return_value=None), \
+             patch.object(afip_token_scheduler, "generate_afip_access_token", side_effect=hung_generate):
+            await asyncio.wait_for(afip_token_scheduler.refresh_tenant_token(CUIT), 1)
+
+        # No valid token: the retry delay is used.
+        assert afip_token_scheduler.get_scheduled_refresh(CUIT) is not None
+
+    async def test_refresh_jobs_share_the_sweep_concurrency_limit(self, tmp_path):
+        cuits = [f"2030405060{n}" for n in range(6)]
+        for cuit in cuits:
+            (tmp_path / cuit).mkdir()
+        running = {"now": 0, "peak": 0}
+
+        async def slow_generate(cuit):
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+            await asyncio.sleep(0.02)
+            running["now"] -= 1
+            return {"status": "success"}
+
+        with patch.object(afip_token_scheduler, "Path", return_value=tmp_path), \
+             patch.object(afip_token_scheduler, "SCHEDULER_MAX_CONCURRENCY", 2), \
+             patch.object(afip_token_scheduler, "_renewal_slots", None), \
+             patch.object(afip_token_scheduler, "_get_token_expiration", return_value=None), \
+             patch.object(afip_token_scheduler, "generate_afip_access_token", side_effect=slow_generate):
+            await asyncio.gather(*(afip_token_scheduler.refresh_tenant_token(cuit) for cuit in cuits))
+
+        assert running["peak"] == 2
+
+    async def test_timed_out_login_keeps_its_slot_until_it_ends(self, tmp_path):
+        cuits = ["20304050607", "27123456789"]
+        for cuit in cuits:
+            (tmp_path / cuit).mkdir()
+        running = {"now": 0, "peak": 0}
+        release_hung = asyncio.Event()
+
+        async def generate(cuit):
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+            if cuit == cuits[0]:
+                await release_hung.wait()
+            running["now"] -= 1
+            return {"status": "success"}
+
+        with patch.object(afip_token_scheduler, "Path", return_value=tmp_path), \
+             patch.object(afip_token_scheduler, "SCHEDULER_MAX_CONCURRENCY", 1), \
+             patch.object(afip_token_scheduler, "SCHEDULER_TENANT_TIMEOUT_SECONDS", 0.05), \
+             patch.object(afip_token_scheduler, "_renewal_slots", None), \
+             patch.object(afip_token_scheduler, "_get_token_expiration", return_value=None), \
+             patch.object(afip_token_scheduler, "generate_afip_access_token", side_effect=generate) as mock_generate:
+            await afip_token_scheduler.refresh_tenant_token(cuits[0])
+            # Timed out, retried after the retry delay, and the login is still running.
+            assert afip_token_scheduler.get_scheduled_refresh(cuits[0]) is not None
+
+            second = asyncio.create_task(afip_token_scheduler.refresh_tenant_token(cuits[1]))
+            await asyncio.sleep(0.1)
+            assert [call.args[0] for call in mock_generate.call_args_list] == [cuits[0]]
+
+            release_hung.set()
+            await asyncio.wait_for(second, 1)
+
+        assert [call.args[0] for call in mock_generate.call_args_list] == cuits
+        assert running["peak"] == 1
@@ -0,0 +1,93 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+from werkzeug import Response
+
+from service.soap_client import async_client
+from service.soap_client.async_client import (WSAAClientManager,
+                                              WSFEClientManager,
+                                              build_wsfe_httpx_client,
+                                              build_wsfe_pool,
+                                              connection_pool_stats)
+
+
+@pytest.mark.asyncio
+async def test_build_wsfe_httpx_client_applies_settings():
+
+    with patch.multiple(
+        async_client,
+        WSFE_MAX_CONNECTIONS=7,
+        WSFE_MAX_KEEPALIVE_CONNECTIONS=3,
+        WSFE_KEEPALIVE_EXPIRY_SECONDS=2.5,
+        WSFE_CONNECT_TIMEOUT_SECONDS=1.0,
+        WSFE_READ_TIMEOUT_SECONDS=9.0,
+        WSFE_WRITE_TIMEOUT_SECONDS=4.0,
+        WSFE_POOL_TIMEOUT_SECONDS=0.5,
+    ):
+        pool = build_wsfe_pool()
+        client = build_wsfe_httpx_client(pool)
+
+    try:
+        assert client.timeout == httpx.Timeout(connect=1.0, read=9.0, write=4.0, pool=0.5)
+
+        stats = pool.stats()
+        assert stats["max_connections"] == 7
+        assert stats["max_keepalive_connections"] == 3
+        assert stats["keepalive_expiry"] == 2.5
+        assert stats["http2"] is False
+
+    finally:
+        await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_build_wsfe_httpx_client_falls_back_to_http1_without_h2():
+
+    with patch.object(async_client, "WSFE_HTTP2", True), \
+         patch.object(async_client, "_http2_available", return_value=False):
+        pool = build_wsfe_pool()
+
+    try:
+        assert pool.stats()["http2"] is False
+    finally:
+        await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pool_stats_reports_in_flight_request(httpserver):
+
+    def slow_handler(request):
+        time.sleep(0.3)
+        return Response("pong")
+
+    httpserver.expect_request("/ping").respond_with_handler(slow_handler)
+    pool = build_wsfe_pool()
+    client = build_wsfe_httpx_client(pool)
+
+    try:
+        assert pool.stats()["in_flight"] == 0
+
+        request = asyncio.create_task(client.get(httpserver.url_for("/ping")))
+        await asyncio.sleep(0.1)
+
+        assert pool.stats()["in_flight"] == 1
+
+        response = await request
+        assert response.text == "pong"
+
+        stats = pool.stats()
+        assert (stats["requests"], stats["in_flight"], stats["peak_in_flight"]) == (1, 0, 1)
+
+    finally:
+        await client.aclose()
+
+
+def test_connection_pool_stats_before_first_use():
+
+    WSFEClientManager.reset_singleton()
+    WSAAClientManager.reset_singleton()
+
+    assert connection_pool_stats() == {"wsfe" : None, "wsaa" : None}
@@ -0,0 +1,40 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from service.utils import blocking_pool
+
+
+def _current_thread_name() -> str:
+    return threading.current_thread().name
+
+
+@pytest.mark.asyncio
+class TestBlockingPool:
+    async def test_run_blocking_uses_worker_thread(self):
+        name = await blocking_pool.run_blocking(_current_thread_name)
+
+        assert name.startswith("afrelay-blocking")
+
+    async def test_run_blocking_passes_arguments_and_exceptions(self):
+        assert await blocking_pool.run_blocking(int, "42", base=10) == 42
+
+        with pytest.raises(ValueError):
+            await blocking_pool.run_blocking(int, "not-a-number")
+
+    async def test_run_cpu_bound_falls_back_to_threads(self):
+        with patch.object(blocking_pool, "_process_executor", None):
+            name = await blocking_pool.run_cpu_bound(_current_thread_name)
+
+        assert name.startswith("afrelay-blocking")
+
+    async def test_run_cpu_bound_uses_configured_executor(self):
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="signing-pool")
+
+        with patch.object(blocking_pool, "_process_executor", executor):
+            name = await blocking_pool.run_cpu_bound(_current_thread_name)
+
+        executor.shutdown()
+        assert name.startswith("signing-pool")
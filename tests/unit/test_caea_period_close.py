@@ -0,0 +1,172 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from service.utils.caea_period_close import CAEAPeriodClose
+from service.utils.contingency import PENDING, REJECTED, REPORTED, contingency
+
+CUIT = 30740253022
+CAEA = "36043123456789"
+
+
+def _details(*numbers: int) -> list[dict]:
+    return [{"CbteDesde" : number, "CbteHasta" : number, "CAEA" : CAEA} for number in numbers]
+
+
+class FakeAfip:
+    def __init__(self, reject: set[int] = frozenset(), down_from: int | None = None, no_movement_rejected: set[int] = frozenset()) -> None:
+        self.reports: list[dict] = []
+        self.no_movement: list[int] = []
+        self.reject = reject
+        self.down_from = down_from
+        self.no_movement_rejected = no_movement_rejected
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _enter(self) -> None:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+
+    async def report(self, payload: dict) -> dict:
+        await self._enter()
+        self.reports.append(payload)
+        details = payload["FeCAEARegInfReq"]["FeDetReq"]["FECAEADetRequest"]
+        if self.down_from is not None and details[0]["CbteDesde"] >= self.down_from:
+            return {"status" : "error", "error" : {"error_type" : "Network error"}}
+        return {"status" : "success", "response" : {"FeCabResp" : {}, "FeDetResp" : {"FECAEADetResponse" : [
+            {"CbteDesde" : d["CbteDesde"], "Resultado" : "R" if d["CbteDesde"] in self.reject else "A", "Observaciones" : None}
+            for d in details
+        ]}, "Errors" : None}}
+
+    async def inform_no_movement(self, cuit: str, pto_vta: int, caea: str) -> dict:
+        await self._enter()
+        self.no_movement.append(pto_vta)
+        return {"status" : "success", "response" : {"Resultado" : "R" if pto_vta in self.no_movement_rejected else "A"}}
+
+
+def _closer(afip: FakeAfip, path, max_records: int = 2, concurrency: int = 5) -> CAEAPeriodClose:
+    closer = CAEAPeriodClose(path, max_records=max_records, concurrency=concurrency)
+    closer.register(afip.report, afip.inform_no_movement)
+    return closer
+
+
+def test_vouchers_are_packed_into_full_batches_per_point_of_sale_and_type(tmp_path):
+    closer = CAEAPeriodClose(tmp_path / "close.sqlite3", max_records=2)
+    groups = [
+        {"PtoVta" : 5, "CbteTipo" : 6, "FECAEADetRequest" : _details(3, 1)},
+        {"PtoVta" : 5, "CbteTipo" : 1, "FECAEADetRequest" : _details(1)},
+        {"PtoVta" : 5, "CbteTipo" : 6, "FECAEADetRequest" : _details(2)},
+    ]
+
+    batches = [(pto_vta, cbte_tipo, [d["CbteDesde"] for d in details]) for pto_vta, cbte_tipo, details in closer.batches(groups)]
+
+    assert batches == [(5, 6, [1, 2]), (5, 6, [3]), (5, 1, [1])]
+
+
+@pytest.mark.asyncio
+async def test_close_reports_every_voucher_and_point_of_sale_without_movement(tmp_path):
+    afip = FakeAfip(reject={2}, no_movement_rejected={8})
+    data = {
+        "Auth" : {"Cuit" : CUIT},
+        "CAEA" : CAEA,
+        "Comprobantes" : [{"PtoVta" : 5, "CbteTipo" : 6, "FECAEADetRequest" : _details(1, 2, 3)}],
+        "SinMovimiento" : [7, 8, 9, 7],
+    }
+
+    result = await _closer(afip, tmp_path / "close.sqlite3").run(data)
+
+    response = result["response"]
+    assert [len(p["FeCAEARegInfReq"]["FeDetReq"]["FECAEADetRequest"]) for p in afip.reports] == [2, 1]
+    assert [(v["CbteDesde"], v["status"]) for v in response["vouchers"]] == [(1, REPORTED), (2, REJECTED), (3, REPORTED)]
+    assert sorted(afip.no_movement) == [7, 8, 9]
+    assert response["summary"] == {
+        "vouchers" : {REPORTED : 2, REJECTED : 1, PENDING : 0},
+        "sin_movimiento" : {REPORTED : 2, REJECTED : 1, PENDING : 0},
+    }
+
+
+@pytest.mark.asyncio
+async def test_unreachable_afip_leaves_the_rest_of_the_sequence_pending(tmp_path):
+    afip = FakeAfip(down_from=3)
+    data = {
+        "Auth" : {"Cuit" : CUIT},
+        "CAEA" : CAEA,
+        "Comprobantes" : [{"PtoVta" : 5, "CbteTipo" : 6, "FECAEADetRequest" : _details(1, 2, 3, 4, 5)}],
+    }
+
+    result = await _closer(afip, tmp_path / "close.sqlite3").run(data)
+
+    # The batch starting at 5 is not sent once the one starting at 3 failed.
+    assert len(afip.reports) == 2
+    assert [v["status"] for v in result["response"]["vouchers"]] == [REPORTED, REPORTED, PENDING, PENDING, PENDING]
+    assert result["response"]["vouchers"][4]["error"] == {"error_type" : "Network error"}
+
+
+@pytest.mark.asyncio
+async def test_unexpected_errors_use_the_usual_error_shape(tmp_path):
+    afip = FakeAfip()
+    afip.inform_no_movement = AsyncMock(side_effect=RuntimeError("boom"))
+    data = {"Auth" : {"Cuit" : CUIT}, "CAEA" : CAEA, "SinMovimiento" : [7]}
+
+    result = await _closer(afip, tmp_path / "close.sqlite3").run(data)
+
+    [record] = result["response"]["sin_movimiento"]
+    assert record["status"] == PENDING
+    assert record["error"] == {"method" : "FECAEASinMovimientoInformar", "error_type" : "Unexpected error", "details" : "boom"}
+
+
+@pytest.mark.asyncio
+async def test_afip_calls_are_bounded_by_concurrency(tmp_path):
+    afip = FakeAfip()
+    data = {"Auth" : {"Cuit" : CUIT}, "CAEA" : CAEA, "SinMovimiento" : list(range(1, 11))}
+
+    await _closer(afip, tmp_path / "close.sqlite3", concurrency=3).run(data)
+
+    assert len(afip.no_movement) == 10
+    assert afip.max_in_flight == 3
+
+
+@pytest.mark.asyncio
+async def test_a_close_run_again_only_sends_what_was_not_reported(tmp_path):
+    data = {
+        "Auth" : {"Cuit" : CUIT},
+        "CAEA" : CAEA,
+        "Comprobantes" : [{"PtoVta" : 5, "CbteTipo" : 6, "FECAEADetRequest" : _details(1, 2, 3, 4, 5)}],
+        "SinMovimiento" : [7],
+    }
+    await _closer(FakeAfip(down_from=3), tmp_path / "close.sqlite3").run(data)
+
+    # A new instance, as after a restart.
+    afip = FakeAfip()
+    result = await _closer(afip, tmp_path / "close.sqlite3").run(data)
+
+    sent = [d["CbteDesde"] for p in afip.reports for d in p["FeCAEARegInfReq"]["FeDetReq"]["FECAEADetRequest"]]
+    assert sent == [3, 4, 5]
+    assert afip.no_movement == []
+    assert [(v["CbteDesde"], v["status"]) for v in result["response"]["vouchers"]] == [(n, REPORTED) for n in range(1, 6)]
+    assert result["response"]["summary"]["sin_movimiento"] == {REPORTED : 1, REJECTED : 0, PENDING : 0}
+
+
+@pytest.mark.asyncio
+async def test_contingency_vouchers_are_skipped_once_reported_and_block_the_close_while_pending(tmp_path, monkeypatch):
+    data = {
+        "Auth" : {"Cuit" : CUIT},
+        "CAEA" : CAEA,
+        "Comprobantes" : [{"PtoVta" : 5, "CbteTipo" : 6, "FECAEADetRequest" : _details(1, 2)}],
+    }
+    afip = FakeAfip()
+    closer = _closer(afip, tmp_path / "close.sqlite3")
+
+    monkeypatch.setattr(contingency, "caea_vouchers", AsyncMock(return_value={(5, 6, 1) : REPORTED, (5, 6, 2) : PENDING}))
+    with pytest.raises(RuntimeError, match="1 contingency voucher"):
+        await closer.run(data)
+    assert afip.reports == []
+
+    monkeypatch.setattr(contingency, "caea_vouchers", AsyncMock(return_value={(5, 6, 1) : REPORTED, (5, 6, 2) : REPORTED}))
+    result = await closer.run(data)
+
+    assert afip.reports == []
+    assert result["response"]["summary"]["vouchers"] == {REPORTED : 2, REJECTED : 0, PENDING : 0}
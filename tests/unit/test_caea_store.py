@@ -0,0 +1,112 @@
+from datetime import date
+
+import pytest
+
+from service.utils.caea_store import (AFIP, LOCAL, CAEAStore, due_periods,
+                                      next_period, period_of)
+
+CUIT = "30740253022"
+
+
+def _granted(periodo: int, orden: int) -> dict:
+    return {"status" : "success", "response" : {
+        "ResultGet" : {"CAEA" : f"3604{periodo}{orden}", "Periodo" : periodo, "Orden" : orden,
+                       "FchVigDesde" : "20260201", "FchVigHasta" : "20260215", "FchTopeInf" : "20260223"},
+        "Errors" : None, "Events" : None,
+    }}
+
+
+def _refused() -> dict:
+    return {"status" : "success", "response" : {
+        "ResultGet" : None, "Errors" : {"Err" : [{"Code" : 15008, "Msg" : "CAEA ya otorgado"}]}, "Events" : None,
+    }}
+
+
+class FakeAfip:
+    def __init__(self, already_granted: set[str] = frozenset(), down: set[str] = frozenset()) -> None:
+        self.calls: list[tuple] = []
+        self.already_granted = already_granted
+        self.down = down
+
+    async def fetch(self, operation: str, cuit: str, periodo: int, orden: int) -> dict:
+        self.calls.append((operation, cuit, periodo, orden))
+        if cuit in self.down:
+            return {"status" : "error", "error" : {"error_type" : "Network error"}}
+        if operation == "FECAEASolicitar" and cuit in self.already_granted:
+            return _refused()
+        return _granted(periodo, orden)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CAEAStore(tmp_path / "caea.sqlite3", concurrency=2, days_ahead=5)
+    yield store
+    store.close()
+
+
+def test_period_math():
+    assert period_of(date(2026, 1, 15)) == (202601, 1)
+    assert period_of(date(2026, 1, 16)) == (202601, 2)
+    assert next_period(202601, 1) == (202601, 2)
+    assert next_period(202612, 2) == (202701, 1)
+
+
+def test_next_period_is_due_only_close_to_its_start():
+    assert due_periods(date(2026, 1, 5), 5) == [(202601, 1)]
+    assert due_periods(date(2026, 1, 11), 5) == [(202601, 1), (202601, 2)]
+    assert due_periods(date(2026, 12, 27), 5) == [(202612, 2), (202701, 1)]
+
+
+@pytest.mark.asyncio
+async def test_prefetch_obtains_and_stores_every_tenant(store):
+    afip = FakeAfip()
+    store.register(afip.fetch)
+
+    summary = await store.prefetch([CUIT, "20123456789"], today=date(2026, 1, 12))
+
+    assert summary == {"stored" : 0, "obtained" : 4, "failed" : 0}
+    result = await store.get(CUIT, 202601, 2)
+    assert result["response"]["ResultGet"]["CAEA"] == "36042026012"
+
+    # Second run finds everything locally.
+    again = await store.prefetch([CUIT, "20123456789"], today=date(2026, 1, 12))
+    assert again == {"stored" : 4, "obtained" : 0, "failed" : 0}
+    assert len(afip.calls) == 4
+
+
+@pytest.mark.asyncio
+async def test_already_granted_caea_is_consulted(store):
+    afip = FakeAfip(already_granted={CUIT})
+    store.register(afip.fetch)
+
+    result, source = await store.obtain(CUIT, 202601, 1)
+
+    assert source == AFIP
+    assert result["response"]["ResultGet"]["CAEA"] == "36042026011"
+    assert [call[0] for call in afip.calls] == ["FECAEASolicitar", "FECAEAConsultar"]
+
+
+@pytest.mark.asyncio
+async def test_failures_are_reported_and_not_stored(store):
+    afip = FakeAfip(down={CUIT})
+    store.register(afip.fetch)
+
+    summary = await store.prefetch([CUIT], today=date(2026, 1, 5))
+
+    assert summary == {"stored" : 0, "obtained" : 0, "failed" : 1}
+    assert await store.get(CUIT, 202601, 1) is None
+
+
+@pytest.mark.asyncio
+async def test_stored_caea_survives_a_restart(tmp_path):
+    path = tmp_path / "caea.sqlite3"
+    first = CAEAStore(path)
+    await first.record(CUIT, _granted(202601, 1))
+    first.close()
+
+    second = CAEAStore(path)
+    result, source = await second.obtain(CUIT, 202601, 1)
+    second.close()
+
+    assert source == LOCAL
+    assert result["response"]["ResultGet"]["CAEA"] == "36042026011"
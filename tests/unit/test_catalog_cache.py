@@ -0,0 +1,168 @@
+import asyncio
+import dataclasses
+from unittest.mock import AsyncMock
+
+import pytest
+
+from service.utils.catalog_cache import (BYPASS, HIT, MISS, STALE,
+                                         CatalogCache, wants_fresh)
+
+CUIT = "30740253022"
+OTHER_CUIT = "20304050607"
+
+SUCCESS = {"status" : "success", "response" : {"ResultGet" : {"IvaTipo" : [{"Id" : 5}]}, "Errors" : None}}
+AFIP_ERROR = {"status" : "success", "response" : {"ResultGet" : None, "Errors" : {"Err" : [{"Code" : 600}]}}}
+NETWORK_ERROR = {"status" : "error", "error" : {"error_type" : "Network error"}}
+
+
+def _age_entries(cache: CatalogCache, seconds: float) -> None:
+    for key, entry in cache._entries.items():
+        cache._entries[key] = dataclasses.replace(entry, fetched_at=entry.fetched_at - seconds)
+
+
+@pytest.fixture
+def cache() -> CatalogCache:
+    return CatalogCache(operation_ttl={"FEParamGetTiposIva" : 100, "FEParamGetPtosVenta" : 10}, stale_seconds=1000)
+
+
+@pytest.mark.asyncio
+async def test_second_call_is_served_from_cache(cache):
+    fetch = AsyncMock(return_value=SUCCESS)
+
+    assert await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch) == (SUCCESS, MISS)
+    assert await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch) == (SUCCESS, HIT)
+    assert fetch.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_global_catalog_shared_across_tenants_but_tenant_catalog_is_not(cache):
+    fetch = AsyncMock(return_value=SUCCESS)
+
+    await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch)
+    assert (await cache.get_or_fetch("FEParamGetTiposIva", OTHER_CUIT, {}, fetch))[1] == HIT
+
+    await cache.get_or_fetch("FEParamGetPtosVenta", CUIT, {}, fetch)
+    assert (await cache.get_or_fetch("FEParamGetPtosVenta", OTHER_CUIT, {}, fetch))[1] == MISS
+
+
+@pytest.mark.asyncio
+async def test_request_parameters_are_part_of_the_key(cache):
+    fetch = AsyncMock(return_value=SUCCESS)
+
+    await cache.get_or_fetch("FEParamGetCondicionIvaReceptor", CUIT, {"ClaseCmp" : "A"}, fetch)
+
+    assert (await cache.get_or_fetch("FEParamGetCondicionIvaReceptor", CUIT, {"ClaseCmp" : "B"}, fetch))[1] == MISS
+
+
+@pytest.mark.asyncio
+async def test_expired_entry_is_served_stale_and_refreshed_in_background(cache):
+    refreshed = {**SUCCESS, "response" : {"ResultGet" : {"IvaTipo" : [{"Id" : 6}]}, "Errors" : None}}
+    fetch = AsyncMock(side_effect=[SUCCESS, refreshed])
+
+    await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch)
+    _age_entries(cache, 150)
+
+    assert await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch) == (SUCCESS, STALE)
+
+    await asyncio.gather(*cache._refreshes)
+    assert await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch) == (refreshed, HIT)
+    assert fetch.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_background_refresh_keeps_stale_entry(cache):
+    fetch = AsyncMock(side_effect=[SUCCESS, NETWORK_ERROR])
+
+    await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch)
+    _age_entries(cache, 150)
+    await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch)
+    await asyncio.gather(*cache._refreshes)
+
+    assert await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch) == (SUCCESS, STALE)
+
+
+@pytest.mark.asyncio
+async def test_entry_past_stale_window_is_fetched_again(cache):
+    fetch = AsyncMock(return_value=SUCCESS)
+
+    await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch)
+    _age_entries(cache, 100 + 1000)
+
+    assert (await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch))[1] == MISS
+    assert fetch.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_entries_past_stale_window_are_purged(cache):
+    fetch = AsyncMock(return_value=SUCCESS)
+
+    await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch)
+    await cache.get_or_fetch("FEParamGetPtosVenta", CUIT, {}, fetch)
+    _age_entries(cache, 10 + 1000)
+
+    assert await cache.purge() == 1
+    assert cache.stats()["entries"] == 1
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_entry_is_evicted():
+    cache = CatalogCache(operation_ttl={"FEParamGetPtosVenta" : 100}, stale_seconds=1000, max_entries=2)
+    fetch = AsyncMock(return_value=SUCCESS)
+
+    await cache.get_or_fetch("FEParamGetPtosVenta", CUIT, {}, fetch)
+    await cache.get_or_fetch("FEParamGetPtosVenta", OTHER_CUIT, {}, fetch)
+    await cache.get_or_fetch("FEParamGetPtosVenta", CUIT, {}, fetch)
+    await cache.get_or_fetch("FEParamGetPtosVenta", "27123456789", {}, fetch)
+
+    assert cache.stats()["entries"] == 2
+    assert (await cache.get_or_fetch("FEParamGetPtosVenta", CUIT, {}, fetch))[1] == HIT
+    assert (await cache.get_or_fetch("FEParamGetPtosVenta", OTHER_CUIT, {}, fetch))[1] == MISS
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("result", [AFIP_ERROR, NETWORK_ERROR])
+async def test_errors_are_not_cached(cache, result):
+    fetch = AsyncMock(return_value=result)
+
+    await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch)
+
+    assert (await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch))[1] == MISS
+
+
+@pytest.mark.asyncio
+async def test_bypass_queries_afip_and_refreshes_the_entry(cache):
+    fetch = AsyncMock(return_value=SUCCESS)
+
+    await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch)
+
+    assert (await cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch, bypass=True))[1] == BYPASS
+    assert fetch.await_count == 2
+    assert cache.stats() == {"entries" : 1, "hit" : 0, "stale" : 0, "miss" : 1, "bypass" : 1}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_afip_call(cache):
+    release = asyncio.Event()
+
+    async def slow_fetch():
+        await release.wait()
+        return SUCCESS
+
+    fetch = AsyncMock(side_effect=slow_fetch)
+    callers = [asyncio.create_task(cache.get_or_fetch("FEParamGetTiposIva", CUIT, {}, fetch)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert [result for result, _ in await asyncio.gather(*callers)] == [SUCCESS] * 5
+    assert fetch.await_count == 1
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("max-age=0", False),
+    ("no-cache", True),
+    ("No-Store", True),
+    ("max-age=0, no-cache", True),
+])
+def test_wants_fresh(header, expected):
+    assert wants_fresh(header) is expected
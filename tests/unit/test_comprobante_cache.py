@@ -0,0 +1,172 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from service.utils.comprobante_cache import (ComprobanteCache,
+                                             authorized_from_fecae,
+                                             fecae_from_consults)
+
+AUTHORIZED = {
+    "status" : "success",
+    "response" : {
+        "ResultGet" : {"CbteDesde" : 100, "CbteHasta" : 100, "ImpTotal" : 121.0, "Resultado" : "A",
+                       "CodAutorizacion" : "76043123456789", "PtoVta" : 1, "CbteTipo" : 6},
+        "Errors" : None,
+        "Events" : None,
+    },
+}
+
+NOT_FOUND = {
+    "status" : "success",
+    "response" : {"ResultGet" : None, "Errors" : {"Err" : [{"Code" : 602, "Msg" : "No existen datos"}]}, "Events" : None},
+}
+
+NETWORK_ERROR = {"status" : "error", "error" : {"error_type" : "HTTP Error"}}
+
+
+def _fecae(cbte_nro: int, resultado: str = "A") -> tuple[dict, dict]:
+    request = {
+        "Auth" : {"Token" : "t", "Sign" : "s", "Cuit" : 30740253022},
+        "FeCAEReq" : {
+            "FeCabReq" : {"CantReg" : 1, "PtoVta" : 1, "CbteTipo" : 6},
+            "FeDetReq" : {"FECAEDetRequest" : [{"Concepto" : 1, "DocTipo" : 80, "DocNro" : 20111111112,
+                                                "CbteDesde" : cbte_nro, "CbteHasta" : cbte_nro, "CbteFch" : "20260125",
+                                                "ImpTotal" : 121.0, "MonId" : "PES", "MonCotiz" : 1.0}]},
+        },
+    }
+    result = {
+        "status" : "success",
+        "response" : {
+            "FeCabResp" : {"Cuit" : 30740253022, "PtoVta" : 1, "CbteTipo" : 6, "FchProceso" : "20260125123045",
+                           "CantReg" : 1, "Resultado" : resultado, "Reproceso" : "N"},
+            "FeDetResp" : {"FECAEDetResponse" : [{"CbteDesde" : cbte_nro, "CbteHasta" : cbte_nro, "CbteFch" : "20260125",
+                                                  "Resultado" : resultado, "Observaciones" : None,
+                                                  "CAE" : "76043123456789" if resultado == "A" else None,
+                                                  "CAEFchVto" : "20260204" if resultado == "A" else None}]},
+            "Events" : None,
+            "Errors" : None,
+        },
+    }
+    return request, result
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ComprobanteCache(path=tmp_path / "comprobantes.sqlite3", max_entries=100, negative_ttl=30)
+    yield cache
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_authorized_voucher_is_cached(cache):
+    fetch = AsyncMock(return_value=AUTHORIZED)
+
+    first, first_status = await cache.get_or_fetch("30740253022", 6, 1, 100, fetch)
+    second, second_status = await cache.get_or_fetch("30740253022", 6, 1, 100, fetch)
+
+    assert (first_status, second_status) == ("MISS", "HIT")
+    assert second == first == AUTHORIZED
+    assert fetch.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_authorized_voucher_survives_a_restart(tmp_path, cache):
+    await cache.get_or_fetch("30740253022", 6, 1, 100, AsyncMock(return_value=AUTHORIZED))
+    cache.close()
+
+    restarted = ComprobanteCache(path=tmp_path / "comprobantes.sqlite3")
+    fetch = AsyncMock()
+    result, status = await restarted.get_or_fetch("30740253022", 6, 1, 100, fetch)
+    restarted.close()
+
+    assert status == "HIT"
+    assert result == AUTHORIZED
+    fetch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_not_found_is_cached_briefly(cache):
+    fetch = AsyncMock(return_value=NOT_FOUND)
+
+    await cache.get_or_fetch("30740253022", 6, 1, 101, fetch)
+    _, status = await cache.get_or_fetch("30740253022", 6, 1, 101, fetch)
+    assert status == "HIT"
+
+    key = cache.make_key("30740253022", 6, 1, 101)
+    result, stored_at = cache._negative[key]
+    cache._negative[key] = (result, stored_at - 31)
+
+    _, status = await cache.get_or_fetch("30740253022", 6, 1, 101, fetch)
+    assert status == "MISS"
+    assert fetch.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_are_not_cached(cache):
+    fetch = AsyncMock(return_value=NETWORK_ERROR)
+
+    await cache.get_or_fetch("30740253022", 6, 1, 100, fetch)
+    await cache.get_or_fetch("30740253022", 6, 1, 100, fetch)
+
+    assert fetch.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_bypass_queries_afip(cache):
+    fetch = AsyncMock(return_value=AUTHORIZED)
+
+    await cache.get_or_fetch("30740253022", 6, 1, 100, fetch)
+    _, status = await cache.get_or_fetch("30740253022", 6, 1, 100, fetch, bypass=True)
+
+    assert status == "BYPASS"
+    assert fetch.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_fecae_result_populates_the_cache_and_replaces_not_found(cache):
+    await cache.get_or_fetch("30740253022", 6, 1, 102, AsyncMock(return_value=NOT_FOUND))
+
+    request, result = _fecae(102)
+    assert await cache.store_fecae_result(request, result) == 1
+
+    fetch = AsyncMock()
+    cached, status = await cache.get_or_fetch("30740253022", 6, 1, 102, fetch)
+
+    assert status == "HIT"
+    fetch.assert_not_awaited()
+    result_get = cached["response"]["ResultGet"]
+    assert result_get["CodAutorizacion"] == "76043123456789"
+    assert result_get["FchVto"] == "20260204"
+    assert result_get["EmisionTipo"] == "CAE"
+    assert result_get["ImpTotal"] == 121.0
+    assert (result_get["PtoVta"], result_get["CbteTipo"], result_get["CbteDesde"]) == (1, 6, 102)
+    assert result_get["Tributos"] is None
+
+
+def test_rejected_vouchers_are_not_taken_from_fecae():
+    assert authorized_from_fecae(*_fecae(103, resultado="R")) == []
+
+
+def test_fecae_result_is_rebuilt_from_consults_of_processed_vouchers():
+    request, original = _fecae(102)
+    stored = authorized_from_fecae(request, original)[0][3]
+
+    rebuilt = fecae_from_consults(request, [stored])
+
+    detail = rebuilt["response"]["FeDetResp"]["FECAEDetResponse"][0]
+    assert (detail["CbteDesde"], detail["Resultado"], detail["CAE"], detail["CAEFchVto"]) == (102, "A", "76043123456789", "20260204")
+    assert rebuilt["response"]["FeCabResp"]["Resultado"] == "A"
+    assert fecae_from_consults(request, [NOT_FOUND]) is None
+
+
+@pytest.mark.asyncio
+async def test_memory_is_bounded_but_disk_keeps_everything(tmp_path):
+    cache = ComprobanteCache(path=tmp_path / "comprobantes.sqlite3", max_entries=2)
+
+    for cbte_nro in (1, 2, 3):
+        await cache.get_or_fetch("30740253022", 6, 1, cbte_nro, AsyncMock(return_value=AUTHORIZED))
+
+    assert len(cache._entries) == 2
+    _, status = await cache.get_or_fetch("30740253022", 6, 1, 1, AsyncMock())
+    assert status == "HIT"
+    cache.close()
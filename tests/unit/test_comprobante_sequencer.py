@@ -0,0 +1,119 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from service.utils.comprobante_sequencer import ComprobanteSequencer
+
+CUIT = 30740253022
+
+
+def _last_authorized(cbte_nro: int) -> dict:
+    return {"status" : "success", "response" : {"PtoVta" : 1, "CbteTipo" : 6, "CbteNro" : cbte_nro, "Errors" : None, "Events" : None}}
+
+
+def _fecae(desde: int, hasta: int, resultado: str = "A", obs_code: int | None = None) -> tuple[dict, dict]:
+    request = {"Auth" : {"Cuit" : CUIT}, "FeCAEReq" : {"FeCabReq" : {"CantReg" : 1, "PtoVta" : 1, "CbteTipo" : 6}}}
+    observaciones = {"Obs" : [{"Code" : obs_code, "Msg" : "..."}]} if obs_code else None
+    result = {
+        "status" : "success",
+        "response" : {
+            "FeCabResp" : {"PtoVta" : 1, "CbteTipo" : 6, "Resultado" : resultado},
+            "FeDetResp" : {"FECAEDetResponse" : [
+                {"CbteDesde" : desde, "CbteHasta" : hasta, "Resultado" : resultado, "Observaciones" : observaciones},
+            ]},
+            "Errors" : None,
+        },
+    }
+    return request, result
+
+
+@pytest.fixture
+def sequencer() -> ComprobanteSequencer:
+    return ComprobanteSequencer()
+
+
+@pytest.mark.asyncio
+async def test_sequence_is_seeded_once(sequencer):
+    seed = AsyncMock(return_value=_last_authorized(41))
+
+    first, first_source = await sequencer.next_number(CUIT, 1, 6, seed)
+    second, second_source = await sequencer.next_number(CUIT, 1, 6, seed)
+
+    assert (first_source, second_source) == ("afip", "local")
+    assert first["response"]["NextCbteNro"] == second["response"]["NextCbteNro"] == 42
+    assert second["response"]["LastCbteNro"] == 41
+    seed.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_sequences_are_independent(sequencer):
+    await sequencer.next_number(CUIT, 1, 6, AsyncMock(return_value=_last_authorized(41)))
+    seed = AsyncMock(return_value=_last_authorized(7))
+
+    result, source = await sequencer.next_number(CUIT, 2, 6, seed)
+
+    assert source == "afip"
+    assert result["response"]["NextCbteNro"] == 8
+
+
+@pytest.mark.asyncio
+async def test_authorized_invoices_advance_the_sequence(sequencer):
+    seed = AsyncMock(return_value=_last_authorized(41))
+    await sequencer.next_number(CUIT, 1, 6, seed)
+
+    sequencer.record_fecae(*_fecae(42, 44))
+    result, source = await sequencer.next_number(CUIT, 1, 6, seed)
+
+    assert source == "local"
+    assert result["response"]["NextCbteNro"] == 45
+    seed.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_rejected_invoices_do_not_advance_the_sequence(sequencer):
+    await sequencer.next_number(CUIT, 1, 6, AsyncMock(return_value=_last_authorized(41)))
+
+    sequencer.record_fecae(*_fecae(42, 42, resultado="R"))
+    result, _ = await sequencer.next_number(CUIT, 1, 6, AsyncMock())
+
+    assert result["response"]["NextCbteNro"] == 42
+
+
+@pytest.mark.asyncio
+async def test_sequence_mismatch_triggers_a_resync(sequencer):
+    await sequencer.next_number(CUIT, 1, 6, AsyncMock(return_value=_last_authorized(41)))
+
+    sequencer.record_fecae(*_fecae(42, 42, resultado="R", obs_code=10016))
+    seed = AsyncMock(return_value=_last_authorized(50))
+    result, source = await sequencer.next_number(CUIT, 1, 6, seed)
+
+    assert source == "afip"
+    assert result["response"]["NextCbteNro"] == 51
+    assert sequencer.stats()["resyncs"] == 1
+
+
+@pytest.mark.asyncio
+async def test_seed_errors_are_returned_and_not_remembered(sequencer):
+    error = {"status" : "error", "error" : {"error_type" : "HTTP Error"}}
+    seed = AsyncMock(side_effect=[error, _last_authorized(41)])
+
+    result, source = await sequencer.next_number(CUIT, 1, 6, seed)
+    assert (result, source) == (error, "afip")
+
+    result, source = await sequencer.next_number(CUIT, 1, 6, seed)
+    assert result["response"]["NextCbteNro"] == 42
+
+
+@pytest.mark.asyncio
+async def test_last_authorized_answers_reset_the_sequence(sequencer):
+    await sequencer.next_number(CUIT, 1, 6, AsyncMock(return_value=_last_authorized(41)))
+
+    sequencer.record_last_authorized(str(CUIT), 1, 6, _last_authorized(60))
+    result, _ = await sequencer.next_number(CUIT, 1, 6, AsyncMock())
+
+    assert result["response"]["NextCbteNro"] == 61
+
+
+def test_one_numbering_lock_per_sequence(sequencer):
+    assert sequencer.lock(CUIT, 1, 6) is sequencer.lock(str(CUIT), "1", "6")
+    assert sequencer.lock(CUIT, 1, 6) is not sequencer.lock(CUIT, 2, 6)
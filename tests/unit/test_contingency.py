@@ -0,0 +1,189 @@
+from datetime import date
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+
+from service.utils.caea_store import caea_store
+from service.utils.comprobante_sequencer import comprobante_sequencer
+from service.utils.contingency import (PENDING, REJECTED, REPORTED,
+                                       ContingencyManager, report_outcomes)
+from service.utils.wsfe_health import WSFEHealth
+
+CUIT = "30740253022"
+CAEA = "36043123456789"
+
+
+def _invoice(imp_total: float = 121.0) -> dict:
+    return {
+        "Auth" : {"Cuit" : int(CUIT)},
+        "FeCAEReq" : {
+            "FeCabReq" : {"CantReg" : 1, "PtoVta" : 1, "CbteTipo" : 6},
+            "FeDetReq" : {"FECAEDetRequest" : [{"CbteDesde" : 0, "CbteHasta" : 0, "CbteFch" : "20260205", "ImpTotal" : imp_total}]},
+        },
+    }
+
+
+class FakeAfip:
+    def __init__(self, healthy: bool = True, reject: set[int] = frozenset(), down: bool = False, last: int = 0) -> None:
+        self.reports: list[dict] = []
+        self.seeds: list[dict] = []
+        self.healthy = healthy
+        self.reject = reject
+        self.down = down
+        self.last = last
+
+    async def report(self, payload: dict) -> dict:
+        self.reports.append(payload)
+        if self.down:
+            return {"status" : "error", "error" : {"error_type" : "Network error"}}
+        details = payload["FeCAEARegInfReq"]["FeDetReq"]["FECAEADetRequest"]
+        return {"status" : "success", "response" : {"FeCabResp" : {}, "FeDetResp" : {"FECAEADetResponse" : [
+            {"CbteDesde" : d["CbteDesde"], "Resultado" : "R" if d["CbteDesde"] in self.reject else "A"} for d in details
+        ]}, "Errors" : None}}
+
+    async def probe(self) -> bool:
+        return self.healthy
+
+    async def last_authorized(self, payload: dict) -> dict:
+        self.seeds.append(payload)
+        return {"status" : "success", "response" : {"PtoVta" : payload["PtoVta"], "CbteTipo" : payload["CbteTipo"], "CbteNro" : self.last, "Errors" : None}}
+
+
+@pytest_asyncio.fixture
+async def manager(tmp_path):
+    health = WSFEHealth(window_seconds=60, min_samples=1, error_rate=0.5, latency_seconds=5.0)
+    manager = ContingencyManager(tmp_path / "contingency.sqlite3", enabled=True, pto_vta=5, batch_size=2, health=health, cbte_tipos=[6])
+    await caea_store.record(CUIT, {"status" : "success", "response" : {"ResultGet" : {"CAEA" : CAEA, "Periodo" : 202602, "Orden" : 1}}})
+    comprobante_sequencer.clear()
+    comprobante_sequencer.advance(CUIT, 5, 6, 41)
+    yield manager
+    manager.close()
+    comprobante_sequencer.clear()
+
+
+@pytest.fixture(autouse=True)
+def current_period():
+    with patch("service.utils.caea_store.afip_today", return_value=date(2026, 2, 5)):
+        yield
+
+
+def _degrade(manager: ContingencyManager) -> None:
+    manager._health.record(0.1, False)
+
+
+@pytest.mark.asyncio
+async def test_only_active_while_degraded(manager):
+    assert not manager.active()
+    _degrade(manager)
+    assert manager.active()
+
+
+@pytest.mark.asyncio
+async def test_vouchers_are_numbered_on_the_caea_point_of_sale(manager):
+    first = await manager.issue(_invoice())
+    second = await manager.issue(_invoice())
+
+    details = [result["response"]["FeDetResp"]["FECAEDetResponse"][0] for result in (first, second)]
+    assert [detail["CbteDesde"] for detail in details] == [42, 43]
+    assert {detail["CAEA"] for detail in details} == {CAEA}
+    assert first["response"]["FeCabResp"]["PtoVta"] == 5
+    assert comprobante_sequencer.last_known(CUIT, 5, 6) == 43
+    assert (await manager.stats())["vouchers"][PENDING] == 2
+
+
+@pytest.mark.asyncio
+async def test_vouchers_without_caea_or_known_number_are_not_eligible(manager):
+    comprobante_sequencer.clear()
+    assert await manager.issue(_invoice()) is None
+
+    other = _invoice()
+    other["Auth"]["Cuit"] = 20123456789
+    assert await manager.issue(other) is None
+    assert manager._counters["not_eligible"] == 2
+
+
+@pytest.mark.asyncio
+async def test_recovery_reports_pending_vouchers_in_batches(manager):
+    afip = FakeAfip(reject={44})
+    manager.register(afip.report, afip.probe, afip.last_authorized)
+    _degrade(manager)
+    for _ in range(3):
+        await manager.issue(_invoice())
+
+    await manager.tick()
+
+    assert not manager.active()
+    assert [len(p["FeCAEARegInfReq"]["FeDetReq"]["FECAEADetRequest"]) for p in afip.reports] == [2, 1]
+    assert afip.reports[0]["FeCAEARegInfReq"]["FeCabReq"] == {"CantReg" : 2, "PtoVta" : 5, "CbteTipo" : 6}
+    counts = (await manager.stats())["vouchers"]
+    assert counts == {PENDING : 0, REPORTED : 2, REJECTED : 1}
+
+
+@pytest.mark.asyncio
+async def test_nothing_is_reported_while_the_probe_fails(manager):
+    afip = FakeAfip(healthy=False)
+    manager.register(afip.report, afip.probe, afip.last_authorized)
+    _degrade(manager)
+    await manager.issue(_invoice())
+
+    await manager.tick()
+
+    assert manager.active()
+    assert afip.reports == []
+
+
+@pytest.mark.asyncio
+async def test_unreachable_afip_keeps_vouchers_pending(manager):
+    afip = FakeAfip(down=True)
+    manager.register(afip.report, afip.probe, afip.last_authorized)
+    _degrade(manager)
+    await manager.issue(_invoice())
+    await manager.issue(_invoice())
+    await manager.issue(_invoice())
+
+    summary = await manager.report_pending()
+
+    assert summary == {REPORTED : 0, REJECTED : 0, PENDING : 3}
+    assert len(afip.reports) == 1
+
+
+def test_enabled_without_a_caea_point_of_sale_is_refused(tmp_path):
+    with pytest.raises(ValueError, match="CONTINGENCY_PTO_VTA"):
+        ContingencyManager(tmp_path / "contingency.sqlite3", enabled=True, pto_vta=0)
+
+
+@pytest.mark.asyncio
+async def test_seeded_last_number_survives_a_restart(tmp_path, manager):
+    afip = FakeAfip(last=70)
+    manager.register(afip.report, afip.probe, afip.last_authorized)
+    comprobante_sequencer.clear()
+
+    assert await manager.seed([CUIT]) == {"seeded" : 1, "failed" : 0}
+    assert [(seed["PtoVta"], seed["CbteTipo"]) for seed in afip.seeds] == [(5, 6)]
+    manager.close()
+
+    comprobante_sequencer.clear()
+    restarted = ContingencyManager(tmp_path / "contingency.sqlite3", enabled=True, pto_vta=5, cbte_tipos=[6], health=manager._health)
+    try:
+        issued = await restarted.issue(_invoice())
+    finally:
+        restarted.close()
+
+    assert issued["response"]["FeDetResp"]["FECAEDetResponse"][0]["CbteDesde"] == 71
+
+
+@pytest.mark.asyncio
+async def test_nothing_is_seeded_while_degraded(manager):
+    afip = FakeAfip(last=70)
+    manager.register(afip.report, afip.probe, afip.last_authorized)
+    _degrade(manager)
+
+    assert await manager.seed([CUIT]) == {"seeded" : 0, "failed" : 0}
+    assert afip.seeds == []
+
+
+def test_request_level_rejection_rejects_every_voucher():
+    result = {"status" : "success", "response" : {"FeDetResp" : None, "Errors" : {"Err" : [{"Code" : 10000}]}}}
+    assert report_outcomes(result, 3) == [REJECTED] * 3
+    assert report_outcomes({"status" : "error"}, 3) is None
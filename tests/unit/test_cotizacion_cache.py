@@ -0,0 +1,164 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from service.utils.cotizacion_cache import LATEST, CotizacionCache
+
+
+def _quote(mon_id: str, rate: float, rate_date: str) -> dict:
+    return {
+        "status" : "success",
+        "response" : {"ResultGet" : {"MonId" : mon_id, "MonCotiz" : rate, "FchCotiz" : rate_date}, "Errors" : None, "Events" : None},
+    }
+
+
+USD_MONDAY = _quote("DOL", 1045.5, "20260126")
+USD_TUESDAY = _quote("DOL", 1050.25, "20260127")
+CUIT = "30740253022"
+AFIP_ERROR = {"status" : "success", "response" : {"ResultGet" : None, "Errors" : {"Err" : [{"Code" : 602}]}}}
+
+
+def _age(cache: CotizacionCache, seconds: float, latest_only: bool = False) -> None:
+    for key, entry in cache._entries.items():
+        if not latest_only or key[2] == LATEST:
+            entry.fetched_monotonic -= seconds
+
+
+@pytest.fixture
+def cache() -> CotizacionCache:
+    return CotizacionCache(ttl_seconds=900, max_entries=100, track_seconds=3600)
+
+
+@pytest.mark.asyncio
+async def test_latest_quote_is_cached_with_freshness(cache):
+    fetch = AsyncMock(return_value=USD_MONDAY)
+    cache.register(fetch)
+
+    first = await cache.get_or_fetch(CUIT, "DOL", None)
+    second = await cache.get_or_fetch(CUIT, "DOL", None)
+
+    assert fetch.await_count == 1
+    assert first["response"] == second["response"] == USD_MONDAY["response"]
+    assert first["freshness"]["cached"] is False
+    assert second["freshness"]["cached"] is True
+    assert second["freshness"]["rate_date"] == "20260126"
+    assert second["freshness"]["fetched_at"] is not None
+
+
+@pytest.mark.asyncio
+async def test_latest_quote_expires_after_ttl(cache):
+    fetch = AsyncMock(side_effect=[USD_MONDAY, USD_TUESDAY])
+    cache.register(fetch)
+
+    await cache.get_or_fetch(CUIT, "DOL", None)
+    _age(cache, 901)
+    result = await cache.get_or_fetch(CUIT, "DOL", None)
+
+    assert fetch.await_count == 2
+    assert result["freshness"]["rate_date"] == "20260127"
+
+
+@pytest.mark.asyncio
+async def test_latest_quote_also_answers_its_rate_date_and_never_expires(cache):
+    fetch = AsyncMock(return_value=USD_MONDAY)
+    cache.register(fetch)
+
+    await cache.get_or_fetch(CUIT, "DOL", None)
+    _age(cache, 10 * 86400)
+    result = await cache.get_or_fetch(CUIT, "DOL", "20260126")
+
+    assert fetch.await_count == 1
+    assert result["freshness"]["cached"] is True
+
+
+@pytest.mark.asyncio
+async def test_errors_are_not_cached(cache):
+    fetch = AsyncMock(return_value=AFIP_ERROR)
+    cache.register(fetch)
+
+    first = await cache.get_or_fetch(CUIT, "DOL", "20990101")
+    await cache.get_or_fetch(CUIT, "DOL", "20990101")
+
+    assert fetch.await_count == 2
+    assert first["freshness"] == {"cached" : False, "fetched_at" : None, "age_seconds" : None, "rate_date" : None}
+
+
+@pytest.mark.asyncio
+async def test_bypass_queries_afip(cache):
+    fetch = AsyncMock(return_value=USD_MONDAY)
+    cache.register(fetch)
+
+    await cache.get_or_fetch(CUIT, "DOL", None)
+    result = await cache.get_or_fetch(CUIT, "DOL", None, bypass=True)
+
+    assert fetch.await_count == 2
+    assert result["freshness"]["cached"] is False
+
+
+@pytest.mark.asyncio
+async def test_scheduled_refresh_picks_up_new_rate_date(cache):
+    request_fetch = AsyncMock(return_value=USD_MONDAY)
+    cache.register(request_fetch)
+    await cache.get_or_fetch(CUIT, "DOL", None)
+
+    request_fetch.return_value = USD_TUESDAY
+    assert await cache.refresh_latest() == {"refreshed" : 1, "failed" : 0}
+
+    result = await cache.get_or_fetch(CUIT, "DOL", None)
+    assert result["freshness"]["cached"] is True
+    assert result["freshness"]["rate_date"] == "20260127"
+    assert (await cache.get_or_fetch(CUIT, "DOL", "20260126"))["response"] == USD_MONDAY["response"]
+    assert request_fetch.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_scheduled_refresh_skips_currencies_nobody_asked_for(cache):
+    fetch = AsyncMock(return_value=USD_MONDAY)
+    cache.register(fetch)
+    await cache.get_or_fetch(CUIT, "DOL", None)
+
+    for entry in cache._entries.values():
+        entry.last_access -= 3601
+
+    assert await cache.refresh_latest() == {"refreshed" : 0, "failed" : 0}
+    assert fetch.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_quotes_are_evicted():
+    cache = CotizacionCache(ttl_seconds=900, max_entries=2, track_seconds=3600)
+
+    cache.register(AsyncMock(side_effect=lambda cuit, mon_id, day: _quote(mon_id, 1000.0, day)))
+
+    for day in ("20260120", "20260121", "20260122"):
+        await cache.get_or_fetch(CUIT, "DOL", day)
+
+    assert [key[2] for key in cache._entries] == ["20260121", "20260122"]
+
+
+@pytest.mark.asyncio
+async def test_quote_of_another_date_than_requested_expires_after_ttl(cache):
+    # No quote is published on Sunday: AFIP answers with Friday's.
+    fetch = AsyncMock(return_value=_quote("DOL", 1040.0, "20260123"))
+    cache.register(fetch)
+
+    await cache.get_or_fetch(CUIT, "DOL", "20260125")
+    await cache.get_or_fetch(CUIT, "DOL", "20260125")
+    assert fetch.await_count == 1
+
+    _age(cache, 901)
+    await cache.get_or_fetch(CUIT, "DOL", "20260125")
+
+    assert fetch.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_scheduled_refresh_fetches_for_the_cuit_of_the_last_request(cache):
+    fetch = AsyncMock(return_value=USD_MONDAY)
+    cache.register(fetch)
+    await cache.get_or_fetch(CUIT, "DOL", None)
+    await cache.get_or_fetch("20111111112", "DOL", None, bypass=True)
+
+    await cache.refresh_latest()
+
+    assert fetch.await_args.args == ("20111111112", "DOL", None)
@@ -1,6 +1,11 @@
-from service.crypto.sign import sign_login_ticket_request
+import base64
 
-from ..conftest import generate_test_files
+from cryptography.hazmat.primitives.serialization import pkcs7
+
+from service.crypto.sign import (sign_login_ticket_request,
+                                 sign_with_key_material)
+
+from ..conftest import generate_test_files, generate_test_key_material
 
 
 def test_sign_login_ticket_request():
@@ -9,3 +14,13 @@ def test_sign_login_ticket_request():
     b64_cms = sign_login_ticket_request(login_ticket_request_bytes, private_key_bytes, certificate_bytes)
 
     assert len(b64_cms) > 0
+
+
+def test_sign_with_key_material():
+
+    login_ticket_request_bytes, _, _ = generate_test_files()
+    private_key, certificate = generate_test_key_material()
+    b64_cms = sign_with_key_material(login_ticket_request_bytes, private_key, certificate)
+
+    signers = pkcs7.load_der_pkcs7_certificates(base64.b64decode(b64_cms))
+    assert signers == [certificate]
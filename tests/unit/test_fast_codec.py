@@ -0,0 +1,236 @@
+import copy
+from types import SimpleNamespace
+
+import pytest
+from lxml import etree
+from zeep import Client
+from zeep.exceptions import Fault, TransportError
+from zeep.helpers import serialize_object
+
+from service.api.models.fecae_solicitar import FECAESolicitar
+from service.soap_client.fast_codec import decode_response, encode_request
+from service.soap_client.wsdl.wsdl_manager import get_wsfe_wsdl
+
+AUTH = {"Token" : "token+/=", "Sign" : "sign&<special>", "Cuit" : 30740253022}
+
+MINIMAL_INVOICE = {
+    "Auth" : {"Cuit" : 30740253022},
+    "FeCAEReq" : {
+        "FeCabReq" : {"CantReg" : 1, "PtoVta" : 1, "CbteTipo" : 11},
+        "FeDetReq" : {
+            "FECAEDetRequest" : [{
+                "Concepto" : 1, "DocTipo" : 99, "DocNro" : 0,
+                "CbteDesde" : 2, "CbteHasta" : 2, "CbteFch" : "20260125",
+                "ImpTotal" : 100.0, "ImpNeto" : 100.0, "ImpTotConc" : 0.0,
+                "ImpOpEx" : 0.0, "ImpTrib" : 0.0, "ImpIVA" : 0.0,
+                "MonId" : "PES", "MonCotiz" : 1, "CondicionIVAReceptorId" : 5,
+            }]
+        },
+    },
+}
+
+FULL_DETAIL = {
+    "Concepto" : 3, "DocTipo" : 80, "DocNro" : 20111111112,
+    "CbteDesde" : 15, "CbteHasta" : 15, "CbteFch" : "20260125",
+    "ImpTotal" : 1331.45, "ImpTotConc" : 0, "ImpNeto" : 1000.1,
+    "ImpOpEx" : 0, "ImpTrib" : 121.33, "ImpIVA" : 210.02,
+    "FchServDesde" : "20260101", "FchServHasta" : "20260131", "FchVtoPago" : "20260215",
+    "MonId" : "DOL", "MonCotiz" : 1045.5, "CanMisMonExt" : "N", "CondicionIVAReceptorId" : 1,
+    "CbtesAsoc" : {"CbteAsoc" : [{"Tipo" : 1, "PtoVta" : 2, "Nro" : 3, "Cuit" : "20111111112", "CbteFch" : "20260110"}]},
+    "Tributos" : {"Tributo" : [
+        {"Id" : 99, "Desc" : "Percepción <IIBB> & otros", "BaseImp" : 1000.1, "Alic" : 3, "Importe" : 30.0},
+        {"Id" : 2, "BaseImp" : 1000.1, "Alic" : 9.13, "Importe" : 91.33},
+    ]},
+    "Iva" : {"AlicIva" : [{"Id" : 5, "BaseImp" : 1000.1, "Importe" : 210.02}]},
+    "Opcionales" : {"Opcional" : [{"Id" : "27", "Valor" : "SCA\r\nline"}]},
+    "Compradores" : {"Comprador" : [
+        {"DocTipo" : 80, "DocNro" : 20111111112, "Porcentaje" : 50},
+        {"DocTipo" : 80, "DocNro" : 20222222223, "Porcentaje" : 50},
+    ]},
+    "PeriodoAsoc" : {"FchDesde" : "20260101", "FchHasta" : "20260131"},
+    "Actividades" : {"Actividad" : [{"Id" : 620100}]},
+}
+
+
+def _full_invoice(records: int) -> dict:
+    payload = copy.deepcopy(MINIMAL_INVOICE)
+    payload["FeCAEReq"]["FeCabReq"]["CantReg"] = records
+    payload["FeCAEReq"]["FeDetReq"]["FECAEDetRequest"] = [
+        {**FULL_DETAIL, "CbteDesde" : 15 + i, "CbteHasta" : 15 + i} for i in range(records)
+    ]
+    return payload
+
+
+def _validated(payload: dict) -> dict:
+    """Payload exactly as the route hands it to the SOAP layer."""
+    data = FECAESolicitar(**payload).model_dump(by_alias=True, exclude_none=True)
+    data["Auth"] = {**AUTH, **data["Auth"]}
+    return data
+
+
+def _canonical(xml: bytes) -> bytes:
+    return etree.tostring(etree.fromstring(xml), method="c14n")
+
+
+def _envelope(xml: str) -> bytes:
+    return (
+        '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">'
+        f'<soap:Body>{xml}</soap:Body></soap:Envelope>'
+    ).encode("utf-8")
+
+
+@pytest.fixture(scope="module")
+def zeep_client() -> Client:
+    return Client(get_wsfe_wsdl())
+
+
+def zeep_encode(client: Client, operation: str, payload: dict) -> bytes:
+    return etree.tostring(client.create_message(client.service, operation, **payload))
+
+
+def zeep_decode(client: Client, operation: str, status_code: int, content: bytes):
+    binding = client.service._binding
+    response = SimpleNamespace(status_code=status_code, content=content, headers={}, encoding="utf-8")
+    return serialize_object(binding.process_reply(client, binding.get(operation), response))
+
+
+# ===================
+# ===== ENCODE ======
+# ===================
+
+@pytest.mark.parametrize("payload", [
+    MINIMAL_INVOICE,
+    _full_invoice(1),
+    _full_invoice(5),
+], ids=["minimal", "full", "batch"])
+def test_fecae_solicitar_envelope_matches_zeep(zeep_client, payload):
+
+    data = _validated(payload)
+
+    assert _canonical(encode_request("FECAESolicitar", data)) == _canonical(zeep_encode(zeep_client, "FECAESolicitar", data))
+
+
+def test_fecomp_ultimo_autorizado_envelope_matches_zeep(zeep_client):
+
+    data = {"Auth" : AUTH, "PtoVta" : 4, "CbteTipo" : 6}
+
+    assert _canonical(encode_request("FECompUltimoAutorizado", data)) == _canonical(zeep_encode(zeep_client, "FECompUltimoAutorizado", data))
+
+
+# ===================
+# ===== DECODE ======
+# ===================
+
+APPROVED = _envelope("""
+<FECAESolicitarResponse xmlns="http://ar.gov.afip.dif.FEV1/">
+  <FECAESolicitarResult>
+    <FeCabResp>
+      <Cuit>30740253022</Cuit><PtoVta>1</PtoVta><CbteTipo>6</CbteTipo>
+      <FchProceso>20260125123045</FchProceso><CantReg>2</CantReg>
+      <Resultado>P</Resultado><Reproceso>N</Reproceso>
+    </FeCabResp>
+    <FeDetResp>
+      <FECAEDetResponse>
+        <Concepto>1</Concepto><DocTipo>99</DocTipo><DocNro>0</DocNro>
+        <CbteDesde>15</CbteDesde><CbteHasta>15</CbteHasta><CbteFch>20260125</CbteFch>
+        <Resultado>A</Resultado><CAE>76043123456789</CAE><CAEFchVto>20260204</CAEFchVto>
+      </FECAEDetResponse>
+      <FECAEDetResponse>
+        <Concepto>1</Concepto><DocTipo>99</DocTipo><DocNro>0</DocNro>
+        <CbteDesde>16</CbteDesde><CbteHasta>16</CbteHasta><CbteFch>20260125</CbteFch>
+        <Resultado>R</Resultado>
+        <Observaciones>
+          <Obs><Code>10016</Code><Msg>El numero o fecha del comprobante no se corresponde &amp; otros</Msg></Obs>
+          <Obs><Code>10048</Code><Msg/></Obs>
+        </Observaciones>
+        <CAE/><CAEFchVto/>
+      </FECAEDetResponse>
+    </FeDetResp>
+    <Events><Evt><Code>1</Code><Msg>Evento de prueba</Msg></Evt></Events>
+  </FECAESolicitarResult>
+</FECAESolicitarResponse>
+""")
+
+REJECTED = _envelope("""
+<FECAESolicitarResponse xmlns="http://ar.gov.afip.dif.FEV1/">
+  <FECAESolicitarResult>
+    <FeCabResp>
+      <Cuit>30740253022</Cuit><PtoVta>1</PtoVta><CbteTipo>6</CbteTipo>
+      <FchProceso>20260125123045</FchProceso><CantReg>1</CantReg><Resultado>R</Resultado>
+    </FeCabResp>
+    <FeDetResp/>
+    <Errors>
+      <Err><Code>600</Code><Msg>ValidacionDeToken: No aparecio CUIT en lista de relaciones</Msg></Err>
+      <Err><Code>10015</Code><Msg>Campo DocNro invalido</Msg></Err>
+    </Errors>
+  </FECAESolicitarResult>
+</FECAESolicitarResponse>
+""")
+
+EMPTY_RESULT = _envelope('<FECAESolicitarResponse xmlns="http://ar.gov.afip.dif.FEV1/"/>')
+
+LAST_AUTHORIZED = _envelope("""
+<FECompUltimoAutorizadoResponse xmlns="http://ar.gov.afip.dif.FEV1/">
+  <FECompUltimoAutorizadoResult>
+    <PtoVta>4</PtoVta><CbteTipo>6</CbteTipo><CbteNro> 1523 </CbteNro>
+    <Events><Evt><Code>2</Code><Msg>Mantenimiento programado</Msg></Evt></Events>
+  </FECompUltimoAutorizadoResult>
+</FECompUltimoAutorizadoResponse>
+""")
+
+LAST_AUTHORIZED_ERROR = _envelope("""
+<FECompUltimoAutorizadoResponse xmlns="http://ar.gov.afip.dif.FEV1/">
+  <FECompUltimoAutorizadoResult>
+    <PtoVta>0</PtoVta><CbteTipo>0</CbteTipo><CbteNro>0</CbteNro>
+    <Errors><Err><Code>11002</Code><Msg>El punto de venta no se encuentra habilitado</Msg></Err></Errors>
+  </FECompUltimoAutorizadoResult>
+</FECompUltimoAutorizadoResponse>
+""")
+
+
+@pytest.mark.parametrize("operation, content", [
+    ("FECAESolicitar", APPROVED),
+    ("FECAESolicitar", REJECTED),
+    ("FECAESolicitar", EMPTY_RESULT),
+    ("FECompUltimoAutorizado", LAST_AUTHORIZED),
+    ("FECompUltimoAutorizado", LAST_AUTHORIZED_ERROR),
+], ids=["approved", "rejected", "empty", "last-authorized", "last-authorized-error"])
+def test_response_matches_zeep(zeep_client, operation, content):
+
+    fast = decode_response(operation, 200, content)
+
+    assert fast == zeep_decode(zeep_client, operation, 200, content)
+    # Same JSON, key order included.
+    assert list(fast or {}) == list(zeep_decode(zeep_client, operation, 200, content) or {})
+
+
+FAULT = (
+    b'<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>'
+    b'<soap:Fault><faultcode>soap:Server</faultcode><faultstring>Server was unable to process request.</faultstring>'
+    b'<detail/></soap:Fault></soap:Body></soap:Envelope>'
+)
+
+
+@pytest.mark.parametrize("status_code", [200, 500])
+def test_fault_raised_like_zeep(zeep_client, status_code):
+
+    with pytest.raises(Fault) as fast:
+        decode_response("FECAESolicitar", status_code, FAULT)
+
+    with pytest.raises(Fault) as zeep:
+        zeep_decode(zeep_client, "FECAESolicitar", status_code, FAULT)
+
+    assert (fast.value.message, fast.value.code) == (zeep.value.message, zeep.value.code)
+
+
+@pytest.mark.parametrize("status_code, content", [
+    (500, b"Internal Server Error"),
+    (502, b""),
+])
+def test_invalid_reply_raises_transport_error_like_zeep(zeep_client, status_code, content):
+
+    with pytest.raises(TransportError):
+        decode_response("FECAESolicitar", status_code, content)
+
+    with pytest.raises(TransportError):
+        zeep_decode(zeep_client, "FECAESolicitar", status_code, content)
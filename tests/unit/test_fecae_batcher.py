@@ -0,0 +1,199 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from service.utils.comprobante_sequencer import comprobante_sequencer
+from service.utils.fecae_batcher import FECAEBatcher, is_batchable
+
+CUIT = 30740253022
+
+
+def _invoice(pto_vta: int = 1, imp_total: float = 121.0) -> dict:
+    return {
+        "Auth" : {"Cuit" : CUIT},
+        "FeCAEReq" : {
+            "FeCabReq" : {"CantReg" : 1, "PtoVta" : pto_vta, "CbteTipo" : 6},
+            "FeDetReq" : {"FECAEDetRequest" : [{"CbteDesde" : 0, "CbteHasta" : 0, "ImpTotal" : imp_total}]},
+        },
+    }
+
+
+def _last_authorized(cbte_nro: int) -> dict:
+    return {"status" : "success", "response" : {"CbteNro" : cbte_nro, "Errors" : None}}
+
+
+class FakeAfip:
+    """
+    Authorizes every record it receives and advances the sequence like the
+    route does. Records with an ImpTotal in `reject_totals` are rejected, and
+    the ones after them too (10016), as AFIP does.
+    """
+    def __init__(self, reject_batches: bool = False, reject_totals: tuple = ()) -> None:
+        self.calls: list[dict] = []
+        self.reject_batches = reject_batches
+        self.reject_totals = reject_totals
+
+    async def send(self, payload: dict) -> dict:
+        self.calls.append(payload)
+        header = payload["FeCAEReq"]["FeCabReq"]
+        details = payload["FeCAEReq"]["FeDetReq"]["FECAEDetRequest"]
+
+        if self.reject_batches and len(details) > 1:
+            result = {"status" : "success", "response" : {"FeCabResp" : None, "FeDetResp" : None,
+                                                          "Errors" : {"Err" : [{"Code" : 10000, "Msg" : "..."}]}}}
+        else:
+            answers, rejected = [], False
+            for d in details:
+                if rejected or d.get("ImpTotal") in self.reject_totals:
+                    code = 10016 if rejected else 10048
+                    answers.append({"CbteDesde" : d["CbteDesde"], "CbteHasta" : d["CbteHasta"], "Resultado" : "R",
+                                    "Observaciones" : {"Obs" : [{"Code" : code, "Msg" : "..."}]}})
+                    rejected = True
+                else:
+                    answers.append({"CbteDesde" : d["CbteDesde"], "CbteHasta" : d["CbteHasta"], "Resultado" : "A", "CAE" : f"CAE{d['CbteDesde']}"})
+            result = {
+                "status" : "success",
+                "response" : {
+                    "FeCabResp" : {**header, "Resultado" : "P" if rejected else "A"},
+                    "FeDetResp" : {"FECAEDetResponse" : answers},
+                    "Errors" : None,
+                },
+            }
+        comprobante_sequencer.record_fecae(payload, result)
+        return result
+
+
+@pytest.fixture(autouse=True)
+def clean_sequencer():
+    comprobante_sequencer.clear()
+    yield
+    comprobante_sequencer.clear()
+
+
+def test_only_single_voucher_requests_are_batchable():
+    invoice = _invoice()
+    assert is_batchable(invoice)
+
+    invoice["FeCAEReq"]["FeCabReq"]["CantReg"] = 2
+    invoice["FeCAEReq"]["FeDetReq"]["FECAEDetRequest"].append({"CbteDesde" : 0, "CbteHasta" : 0})
+    assert not is_batchable(invoice)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_invoices_share_one_call_with_consecutive_numbers():
+    batcher = FECAEBatcher(window_ms=20, max_records=250)
+    afip = FakeAfip()
+    seed = AsyncMock(return_value=_last_authorized(41))
+
+    results = await asyncio.gather(*(
+        batcher.submit(_invoice(imp_total=total), afip.send, seed) for total in (100.0, 200.0, 300.0)
+    ))
+
+    assert len(afip.calls) == 1
+    sent = afip.calls[0]["FeCAEReq"]
+    assert sent["FeCabReq"]["CantReg"] == 3
+    assert [(d["CbteDesde"], d["ImpTotal"]) for d in sent["FeDetReq"]["FECAEDetRequest"]] == [(42, 100.0), (43, 200.0), (44, 300.0)]
+
+    for (result, batch_size), number in zip(results, (42, 43, 44)):
+        assert batch_size == 3
+        assert result["response"]["FeCabResp"]["CantReg"] == 1
+        assert result["response"]["FeDetResp"]["FECAEDetResponse"] == [
+            {"CbteDesde" : number, "CbteHasta" : number, "Resultado" : "A", "CAE" : f"CAE{number}"}
+        ]
+    seed.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_next_batch_continues_the_sequence():
+    batcher = FECAEBatcher(window_ms=5, max_records=250)
+    afip = FakeAfip()
+    seed = AsyncMock(return_value=_last_authorized(41))
+
+    await batcher.submit(_invoice(), afip.send, seed)
+    result, _ = await batcher.submit(_invoice(), afip.send, seed)
+
+    assert result["response"]["FeDetResp"]["FECAEDetResponse"][0]["CbteDesde"] == 43
+    seed.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_points_of_sale_are_batched_separately():
+    batcher = FECAEBatcher(window_ms=20, max_records=250)
+    afip = FakeAfip()
+    seed = AsyncMock(return_value=_last_authorized(0))
+
+    await asyncio.gather(batcher.submit(_invoice(pto_vta=1), afip.send, seed), batcher.submit(_invoice(pto_vta=2), afip.send, seed))
+
+    assert sorted(call["FeCAEReq"]["FeCabReq"]["PtoVta"] for call in afip.calls) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_sent_without_waiting_for_the_window():
+    batcher = FECAEBatcher(window_ms=60_000, max_records=2)
+    afip = FakeAfip()
+    seed = AsyncMock(return_value=_last_authorized(0))
+
+    results = await asyncio.wait_for(asyncio.gather(
+        batcher.submit(_invoice(), afip.send, seed), batcher.submit(_invoice(), afip.send, seed),
+    ), timeout=1)
+
+    assert [batch_size for _, batch_size in results] == [2, 2]
+
+
+@pytest.mark.asyncio
+async def test_batch_rejected_as_a_whole_is_retried_one_by_one():
+    batcher = FECAEBatcher(window_ms=20, max_records=250)
+    afip = FakeAfip(reject_batches=True)
+    seed = AsyncMock(return_value=_last_authorized(41))
+
+    results = await asyncio.gather(batcher.submit(_invoice(), afip.send, seed), batcher.submit(_invoice(), afip.send, seed))
+
+    assert [call["FeCAEReq"]["FeCabReq"]["CantReg"] for call in afip.calls] == [2, 1, 1]
+    assert [result["response"]["FeDetResp"]["FECAEDetResponse"][0]["CbteDesde"] for result, _ in results] == [42, 43]
+    assert batcher.stats()["split_batches"] == 1
+
+
+@pytest.mark.asyncio
+async def test_records_after_a_rejected_one_are_renumbered_and_sent_again():
+    batcher = FECAEBatcher(window_ms=20, max_records=250)
+    afip = FakeAfip(reject_totals=(200.0,))
+    seed = AsyncMock(return_value=_last_authorized(41))
+
+    results = await asyncio.gather(*(
+        batcher.submit(_invoice(imp_total=total), afip.send, seed) for total in (100.0, 200.0, 300.0, 400.0)
+    ))
+
+    assert [[d["CbteDesde"] for d in call["FeCAEReq"]["FeDetReq"]["FECAEDetRequest"]] for call in afip.calls] == [[42, 43, 44, 45], [43, 44]]
+    answers = [result["response"]["FeDetResp"]["FECAEDetResponse"][0] for result, _ in results]
+    assert [(answer["CbteDesde"], answer["Resultado"]) for answer in answers] == [(42, "A"), (43, "R"), (43, "A"), (44, "A")]
+    assert answers[1]["Observaciones"]["Obs"][0]["Code"] == 10048
+    assert comprobante_sequencer.last_known(str(CUIT), 1, 6) == 44
+    assert batcher.stats()["resent_records"] == 2
+    seed.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_seed_error_is_returned_to_every_caller():
+    batcher = FECAEBatcher(window_ms=20, max_records=250)
+    afip = FakeAfip()
+    error = {"status" : "error", "error" : {"error_type" : "HTTP Error"}}
+    seed = AsyncMock(return_value=error)
+
+    results = await asyncio.gather(batcher.submit(_invoice(), afip.send, seed), batcher.submit(_invoice(), afip.send, seed))
+
+    assert [result for result, _ in results] == [error, error]
+    assert afip.calls == []
+
+
+@pytest.mark.asyncio
+async def test_unexpected_exceptions_reach_every_caller():
+    batcher = FECAEBatcher(window_ms=20, max_records=250)
+    send = AsyncMock(side_effect=RuntimeError("boom"))
+    seed = AsyncMock(return_value=_last_authorized(0))
+
+    results = await asyncio.gather(
+        batcher.submit(_invoice(), send, seed), batcher.submit(_invoice(), send, seed), return_exceptions=True,
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
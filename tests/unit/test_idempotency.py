@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from service.utils.idempotency import (IdempotencyKeyReused, IdempotencyStore,
+                                       fingerprint)
+
+CUIT = "30740253022"
+PAYLOAD = {"Auth" : {"Cuit" : CUIT}, "FeCAEAReq" : {"Periodo" : 202601, "Orden" : 1}}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = IdempotencyStore(tmp_path / "idempotency.sqlite3", ttl=60)
+    yield store
+    store.close()
+
+
+class FakeAfip:
+    def __init__(self, result: dict | None = None, delay: float = 0) -> None:
+        self.calls = 0
+        self.result = result or {"status" : "success", "response" : {"ResultGet" : {"CAEA" : "36043123456789"}}}
+        self.delay = delay
+
+    async def call(self) -> dict:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.result
+
+
+def test_fingerprint_ignores_auth():
+    with_token = {**PAYLOAD, "Auth" : {"Cuit" : CUIT, "Token" : "t", "Sign" : "s"}}
+    assert fingerprint(with_token) == fingerprint(PAYLOAD)
+    assert fingerprint({**PAYLOAD, "FeCAEAReq" : {"Periodo" : 202601, "Orden" : 2}}) != fingerprint(PAYLOAD)
+
+
+@pytest.mark.asyncio
+async def test_completed_result_is_replayed(store):
+    afip = FakeAfip()
+
+    first, replayed_first = await store.run("FECAEASolicitar", CUIT, "key-1", PAYLOAD, afip.call)
+    second, replayed_second = await store.run("FECAEASolicitar", CUIT, "key-1", PAYLOAD, afip.call)
+
+    assert afip.calls == 1
+    assert first == second
+    assert (replayed_first, replayed_second) == (False, True)
+    assert store.stats()["replayed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_wait_for_the_first_call(store):
+    afip = FakeAfip(delay=0.05)
+
+    results = await asyncio.gather(*(
+        store.run("FECAEASolicitar", CUIT, "key-1", PAYLOAD, afip.call) for _ in range(5)
+    ))
+
+    assert afip.calls == 1
+    assert sorted(replayed for _, replayed in results) == [False, True, True, True, True]
+
+
+@pytest.mark.asyncio
+async def test_result_survives_a_restart(tmp_path):
+    path = tmp_path / "idempotency.sqlite3"
+    afip = FakeAfip()
+
+    first = IdempotencyStore(path, ttl=60)
+    await first.run("FECAEASolicitar", CUIT, "key-1", PAYLOAD, afip.call)
+    first.close()
+
+    second = IdempotencyStore(path, ttl=60)
+    _, replayed = await second.run("FECAEASolicitar", CUIT, "key-1", PAYLOAD, afip.call)
+    second.close()
+
+    assert replayed
+    assert afip.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_key_reused_with_another_body_is_rejected(store):
+    afip = FakeAfip()
+    await store.run("FECAEASolicitar", CUIT, "key-1", PAYLOAD, afip.call)
+
+    other = {**PAYLOAD, "FeCAEAReq" : {"Periodo" : 202601, "Orden" : 2}}
+    with pytest.raises(IdempotencyKeyReused):
+        await store.run("FECAEASolicitar", CUIT, "key-1", other, afip.call)
+    assert afip.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_keys_are_scoped_by_operation_and_cuit(store):
+    afip = FakeAfip()
+    await store.run("FECAEASolicitar", CUIT, "key-1", PAYLOAD, afip.call)
+    await store.run("FECAEARegInformativo", CUIT, "key-1", PAYLOAD, afip.call)
+    await store.run("FECAEASolicitar", "20123456789", "key-1", PAYLOAD, afip.call)
+    assert afip.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_transport_errors_are_not_stored(store):
+    afip = FakeAfip(result={"status" : "error", "error" : {"error_type" : "timeout"}})
+
+    await store.run("FECAEASolicitar", CUIT, "key-1", PAYLOAD, afip.call)
+    _, replayed = await store.run("FECAEASolicitar", CUIT, "key-1", PAYLOAD, afip.call)
+
+    assert not replayed
+    assert afip.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_results_are_not_replayed_and_purged(store):
+    afip = FakeAfip()
+    await store.run("FECAEASolicitar", CUIT, "key-1", PAYLOAD, afip.call)
+    await store._store.call(lambda db: db.execute("UPDATE idempotency SET stored_at = ?", (time.time() - 120,)))
+
+    assert await store.purge() == 1
+    _, replayed = await store.run("FECAEASolicitar", CUIT, "key-1", PAYLOAD, afip.call)
+    assert not replayed
+    assert afip.calls == 2
@@ -0,0 +1,232 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from service.utils.job_queue import DONE, FAILED, QUEUED, RUNNING, JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite3", workers=2, poll_seconds=0.05, retention_seconds=60)
+    yield queue
+    queue.close()
+
+
+async def _wait_finished(queue: JobQueue, job_id: str, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = await queue.get(job_id)
+        if job.status in (DONE, FAILED):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+@pytest.mark.asyncio
+async def test_submitted_job_runs_and_stores_result(queue):
+    async def handler(payload):
+        return {"status" : "success", "response" : {"echo" : payload["n"]}}
+
+    queue.register("Echo", handler)
+    job = await queue.submit("Echo", {"n" : 7})
+    assert job.status == QUEUED
+
+    await queue.start()
+    try:
+        finished = await _wait_finished(queue, job.id)
+    finally:
+        await queue.stop()
+
+    assert finished.status == DONE
+    assert finished.attempts == 1
+    assert finished.result == {"status" : "success", "response" : {"echo" : 7}}
+    assert finished.summary()["finished_at"] is not None
+
+
+@pytest.mark.asyncio
+async def test_handler_exception_marks_job_failed(queue):
+    async def handler(payload):
+        raise RuntimeError("boom")
+
+    queue.register("Boom", handler)
+    job = await queue.submit("Boom", {})
+
+    await queue.start()
+    try:
+        finished = await _wait_finished(queue, job.id)
+    finally:
+        await queue.stop()
+
+    assert finished.status == FAILED
+    assert finished.result["error"]["details"] == "boom"
+
+
+@pytest.mark.asyncio
+async def test_submit_without_handler_is_rejected(queue):
+    with pytest.raises(ValueError):
+        await queue.submit("Unknown", {})
+
+
+@pytest.mark.asyncio
+async def test_jobs_survive_a_restart(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+
+    async def handler(payload):
+        return {"status" : "success"}
+
+    first = JobQueue(path, workers=1, poll_seconds=0.05)
+    first.register("Op", handler)
+    job = await first.submit("Op", {})
+    # Simulate a crash while the job was running.
+    await first._store.call(lambda db: db.execute("UPDATE jobs SET status = ?, attempts = 1", (RUNNING,)))
+    first.close()
+
+    second = JobQueue(path, workers=1, poll_seconds=0.05)
+    second.register("Op", handler)
+    await second.start()
+    try:
+        finished = await _wait_finished(second, job.id)
+    finally:
+        await second.stop()
+
+    assert finished.status == DONE
+    assert finished.attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_rerun_uses_the_recovered_result_instead_of_calling_again(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    calls = []
+
+    async def handler(payload):
+        calls.append(payload)
+        return {"status" : "success", "recovered" : False}
+
+    async def recover(payload):
+        return {"status" : "success", "recovered" : True} if payload["sent"] else None
+
+    first = JobQueue(path, workers=1, poll_seconds=0.05)
+    first.register("Op", handler, recover)
+    sent = await first.submit("Op", {"sent" : True})
+    lost = await first.submit("Op", {"sent" : False})
+    fresh = await first.submit("Op", {"sent" : True})
+    # Simulate a crash while the first two jobs were running.
+    await first._store.call(lambda db: db.execute("UPDATE jobs SET status = ?, attempts = 1 WHERE id IN (?, ?)", (RUNNING, sent.id, lost.id)))
+    first.close()
+
+    second = JobQueue(path, workers=1, poll_seconds=0.05)
+    second.register("Op", handler, recover)
+    await second.start()
+    try:
+        results = [(await _wait_finished(second, job.id)).result["recovered"] for job in (sent, lost, fresh)]
+    finally:
+        await second.stop()
+
+    # Only jobs claimed before the restart are checked.
+    assert results == [True, False, False]
+    assert calls == [{"sent" : False}, {"sent" : True}]
+
+
+@pytest.mark.asyncio
+async def test_workers_survive_storage_errors(queue):
+    async def handler(payload):
+        return {"status" : "success"}
+
+    queue.register("Op", handler)
+    job = await queue.submit("Op", {})
+
+    store_call = queue._store.call
+    failures = 2
+
+    async def flaky_call(func):
+        nonlocal failures
+        if failures and asyncio.current_task() in queue._workers:
+            failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return await store_call(func)
+
+    queue._store.call = flaky_call
+    await queue.start()
+    try:
+        finished = await _wait_finished(queue, job.id)
+    finally:
+        await queue.stop()
+
+    assert finished.status == DONE
+    assert failures == 0
+
+
+@pytest.mark.asyncio
+async def test_jobs_of_a_sequence_run_one_at_a_time_in_order(queue):
+    running = 0
+    order = []
+
+    async def handler(payload):
+        nonlocal running
+        running += 1
+        assert running == 1
+        await asyncio.sleep(0.01)
+        order.append(payload["n"])
+        running -= 1
+        return {"status" : "success"}
+
+    queue.register("Op", handler)
+    jobs = [await queue.submit("Op", {"n" : n}, sequence="30740253022/1/6") for n in range(4)]
+
+    await queue.start()
+    try:
+        for job in jobs:
+            await _wait_finished(queue, job.id)
+    finally:
+        await queue.stop()
+
+    assert order == [0, 1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_purge_deletes_only_old_finished_jobs(queue):
+    async def handler(payload):
+        return {"status" : "success"}
+
+    queue.register("Op", handler)
+    old = await queue.submit("Op", {})
+    pending = await queue.submit("Op", {})
+    await queue._store.call(lambda db: db.execute(
+        "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?", (DONE, time.time() - 3600, old.id)
+    ))
+
+    assert await queue.purge() == 1
+    assert await queue.get(old.id) is None
+    assert (await queue.get(pending.id)).status == QUEUED
+    assert (await queue.stats())[QUEUED] == 1
+
+
+@pytest.mark.asyncio
+async def test_running_job_reports_progress(queue):
+    release = asyncio.Event()
+
+    async def handler(payload):
+        queue.report_progress({"done" : 1, "total" : 2})
+        await release.wait()
+        return {"status" : "success"}
+
+    queue.register("Slow", handler)
+    job = await queue.submit("Slow", {})
+
+    await queue.start()
+    try:
+        for _ in range(200):
+            running = await queue.get(job.id)
+            if running.progress is not None:
+                break
+            await asyncio.sleep(0.01)
+        assert running.summary()["progress"] == {"done" : 1, "total" : 2}
+
+        release.set()
+        finished = await _wait_finished(queue, job.id)
+    finally:
+        await queue.stop()
+
+    assert "progress" not in finished.summary()
@@ -0,0 +1,75 @@
+import os
+from unittest.mock import patch
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+
+from config.paths import AfipPaths
+from service.crypto.key_cache import KeyMaterialCache
+
+from ..conftest import generate_test_files
+
+CUIT = "20304050607"
+
+
+@pytest.fixture
+def tenant_paths(tmp_path):
+    paths = AfipPaths(
+        base_xml=tmp_path / f"xml/{CUIT}",
+        base_crypto=tmp_path / "crypto",
+        base_certs=tmp_path / f"certs/{CUIT}",
+    )
+    os.makedirs(paths.base_certs, exist_ok=True)
+    _, private_key_bytes, certificate_bytes = generate_test_files()
+    paths.private_key.write_bytes(private_key_bytes)
+    paths.certificate.write_bytes(certificate_bytes)
+
+    with patch("service.crypto.key_cache.paths.get_afip_paths", return_value=paths):
+        yield paths
+
+
+def _replace_tenant_files(paths: AfipPaths) -> None:
+    _, private_key_bytes, certificate_bytes = generate_test_files()
+    paths.private_key.write_bytes(private_key_bytes)
+    paths.certificate.write_bytes(certificate_bytes)
+    # Make sure the new mtime differs even on coarse-grained filesystems.
+    stat = os.stat(paths.private_key)
+    os.utime(paths.private_key, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+class TestKeyMaterialCache:
+    def test_pem_files_are_parsed_once(self, tenant_paths):
+        cache = KeyMaterialCache()
+
+        with patch("service.crypto.key_cache.serialization.load_pem_private_key",
+                   wraps=serialization.load_pem_private_key) as spy:
+            first = cache.get(CUIT)
+            second = cache.get(CUIT)
+
+        assert spy.call_count == 1
+        assert first[0] is second[0]
+        assert first[1] is second[1]
+
+    def test_reloads_when_files_change(self, tenant_paths):
+        cache = KeyMaterialCache()
+        _, old_certificate = cache.get(CUIT)
+
+        _replace_tenant_files(tenant_paths)
+        _, new_certificate = cache.get(CUIT)
+
+        assert new_certificate != old_certificate
+
+    def test_invalidate_forces_reload(self, tenant_paths):
+        cache = KeyMaterialCache()
+        old_key, _ = cache.get(CUIT)
+
+        cache.invalidate(CUIT)
+
+        assert cache.get(CUIT)[0] is not old_key
+
+    def test_missing_files_raise(self, tmp_path):
+        paths = AfipPaths(base_xml=tmp_path, base_crypto=tmp_path, base_certs=tmp_path / "missing")
+
+        with patch("service.crypto.key_cache.paths.get_afip_paths", return_value=paths):
+            with pytest.raises(FileNotFoundError):
+                KeyMaterialCache().get(CUIT)
@@ -0,0 +1,156 @@
+import asyncio
+import json
+
+import pytest
+
+from service.utils.ndjson_stream import map_ordered, read_lines, stream_ndjson
+
+
+async def _chunks(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(stream) -> list[dict]:
+    return [json.loads(line) async for line in stream]
+
+
+@pytest.mark.asyncio
+async def test_lines_are_split_across_chunks():
+    lines = [item async for item in read_lines(_chunks(b'{"a":', b' 1}\n\n{"b"', b': 2}\n{"c": 3}'), 1024)]
+
+    assert lines == [(1, b'{"a": 1}'), (3, b'{"b": 2}'), (4, b'{"c": 3}')]
+
+
+@pytest.mark.asyncio
+async def test_overlong_line_stops_the_stream():
+    with pytest.raises(ValueError):
+        [item async for item in read_lines(_chunks(b"x" * 20, b"y" * 20), 32)]
+
+
+@pytest.mark.asyncio
+async def test_every_line_gets_a_result():
+
+    def handle(line_no, line):
+        value = json.loads(line)["n"]
+        if value < 0:
+            return None, {"status" : "error"}
+
+        async def work():
+            await asyncio.sleep(0.001 * (3 - value))
+            return {"status" : "success", "n" : value}
+
+        return value % 2, work
+
+    results = await _collect(stream_ndjson(
+        _chunks(b'{"n": 0}\n{"n": 1}\n{"n": -1}\n{"n": 2}\n'), handle,
+        method="Test", max_in_flight=10, per_sequence=5, max_line_bytes=1024,
+    ))
+
+    assert sorted(result["line"] for result in results) == [1, 2, 3, 4]
+    assert {result["line"] : result["status"] for result in results}[3] == "error"
+
+
+@pytest.mark.asyncio
+async def test_same_sequence_runs_in_input_order_one_at_a_time():
+    running, started = [], []
+
+    def handle(line_no, line):
+        async def work():
+            assert not running
+            running.append(line_no)
+            started.append(line_no)
+            await asyncio.sleep(0.001)
+            running.remove(line_no)
+            return {"status" : "success"}
+
+        return "same-sequence", work
+
+    body = b"".join(b'{"n": %d}\n' % n for n in range(10))
+    results = await _collect(stream_ndjson(
+        _chunks(body), handle, method="Test", max_in_flight=10, per_sequence=1, max_line_bytes=1024,
+    ))
+
+    assert started == list(range(1, 11))
+    assert [result["line"] for result in results] == list(range(1, 11))
+
+
+@pytest.mark.asyncio
+async def test_reading_stops_while_too_many_lines_are_in_flight():
+    read = 0
+    release = asyncio.Event()
+
+    async def chunks():
+        nonlocal read
+        for n in range(20):
+            read += 1
+            yield b'{"n": %d}\n' % n
+
+    def handle(line_no, line):
+        async def work():
+            await release.wait()
+            return {"status" : "success"}
+        return line_no, work
+
+    stream = stream_ndjson(chunks(), handle, method="Test", max_in_flight=3, per_sequence=1, max_line_bytes=1024)
+    consumer = asyncio.create_task(_collect(stream))
+    await asyncio.sleep(0.05)
+
+    assert read <= 4
+    release.set()
+    assert len(await consumer) == 20
+
+
+@pytest.mark.asyncio
+async def test_failed_work_and_invalid_stream_are_reported():
+
+    def handle(line_no, line):
+        async def work():
+            raise RuntimeError("boom")
+        return line_no, work
+
+    results = await _collect(stream_ndjson(
+        _chunks(b'{"n": 1}\n', b"x" * 64), handle, method="Test", max_in_flight=5, per_sequence=1, max_line_bytes=32,
+    ))
+
+    assert {(result["line"], result["error"]["error_type"]) for result in results} == {(1, "unknown"), (None, "Invalid stream")}
+
+
+@pytest.mark.asyncio
+async def test_map_ordered_keeps_input_order_with_bounded_concurrency():
+    running = 0
+    peak = 0
+
+    async def lookup(n: int) -> int:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        # Later items finish first.
+        await asyncio.sleep(0.01 * (5 - n % 5))
+        running -= 1
+        return n * 10
+
+    results = [result async for result in map_ordered(range(10), lookup, max_in_flight=3)]
+
+    assert results == [n * 10 for n in range(10)]
+    assert peak == 3
+
+
+@pytest.mark.asyncio
+async def test_map_ordered_cancels_pending_calls_when_closed():
+    cancelled = []
+
+    async def lookup(n: int) -> int:
+        try:
+            await asyncio.sleep(0 if n == 0 else 10)
+        except asyncio.CancelledError:
+            cancelled.append(n)
+            raise
+        return n
+
+    stream = map_ordered(range(5), lookup, max_in_flight=3)
+    assert await stream.__anext__() == 0
+    await stream.aclose()
+    await asyncio.sleep(0)
+
+    assert sorted(cancelled) == [1, 2]
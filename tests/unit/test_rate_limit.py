@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import pytest
+
+from service.utils.rate_limit import (CATALOG, INVOICE, QUERY, AFIPRateLimiter,
+                                      FairLimiter, TokenBucket,
+                                      operation_class)
+
+
+@pytest.mark.asyncio
+async def test_burst_is_served_without_waiting():
+    bucket = TokenBucket(rate=10, burst=5)
+
+    waits = [await bucket.acquire() for _ in range(5)]
+
+    assert max(waits) < 0.01
+    assert bucket.stats()["delayed"] == 0
+
+
+@pytest.mark.asyncio
+async def test_acquisitions_beyond_the_burst_are_paced():
+    bucket = TokenBucket(rate=50, burst=2)
+
+    started = time.monotonic()
+    await asyncio.gather(*(bucket.acquire() for _ in range(7)))
+    elapsed = time.monotonic() - started
+
+    # 2 from the burst, the other 5 at 50/s.
+    assert elapsed >= 0.09
+    assert bucket.stats()["acquired"] == 7
+    assert bucket.stats()["delayed"] >= 5
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_in_arrival_order():
+    bucket = TokenBucket(rate=100, burst=1)
+    order = []
+
+    async def take(n: int) -> None:
+        await bucket.acquire()
+        order.append(n)
+
+    await asyncio.gather(*(take(n) for n in range(5)))
+
+    assert order == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_zero_rate_disables_the_limit():
+    bucket = TokenBucket(rate=0, burst=1)
+
+    assert [await bucket.acquire() for _ in range(100)] == [0.0] * 100
+
+
+@pytest.mark.asyncio
+async def test_global_queue_is_served_round_robin_across_cuits():
+    limiter = FairLimiter(global_rate=200, per_cuit_rate=0, burst_seconds=0)
+    order = []
+
+    async def call(cuit: str) -> None:
+        await limiter.acquire(cuit)
+        order.append(cuit)
+
+    # A bulk import of one tenant queued ahead of two calls of another.
+    await asyncio.gather(*(call("bulk") for _ in range(6)), *(call("pos") for _ in range(2)))
+
+    assert order.index("pos") <= 2
+    assert order[:5].count("pos") == 2
+    assert limiter.stats()["delayed"] >= 6
+
+
+@pytest.mark.asyncio
+async def test_per_cuit_limit_does_not_slow_other_tenants():
+    limiter = FairLimiter(global_rate=0, per_cuit_rate=20, burst_seconds=0.1)
+
+    started = time.monotonic()
+    await asyncio.gather(*(limiter.acquire("bulk") for _ in range(4)))
+    bulk_elapsed = time.monotonic() - started
+
+    assert await limiter.acquire("pos") < 0.01
+    # 2 from the burst, the other 2 at 20/s.
+    assert bulk_elapsed >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiters_are_skipped():
+    limiter = FairLimiter(global_rate=50, per_cuit_rate=0, burst_seconds=0)
+    await limiter.acquire("a")
+
+    waiter = asyncio.create_task(limiter.acquire("a"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+
+    assert await limiter.acquire("b") < 0.1
+    assert limiter.stats()["waiting"] == 0
+
+
+@pytest.mark.asyncio
+async def test_operations_are_limited_by_class():
+    limiter = AFIPRateLimiter({INVOICE : (10, 0), QUERY : (0, 0), CATALOG : (0, 0)}, burst_seconds=0)
+
+    await limiter.acquire("FECAESolicitar", "30740253022")
+    assert max([await limiter.acquire("FECompConsultar", "30740253022") for _ in range(20)]) < 0.01
+    assert limiter.stats()[INVOICE]["acquired"] == 1
+    assert (operation_class("FEParamGetPtosVenta"), operation_class("FECAEARegInformativo"), operation_class("FECompUltimoAutorizado")) == (CATALOG, INVOICE, QUERY)
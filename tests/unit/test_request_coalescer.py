@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from service.utils.request_coalescer import RequestCoalescer
+
+
+def _payload(token: str, pto_vta: int = 1, cuit: int = 30740253022) -> dict:
+    return {"Auth" : {"Cuit" : cuit, "Token" : token, "Sign" : "sign"}, "PtoVta" : pto_vta, "CbteTipo" : 6}
+
+
+class FakeAfip:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def call(self) -> dict:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {"status" : "success", "response" : {"CbteNro" : self.calls}}
+
+
+@pytest.mark.asyncio
+async def test_identical_read_only_calls_in_flight_share_one_upstream_call():
+    coalescer = RequestCoalescer(enabled=True)
+    afip = FakeAfip()
+
+    results = await asyncio.gather(*(
+        coalescer.run("FECompUltimoAutorizado", _payload(token=f"token-{n}"), afip.call) for n in range(5)
+    ))
+
+    assert afip.calls == 1
+    assert all(result == results[0] for result in results)
+    assert coalescer.stats() == {"enabled" : True, "upstream_calls" : 1, "coalesced" : 4}
+
+
+@pytest.mark.asyncio
+async def test_callers_sharing_a_call_get_their_own_result():
+    coalescer = RequestCoalescer(enabled=True)
+    afip = FakeAfip()
+
+    first, second = await asyncio.gather(*(
+        coalescer.run("FECompUltimoAutorizado", _payload(token=f"token-{n}"), afip.call) for n in range(2)
+    ))
+    first["response"]["CbteNro"] = 99
+
+    assert afip.calls == 1
+    assert second["response"]["CbteNro"] == 1
+
+
+@pytest.mark.asyncio
+async def test_different_payloads_or_tenants_are_not_shared():
+    coalescer = RequestCoalescer(enabled=True)
+    afip = FakeAfip()
+
+    await asyncio.gather(
+        coalescer.run("FECompUltimoAutorizado", _payload("t", pto_vta=1), afip.call),
+        coalescer.run("FECompUltimoAutorizado", _payload("t", pto_vta=2), afip.call),
+        coalescer.run("FECompUltimoAutorizado", _payload("t", cuit=20123456789), afip.call),
+        coalescer.run("FEParamGetPtosVenta", _payload("t"), afip.call),
+    )
+
+    assert afip.calls == 4
+
+
+@pytest.mark.asyncio
+async def test_sequential_calls_are_not_cached():
+    coalescer = RequestCoalescer(enabled=True)
+    afip = FakeAfip()
+
+    first = await coalescer.run("FECompUltimoAutorizado", _payload("t"), afip.call)
+    second = await coalescer.run("FECompUltimoAutorizado", _payload("t"), afip.call)
+
+    assert (first["response"]["CbteNro"], second["response"]["CbteNro"]) == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_mutating_operations_and_disabled_coalescer_pass_through():
+    afip = FakeAfip()
+
+    await asyncio.gather(*(RequestCoalescer(enabled=True).run("FECAEASolicitar", _payload("t"), afip.call) for _ in range(2)))
+    disabled = RequestCoalescer(enabled=False)
+    await asyncio.gather(*(disabled.run("FECompUltimoAutorizado", _payload("t"), afip.call) for _ in range(2)))
+
+    assert afip.calls == 4
@@ -0,0 +1,99 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from service.utils.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+class TestSingleFlight:
+    async def test_concurrent_calls_share_one_execution(self):
+        flights = SingleFlight()
+        calls = {"value": 0}
+
+        async def work():
+            calls["value"] += 1
+            await asyncio.sleep(0.05)
+            return {"status": "success"}
+
+        results = await asyncio.gather(*(flights.run("20304050607", work) for _ in range(50)))
+
+        assert calls["value"] == 1
+        assert all(result == {"status": "success"} for result in results)
+        assert not flights.in_flight("20304050607")
+
+    async def test_different_keys_run_independently(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def work(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return key
+
+        results = await asyncio.gather(
+            flights.run("a", lambda: work("a")),
+            flights.run("b", lambda: work("b")),
+        )
+
+        assert results == ["a", "b"]
+        assert sorted(calls) == ["a", "b"]
+
+    async def test_exception_is_shared_by_all_waiters(self):
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("WSAA error")
+
+        results = await asyncio.gather(*(flights.run("k", work) for _ in range(3)), return_exceptions=True)
+
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    async def test_waiter_timeout_does_not_cancel_shared_work(self):
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.1)
+            return "done"
+
+        with pytest.raises(asyncio.TimeoutError):
+            await flights.run("k", work, timeout=0.01)
+
+        assert flights.in_flight("k")
+        assert await flights.run("k", work) == "done"
+
+
+@pytest.mark.asyncio
+class TestRegenerateAfipAccessToken:
+    async def test_burst_triggers_single_generation(self):
+        from service.controllers.request_access_token_controller import \
+            regenerate_afip_access_token
+
+        calls = {"value": 0}
+
+        async def fake_generate(cuit):
+            calls["value"] += 1
+            await asyncio.sleep(0.05)
+            return {"status": "success"}
+
+        with patch("service.controllers.request_access_token_controller.generate_afip_access_token", fake_generate):
+            results = await asyncio.gather(*(regenerate_afip_access_token("20304050607") for _ in range(200)))
+
+        assert calls["value"] == 1
+        assert all(result["status"] == "success" for result in results)
+
+    async def test_wait_timeout_returns_error_status(self):
+        from service.controllers.request_access_token_controller import \
+            regenerate_afip_access_token
+
+        async def slow_generate(cuit):
+            await asyncio.sleep(0.2)
+            return {"status": "success"}
+
+        with patch("service.controllers.request_access_token_controller.generate_afip_access_token", slow_generate):
+            result = await regenerate_afip_access_token("20304050607", timeout=0.01)
+            assert result["status"] != "success"
+            # Let the shared regeneration finish inside the patch.
+            await asyncio.sleep(0.25)
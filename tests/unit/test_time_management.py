@@ -1,14 +1,53 @@
 from unittest.mock import patch
 
-from service.time.time_management import generate_ntp_timestamp
+from service.time.afip_clock import afip_clock
+from service.time.time_management import (generate_ntp_timestamp,
+                                          request_ntp_for_readiness)
 
 
 def test_generate_ntp_timestamp():
 
+    afip_clock.reset()
     with patch('ntplib.NTPClient') as MockClient:
         instance = MockClient.return_value
         instance.request.return_value.tx_time = 1673356800
 
         epoch, gen_time, exp_time = generate_ntp_timestamp()
 
-        assert epoch == 1673356800
\ No newline at end of file
+        assert epoch == 1673356800
+    afip_clock.reset()
+
+
+def test_generate_ntp_timestamp_served_from_clock_offset():
+
+    afip_clock.reset()
+    with patch('ntplib.NTPClient') as MockClient:
+        MockClient.return_value.request.return_value.tx_time = 1673356800
+        generate_ntp_timestamp()
+        generate_ntp_timestamp()
+
+        assert MockClient.return_value.request.call_count == 1
+    afip_clock.reset()
+
+
+def test_generate_ntp_timestamp_ntp_unavailable():
+
+    afip_clock.reset()
+    with patch('ntplib.NTPClient') as MockClient:
+        MockClient.return_value.request.side_effect = OSError("unreachable")
+
+        assert generate_ntp_timestamp() == (False, False, False)
+
+
+def test_readiness_does_not_query_ntp():
+
+    afip_clock.reset()
+    with patch('ntplib.NTPClient') as MockClient:
+        assert request_ntp_for_readiness() is False
+
+        MockClient.return_value.request.return_value.tx_time = 1673356800
+        afip_clock.sample()
+        assert request_ntp_for_readiness() is True
+
+        assert MockClient.return_value.request.call_count == 1
+    afip_clock.reset()
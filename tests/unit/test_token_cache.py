@@ -0,0 +1,114 @@
+import os
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from config.paths import AfipPaths
+from service.utils.token_cache import TokenCache, token_cache
+from service.xml_management.xml_builder import extract_credentials_from_xml
+
+CUIT = "20304050607"
+
+LOGIN_TICKET_RESPONSE = """<?xml version="1.0" encoding="UTF-8"?>
+<loginTicketResponse version="1.0">
+    <header>
+        <expirationTime>{expiration}</expirationTime>
+    </header>
+    <credentials>
+        <token>disk-token</token>
+        <sign>disk-sign</sign>
+    </credentials>
+</loginTicketResponse>"""
+
+
+@pytest.fixture(autouse=True)
+def clean_token_cache():
+    token_cache.clear()
+    yield
+    token_cache.clear()
+
+
+def _write_login_response(tmp_path, expiration: datetime) -> AfipPaths:
+    paths = AfipPaths(
+        base_xml=tmp_path / f"xml/{CUIT}",
+        base_crypto=tmp_path / "crypto",
+        base_certs=tmp_path / f"certs/{CUIT}",
+    )
+    os.makedirs(paths.base_xml, exist_ok=True)
+    paths.login_response.write_text(LOGIN_TICKET_RESPONSE.format(expiration=expiration.isoformat()))
+    return paths
+
+
+class TestTokenCache:
+    def test_returns_valid_entry(self):
+        cache = TokenCache(expiry_margin_seconds=60)
+        expiration = datetime.now(timezone.utc) + timedelta(hours=12)
+        cache.set(CUIT, "token", "sign", expiration)
+
+        entry = cache.get(CUIT)
+        assert entry.token == "token"
+        assert entry.sign == "sign"
+        assert entry.expiration == expiration
+
+    def test_evicts_entry_inside_expiry_margin(self):
+        cache = TokenCache(expiry_margin_seconds=60)
+        cache.set(CUIT, "token", "sign", datetime.now(timezone.utc) + timedelta(seconds=30))
+
+        assert cache.get(CUIT) is None
+        assert cache.get(CUIT) is None
+
+    def test_invalidate_is_per_cuit(self):
+        cache = TokenCache()
+        expiration = datetime.now(timezone.utc) + timedelta(hours=12)
+        cache.set(CUIT, "token", "sign", expiration)
+        cache.set("27123456789", "other", "other", expiration)
+
+        cache.invalidate(CUIT)
+
+        assert cache.get(CUIT) is None
+        assert cache.get("27123456789").token == "other"
+
+
+@pytest.mark.asyncio
+class TestGetTokenAndSignUsesCache:
+    async def test_cache_hit_skips_disk(self):
+        from service.api.wsfe import _get_token_and_sign
+
+        token_cache.set(CUIT, "cached-token", "cached-sign", datetime.now(timezone.utc) + timedelta(hours=12))
+
+        with patch("service.api.wsfe.xml_exists") as mock_exists, \
+             patch("service.api.wsfe.extract_credentials_from_xml") as mock_extract:
+            assert await _get_token_and_sign(CUIT) == ("cached-token", "cached-sign")
+
+        mock_exists.assert_not_called()
+        mock_extract.assert_not_called()
+
+    async def test_cache_miss_reads_disk_once(self, tmp_path):
+        from service.api.wsfe import _get_token_and_sign
+
+        paths = _write_login_response(tmp_path, datetime.now(timezone.utc) + timedelta(hours=12))
+
+        with patch("service.xml_management.xml_builder.paths.get_afip_paths", return_value=paths), \
+             patch("service.api.wsfe.extract_credentials_from_xml", wraps=extract_credentials_from_xml) as spy:
+            assert await _get_token_and_sign(CUIT) == ("disk-token", "disk-sign")
+            assert await _get_token_and_sign(CUIT) == ("disk-token", "disk-sign")
+
+        assert spy.call_count == 1
+
+    async def test_expired_token_on_disk_is_regenerated(self, tmp_path):
+        from service.api.wsfe import _get_token_and_sign
+
+        paths = _write_login_response(tmp_path, datetime.now(timezone.utc) - timedelta(hours=1))
+
+        async def fake_generate(cuit):
+            token_cache.set(cuit, "new-token", "new-sign", datetime.now(timezone.utc) + timedelta(hours=12))
+            return {"status": "success"}
+
+        mock_generate = AsyncMock(side_effect=fake_generate)
+
+        with patch("service.xml_management.xml_builder.paths.get_afip_paths", return_value=paths), \
+             patch("service.controllers.request_access_token_controller.generate_afip_access_token", mock_generate):
+            assert await _get_token_and_sign(CUIT) == ("new-token", "new-sign")
+
+        mock_generate.assert_awaited_once_with(CUIT)
@@ -0,0 +1,107 @@
+from unittest.mock import patch
+
+from lxml import etree
+from zeep import AsyncClient, Settings
+from zeep.helpers import serialize_object
+from zeep.transports import AsyncTransport
+
+from service.soap_client.wsdl import wsdl_cache
+from service.soap_client.wsdl.wsdl_cache import (get_cache_path,
+                                                 load_wsdl_document)
+from service.soap_client.wsdl.wsdl_manager import get_wsfe_wsdl
+
+AUTH = {"Token" : "t", "Sign" : "s", "Cuit" : 30740253022}
+
+INVOICE = {
+    "FeCabReq" : {"CantReg" : 1, "PtoVta" : 1, "CbteTipo" : 6},
+    "FeDetReq" : {
+        "FECAEDetRequest" : [{
+            "Concepto" : 1, "DocTipo" : 99, "DocNro" : 0,
+            "CbteDesde" : 1, "CbteHasta" : 1, "CbteFch" : "20260101",
+            "ImpTotal" : 121.0, "ImpTotConc" : 0, "ImpNeto" : 100.0,
+            "ImpOpEx" : 0, "ImpTrib" : 0, "ImpIVA" : 21.0,
+            "MonId" : "PES", "MonCotiz" : 1, "CondicionIVAReceptorId" : 5,
+            "Iva" : {"AlicIva" : [{"Id" : 5, "BaseImp" : 100.0, "Importe" : 21.0}]},
+        }]
+    },
+}
+
+
+LAST_AUTHORIZED_RESPONSE = b"""<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap:Body>
+    <FECompUltimoAutorizadoResponse xmlns="http://ar.gov.afip.dif.FEV1/">
+      <FECompUltimoAutorizadoResult>
+        <PtoVta>1</PtoVta>
+        <CbteTipo>6</CbteTipo>
+        <CbteNro>42</CbteNro>
+      </FECompUltimoAutorizadoResult>
+    </FECompUltimoAutorizadoResponse>
+  </soap:Body>
+</soap:Envelope>"""
+
+
+def _build_client(transport: AsyncTransport) -> AsyncClient:
+    settings = Settings()
+    document = load_wsdl_document(get_wsfe_wsdl(), transport, settings, enabled=True)
+    return AsyncClient(wsdl=document, transport=transport, settings=settings)
+
+
+def _envelope(client: AsyncClient, operation: str, **kwargs) -> bytes:
+    return etree.tostring(client.create_message(client.service, operation, **kwargs))
+
+
+def _reply(client: AsyncClient, operation: str, envelope: bytes) -> dict:
+    output = client.service._binding.get(operation).output
+    return serialize_object(output.deserialize(etree.fromstring(envelope)))
+
+
+def test_cached_document_builds_identical_envelopes(wsdl_cache_dir):
+
+    transport = AsyncTransport()
+    parsed = _build_client(transport)
+    assert get_cache_path(get_wsfe_wsdl()).exists()
+
+    with patch.object(wsdl_cache, "Document", side_effect=AssertionError("WSDL parsed again")):
+        cached = _build_client(transport)
+
+    assert cached.wsdl is not parsed.wsdl
+
+    for operation, kwargs in (
+        ("FECompUltimoAutorizado", {"Auth" : AUTH, "PtoVta" : 1, "CbteTipo" : 6}),
+        ("FECAESolicitar", {"Auth" : AUTH, "FeCAEReq" : INVOICE}),
+    ):
+        assert _envelope(cached, operation, **kwargs) == _envelope(parsed, operation, **kwargs)
+
+    reply = _reply(cached, "FECompUltimoAutorizado", LAST_AUTHORIZED_RESPONSE)
+    assert reply == _reply(parsed, "FECompUltimoAutorizado", LAST_AUTHORIZED_RESPONSE)
+    assert reply["CbteNro"] == 42
+
+
+def test_cache_key_changes_with_wsdl_content(tmp_path, wsdl_cache_dir):
+
+    wsdl = tmp_path / "wsfe.wsdl"
+    wsdl.write_bytes(open(get_wsfe_wsdl(), "rb").read())
+    original = get_cache_path(str(wsdl))
+
+    wsdl.write_bytes(wsdl.read_bytes() + b"\n")
+
+    assert get_cache_path(str(wsdl)) != original
+
+
+def test_corrupt_cache_file_is_replaced(wsdl_cache_dir):
+
+    cache_path = get_cache_path(get_wsfe_wsdl())
+    cache_path.parent.mkdir(parents=True)
+    cache_path.write_bytes(b"not a pickle")
+
+    client = _build_client(AsyncTransport())
+
+    assert client.service.FEDummy is not None
+    assert cache_path.read_bytes() != b"not a pickle"
+
+
+def test_disabled_cache_writes_nothing(wsdl_cache_dir):
+
+    load_wsdl_document(get_wsfe_wsdl(), AsyncTransport(), Settings(), enabled=False)
+
+    assert not wsdl_cache_dir.exists()
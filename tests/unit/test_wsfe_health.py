@@ -0,0 +1,52 @@
+from service.utils.wsfe_health import WSFEHealth
+
+
+def _health() -> WSFEHealth:
+    return WSFEHealth(window_seconds=60, min_samples=4, error_rate=0.5, latency_seconds=5.0)
+
+
+def test_errors_above_the_threshold_mark_wsfe_degraded():
+    health = _health()
+
+    for ok in (True, False, True):
+        health.record(0.2, ok)
+    assert not health.degraded
+
+    health.record(0.2, False)
+    assert health.degraded
+    assert health.stats()["episodes"] == 1
+
+
+def test_slow_calls_mark_wsfe_degraded():
+    health = _health()
+
+    for _ in range(4):
+        health.record(6.0, True)
+
+    assert health.degraded
+
+
+def test_too_few_samples_do_not_trigger():
+    health = _health()
+
+    for _ in range(3):
+        health.record(0.1, False)
+
+    assert not health.degraded
+
+
+def test_recover_accumulates_time_in_contingency():
+    health = _health()
+    for _ in range(4):
+        health.record(0.1, False)
+
+    # Successful calls while degraded do not switch back on their own.
+    health.record(0.1, True)
+    assert health.degraded
+
+    health.recover()
+    stats = health.stats()
+    assert not health.degraded
+    assert stats["mode"] == "normal"
+    assert stats["window_calls"] == 0
+    assert stats["total_seconds_degraded"] >= 0.0